@@ -0,0 +1,33 @@
+import importlib
+import sys
+
+# 协程异步模式需要在导入 socket、threading 等模块之前 monkey patch，
+# 由入口（main.py）在导入服务器之前调用；threading 模式什么都不做
+
+
+def patch(mode):
+    if mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+    elif mode != 'threading':
+        raise ValueError(f'未知的异步模式: {mode}')
+
+
+def original(module, name):
+    """
+    monkey patch 之前的 module.name，例如 original('_thread', 'start_new_thread')。
+    打过补丁后 threading、time.sleep 等都是协程版本，必须运行在真正操作系统线程里的代码
+    （例如录制的写线程）用这里取到的原始实现；没有打补丁时就是当前的实现
+    """
+    if 'eventlet.patcher' in sys.modules:
+        from eventlet import patcher
+        if patcher.is_monkey_patched('thread'):
+            return getattr(patcher.original(module), name)
+    if 'gevent.monkey' in sys.modules:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            return monkey.get_original(module, name)
+    return getattr(importlib.import_module(module), name)
@@ -0,0 +1,185 @@
+import struct
+
+import numpy as np
+
+try:
+    import opuslib
+except ImportError:  # 没有 opuslib（libopus）时不提供 opus
+    opuslib = None
+
+# 音频服务器的编解码器。服务器内部统一使用 16 位小端单声道 PCM（采样率 pcm_rate），
+# 每个客户端连接时协商一个编解码器，收到的音频先解码成 PCM，发出的音频按接收者的编解码器编码：
+#   pcm   原样传输（旧客户端），44.1 kHz 约 705 kbit/s
+#   pcmu  G.711 μ-law，降采样到 8 kHz，64 kbit/s
+#   pcma  G.711 A-law，降采样到 8 kHz，64 kbit/s
+#   opus  48 kHz、20ms 一帧，默认 24 kbit/s（需要 opuslib）
+# 编解码器对象带状态（opus 的编码器/解码器、未凑满一帧的样本），每个客户端一个实例。
+
+PCM_DTYPE = np.dtype('<i2')
+
+
+def _lowpass(samples, cutoff):
+    """简单的加窗 sinc 低通滤波，cutoff 为相对采样率的截止频率（0~0.5）"""
+    taps = 31
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = np.sinc(2 * cutoff * n) * np.hamming(taps)
+    kernel /= kernel.sum()
+    return np.convolve(samples, kernel, mode='same')
+
+
+def resample(samples, src_rate, dst_rate):
+    """线性插值重采样，降采样前先低通滤波防止混叠；返回 float64 数组"""
+    samples = np.asarray(samples, dtype=np.float64)
+    if src_rate == dst_rate or not len(samples):
+        return samples
+    if dst_rate < src_rate:
+        samples = _lowpass(samples, dst_rate / src_rate / 2)
+    count = max(1, int(round(len(samples) * dst_rate / src_rate)))
+    positions = np.linspace(0, len(samples) - 1, count)
+    return np.interp(positions, np.arange(len(samples)), samples)
+
+
+def _to_int16(samples):
+    return np.clip(np.round(samples), -32768, 32767).astype(PCM_DTYPE)
+
+
+class PcmCodec:
+    name = 'pcm'
+    stateless = True
+
+    def __init__(self, pcm_rate=44100):
+        self.pcm_rate = pcm_rate
+        self.rate = pcm_rate
+
+    def encode(self, pcm):
+        return bytes(pcm)
+
+    def decode(self, data):
+        return bytes(data)
+
+
+class _G711Codec:
+    """G.711 的公共部分：8 kHz 重采样，子类实现 8 位压扩"""
+    rate = 8000
+    stateless = True
+
+    def __init__(self, pcm_rate=44100):
+        self.pcm_rate = pcm_rate
+
+    def encode(self, pcm):
+        samples = np.frombuffer(pcm, dtype=PCM_DTYPE)
+        samples = _to_int16(resample(samples, self.pcm_rate, self.rate)).astype(np.int32)
+        return self._compress(samples).astype(np.uint8).tobytes()
+
+    def decode(self, data):
+        samples = self._expand(np.frombuffer(data, dtype=np.uint8).astype(np.int32))
+        return _to_int16(resample(samples, self.rate, self.pcm_rate)).tobytes()
+
+
+class MuLawCodec(_G711Codec):
+    name = 'pcmu'
+    BIAS = 0x84
+    CLIP = 32635
+
+    def _compress(self, x):
+        sign = (x < 0).astype(np.int32) << 7
+        x = np.minimum(np.abs(x), self.CLIP) + self.BIAS
+        exponent = np.floor(np.log2(x)).astype(np.int32) - 7
+        mantissa = (x >> (exponent + 3)) & 0x0F
+        return ~(sign | (exponent << 4) | mantissa) & 0xFF
+
+    def _expand(self, b):
+        b = ~b & 0xFF
+        exponent = (b >> 4) & 0x07
+        x = (((b & 0x0F) << 3) + self.BIAS) << exponent
+        x -= self.BIAS
+        return np.where(b & 0x80, -x, x)
+
+
+class ALawCodec(_G711Codec):
+    name = 'pcma'
+
+    def _compress(self, x):
+        positive = x >= 0
+        x = np.minimum(np.abs(x), 32767) >> 3
+        exponent = np.where(x < 32, 0, np.floor(np.log2(np.maximum(x, 1))).astype(np.int32) - 4)
+        mantissa = np.where(exponent == 0, x >> 1, x >> np.maximum(exponent, 1)) & 0x0F
+        b = (exponent << 4) | mantissa
+        return np.where(positive, b | 0x80, b) ^ 0x55
+
+    def _expand(self, b):
+        b = b ^ 0x55
+        exponent = (b >> 4) & 0x07
+        mantissa = b & 0x0F
+        x = np.where(exponent == 0, (mantissa << 4) + 8,
+                     ((mantissa << 4) + 0x108) << np.maximum(exponent - 1, 0))
+        return np.where(b & 0x80, x, -x)
+
+
+class OpusCodec:
+    """
+    48 kHz、20ms 一帧。一次 encode 可能输出零个或多个帧，
+    每帧前加 2 字节长度，decode 按长度拆开逐帧解码
+    """
+    name = 'opus'
+    stateless = False
+    rate = 48000
+    FRAME_SAMPLES = 960
+    FRAME_LENGTH = struct.Struct('!H')
+
+    def __init__(self, pcm_rate=44100, bitrate=24000):
+        self.pcm_rate = pcm_rate
+        self._encoder = opuslib.Encoder(self.rate, 1, opuslib.APPLICATION_VOIP)
+        self._encoder.bitrate = bitrate
+        self._decoder = opuslib.Decoder(self.rate, 1)
+        self._pending = np.zeros(0, dtype=PCM_DTYPE)  # 未凑满一帧的样本
+
+    def encode(self, pcm):
+        samples = _to_int16(resample(np.frombuffer(pcm, dtype=PCM_DTYPE), self.pcm_rate, self.rate))
+        samples = np.concatenate((self._pending, samples))
+        parts = []
+        while len(samples) >= self.FRAME_SAMPLES:
+            frame = self._encoder.encode(samples[:self.FRAME_SAMPLES].tobytes(), self.FRAME_SAMPLES)
+            parts.append(self.FRAME_LENGTH.pack(len(frame)))
+            parts.append(frame)
+            samples = samples[self.FRAME_SAMPLES:]
+        self._pending = samples
+        return b''.join(parts)
+
+    def decode(self, data):
+        data = memoryview(data)
+        decoded = []
+        offset = 0
+        while offset + self.FRAME_LENGTH.size <= len(data):
+            (length,) = self.FRAME_LENGTH.unpack_from(data, offset)
+            offset += self.FRAME_LENGTH.size
+            frame = bytes(data[offset:offset + length])
+            offset += length
+            decoded.append(np.frombuffer(self._decoder.decode(frame, self.FRAME_SAMPLES), dtype=PCM_DTYPE))
+        if not decoded:
+            return b''
+        return _to_int16(resample(np.concatenate(decoded), self.rate, self.pcm_rate)).tobytes()
+
+
+CODECS = {
+    'pcm': PcmCodec,
+    'pcmu': MuLawCodec,
+    'pcma': ALawCodec,
+}
+if opuslib is not None:
+    CODECS['opus'] = OpusCodec
+
+
+def negotiate(offered, supported=None):
+    """按客户端给出的偏好顺序，选择第一个服务器也支持的编解码器；都不支持时用 pcm"""
+    supported = [name for name in (supported or CODECS) if name in CODECS]
+    for name in offered or ():
+        if name in supported:
+            return name
+    return 'pcm'
+
+
+def make_codec(name, pcm_rate=44100, opus_bitrate=24000):
+    if name == 'opus':
+        return OpusCodec(pcm_rate, bitrate=opus_bitrate)
+    return CODECS[name](pcm_rate)
@@ -0,0 +1,126 @@
+import threading
+
+import numpy as np
+
+from jitter_buffer import JitterBuffer
+
+# 服务器端混音：每个会议内，把每个发言者的 16 位 PCM 按固定的 tick（默认 20ms）对齐，
+# 用 NumPy 求和后给每个参与者发送“除自己以外所有人”的混音（mix-minus），
+# 每个客户端只收一路音频，而不是 N 路。
+# PCM 格式：16 位有符号小端、单声道，采样率由配置决定（与客户端 AudioContext 一致）。
+# 带序号的音频包（media_packet，KIND_AUDIO）先经过每个发言者的抖动缓冲重排，到播放时间后再参与混音。
+
+SAMPLE_DTYPE = np.dtype('<i2')
+DEFAULT_ROOM = None  # 没有声明会议的旧客户端都在这个房间里
+
+
+class AudioMixer:
+
+    def __init__(self, sample_rate=44100, tick_ms=20, max_buffer_ms=200, jitter_buffer=None):
+        self.sample_rate = sample_rate
+        self.tick_ms = tick_ms
+        self.samples_per_tick = sample_rate * tick_ms // 1000
+        # 每个发言者最多缓存的字节数，超出时丢弃最旧的数据，避免时延越积越大
+        self.max_buffer_bytes = sample_rate * max_buffer_ms // 1000 * SAMPLE_DTYPE.itemsize
+        self._rooms = {}    # 房间 -> {sid: bytearray 待混音的 PCM}
+        self._room_of = {}  # sid -> 房间
+        self._jitter = {}   # sid -> JitterBuffer，只有发送带序号音频包的客户端才有
+        self._jitter_factory = jitter_buffer or JitterBuffer  # 创建抖动缓冲的函数
+        self._lock = threading.Lock()
+
+    def join(self, sid, room=DEFAULT_ROOM):
+        with self._lock:
+            self._leave(sid)
+            self._rooms.setdefault(room, {})[sid] = bytearray()
+            self._room_of[sid] = room
+
+    def leave(self, sid):
+        with self._lock:
+            self._leave(sid)
+
+    def _leave(self, sid):
+        self._jitter.pop(sid, None)
+        room = self._room_of.pop(sid, DEFAULT_ROOM)
+        members = self._rooms.get(room)
+        if members is not None and members.pop(sid, None) is not None and not members:
+            del self._rooms[room]
+
+    def _buffer(self, sid):
+        """发言者的待混音缓冲；未加入任何会议的客户端自动加入默认房间"""
+        if sid not in self._room_of:
+            self._rooms.setdefault(DEFAULT_ROOM, {})[sid] = bytearray()
+            self._room_of[sid] = DEFAULT_ROOM
+        return self._rooms[self._room_of[sid]][sid]
+
+    def _append(self, buf, pcm):
+        buf += pcm
+        # 按整样本对齐地丢弃最旧的数据
+        overflow = len(buf) - self.max_buffer_bytes
+        if overflow > 0:
+            del buf[:overflow + overflow % SAMPLE_DTYPE.itemsize]
+
+    def push(self, sid, pcm):
+        """收到一段按到达顺序处理的 PCM"""
+        with self._lock:
+            self._append(self._buffer(sid), pcm)
+
+    def push_packet(self, sid, seq, timestamp_ms, pcm):
+        """收到一个带序号的音频包，放入该发言者的抖动缓冲；迟到或重复时返回 False"""
+        with self._lock:
+            self._buffer(sid)
+            jitter = self._jitter.get(sid)
+            if jitter is None:
+                jitter = self._jitter[sid] = self._jitter_factory()
+            return jitter.push(seq, timestamp_ms, pcm)
+
+    def jitter_stats(self):
+        with self._lock:
+            return {sid: jitter.stats() for sid, jitter in self._jitter.items()}
+
+    def tick(self):
+        """
+        取出每个发言者一个 tick 的数据并混音。
+        返回 [(房间, 完整混音 bytes, [(sid, mix-minus bytes), ...]), ...]，只包含有声音的房间
+        """
+        size = self.samples_per_tick
+        nbytes = size * SAMPLE_DTYPE.itemsize
+        results = []
+        with self._lock:
+            # 到了播放时间的音频包按序号进入待混音缓冲
+            for sid, jitter in self._jitter.items():
+                ready = jitter.pop_ready()
+                if ready:
+                    buf = self._rooms[self._room_of[sid]][sid]
+                    for pcm in ready:
+                        self._append(buf, pcm)
+            for room, members in self._rooms.items():
+                sids = list(members)
+                frames = np.zeros((len(sids), size), dtype=np.int32)
+                talking = np.zeros(len(sids), dtype=bool)
+                for i, sid in enumerate(sids):
+                    buf = members[sid]
+                    n = min(len(buf), nbytes) // SAMPLE_DTYPE.itemsize
+                    if n:
+                        frames[i, :n] = np.frombuffer(buf, dtype=SAMPLE_DTYPE, count=n)
+                        del buf[:n * SAMPLE_DTYPE.itemsize]
+                        talking[i] = True
+                if talking.any():
+                    results.append((room, sids, frames, talking))
+
+        # 求和和编码在锁外进行
+        mixes = []
+        for room, sids, frames, talking in results:
+            total = frames.sum(axis=0)
+            outputs = []
+            talkers = int(talking.sum())
+            for i, sid in enumerate(sids):
+                if talkers - int(talking[i]) == 0:
+                    # 只有自己在说话，没有要发送的声音
+                    continue
+                outputs.append((sid, _to_pcm(total - frames[i])))
+            mixes.append((room, _to_pcm(total), outputs))
+        return mixes
+
+
+def _to_pcm(samples):
+    return np.clip(samples, -32768, 32767).astype(SAMPLE_DTYPE).tobytes()
@@ -0,0 +1,216 @@
+import logging
+import time
+import wave
+from collections import deque
+
+import async_mode
+
+# 音频服务器的本地播放输出。
+# 生产者（混音 tick 或收到的 PCM）把数据写进有界环形缓冲，独立的播放线程取出后交给输出设备：
+#   - 环形缓冲的槽位在启动时一次性分配（bytearray），读写都通过 memoryview，不产生新的 bytes 对象
+#   - 缓冲满时丢弃最旧的音频（overrun），播放线程没有数据可播时记一次 underrun
+#   - 输出设备可替换：WaveOutput（写入 wav 文件，便于测试）、PyAudioOutput（声卡）；
+#     不需要播放时用 NullSink，连播放线程都不启动
+#   - 播放线程和环形缓冲的锁是真正的操作系统线程和锁：eventlet / gevent 打过补丁时用 async_mode.original
+#     取原始实现（与 recorder.py 相同），否则阻塞的 stream.write 会卡住整个协程调度。
+#     生产者只在锁内做索引和拷贝，唤醒读者时不会阻塞
+
+log = logging.getLogger('audio')
+
+_allocate_lock = async_mode.original('_thread', 'allocate_lock')
+_start_thread = async_mode.original('_thread', 'start_new_thread')
+
+
+class PcmRingBuffer:
+    """
+    slots 个大小为 slot_size 字节的预分配槽位。
+    读者用 acquire() 取得最旧的一个槽位的 memoryview，用完后 release()；
+    读者持有的槽位不会被写者覆盖
+    """
+
+    def __init__(self, slots=16, slot_size=2048):
+        self.slot_size = slot_size
+        self._buffer = bytearray(slots * slot_size)
+        self._view = memoryview(self._buffer)
+        self._lengths = [0] * slots
+        # 槽位号只在空闲、未读（按写入顺序）和读者持有三处之间移动，读者持有的槽位不在前两者中
+        self._free = deque(range(slots))
+        self._unread = deque()
+        self._reading = None    # 读者正在使用的槽位
+        self._starved = True    # 没有数据可读；连续的空闲只算一次 underrun
+        self._lock = _allocate_lock()
+        # 有新数据时由写者释放，读者在上面等待；释放是非阻塞的，多次释放只会让读者多检查一次
+        self._ready = _allocate_lock()
+        self._ready.acquire()
+        self.written = 0
+        self.played = 0
+        self.overruns = 0
+        self.underruns = 0
+
+    def write(self, pcm):
+        """写入一段 PCM，超过槽位大小时拆成多个槽位；缓冲满时丢弃最旧的槽位"""
+        pcm = memoryview(pcm).cast('B')
+        with self._lock:
+            for start in range(0, len(pcm), self.slot_size):
+                part = pcm[start:start + self.slot_size]
+                if self._free:
+                    index = self._free.popleft()
+                elif self._unread:
+                    # 丢弃最旧的未读音频，保证时延有上界
+                    index = self._unread.popleft()
+                    self.overruns += 1
+                else:
+                    # 只有一个槽位且正被读者持有
+                    self.overruns += 1
+                    continue
+                offset = index * self.slot_size
+                self._view[offset:offset + len(part)] = part
+                self._lengths[index] = len(part)
+                self._unread.append(index)
+                self.written += 1
+            self._starved = False
+        try:
+            self._ready.release()
+        except RuntimeError:
+            # 读者还没取走上一次的通知
+            pass
+
+    def acquire(self, timeout=None):
+        """取出最旧的槽位，超时仍没有数据时返回 None（播放中断流时记一次 underrun）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if self._unread:
+                    index = self._reading = self._unread.popleft()
+                    offset = index * self.slot_size
+                    return self._view[offset:offset + self._lengths[index]]
+                remaining = -1 if deadline is None else deadline - time.monotonic()
+                if deadline is not None and remaining <= 0:
+                    if not self._starved:
+                        self._starved = True
+                        self.underruns += 1
+                    return None
+            self._ready.acquire(timeout=remaining)
+
+    def release(self):
+        with self._lock:
+            if self._reading is not None:
+                self._free.append(self._reading)
+                self._reading = None
+            self.played += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'buffered': len(self._unread),
+                'written': self.written,
+                'played': self.played,
+                'overruns': self.overruns,
+                'underruns': self.underruns,
+            }
+
+
+class WaveOutput:
+    """把播放的音频写入 wav 文件，用于测试和排查"""
+
+    def __init__(self, path, sample_rate=44100, channels=1):
+        self._file = wave.open(path, 'wb')
+        self._file.setnchannels(channels)
+        self._file.setsampwidth(2)
+        self._file.setframerate(sample_rate)
+
+    def write(self, pcm):
+        self._file.writeframes(pcm)
+
+    def close(self):
+        self._file.close()
+
+
+class PyAudioOutput:
+
+    def __init__(self, sample_rate=44100, channels=1, chunk=1024):
+        import pyaudio
+        self._pyaudio = pyaudio.PyAudio()
+        self._stream = self._pyaudio.open(format=pyaudio.paInt16,
+                                          channels=channels,
+                                          rate=sample_rate,
+                                          output=True,
+                                          frames_per_buffer=chunk)
+
+    def write(self, pcm):
+        self._stream.write(bytes(pcm))
+
+    def close(self):
+        self._stream.stop_stream()
+        self._stream.close()
+        self._pyaudio.terminate()
+
+
+class BufferedSink:
+    """
+    生产者调用 write() 只做一次内存拷贝，不会被输出设备阻塞；
+    播放线程从环形缓冲取数据写到输出设备
+    """
+
+    def __init__(self, output, slots=16, slot_size=2048, poll_interval=0.1):
+        self.output = output
+        self.ring = PcmRingBuffer(slots, slot_size)
+        self.poll_interval = poll_interval
+        self._running = True
+        self._finished = False
+        _start_thread(self._play, ())
+
+    def _play(self):
+        """播放线程，持续从环形缓冲中读取数据并播放"""
+        try:
+            while self._running:
+                pcm = self.ring.acquire(timeout=self.poll_interval)
+                if pcm is None:
+                    continue
+                try:
+                    self.output.write(pcm)
+                except Exception:
+                    log.exception('failed to play audio')
+                finally:
+                    self.ring.release()
+        finally:
+            self._finished = True
+
+    def write(self, pcm):
+        self.ring.write(pcm)
+
+    def stats(self):
+        return self.ring.stats()
+
+    def close(self):
+        self._running = False
+        while not self._finished:
+            # 调用方可能在协程里，用（可能打过补丁的）time.sleep 等播放线程退出
+            time.sleep(self.poll_interval / 10)
+        self.output.close()
+
+
+class NullSink:
+    """不播放，混音器可以在没有声卡的机器上运行"""
+
+    def write(self, pcm):
+        pass
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+def make_sink(spec, sample_rate=44100, channels=1, chunk=1024, slots=16):
+    """
+    spec: 'null' 不播放，'pyaudio' 用声卡播放，'wav:/path/to/file.wav' 写入文件
+    """
+    if spec == 'pyaudio':
+        output = PyAudioOutput(sample_rate, channels, chunk)
+    elif spec.startswith('wav:'):
+        output = WaveOutput(spec[len('wav:'):], sample_rate, channels)
+    else:
+        return NullSink()
+    return BufferedSink(output, slots=slots, slot_size=chunk * 2 * channels)
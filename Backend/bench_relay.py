@@ -0,0 +1,402 @@
+import argparse
+import base64
+import json
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import socketio
+
+import media_packet
+
+try:
+    import psutil
+except ImportError:  # 没有 psutil 时直接读 /proc（仅 Linux）
+    psutil = None
+
+# 转发服务器压测脚本：在 M 个会议里各启动 N 个合成客户端，按给定速率发送视频帧、评论和音频，
+# 统计端到端时延分位数、服务器 CPU / RSS、应收与实收帧数，结果写成 JSON 便于和基线比较。
+#   python bench_relay.py --meetings 4 --clients 6 --duration 20 --output bench.json
+#   python bench_relay.py --url http://127.0.0.1:5000 --server-pid 1234   # 压测已启动的服务器
+#   python bench_relay.py --baseline bench.json                           # 与上一次结果对比
+# 每个负载的前 8 字节是发送时刻（double），接收端据此计算时延；客户端和服务器需在同一台机器上。
+# 音频默认走视频服务器上的 audio 流水线（事件 audio-stream），单独运行的 test.py 用 --audio-url 指定，
+# --audio-rate 为 0 时不发送音频。
+# 音频服务器为混音模式（--audio-mode mix）时，收到的是混音后的 PCM，无法还原发送时刻，只统计收到的块数。
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SEND_TIME = struct.Struct('!d')
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    samples = sorted(samples)
+
+    def at(q):
+        return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 3)
+    return {'count': len(samples), 'p50_ms': at(0.5), 'p90_ms': at(0.9),
+            'p99_ms': at(0.99), 'max_ms': round(samples[-1] * 1000, 3)}
+
+
+def timed_payload(size):
+    return SEND_TIME.pack(time.time()) + b'\x00' * max(0, size - SEND_TIME.size)
+
+
+class Stats:
+    """所有客户端共享的计数和时延样本"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = {'video': 0, 'comment': 0, 'audio': 0}
+        self.expected = {'video': 0, 'comment': 0, 'audio': 0}
+        self.received = {'video': 0, 'comment': 0, 'audio': 0}
+        self.latency = {'video': [], 'comment': [], 'audio': []}
+        self.errors = 0
+        self.recording = False
+
+    def on_send(self, kind, receivers):
+        with self.lock:
+            self.sent[kind] += 1
+            self.expected[kind] += receivers
+
+    def on_receive(self, kind, sent_at):
+        if not self.recording:
+            return
+        now = time.time()
+        with self.lock:
+            self.received[kind] += 1
+            if sent_at is not None:
+                self.latency[kind].append(now - sent_at)
+
+    def report(self):
+        result = {}
+        for kind in self.sent:
+            expected = self.expected[kind]
+            result[kind] = {
+                'sent': self.sent[kind],
+                'expected': expected,
+                'delivered': self.received[kind],
+                'dropped': max(0, expected - self.received[kind]),
+                'delivery_ratio': round(self.received[kind] / expected, 4) if expected else None,
+                'latency': percentiles(self.latency[kind]),
+            }
+        result['errors'] = self.errors
+        return result
+
+
+class BenchClient:
+    """一个合成与会者：一条视频连接，可选一条音频连接"""
+
+    def __init__(self, args, stats, meeting_id, user, peers):
+        self.args = args
+        self.stats = stats
+        self.meeting_id = meeting_id
+        self.user = user
+        self.peers = peers  # 同一会议中的其他客户端数
+        self.seq = 0
+        self.sio = socketio.Client(reconnection=False)
+        self.audio = None
+        if args.audio_rate > 0:
+            # 音频流水线与视频在同一个服务器里时共用一条连接，加入会议即加入混音房间
+            self.audio = self.sio if args.audio_url == args.url else socketio.Client(reconnection=False)
+        self._register()
+
+    def _register(self):
+        ack = self.args.ack
+
+        @self.sio.on('receive_frame')
+        def on_frame(data):
+            body = data['frame'].rpartition(',')[2]
+            self.stats.on_receive('video', SEND_TIME.unpack(base64.b64decode(body[:12])[:8])[0])
+            return True if ack else None
+
+        @self.sio.on('receive_frame_bin')
+        def on_frame_bin(packet):
+            payload = media_packet.payload_of(packet)
+            self.stats.on_receive('video', SEND_TIME.unpack_from(payload)[0])
+            return True if ack else None
+
+        @self.sio.on('receive_comment')
+        def on_comment(data):
+            self.stats.on_receive('comment', float(data['message']))
+
+        @self.sio.on('error')
+        def on_error(data):
+            with self.stats.lock:
+                self.stats.errors += 1
+
+        if self.audio is not None:
+            @self.audio.on('audio-stream')
+            def on_audio(chunk):
+                if self.args.audio_mode == 'mix':
+                    self.stats.on_receive('audio', None)
+                else:
+                    self.stats.on_receive('audio', SEND_TIME.unpack_from(chunk)[0])
+
+    def connect(self):
+        self.sio.connect(self.args.url, transports=['websocket'])
+        capabilities = ['ack'] if self.args.ack else []
+        self.sio.emit('join_meeting', {'meeting_id': self.meeting_id, 'user': self.user,
+                                       'capabilities': capabilities})
+        if self.audio is not None and self.audio is not self.sio:
+            self.audio.connect(self.args.audio_url, transports=['websocket'])
+            if self.args.audio_mode == 'mix':
+                self.audio.emit('join_audio', {'meeting_id': self.meeting_id})
+
+    def disconnect(self):
+        for client in (self.sio, self.audio):
+            if client is not None and client.connected:
+                try:
+                    client.disconnect()
+                except Exception:
+                    pass
+
+    def send_video(self):
+        payload = timed_payload(self.args.frame_size)
+        if self.args.binary:
+            packet = media_packet.pack(media_packet.KIND_VIDEO, self.meeting_id, self.user,
+                                       self.seq, int(time.time() * 1000), payload)
+            self.sio.emit('video_frame_bin', packet)
+        else:
+            frame = 'data:image/jpeg;base64,' + base64.b64encode(payload).decode('ascii')
+            self.sio.emit('video_frame', {'meeting_id': self.meeting_id, 'user': self.user, 'frame': frame})
+        self.seq += 1
+        self.stats.on_send('video', self.peers)
+
+    def send_comment(self):
+        self.sio.emit('send_comment', {'meeting_id': self.meeting_id, 'user': self.user,
+                                       'message': repr(time.time())})
+        self.stats.on_send('comment', self.peers)
+
+    def send_audio(self, listeners):
+        self.audio.emit('audio-stream', timed_payload(self.args.audio_size))
+        # 混音模式下收到的块数取决于混音 tick 而不是发送次数，不计算应收数
+        self.stats.on_send('audio', listeners if self.args.audio_mode == 'broadcast' else 0)
+
+    def run(self, deadline, listeners):
+        """按各自的速率发送，直到 deadline"""
+        schedule = []
+        if self.args.video_fps > 0:
+            schedule.append([time.time(), 1 / self.args.video_fps, self.send_video])
+        if self.args.comment_rate > 0:
+            schedule.append([time.time(), 1 / self.args.comment_rate, self.send_comment])
+        if self.audio is not None:
+            schedule.append([time.time(), 1 / self.args.audio_rate, lambda: self.send_audio(listeners)])
+        if not schedule:
+            return
+        while True:
+            item = min(schedule, key=lambda s: s[0])
+            if item[0] >= deadline:
+                return
+            delay = item[0] - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                item[2]()
+            except socketio.exceptions.SocketIOError:
+                with self.stats.lock:
+                    self.stats.errors += 1
+            item[0] += item[1]
+
+
+class ResourceSampler(threading.Thread):
+    """周期采样服务器进程的 CPU 占用和 RSS"""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.cpu = []
+        self.rss = []
+        self._done = threading.Event()
+
+    def _cpu_seconds(self):
+        with open(f'/proc/{self.pid}/stat') as f:
+            fields = f.read().rpartition(')')[2].split()
+        # utime、stime 是 ')' 之后的第 12、13 个字段
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+    def _rss_bytes(self):
+        with open(f'/proc/{self.pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    def run(self):
+        process = psutil.Process(self.pid) if psutil is not None else None
+        last_cpu, last_time = None, None
+        while not self._done.wait(self.interval):
+            try:
+                if process is not None:
+                    cpu = sum(process.cpu_times()[:2])
+                    rss = process.memory_info().rss
+                else:
+                    cpu, rss = self._cpu_seconds(), self._rss_bytes()
+            except (OSError, ValueError):
+                return
+            now = time.time()
+            if last_cpu is not None:
+                self.cpu.append(100 * (cpu - last_cpu) / (now - last_time))
+            last_cpu, last_time = cpu, now
+            self.rss.append(rss)
+
+    def stop(self):
+        self._done.set()
+
+    def report(self):
+        if not self.rss:
+            return None
+        return {
+            'cpu_avg_percent': round(sum(self.cpu) / len(self.cpu), 1) if self.cpu else None,
+            'cpu_max_percent': round(max(self.cpu), 1) if self.cpu else None,
+            'rss_max_mb': round(max(self.rss) / 2 ** 20, 1),
+            'rss_end_mb': round(self.rss[-1] / 2 ** 20, 1),
+        }
+
+
+def http(url, method='GET'):
+    request = urllib.request.Request(url, method=method)
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def wait_for_server(url, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            http(url + '/list_meetings')
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'服务器 {url} 未能在 {timeout} 秒内启动')
+
+
+def queue_summary(url):
+    """服务器端发送队列的累计计数（需要 /queue_stats）"""
+    try:
+        queues = http(url + '/queue_stats').get('queues', {})
+    except OSError:
+        return None
+    total = {'sent': 0, 'dropped': 0, 'acked': 0}
+    for q in queues.values():
+        for key in total:
+            total[key] += q.get(key, 0)
+    return total
+
+
+def compare(result, baseline):
+    """打印与基线结果的差异"""
+    print('\n与基线对比:')
+    for kind in ('video', 'comment', 'audio'):
+        now, before = result.get(kind) or {}, baseline.get(kind) or {}
+        for key in ('p50_ms', 'p99_ms'):
+            a = (before.get('latency') or {}).get(key)
+            b = (now.get('latency') or {}).get(key)
+            if a is not None and b is not None:
+                print(f'  {kind:8s} {key:7s} {a:10.3f} -> {b:10.3f}')
+        a, b = before.get('delivery_ratio'), now.get('delivery_ratio')
+        if a is not None and b is not None:
+            print(f'  {kind:8s} {"送达率":7s} {a:10.4f} -> {b:10.4f}')
+    a = (baseline.get('server') or {}).get('cpu_avg_percent')
+    b = (result.get('server') or {}).get('cpu_avg_percent')
+    if a is not None and b is not None:
+        print(f'  {"server":8s} {"cpu%":7s} {a:10.1f} -> {b:10.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for the Socket.IO relay')
+    parser.add_argument('--url', help='已启动的服务器地址；不指定时自动启动 server2.py')
+    parser.add_argument('--port', type=int, default=5090, help='自动启动服务器时使用的端口')
+    parser.add_argument('--server-pid', type=int, help='--url 模式下用于采样 CPU/RSS 的服务器进程号')
+    parser.add_argument('--meetings', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=4, help='每个会议的客户端数')
+    parser.add_argument('--duration', type=float, default=10.0, help='测量时长（秒）')
+    parser.add_argument('--warmup', type=float, default=1.0, help='全部加入后到开始测量前的等待（秒）')
+    parser.add_argument('--video-fps', type=float, default=10.0)
+    parser.add_argument('--frame-size', type=int, default=20000, help='视频帧负载字节数')
+    parser.add_argument('--binary', action='store_true', help='使用 video_frame_bin 二进制帧')
+    parser.add_argument('--ack', action='store_true', help='声明 ack 能力，对收到的帧回 ack')
+    parser.add_argument('--comment-rate', type=float, default=0.5, help='每客户端每秒评论数')
+    parser.add_argument('--audio-rate', type=float, default=0.0, help='每客户端每秒音频块数，0 表示不测音频')
+    parser.add_argument('--audio-size', type=int, default=2048, help='音频块字节数')
+    parser.add_argument('--audio-url', help='单独的音频服务器地址（test.py），默认与视频共用 --url')
+    parser.add_argument('--audio-mode', choices=('mix', 'broadcast'), default='mix',
+                        help='音频服务器的模式（VC_AUDIO_MODE）')
+    parser.add_argument('--output', default='bench_result.json')
+    parser.add_argument('--baseline', help='用于对比的上一次结果文件')
+    args = parser.parse_args()
+
+    server = None
+    if args.url is None:
+        args.url = f'http://127.0.0.1:{args.port}'
+        env = dict(os.environ, VC_PORT=str(args.port), VC_DEBUG='0', VC_AUDIO_MODE=args.audio_mode)
+        server = subprocess.Popen([sys.executable, os.path.join(HERE, 'server2.py')], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        args.server_pid = server.pid
+    args.url = args.url.rstrip('/')
+    args.audio_url = (args.audio_url or args.url).rstrip('/')
+
+    stats = Stats()
+    clients = []
+    sampler = None
+    try:
+        wait_for_server(args.url)
+        for m in range(args.meetings):
+            meeting_id = http(args.url + '/create_meeting', 'POST')['meeting_id']
+            for c in range(args.clients):
+                client = BenchClient(args, stats, meeting_id, f'bench{m}_{c}', args.clients - 1)
+                client.connect()
+                clients.append(client)
+        time.sleep(args.warmup)
+
+        if args.server_pid:
+            sampler = ResourceSampler(args.server_pid)
+            sampler.start()
+        stats.recording = True
+        start = time.time()
+        deadline = start + args.duration
+        # 音频服务器向所有连接广播，接收者是除自己外的全部客户端
+        listeners = len(clients) - 1
+        threads = [threading.Thread(target=c.run, args=(deadline, listeners), daemon=True) for c in clients]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # 给在途的帧留出送达时间
+        time.sleep(1.0)
+        stats.recording = False
+        elapsed = time.time() - start
+
+        result = stats.report()
+        result['config'] = vars(args)
+        result['elapsed'] = round(elapsed, 3)
+        if sampler is not None:
+            sampler.stop()
+            result['server'] = sampler.report()
+        result['server_queues'] = queue_summary(args.url)
+    finally:
+        for client in clients:
+            client.disconnect()
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(json.dumps({k: result[k] for k in ('video', 'comment', 'audio', 'server') if k in result},
+                     indent=2, ensure_ascii=False))
+    print(f'结果已写入 {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import socketio
+
+from bench_relay import ResourceSampler, percentiles
+
+# 信令服务器（server_test.py）的 mesh 建立压测：N 个合成客户端加入同一个会议，上报足够的上行带宽，
+# 等服务器选出全连接方案后同时开始建立 N(N-1)/2 条 P2P 连接：
+# sid 较小的一方发 offer 和 --candidates 个 ICE candidate，另一方回 answer 和同样数量的 candidate。
+# 一条连接在双方都收到对方的 SDP 和全部 candidate 时算建好，统计每个客户端建好所有连接的时间。
+#   python bench_signaling.py --peers 10                      # 逐条发送 signal（旧客户端的方式）
+#   python bench_signaling.py --peers 10 --batch              # signal_batch 发送，声明 'batch' 能力合并接收
+#   python bench_signaling.py --url http://127.0.0.1:5000 --server-pid 1234   # 压测已启动的服务器
+# 已启动的服务器需要 VC_TOPOLOGY_MESH_MAX、VC_TOPOLOGY_PARTIAL_MAX 不小于 --peers，否则不会选全连接。
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def http(url, method='GET'):
+    request = urllib.request.Request(url, method=method)
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def wait_for_server(url, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            http(url + '/check_meeting')
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'服务器 {url} 未能在 {timeout} 秒内启动')
+
+
+def fake_sdp(kind, sid, size):
+    return {'type': kind, 'sdp': f'v=0 o={sid} ' + 'a' * max(0, size - 16)}
+
+
+def fake_candidate(sid, i):
+    return {'candidate': f'candidate:{i} 1 udp 2122260223 10.0.0.{i % 250} {50000 + i} typ host',
+            'sdpMid': '0', 'sdpMLineIndex': 0, 'usernameFragment': sid[:4]}
+
+
+class MeshPeer:
+    """一个合成客户端：只收发信令，不建立真正的 P2P 连接"""
+
+    def __init__(self, args, meeting_id, user):
+        self.args = args
+        self.meeting_id = meeting_id
+        self.user = user
+        self.client = socketio.Client(reconnection=False)
+        self.sid = None
+        self.plan = None
+        self.lock = threading.Lock()
+        self.remote = {}       # 对端 sid -> [是否收到 SDP, 收到的 candidate 数]
+        self.peers = set()
+        self.done_at = None
+        self.done = threading.Event()
+        self.frames = 0        # 收到的信令帧数（一条 signal 或一条 batch）
+        self.signals = 0       # 收到的信令条数
+        self.messages = 0      # 发出的信令消息数
+        self.errors = []
+        self._register()
+
+    def _register(self):
+        client = self.client
+
+        @client.on('topology')
+        def on_topology(data):
+            # 服务器各线程发出的方案可能乱序到达，只保留 plan_id 最大的
+            if self.plan is None or data['plan_id'] > self.plan['plan_id']:
+                self.plan = data
+
+        @client.on('joined_meeting')
+        def on_joined(data):
+            # 服务器并发处理同一连接的事件，加入成功后再上报带宽，否则可能先于加入被处理而丢弃
+            client.emit('report_bandwidth', {'meeting_id': self.meeting_id, 'uplink_kbps': 10 ** 6})
+
+        @client.on('signal')
+        def on_signal(data):
+            self.frames += 1
+            self._on_signals([data])
+
+        @client.on('batch')
+        def on_batch(items):
+            self.frames += 1
+            self._on_signals([data for event, data in items if event == 'signal'])
+
+        @client.on('error')
+        def on_error(data):
+            self.errors.append(data.get('message'))
+
+    def connect(self):
+        self.client.connect(self.args.url, transports=['websocket'])
+        self.sid = self.client.get_sid()
+        capabilities = ['batch'] if self.args.batch else []
+        self.client.emit('join_meeting', {'meeting_id': self.meeting_id, 'userName': self.user,
+                                          'capabilities': capabilities})
+
+    def disconnect(self):
+        try:
+            self.client.disconnect()
+        except Exception:
+            pass
+
+    def mesh_ready(self):
+        plan = self.plan
+        return plan is not None and len(plan['routes']) == self.args.peers and \
+            all(route == 'p2p' for route in plan['routes'].values())
+
+    def _send(self, signals):
+        """signals: [(目标 sid, 信令), ...]；--batch 时一条消息发出，否则逐条发送"""
+        if self.args.batch:
+            self.client.emit('signal_batch', {'meeting_id': self.meeting_id, 'signals': [
+                {'target_sid': target, 'signal': signal} for target, signal in signals]})
+            self.messages += 1
+        else:
+            for target, signal in signals:
+                self.client.emit('signal', {'meeting_id': self.meeting_id, 'target_sid': target, 'signal': signal})
+            self.messages += len(signals)
+
+    def _local_signals(self, target, kind):
+        signals = [(target, fake_sdp(kind, self.sid, self.args.sdp_size))]
+        signals += [(target, fake_candidate(self.sid, i)) for i in range(self.args.candidates)]
+        return signals
+
+    def start(self, peers):
+        """向 sid 比自己大的对端发 offer 和 candidate"""
+        with self.lock:
+            self.peers = set(peers) - {self.sid}
+            # 别的客户端先开始时，发给自己的信令可能已经到了
+            for sid in self.peers:
+                self.remote.setdefault(sid, [False, 0])
+        signals = []
+        for target in sorted(self.peers):
+            if target > self.sid:
+                signals += self._local_signals(target, 'offer')
+        if signals:
+            self._send(signals)
+        self._check_done()
+
+    def _on_signals(self, items):
+        replies = []
+        with self.lock:
+            for data in items:
+                self.signals += 1
+                sender, signal = data['from_sid'], data['signal']
+                state = self.remote.setdefault(sender, [False, 0])
+                if signal.get('type') == 'offer':
+                    state[0] = True
+                    replies += self._local_signals(sender, 'answer')
+                elif signal.get('type') == 'answer':
+                    state[0] = True
+                elif 'candidate' in signal:
+                    state[1] += 1
+        if replies:
+            self._send(replies)
+        self._check_done()
+
+    def _check_done(self):
+        with self.lock:
+            if self.done_at is not None or not self.peers:
+                return
+            if all(self.remote.get(sid, [False, 0])[0] and self.remote[sid][1] >= self.args.candidates
+                   for sid in self.peers):
+                self.done_at = time.time()
+                self.done.set()
+
+
+def disconnect_all(peers, timeout=2.0):
+    # werkzeug 开发服务器上 websocket 的关闭握手偶尔收不到回应，并行断开并限制等待时间，不让它卡住压测
+    threads = [threading.Thread(target=peer.disconnect, daemon=True) for peer in peers]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.time()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mesh signaling benchmark for server_test.py')
+    parser.add_argument('--url', help='已启动的服务器地址；不指定时自动启动 server_test.py')
+    parser.add_argument('--port', type=int, default=5095, help='自动启动服务器时使用的端口')
+    parser.add_argument('--server-pid', type=int, help='--url 模式下用于采样 CPU/RSS 的服务器进程号')
+    parser.add_argument('--peers', type=int, default=10, help='会议人数')
+    parser.add_argument('--candidates', type=int, default=8, help='每条连接每一方发送的 ICE candidate 数')
+    parser.add_argument('--sdp-size', type=int, default=3000, help='SDP 字节数')
+    parser.add_argument('--batch', action='store_true', help='使用 signal_batch 发送并声明 batch 能力')
+    parser.add_argument('--rounds', type=int, default=3, help='重复建立 mesh 的次数，每次使用新的会议')
+    parser.add_argument('--timeout', type=float, default=30.0, help='单次建立 mesh 的最长等待（秒）')
+    parser.add_argument('--output', default='bench_signaling.json')
+    args = parser.parse_args()
+
+    server = None
+    if args.url is None:
+        args.url = f'http://127.0.0.1:{args.port}'
+        env = dict(os.environ, VC_PORT=str(args.port), VC_DEBUG='0', VC_LOG_LEVEL='WARNING',
+                   VC_TOPOLOGY_MESH_MAX=str(args.peers), VC_TOPOLOGY_PARTIAL_MAX=str(args.peers))
+        server = subprocess.Popen([sys.executable, os.path.join(HERE, 'server_test.py')], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        args.server_pid = server.pid
+    args.url = args.url.rstrip('/')
+
+    rounds = []
+    sampler = None
+    try:
+        wait_for_server(args.url)
+        if args.server_pid:
+            sampler = ResourceSampler(args.server_pid)
+            sampler.start()
+        for _ in range(args.rounds):
+            meeting_id = http(args.url + '/create_meeting', 'POST')['meeting_id']
+            peers = [MeshPeer(args, meeting_id, f'peer{i}') for i in range(args.peers)]
+            try:
+                for peer in peers:
+                    peer.connect()
+                deadline = time.time() + args.timeout
+                while not all(peer.mesh_ready() for peer in peers):
+                    if time.time() > deadline:
+                        raise RuntimeError('服务器没有选出全连接方案，检查 VC_TOPOLOGY_MESH_MAX')
+                    time.sleep(0.05)
+
+                sids = [peer.sid for peer in peers]
+                start = time.time()
+                for peer in peers:
+                    peer.start(sids)
+                for peer in peers:
+                    peer.done.wait(max(0.0, deadline - time.time()))
+                converged = [peer.done_at - start for peer in peers if peer.done_at is not None]
+                rounds.append({
+                    'converged_peers': len(converged),
+                    'converge_s': round(max(converged), 4) if len(converged) == len(peers) else None,
+                    'per_peer': percentiles(converged),
+                    'messages_sent': sum(peer.messages for peer in peers),
+                    'frames_received': sum(peer.frames for peer in peers),
+                    'signals_received': sum(peer.signals for peer in peers),
+                    'errors': sum(len(peer.errors) for peer in peers),
+                })
+            finally:
+                disconnect_all(peers)
+            time.sleep(0.2)
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    times = [r['converge_s'] for r in rounds if r['converge_s'] is not None]
+    result = {
+        'config': vars(args),
+        'pairs': args.peers * (args.peers - 1) // 2,
+        'signals_per_round': args.peers * (args.peers - 1) * (1 + args.candidates),
+        'converge_s': {'best': min(times), 'median': sorted(times)[len(times) // 2], 'worst': max(times)}
+        if times else None,
+        'rounds': rounds,
+        'server': sampler.report() if sampler is not None else None,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(json.dumps({k: result[k] for k in ('pairs', 'signals_per_round', 'converge_s', 'server')},
+                     indent=2, ensure_ascii=False))
+    print(json.dumps(rounds[-1] if rounds else None, indent=2, ensure_ascii=False))
+    print(f'结果已写入 {args.output}')
+
+
+if __name__ == '__main__':
+    main()
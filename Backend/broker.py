@@ -0,0 +1,84 @@
+import os
+import socketserver
+import sys
+import threading
+
+from bus import MemoryStore, recv_frame, send_frame
+
+# 本地 Unix socket broker：多个 worker 进程通过它共享会议目录并互相转发房间消息。
+# 协议：每帧 4 字节长度 + JSON 数组 [op, *args]，见 bus.BrokerStore
+#   python broker.py /tmp/vc-bus.sock
+
+store = MemoryStore()
+subscribers = {}  # channel -> {socket: lock}
+subscribers_lock = threading.Lock()
+
+
+def publish(channel, message):
+    with subscribers_lock:
+        targets = list(subscribers.get(channel, {}).items())
+    for sock, lock in targets:
+        try:
+            with lock:
+                send_frame(sock, ['message', message])
+        except OSError:
+            # 订阅者已断开，由其所在的处理线程负责清理
+            pass
+
+
+class BrokerHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        sock = self.request
+        while True:
+            try:
+                request = recv_frame(sock)
+            except (OSError, ValueError):
+                return
+            if request is None:
+                return
+            op, args = request[0], request[1:]
+
+            if op == 'subscribe':
+                self.serve_subscription(args[0])
+                return
+            if op == 'publish':
+                publish(*args)
+                response = None
+            elif op in ('hset', 'hsetnx', 'hget', 'hdel', 'hgetall', 'hlen', 'hincrby', 'delete'):
+                response = getattr(store, op)(*args)
+            else:
+                response = None
+            # 响应包一层列表，避免与连接关闭时 recv_frame 返回的 None 混淆
+            send_frame(sock, [response])
+
+    def serve_subscription(self, channel):
+        """把连接登记为 channel 的订阅者，直到对端断开"""
+        sock = self.request
+        with subscribers_lock:
+            subscribers.setdefault(channel, {})[sock] = threading.Lock()
+        try:
+            # 订阅连接上不再有请求，recv 返回空表示对端关闭
+            while sock.recv(1):
+                pass
+        except OSError:
+            pass
+        finally:
+            with subscribers_lock:
+                subscribers.get(channel, {}).pop(sock, None)
+
+
+class BrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path):
+    if os.path.exists(path):
+        os.unlink(path)
+    with BrokerServer(path, BrokerHandler) as server:
+        print(f'broker listening on {path}')
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1] if len(sys.argv) > 1 else '/tmp/vc-bus.sock')
@@ -0,0 +1,267 @@
+# 多进程部署用的消息总线。
+#
+# 同一套接口有三种实现，通过 URL 选择：
+#   memory://                  进程内（单进程默认，不跨进程）
+#   unix:///tmp/vc-bus.sock    本地 Unix socket broker（见 broker.py）
+#   redis://host:port/0        Redis 或兼容 Redis 协议的服务
+#
+# 总线提供两类能力：
+#   1. 简单的哈希表存储（hset/hget/...），用于各 worker 共享会议目录
+#   2. 发布/订阅，用于房间消息在 worker 之间扇出（BusManager）
+import json
+import queue
+import socket
+import struct
+import threading
+
+import socketio
+
+_LEN = struct.Struct('!I')
+
+
+class MemoryStore:
+    """进程内实现，只在单进程内有效"""
+
+    def __init__(self):
+        self._data = {}
+        self._subscribers = {}  # channel -> [queue.Queue]
+        self._lock = threading.Lock()
+
+    def hset(self, key, field, value):
+        with self._lock:
+            self._data.setdefault(key, {})[field] = value
+
+    def hsetnx(self, key, field, value):
+        with self._lock:
+            h = self._data.setdefault(key, {})
+            if field in h:
+                return False
+            h[field] = value
+            return True
+
+    def hget(self, key, field):
+        with self._lock:
+            return self._data.get(key, {}).get(field)
+
+    def hdel(self, key, field):
+        with self._lock:
+            h = self._data.get(key)
+            if h is None or field not in h:
+                return 0
+            del h[field]
+            if not h:
+                del self._data[key]
+            return 1
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._data.get(key, {}))
+
+    def hlen(self, key):
+        with self._lock:
+            return len(self._data.get(key, {}))
+
+    def hincrby(self, key, field, amount):
+        with self._lock:
+            h = self._data.setdefault(key, {})
+            h[field] = int(h.get(field, 0)) + amount
+            return h[field]
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for q in subscribers:
+            q.put(message)
+
+    def subscribe(self, channel):
+        """返回一个阻塞的生成器，逐条产出该频道上的消息"""
+        q = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(q)
+        while True:
+            yield q.get()
+
+
+def send_frame(sock, obj):
+    data = json.dumps(obj).encode('utf-8')
+    sock.sendall(_LEN.pack(len(data)) + data)
+
+
+def recv_frame(sock):
+    """读取一个长度前缀的 JSON 帧，连接关闭时返回 None"""
+    header = _recv_exact(sock, _LEN.size)
+    if header is None:
+        return None
+    (length,) = _LEN.unpack(header)
+    body = _recv_exact(sock, length)
+    if body is None:
+        return None
+    return json.loads(body.decode('utf-8'))
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+class BrokerStore:
+    """
+    连接本地 broker.py 的客户端。
+    请求/响应走一条共享连接（加锁），每个订阅单独开一条连接
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        return sock
+
+    def _call(self, *request):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._sock = self._connect()
+                    send_frame(self._sock, list(request))
+                    response = recv_frame(self._sock)
+                    if response is None:
+                        raise ConnectionError('broker 连接已关闭')
+                    return response[0]
+                except OSError:
+                    # broker 重启等情况下重连一次
+                    if self._sock is not None:
+                        self._sock.close()
+                    self._sock = None
+                    if attempt:
+                        raise
+
+    def hset(self, key, field, value):
+        self._call('hset', key, field, value)
+
+    def hsetnx(self, key, field, value):
+        return self._call('hsetnx', key, field, value)
+
+    def hget(self, key, field):
+        return self._call('hget', key, field)
+
+    def hdel(self, key, field):
+        return self._call('hdel', key, field)
+
+    def hgetall(self, key):
+        return self._call('hgetall', key)
+
+    def hlen(self, key):
+        return self._call('hlen', key)
+
+    def hincrby(self, key, field, amount):
+        return self._call('hincrby', key, field, amount)
+
+    def delete(self, key):
+        self._call('delete', key)
+
+    def publish(self, channel, message):
+        self._call('publish', channel, message)
+
+    def subscribe(self, channel):
+        sock = self._connect()
+        send_frame(sock, ['subscribe', channel])
+        while True:
+            frame = recv_frame(sock)
+            if frame is None:
+                return
+            yield frame[1]
+
+
+class RedisStore:
+    """Redis（或兼容协议的服务）实现，需要安装 redis 包"""
+
+    def __init__(self, url):
+        import redis
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+
+    def hset(self, key, field, value):
+        self.redis.hset(key, field, value)
+
+    def hsetnx(self, key, field, value):
+        return bool(self.redis.hsetnx(key, field, value))
+
+    def hget(self, key, field):
+        return self.redis.hget(key, field)
+
+    def hdel(self, key, field):
+        return self.redis.hdel(key, field)
+
+    def hgetall(self, key):
+        return self.redis.hgetall(key)
+
+    def hlen(self, key):
+        return self.redis.hlen(key)
+
+    def hincrby(self, key, field, amount):
+        return self.redis.hincrby(key, field, amount)
+
+    def delete(self, key):
+        self.redis.delete(key)
+
+    def publish(self, channel, message):
+        self.redis.publish(channel, message)
+
+    def subscribe(self, channel):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        for message in pubsub.listen():
+            if message.get('type') == 'message':
+                yield message['data']
+
+
+def make_store(url):
+    if not url or url.startswith('memory://'):
+        return MemoryStore()
+    if url.startswith('unix://'):
+        return BrokerStore(url[len('unix://'):])
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisStore(url)
+    raise ValueError(f'不支持的总线地址: {url}')
+
+
+class BusManager(socketio.PubSubManager):
+    """
+    基于 BrokerStore 的 Socket.IO 客户端管理器，
+    让 emit(room=...) 能够送达连接在其他 worker 上的客户端
+    """
+    name = 'bus'
+
+    def __init__(self, store, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.store = store
+
+    def _publish(self, data):
+        self.store.publish(self.channel, self.json.dumps(data))
+
+    def _listen(self):
+        yield from self.store.subscribe(self.channel)
+
+
+def make_client_manager(url, store=None):
+    """
+    根据总线地址返回 Socket.IO 的 client_manager。
+    memory:// 返回 None，即使用默认的进程内管理器
+    """
+    if not url or url.startswith('memory://'):
+        return None
+    if url.startswith(('redis://', 'rediss://')):
+        return socketio.RedisManager(url)
+    return BusManager(store or make_store(url))
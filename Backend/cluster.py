@@ -0,0 +1,68 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import config
+
+# 多进程启动脚本：启动若干个 server2.py worker，通过消息总线共享会议和房间消息。
+#   python cluster.py --workers 4                                  # 本地 Unix socket broker
+#   python cluster.py --workers 4 --bus redis://127.0.0.1:6379/0   # Redis
+#   python cluster.py --host 0.0.0.0 --public-host 10.0.0.5         # 监听所有网卡，客户端用 10.0.0.5 连接
+# worker i 监听 CLUSTER_BASE_PORT + i；创建会议的 worker 即会议的归属 worker，
+# /check_meeting 会返回归属 worker 的地址，客户端连到该地址可以让会议留在同一个进程内。
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def worker_env(args, i):
+    """worker i 的环境变量：监听地址和端口、共享总线，以及 /check_meeting 返回给客户端的地址"""
+    port = args.base_port + i
+    return dict(
+        os.environ,
+        VC_BUS_URL=args.bus,
+        VC_WORKER_ID=str(i),
+        VC_HOST=args.host,
+        VC_PORT=str(port),
+        VC_WORKER_URL=f'http://{args.public_host or args.host}:{port}',
+        VC_DEBUG='0',
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run several relay workers behind a shared bus')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--bus', default='unix:///tmp/vc-bus.sock')
+    parser.add_argument('--host', default=config.HOST, help='workers bind address')
+    parser.add_argument('--public-host', help='address clients use to reach the workers (default: --host)')
+    parser.add_argument('--base-port', type=int, default=config.CLUSTER_BASE_PORT)
+    args = parser.parse_args()
+
+    processes = []
+    if args.bus.startswith('unix://'):
+        path = args.bus[len('unix://'):]
+        processes.append(subprocess.Popen([sys.executable, os.path.join(HERE, 'broker.py'), path]))
+        # 等待 broker 创建 socket 文件
+        for _ in range(50):
+            if os.path.exists(path):
+                break
+            time.sleep(0.1)
+
+    for i in range(args.workers):
+        env = worker_env(args, i)
+        processes.append(subprocess.Popen([sys.executable, os.path.join(HERE, 'server2.py')], env=env))
+        print(f'worker {i} listening on {args.host}:{env["VC_PORT"]}, advertised as {env["VC_WORKER_URL"]}')
+
+    try:
+        for p in processes:
+            p.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in processes:
+            p.terminate()
+
+
+if __name__ == '__main__':
+    main()
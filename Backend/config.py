@@ -1,2 +1,119 @@
-HOST = '127.0.0.1'
-PORT = 5000
\ No newline at end of file
+import os
+
+HOST = os.environ.get('VC_HOST', '127.0.0.1')
+PORT = int(os.environ.get('VC_PORT', 5000))
+DEBUG = os.environ.get('VC_DEBUG', '1') == '1'
+
+# Flask-SocketIO 的异步模式：threading、eventlet 或 gevent（后两者需要安装对应的包，由 main.py 先 monkey patch）
+ASYNC_MODE = os.environ.get('VC_ASYNC_MODE', 'threading')
+# 服务器启用的媒体流水线（见 pipelines/__init__.py）：video、desktop、audio、signaling，逗号分隔
+PIPELINES = tuple(name.strip() for name in os.environ.get('VC_PIPELINES', 'video,desktop,audio,signaling').split(',')
+                  if name.strip())
+
+# 媒体帧发送队列：每个接收者最多积压的帧数、发送窗口、补发间隔（秒）
+FRAME_QUEUE_SIZE = 2
+FRAME_SEND_WINDOW = 2
+FRAME_PUMP_INTERVAL = 0.02
+FRAME_ACK_TIMEOUT = 2.0
+
+# 信令流水线（main.py 中的 signaling，或单独运行的 server_test.py）的拓扑选择：每路 P2P 视频流的带宽（kbps）、全连接和部分 P2P 的最多人数、
+# 从经服务器转发改为 P2P 需要的带宽余量、切换方案时等待客户端建好连接的最长时间（秒）
+TOPOLOGY_STREAM_KBPS = 400
+TOPOLOGY_MESH_MAX = int(os.environ.get('VC_TOPOLOGY_MESH_MAX', 4))
+TOPOLOGY_PARTIAL_MAX = int(os.environ.get('VC_TOPOLOGY_PARTIAL_MAX', 8))
+TOPOLOGY_UPGRADE_MARGIN = 1.2
+TOPOLOGY_TRANSITION_TIMEOUT = 10.0
+
+# 信令合并发送：声明了 'batch' 能力的客户端每个间隔最多收到一帧信令（秒），单个会议积压超过上限时立即发送
+SIGNAL_BATCH_INTERVAL = 0.01
+SIGNAL_BATCH_MAX_ITEMS = 256
+
+# 会议创建和加入的限流（令牌桶：每秒速率、突发上限，速率为 0 时不限流）。
+# 同一 IP 创建、加入过于频繁时直接拒绝；同一会议的加入请求排队，超过 JOIN_MAX_WAIT 秒的拒绝
+CREATE_RATE_PER_IP = float(os.environ.get('VC_CREATE_RATE_PER_IP', 2))
+CREATE_BURST_PER_IP = 10
+JOIN_RATE_PER_IP = float(os.environ.get('VC_JOIN_RATE_PER_IP', 10))
+JOIN_BURST_PER_IP = 30
+JOIN_RATE_PER_MEETING = float(os.environ.get('VC_JOIN_RATE_PER_MEETING', 20))
+JOIN_BURST_PER_MEETING = 40
+JOIN_MAX_WAIT = 10.0
+
+# 会议内控制消息的合并发送：声明了 'batch' 能力的客户端每个间隔最多收到一帧（秒，即最大延迟），
+# 单个会议积压的消息超过上限时立即发送
+CONTROL_BATCH_INTERVAL = 0.02
+CONTROL_BATCH_MAX_ITEMS = 64
+
+# 会议表分片数
+REGISTRY_SHARDS = 64
+
+# 多进程部署：消息总线地址（memory:// 为单进程）、当前 worker 的编号和对外地址
+BUS_URL = os.environ.get('VC_BUS_URL', 'memory://')
+WORKER_ID = os.environ.get('VC_WORKER_ID', '0')
+WORKER_URL = os.environ.get('VC_WORKER_URL', f'http://{HOST}:{PORT}')
+CLUSTER_BASE_PORT = 5100
+
+# 转发帧率自适应：帧率上下限、目标时延（秒）、判定拥塞的丢帧比例、调整周期（秒）
+RATE_MAX_FPS = 10
+RATE_MIN_FPS = 1
+RATE_TARGET_LATENCY = 0.3
+RATE_DROP_THRESHOLD = 0.2
+RATE_UPDATE_INTERVAL = 1.0
+# 客户端默认的桌面帧采集间隔（毫秒）
+DESKTOP_CAPTURE_INTERVAL = 500
+
+# 桌面分块编码：累积变化块超过整屏的比例时请求关键帧，关键帧请求的最小间隔（秒）
+DESKTOP_KEYFRAME_RATIO = 0.5
+DESKTOP_KEYFRAME_MIN_INTERVAL = 2.0
+
+# 新成员加入时下发的最近一帧缓存：每个会议的内存预算（字节），超出时淘汰最久未更新的帧
+SNAPSHOT_BUDGET = 4 * 1024 * 1024
+
+# /list_meetings 每页最多返回的会议数
+LIST_MEETINGS_MAX_LIMIT = 500
+
+# 选择性转发：全帧率转发的最近发言人数（last-N）、其余发布者的缩略图帧率（0 为不转发）、
+# 视为正在发言的音量阈值（0~1）
+SFU_LAST_N = 4
+SFU_OTHERS_FPS = 1.0
+SFU_SPEAKING_LEVEL = 0.05
+
+# simulcast：缩略图层、中间层的标称宽度（更宽的格子收完整层），超过多久没收到某层视为停发（秒），
+# 接收者帧率低于最高帧率的这些比例时，分别最多只收中间层、缩略图层
+SIMULCAST_LAYER_WIDTHS = (160, 640)
+SIMULCAST_LAYER_TIMEOUT = 2.0
+SIMULCAST_MEDIUM_FPS_RATIO = 0.7
+SIMULCAST_THUMBNAIL_FPS_RATIO = 0.4
+
+# 服务器端 JPEG 转码（需要 Pillow）：只发一层的发布者，为想要更低层的接收者缩小并重新编码。
+# 转码进程数（0 为不转码）、排队中的转码任务上限（超出时接收者收原始帧）、缩略图层和中间层的 JPEG 质量
+TRANSCODE_WORKERS = int(os.environ.get('VC_TRANSCODE_WORKERS', '0'))
+TRANSCODE_QUEUE_LIMIT = 4
+TRANSCODE_QUALITY = (50, 65)
+
+# 音频流水线（main.py 中的 audio，或单独运行的 test.py）：mix 为服务器混音（每人一路 mix-minus），broadcast 为原样广播；
+# 采样率、混音间隔（毫秒）、每个发言者最多缓存的音频（毫秒）
+AUDIO_MODE = os.environ.get('VC_AUDIO_MODE', 'mix')
+AUDIO_SAMPLE_RATE = 44100
+AUDIO_TICK_MS = 20
+AUDIO_MAX_BUFFER_MS = 200
+# 服务器本地播放：null 不播放，pyaudio 用声卡，wav:/path 写入文件；播放环形缓冲的槽位数
+AUDIO_SINK = os.environ.get('VC_AUDIO_SINK', 'null')
+AUDIO_RING_SLOTS = 16
+
+# 音频编解码器：服务器支持的编解码器（客户端连接时按自己的偏好协商），opus 码率（bit/s）
+AUDIO_CODECS = ('opus', 'pcmu', 'pcma', 'pcm')
+AUDIO_OPUS_BITRATE = 24000
+
+# 抖动缓冲：初始目标时延与自适应调整的上下限（毫秒）
+JITTER_TARGET_DELAY_MS = 60
+JITTER_MIN_DELAY_MS = 20
+JITTER_MAX_DELAY_MS = 200
+
+# 会议录制（见 recorder.py）：录制目录、分段时长（秒）、待写入记录队列的长度（满了丢帧，不阻塞转发）
+RECORD_DIR = os.environ.get('VC_RECORD_DIR', 'recordings')
+RECORD_SEGMENT_SECONDS = float(os.environ.get('VC_RECORD_SEGMENT_SECONDS', 60))
+RECORD_QUEUE_SIZE = 256
+
+# 日志级别（DEBUG 时输出每帧日志）和每类高频日志的最小输出间隔（秒）
+LOG_LEVEL = os.environ.get('VC_LOG_LEVEL', 'INFO')
+LOG_THROTTLE_INTERVAL = 5.0
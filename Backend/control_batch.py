@@ -0,0 +1,135 @@
+import threading
+
+# 会议内控制消息（系统消息、聊天、成员变化、模式切换、发言人、密钥）的合并发送。
+# 大会议开始时大量用户同时加入，每次加入/离开都会连续发出好几条消息；
+# 声明了 'batch' 能力的客户端改为每个 tick 收到一条 'batch' 事件：[[事件名, 数据], ...]，
+# 按原来的顺序处理即可。其他客户端仍然立即逐条收到，行为不变。
+#   - 收件人在调用时确定，与直接 emit 到房间的语义一致
+#   - 同一个 tick 内收件人完全相同的消息合成一帧，只编码一次
+#   - coalesce 的事件（发言人列表、媒体密钥）对每个收件人只保留同一会议中最新的一条；
+#     新消息只替换旧消息中同样收到新消息的收件人，其余收件人仍然收到旧消息
+#   - 客户端移除（离开、断开）或会议删除时丢弃尚未发出的消息，不会再发给已经不在会议里的人
+#   - 最大延迟为一个 tick；单个会议积压的消息超过 max_items 时立即发送
+
+
+def _strip(pending, recipients):
+    """用 recipients(item) 重新计算每条积压消息的收件人，去掉没有收件人的消息"""
+    items = ((event, data, recipients((event, data, sids))) for event, data, sids in pending)
+    return [item for item in items if item[2]]
+
+
+class ControlBatcher:
+
+    def __init__(self, socketio, interval=0.02, max_items=64):
+        self.socketio = socketio
+        self.interval = interval
+        self.max_items = max_items
+        self._batch_sids = set()  # 声明了 'batch' 能力的客户端
+        self._pending = {}        # 会议号 -> [(事件名, 数据, 收件人 frozenset), ...]
+        self._lock = threading.Lock()
+        self._started = False
+        self.events = 0           # 经过合并发送的消息数
+        self.frames = 0           # 实际发出的帧数
+
+    def add(self, sid, batch=False):
+        if batch:
+            with self._lock:
+                self._batch_sids.add(sid)
+            if not self._started:
+                self._started = True
+                self.socketio.start_background_task(self._run)
+
+    def remove(self, sid):
+        with self._lock:
+            self._batch_sids.discard(sid)
+            for room, pending in list(self._pending.items()):
+                pending = _strip(pending, lambda item: item[2] - {sid})
+                if pending:
+                    self._pending[room] = pending
+                else:
+                    del self._pending[room]
+
+    def discard(self, room):
+        """会议被删除或取消时丢弃它积压的消息"""
+        with self._lock:
+            self._pending.pop(room, None)
+
+    def emit(self, room, event, data, members, coalesce=False):
+        """向会议 room 中的 members 发送一条控制消息"""
+        legacy, flush = self._queue(room, event, data, members, coalesce)
+        if legacy:
+            self.socketio.emit(event, data, to=legacy)
+        if flush:
+            self.flush(room)
+
+    def _queue(self, room, event, data, members, coalesce):
+        """登记批量发送的部分，返回 (需要立即发送的旧客户端, 是否需要立即 flush)"""
+        members = set(members)
+        with self._lock:
+            batched = frozenset(members & self._batch_sids)
+            legacy = members - batched
+            if batched:
+                pending = self._pending.setdefault(room, [])
+                if coalesce:
+                    pending[:] = _strip(pending, lambda item: item[2] - batched if item[0] == event else item[2])
+                pending.append((event, data, batched))
+                flush = len(pending) >= self.max_items
+            else:
+                flush = False
+        return list(legacy), flush
+
+    def flush(self, room=None):
+        """发送积压的消息；room 为 None 时发送所有会议的"""
+        for event, data, sids in self._frames(room):
+            self.socketio.emit(event, data, to=sids)
+
+    def _frames(self, room):
+        """取出积压的消息，返回要发出的帧 [(事件名, 数据, 收件人), ...]"""
+        with self._lock:
+            if room is None:
+                rooms, self._pending = self._pending, {}
+            else:
+                rooms = {room: self._pending.pop(room)} if room in self._pending else {}
+        frames = []
+        for items in rooms.values():
+            # 按每个收件人收到的消息组合分组，同一组只发一帧
+            groups = {}
+            for sid in set().union(*(recipients for _, _, recipients in items)):
+                key = tuple(i for i, (_, _, recipients) in enumerate(items) if sid in recipients)
+                groups.setdefault(key, []).append(sid)
+            for indexes, sids in groups.items():
+                if len(indexes) == 1:
+                    event, data, _ = items[indexes[0]]
+                    frames.append((event, data, sids))
+                else:
+                    frames.append(('batch', [[items[i][0], items[i][1]] for i in indexes], sids))
+                self.frames += len(sids)
+                self.events += len(indexes) * len(sids)
+        return frames
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            if self._pending:
+                self.flush()
+
+
+class AsyncControlBatcher(ControlBatcher):
+    """ControlBatcher 的 asyncio 版本，用于 python-socketio 的 AsyncServer（见 server_asgi.py）"""
+
+    async def emit(self, room, event, data, members, coalesce=False):
+        legacy, flush = self._queue(room, event, data, members, coalesce)
+        if legacy:
+            await self.socketio.emit(event, data, to=legacy)
+        if flush:
+            await self.flush(room)
+
+    async def flush(self, room=None):
+        for event, data, sids in self._frames(room):
+            await self.socketio.emit(event, data, to=sids)
+
+    async def _run(self):
+        while True:
+            await self.socketio.sleep(self.interval)
+            if self._pending:
+                await self.flush()
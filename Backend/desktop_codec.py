@@ -0,0 +1,224 @@
+import struct
+import time
+
+import media_packet
+
+# 桌面共享的分块编码。屏幕被切成 tile_size x tile_size 的块：
+#   关键帧（FLAG_KEYFRAME）：| width(2) | height(2) | tile_size(2) | 整屏 JPEG |
+#   增量帧（FLAG_DELTA）：  | width(2) | height(2) | tile_size(2) | count(2) |
+#                           count 个 | col(2) | row(2) | length(4) | 块 JPEG |
+# 两者都作为 media_packet 的 payload，kind 为 KIND_DESKTOP。
+# 服务器只解析块的位置和长度，块数据原样转发（可以是加密后的数据）。
+SCREEN = struct.Struct('!HHH')
+DELTA_COUNT = struct.Struct('!H')
+TILE = struct.Struct('!HHI')
+
+# 画面尺寸和块大小由客户端给出，解析时检查范围，超出的帧直接拒绝
+MAX_SCREEN_SIZE = 16384
+MIN_TILE_SIZE = 8
+MAX_TILE_SIZE = 2048
+
+
+def pack_keyframe(width, height, tile_size, image):
+    return SCREEN.pack(width, height, tile_size) + bytes(image)
+
+
+def pack_delta(width, height, tile_size, tiles):
+    """tiles: [(col, row, data), ...]"""
+    parts = [SCREEN.pack(width, height, tile_size), DELTA_COUNT.pack(len(tiles))]
+    for col, row, data in tiles:
+        parts.append(TILE.pack(col, row, len(data)))
+        parts.append(bytes(data))
+    return b''.join(parts)
+
+
+def _check_screen(width, height, tile_size):
+    if not 0 < width <= MAX_SCREEN_SIZE or not 0 < height <= MAX_SCREEN_SIZE:
+        raise media_packet.PacketError(f'无效的画面尺寸: {width}x{height}')
+    if not MIN_TILE_SIZE <= tile_size <= MAX_TILE_SIZE:
+        raise media_packet.PacketError(f'无效的块大小: {tile_size}')
+
+
+def grid_size(width, height, tile_size):
+    """画面被切成的 (列数, 行数)"""
+    return -(-width // tile_size), -(-height // tile_size)
+
+
+def parse_keyframe(payload):
+    """返回 (width, height, tile_size, image)"""
+    if len(payload) < SCREEN.size:
+        raise media_packet.PacketError('关键帧长度不足')
+    width, height, tile_size = SCREEN.unpack_from(payload)
+    _check_screen(width, height, tile_size)
+    return width, height, tile_size, payload[SCREEN.size:]
+
+
+def parse_delta(payload):
+    """返回 (width, height, tile_size, [(col, row, data), ...])，data 为 memoryview"""
+    payload = memoryview(payload)
+    if len(payload) < SCREEN.size + DELTA_COUNT.size:
+        raise media_packet.PacketError('增量帧长度不足')
+    width, height, tile_size = SCREEN.unpack_from(payload)
+    _check_screen(width, height, tile_size)
+    cols, rows = grid_size(width, height, tile_size)
+    (count,) = DELTA_COUNT.unpack_from(payload, SCREEN.size)
+    offset = SCREEN.size + DELTA_COUNT.size
+    tiles = []
+    for _ in range(count):
+        if len(payload) < offset + TILE.size:
+            raise media_packet.PacketError('增量帧块头不完整')
+        col, row, length = TILE.unpack_from(payload, offset)
+        if col >= cols or row >= rows:
+            raise media_packet.PacketError(f'块位置超出画面: ({col}, {row})')
+        offset += TILE.size
+        if len(payload) < offset + length:
+            raise media_packet.PacketError('增量帧块数据不完整')
+        tiles.append((col, row, payload[offset:offset + length]))
+        offset += length
+    return width, height, tile_size, tiles
+
+
+class DesktopComposite:
+    """
+    服务器端保存的桌面合成状态：最近一个关键帧 + 之后每个块的最新数据。
+    新加入的用户收到 snapshot()：一个关键帧加一个包含所有已变化块的增量帧，
+    即可得到与其他人一致的完整画面，不需要共享者重新发送关键帧
+    """
+
+    def __init__(self, meeting_id, user):
+        self.meeting_id = meeting_id
+        self.user = user
+        self.keyframe = None     # 最近的关键帧包（完整 media_packet）
+        self.screen = None       # (width, height, tile_size)
+        self.tiles = {}          # (col, row) -> bytes
+        self.seq = 0
+        self.timestamp = 0
+        self.last_keyframe_request = 0.0
+        self.encrypted = False   # 共享者发送加密的桌面帧，服务器无法合成画面
+
+    def apply(self, packet, header):
+        """
+        根据收到的桌面包更新合成状态，格式错误时抛出 media_packet.PacketError。
+        增量帧到达时还没有关键帧返回 False，调用方应向共享者请求关键帧
+        """
+        payload = media_packet.payload_of(packet, header)
+        self.seq = header['seq']
+        self.timestamp = header['timestamp']
+        if header['flags'] & media_packet.FLAG_ENCRYPTED:
+            # 密文只转发不解析：没有可提供给新成员的画面，由共享者补发关键帧
+            self.encrypted = True
+            self.keyframe = None
+            self.screen = None
+            self.tiles = {}
+            return True
+        self.encrypted = False
+        if header['flags'] & media_packet.FLAG_KEYFRAME:
+            width, height, tile_size, _ = parse_keyframe(payload)
+            self.keyframe = packet
+            self.screen = (width, height, tile_size)
+            self.tiles = {}
+            return True
+        if header['flags'] & media_packet.FLAG_DELTA:
+            width, height, tile_size, tiles = parse_delta(payload)
+            if self.keyframe is None or self.screen != (width, height, tile_size):
+                # 没有可叠加的关键帧（或分辨率变了），增量帧无法得到完整画面
+                return False
+            for col, row, data in tiles:
+                self.tiles[(col, row)] = bytes(data)
+            return True
+        # 不分块的整帧，直接当作关键帧保存
+        self.keyframe = packet
+        self.screen = None
+        self.tiles = {}
+        return True
+
+    def tile_count(self):
+        if self.screen is None:
+            return 0
+        cols, rows = grid_size(*self.screen)
+        return cols * rows
+
+    def needs_keyframe(self, ratio):
+        """累积的变化块超过整屏的 ratio 时，重新发一个关键帧比补发所有块更省"""
+        total = self.tile_count()
+        return total > 0 and len(self.tiles) > total * ratio
+
+    def should_request_keyframe(self, min_interval):
+        """向共享者请求关键帧的节流"""
+        now = time.time()
+        if now - self.last_keyframe_request < min_interval:
+            return False
+        self.last_keyframe_request = now
+        return True
+
+    def snapshot(self):
+        """新加入的用户需要的包列表"""
+        if self.keyframe is None:
+            return []
+        packets = [self.keyframe]
+        if self.tiles:
+            width, height, tile_size = self.screen
+            payload = pack_delta(width, height, tile_size,
+                                 [(col, row, data) for (col, row), data in self.tiles.items()])
+            packets.append(media_packet.pack(
+                media_packet.KIND_DESKTOP, self.meeting_id, self.user, self.seq,
+                self.timestamp, payload, flags=media_packet.FLAG_DELTA))
+        return packets
+
+
+class TileEncoder:
+    """
+    发送端参考实现（Python 客户端、压测脚本使用），需要 NumPy。
+    比较相邻两帧，每块只要有像素变化超过 threshold 就作为变化块发送；
+    按 keyframe_interval 秒或收到请求时发送整屏关键帧。
+    encode_image(ndarray) -> bytes 由调用方提供（例如 Pillow 的 JPEG 编码）
+    """
+
+    def __init__(self, encode_image, tile_size=64, keyframe_interval=10.0, threshold=8):
+        self.encode_image = encode_image
+        self.tile_size = tile_size
+        self.keyframe_interval = keyframe_interval
+        self.threshold = threshold
+        self._previous = None
+        self._last_keyframe = 0.0
+        self._force_keyframe = True
+
+    def request_keyframe(self):
+        self._force_keyframe = True
+
+    def encode(self, frame, now=None):
+        """
+        frame: HxWxC 的 uint8 数组。
+        返回 (flags, payload)；画面没有任何变化时返回 (None, None)
+        """
+        import numpy as np
+        now = now if now is not None else time.time()
+        height, width = frame.shape[:2]
+        ts = self.tile_size
+        keyframe = (self._force_keyframe or self._previous is None
+                    or self._previous.shape != frame.shape
+                    or now - self._last_keyframe >= self.keyframe_interval)
+        if keyframe:
+            self._previous = frame.copy()
+            self._last_keyframe = now
+            self._force_keyframe = False
+            return media_packet.FLAG_KEYFRAME, pack_keyframe(width, height, ts, self.encode_image(frame))
+
+        diff = np.abs(frame.astype(np.int16) - self._previous.astype(np.int16))
+        if diff.ndim == 3:
+            diff = diff.max(axis=2)
+        rows, cols = -(-height // ts), -(-width // ts)
+        # 补齐到整块后按块求最大差值
+        padded = np.zeros((rows * ts, cols * ts), dtype=diff.dtype)
+        padded[:height, :width] = diff
+        changed = padded.reshape(rows, ts, cols, ts).max(axis=(1, 3)) > self.threshold
+
+        tiles = []
+        for row, col in zip(*np.nonzero(changed)):
+            area = (slice(row * ts, (row + 1) * ts), slice(col * ts, (col + 1) * ts))
+            tiles.append((int(col), int(row), self.encode_image(frame[area])))
+            # 只更新已发送的块，未发送块的缓慢变化会继续累积直到超过阈值
+            self._previous[area] = frame[area]
+        if not tiles:
+            return None, None
+        return media_packet.FLAG_DELTA, pack_delta(width, height, ts, tiles)
@@ -0,0 +1,126 @@
+import json
+
+# 多 worker 部署时在总线存储上共享的会议目录。
+# 每个 worker 仍在本地 MeetingRegistry 中保存热数据（成员、帧），
+# 目录只保存跨进程需要一致的部分：
+#   vc:meetings            meeting_id -> {key, iv, mode, worker, worker_url}
+#   vc:creators            meeting_id -> 创建者 sid
+#   vc:members:<id>        userName -> sid（用户名在整个集群内唯一）
+#   vc:workers:<id>        worker_id -> 该 worker 上的成员数
+# 成员分布变化时在 vc:directory 频道上广播，各 worker 据此更新 meeting.remote
+
+MEETINGS_KEY = 'vc:meetings'
+CREATORS_KEY = 'vc:creators'
+CHANNEL = 'vc:directory'
+
+
+class MeetingDirectory:
+
+    def __init__(self, store, worker_id, worker_url):
+        self.store = store
+        self.worker_id = worker_id
+        self.worker_url = worker_url
+
+    # ---- 会议 ----
+
+    def publish_meeting(self, meeting):
+        """登记本 worker 创建的会议，会议与本 worker 绑定（affinity）"""
+        self.store.hset(MEETINGS_KEY, meeting.meeting_id, json.dumps({
+            'key': meeting.key,
+            'iv': meeting.iv,
+            'mode': meeting.mode,
+            'worker': self.worker_id,
+            'worker_url': self.worker_url,
+        }))
+
+    def lookup(self, meeting_id):
+        if not meeting_id:
+            return None
+        record = self.store.hget(MEETINGS_KEY, meeting_id)
+        return json.loads(record) if record else None
+
+    def list(self):
+        """{meeting_id: record}"""
+        return {mid: json.loads(record)
+                for mid, record in self.store.hgetall(MEETINGS_KEY).items()}
+
+    def creator_of(self, meeting_id):
+        return self.store.hget(CREATORS_KEY, meeting_id)
+
+    def set_mode(self, meeting_id, mode):
+        record = self.lookup(meeting_id)
+        if record is not None and record['mode'] != mode:
+            record['mode'] = mode
+            self.store.hset(MEETINGS_KEY, meeting_id, json.dumps(record))
+
+    def remove_meeting(self, meeting_id):
+        self.store.hdel(MEETINGS_KEY, meeting_id)
+        self.store.hdel(CREATORS_KEY, meeting_id)
+        self.store.delete(f'vc:members:{meeting_id}')
+        self.store.delete(f'vc:workers:{meeting_id}')
+
+    # ---- 成员 ----
+
+    def claim_user(self, meeting_id, user, sid):
+        """在整个集群内占用用户名，已被占用时返回 False"""
+        return self.store.hsetnx(f'vc:members:{meeting_id}', user, sid)
+
+    def unclaim_user(self, meeting_id, user):
+        self.store.hdel(f'vc:members:{meeting_id}', user)
+
+    def claim_creator(self, meeting_id, sid):
+        return self.store.hsetnx(CREATORS_KEY, meeting_id, sid)
+
+    def set_creator(self, meeting_id, sid):
+        self.store.hset(CREATORS_KEY, meeting_id, sid)
+
+    def creator_name(self, meeting_id):
+        creator_sid = self.creator_of(meeting_id)
+        for user, sid in self.store.hgetall(f'vc:members:{meeting_id}').items():
+            if sid == creator_sid:
+                return user
+        return None
+
+    def reassign_creator(self, meeting_id, leaving_sid, new_creator_sid=None):
+        """
+        leaving_sid 是创建者时把创建者交给 new_creator_sid，
+        本 worker 上没有其他成员时交给集群中任意一个剩余成员。
+        返回 (新创建者用户名, sid)，无需变更时返回 None
+        """
+        if self.creator_of(meeting_id) != leaving_sid:
+            return None
+        members = self.store.hgetall(f'vc:members:{meeting_id}')
+        for user, sid in members.items():
+            if new_creator_sid is None or sid == new_creator_sid:
+                self.set_creator(meeting_id, sid)
+                return user, sid
+        return None
+
+    def count(self, meeting_id):
+        """整个集群中会议的参与人数"""
+        return self.store.hlen(f'vc:members:{meeting_id}')
+
+    def member_joined(self, meeting_id):
+        self.store.hincrby(f'vc:workers:{meeting_id}', self.worker_id, 1)
+        self.store.publish(CHANNEL, meeting_id)
+
+    def member_left(self, meeting_id):
+        """本 worker 上的成员离开（用户名需先 unclaim_user），返回剩余人数，没人时删除会议"""
+        self.store.hincrby(f'vc:workers:{meeting_id}', self.worker_id, -1)
+        remaining = self.count(meeting_id)
+        if remaining == 0:
+            self.remove_meeting(meeting_id)
+        self.store.publish(CHANNEL, meeting_id)
+        return remaining
+
+    def notify(self, meeting_id):
+        self.store.publish(CHANNEL, meeting_id)
+
+    def has_remote_members(self, meeting_id):
+        """会议是否有成员连接在其他 worker 上"""
+        workers = self.store.hgetall(f'vc:workers:{meeting_id}')
+        return any(int(n) > 0 for w, n in workers.items() if w != self.worker_id)
+
+    def changes(self):
+        """阻塞生成器，产出成员分布发生变化的会议号"""
+        return self.store.subscribe(CHANNEL)
@@ -0,0 +1,267 @@
+import threading
+import time
+from collections import OrderedDict
+
+import media_packet
+
+# 选择性转发（SFU）：每个接收者只以全帧率收到最近发言的 last-N 个用户和自己置顶的用户，
+# 其余发布者按缩略图帧率转发（others_fps 为 0 时不转发）；接收者可以按发布者退订/重新订阅。
+# 会议人数不超过 last-N + 1 时所有人都是全帧率，与原来的行为一致。
+#
+# 发布者同时发送多个分辨率层（simulcast）时，每个接收者只收其中一层：
+#   min(按画面格子宽度选的层, 按测得带宽选的层)，非 last-N 的发布者固定为缩略图层；
+# 发布者没有发送想要的层时，退而选择最接近的较低层，没有较低层再选较高层。
+
+FULL = 'full'
+THUMBNAIL = 'thumbnail'
+NONE = 'none'
+
+MAX_VIEWPORT_WIDTH = 16384  # 画面格子宽度上限（像素）
+MAX_VIEWPORT_TILES = 256    # 一次上报最多的格子数
+
+
+def _viewport_width(value):
+    """把客户端上报的宽度转成 1 ~ MAX_VIEWPORT_WIDTH 的整数，无效时返回 None"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if value != value or not 1 <= value <= MAX_VIEWPORT_WIDTH:
+        # NaN、非正数和过大的宽度
+        return None
+    return int(value)
+
+
+class ForwardingState:
+    """单个会议的转发状态，保存在 Meeting.forwarding 中"""
+
+    def __init__(self):
+        # 发布者按最近发言时间排序，越靠后越近；从未发言的新发布者排在最前
+        self.speakers = OrderedDict()  # userName -> 最近发言时间
+        self.active = frozenset()      # 当前的 last-N 发布者
+        self.pins = {}                 # 接收者 sid -> {置顶的 userName}
+        self.unsubscribed = {}         # 接收者 sid -> {退订的 userName}
+        self.thumbnail_sent = {}       # (接收者 sid, userName) -> 上次按缩略图帧率转发的时间
+        self.layers = {}               # userName -> {层: 最近收到该层的时间}
+        self.viewports = {}            # 接收者 sid -> {userName 或 None(默认): 画面格子宽度}
+        self.lock = threading.Lock()
+
+
+class ForwardingPolicy:
+
+    def __init__(self, last_n=4, others_fps=1.0, speaking_level=0.05,
+                 layer_widths=(160, 640), layer_timeout=2.0):
+        self.last_n = last_n
+        self.others_fps = others_fps
+        self.speaking_level = speaking_level
+        self.layer_widths = layer_widths    # 缩略图层、中间层的标称宽度，更宽的格子用完整层
+        self.layer_timeout = layer_timeout  # 超过这个时间没收到的层视为已停止发送
+        # 可选回调 sid -> 该接收者带宽允许的最高层，由调用方根据实测吞吐提供
+        self.bandwidth_layer = None
+
+    def _refresh(self, state):
+        """重新计算 last-N，集合变化时返回新的有序列表，否则返回 None"""
+        users = list(state.speakers)[-self.last_n:] if self.last_n > 0 else []
+        active = frozenset(users)
+        if active == state.active:
+            return None
+        state.active = active
+        return list(reversed(users))
+
+    # ---- 发布者 ----
+
+    def on_publish(self, meeting, user):
+        """发布者的每一帧都会调用；新发布者加入排序，返回变化后的 last-N 或 None"""
+        state = meeting.forwarding
+        if user in state.speakers:
+            return None
+        with state.lock:
+            state.speakers[user] = 0.0
+            state.speakers.move_to_end(user, last=False)
+            return self._refresh(state)
+
+    def on_audio_level(self, meeting, user, level, now=None):
+        """
+        客户端上报的音量，超过阈值视为正在发言，返回变化后的 last-N 或 None。
+        last-N 只在视频发布者中排序：没有发布视频的用户发言不会把发布者挤出 last-N
+        """
+        if level < self.speaking_level:
+            return None
+        state = meeting.forwarding
+        if user not in state.speakers:
+            return None
+        with state.lock:
+            if user not in state.speakers:
+                # 加锁前发布者刚好停止了视频
+                return None
+            state.speakers[user] = now if now is not None else time.time()
+            state.speakers.move_to_end(user)
+            return self._refresh(state)
+
+    def remove_publisher(self, meeting, user):
+        state = meeting.forwarding
+        with state.lock:
+            state.layers.pop(user, None)
+            if state.speakers.pop(user, None) is None:
+                return None
+            for key in [k for k in state.thumbnail_sent if k[1] == user]:
+                del state.thumbnail_sent[key]
+            return self._refresh(state)
+
+    def remove_member(self, meeting, sid, user):
+        """成员离开会议：清理其作为接收者和发布者的状态"""
+        state = meeting.forwarding
+        with state.lock:
+            state.pins.pop(sid, None)
+            state.unsubscribed.pop(sid, None)
+            state.viewports.pop(sid, None)
+            for key in [k for k in state.thumbnail_sent if k[0] == sid]:
+                del state.thumbnail_sent[key]
+        return self.remove_publisher(meeting, user)
+
+    # ---- 接收者 ----
+
+    def pin(self, meeting, sid, user):
+        with meeting.forwarding.lock:
+            meeting.forwarding.pins.setdefault(sid, set()).add(user)
+
+    def unpin(self, meeting, sid, user):
+        with meeting.forwarding.lock:
+            meeting.forwarding.pins.get(sid, set()).discard(user)
+
+    def subscribe(self, meeting, sid, user):
+        with meeting.forwarding.lock:
+            meeting.forwarding.unsubscribed.get(sid, set()).discard(user)
+
+    def unsubscribe(self, meeting, sid, user):
+        with meeting.forwarding.lock:
+            meeting.forwarding.unsubscribed.setdefault(sid, set()).add(user)
+
+    def set_viewport(self, meeting, sid, width=None, tiles=None):
+        """
+        接收者上报画面格子宽度：width 为默认值，tiles 为 {userName: 宽度}。
+        宽度取整后必须在 1 ~ MAX_VIEWPORT_WIDTH 之间，有任何一项无效时忽略整次上报并返回 False
+        """
+        viewport = {}
+        if tiles is not None:
+            if not isinstance(tiles, dict) or len(tiles) > MAX_VIEWPORT_TILES:
+                return False
+            for user, tile_width in tiles.items():
+                tile_width = _viewport_width(tile_width)
+                if not isinstance(user, str) or tile_width is None:
+                    return False
+                viewport[user] = tile_width
+        if width is not None:
+            width = _viewport_width(width)
+            if width is None:
+                return False
+            viewport[None] = width
+        with meeting.forwarding.lock:
+            meeting.forwarding.viewports[sid] = viewport
+        return True
+
+    def active_speakers(self, meeting):
+        state = meeting.forwarding
+        with state.lock:
+            return [u for u in reversed(state.speakers) if u in state.active]
+
+    # ---- simulcast 层 ----
+
+    def _note_layer(self, state, user, layer, now):
+        """记录发布者发送了 layer，返回当前仍在发送的层（升序）"""
+        seen = state.layers.get(user)
+        if seen is None:
+            seen = state.layers[user] = {}
+        seen[layer] = now
+        return sorted(l for l, t in seen.items() if now - t <= self.layer_timeout)
+
+    def _available(self, meeting, user, now):
+        seen = meeting.forwarding.layers.get(user) or {}
+        return sorted(l for l, t in seen.items() if now - t <= self.layer_timeout)
+
+    def top_layer(self, meeting, user, now=None):
+        """发布者当前发送的最高层，没有记录时返回 None"""
+        layers = self._available(meeting, user, now if now is not None else time.time())
+        return layers[-1] if layers else None
+
+    def _width_layer(self, width):
+        for layer, nominal in enumerate(self.layer_widths):
+            if width <= nominal:
+                return layer
+        return media_packet.LAYER_FULL
+
+    def wanted_layer(self, meeting, sid, user, tier):
+        if tier == THUMBNAIL:
+            return media_packet.LAYER_THUMBNAIL
+        wanted = media_packet.LAYER_FULL
+        viewport = meeting.forwarding.viewports.get(sid)
+        if viewport:
+            width = viewport.get(user, viewport.get(None))
+            if width:
+                wanted = self._width_layer(width)
+        if self.bandwidth_layer is not None:
+            wanted = min(wanted, self.bandwidth_layer(sid))
+        return wanted
+
+    @staticmethod
+    def _resolve(wanted, available):
+        """在发布者正在发送的层中选出最接近 wanted 的一层"""
+        lower = [l for l in available if l <= wanted]
+        return lower[-1] if lower else available[0]
+
+    # ---- 转发决策 ----
+
+    def tier(self, meeting, sid, user):
+        """接收者 sid 应该以什么方式收到发布者 user 的视频：FULL / THUMBNAIL / NONE"""
+        state = meeting.forwarding
+        if user in state.unsubscribed.get(sid, ()):
+            return NONE
+        if user in state.active or user in state.pins.get(sid, ()):
+            return FULL
+        return THUMBNAIL if self.others_fps > 0 else NONE
+
+    def full_rate_receivers(self, meeting, user, receivers):
+        """receivers 中以全帧率收到 user 视频的接收者（不含只收缩略图和已退订的）"""
+        state = meeting.forwarding
+        if len(meeting.clients) <= self.last_n + 1 and not state.unsubscribed:
+            # 与 select 相同：小会议里所有人都在 last-N 之内
+            return list(receivers)
+        return [sid for sid in receivers if self.tier(meeting, sid, user) == FULL]
+
+    def select(self, meeting, user, receivers, layer=media_packet.LAYER_FULL, now=None):
+        """从 receivers 中选出这一帧（属于 simulcast 的 layer 层）要转发给的接收者"""
+        now = now if now is not None else time.time()
+        state = meeting.forwarding
+        available = self._note_layer(state, user, layer, now)
+        layered = len(available) > 1
+        if not layered and len(meeting.clients) <= self.last_n + 1 and not state.unsubscribed:
+            # 小会议且只有一层：所有人都在 last-N 之内
+            return receivers
+        selected = []
+        for sid in receivers:
+            tier = self.tier(meeting, sid, user)
+            if tier == NONE:
+                continue
+            if layered and self._resolve(self.wanted_layer(meeting, sid, user, tier), available) != layer:
+                continue
+            if tier == FULL:
+                selected.append(sid)
+            else:
+                key = (sid, user)
+                if now - state.thumbnail_sent.get(key, 0.0) >= 0.9 / self.others_fps:
+                    state.thumbnail_sent[key] = now
+                    selected.append(sid)
+        return selected
+
+    def transcode_layers(self, meeting, user, receivers, layer, now=None):
+        """
+        发布者只发送 layer 一层时，找出想要更低层的接收者，返回 {层: [sid, ...]}；
+        这些接收者可以改收服务器转码后的帧。发布者自己发送多层时返回空字典
+        """
+        now = now if now is not None else time.time()
+        if self._available(meeting, user, now) != [layer]:
+            return {}
+        groups = {}
+        for sid in receivers:
+            wanted = self.wanted_layer(meeting, sid, user, self.tier(meeting, sid, user))
+            if wanted < layer:
+                groups.setdefault(wanted, []).append(sid)
+        return groups
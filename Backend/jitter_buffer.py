@@ -0,0 +1,151 @@
+import heapq
+import time
+from collections import deque
+
+# 按序号重排的自适应抖动缓冲，服务器（音频混音、视频转发）和 Python 客户端都可以使用，不依赖其他模块。
+#   - 包按 media_packet 头部的 seq（32 位，可回绕）排序，按发送时间戳 + 目标时延出队
+#   - 目标时延按 RFC 3550 的到达间隔抖动估计自适应调整，限制在 [min_delay, max_delay]
+#   - 晚于播放位置到达的包和重复包直接丢弃
+#   - 时钟偏移取最近一段时间内的最小传输时延，发送端与接收端的时钟漂移会被逐步跟上；
+#     缓冲的时长超过 max_delay 时丢弃最旧的包，防止时延越积越大
+
+SEQ_MOD = 1 << 32
+
+
+def seq_diff(a, b):
+    """a - b，考虑 32 位回绕，结果在 [-2^31, 2^31)"""
+    return (a - b + (SEQ_MOD >> 1)) % SEQ_MOD - (SEQ_MOD >> 1)
+
+
+def _now_ms():
+    return time.monotonic() * 1000
+
+
+class JitterBuffer:
+
+    def __init__(self, target_delay_ms=60, min_delay_ms=20, max_delay_ms=200,
+                 jitter_factor=3.0, offset_window=64):
+        self.min_delay = min_delay_ms
+        self.max_delay = max_delay_ms
+        self.delay = min(max(target_delay_ms, min_delay_ms), max_delay_ms)
+        self.jitter_factor = jitter_factor
+        self.jitter = 0.0
+        self._heap = []          # (展开后的序号, 时间戳, payload)
+        self._queued = set()     # 缓冲中的展开序号，用于去重
+        self._next = None        # 下一个应出队的展开序号
+        self._highest = None     # 收到过的最大展开序号
+        self._newest_ts = None   # 缓冲中最新的时间戳
+        self._last_transit = None
+        self._transits = deque(maxlen=offset_window)
+        self.offset = None       # 到达时间 - 发送时间戳 的估计（包含时钟差）
+        self.received = 0
+        self.late = 0
+        self.duplicate = 0
+        self.lost = 0
+        self.dropped = 0
+
+    def _unwrap(self, seq):
+        if self._highest is None:
+            return seq
+        return self._highest + seq_diff(seq, self._highest % SEQ_MOD)
+
+    def push(self, seq, timestamp_ms, payload, now_ms=None):
+        """放入一个包，迟到或重复时返回 False"""
+        now_ms = now_ms if now_ms is not None else _now_ms()
+        ext = self._unwrap(seq)
+        if self._next is not None and ext < self._next:
+            self.late += 1
+            return False
+        if ext in self._queued:
+            self.duplicate += 1
+            return False
+        self.received += 1
+        if self._highest is None or ext > self._highest:
+            self._highest = ext
+
+        # 抖动估计与时钟偏移
+        transit = now_ms - timestamp_ms
+        if self._last_transit is not None:
+            self.jitter += (abs(transit - self._last_transit) - self.jitter) / 16
+            self.delay = min(max(self.jitter_factor * self.jitter, self.min_delay), self.max_delay)
+        self._last_transit = transit
+        self._transits.append(transit)
+        self.offset = min(self._transits)
+
+        heapq.heappush(self._heap, (ext, timestamp_ms, payload))
+        self._queued.add(ext)
+        if self._newest_ts is None or timestamp_ms > self._newest_ts:
+            self._newest_ts = timestamp_ms
+        self._trim()
+        return True
+
+    def _trim(self):
+        """缓冲的时长超过 max_delay 时丢弃最旧的包"""
+        while len(self._heap) > 1 and self._newest_ts - self._heap[0][1] > self.max_delay:
+            ext, _, _ = heapq.heappop(self._heap)
+            self._queued.discard(ext)
+            self.dropped += 1
+            self._next = ext + 1
+
+    def pop_ready(self, now_ms=None):
+        """取出所有到了播放时间的包（按序号），返回 payload 列表"""
+        now_ms = now_ms if now_ms is not None else _now_ms()
+        ready = []
+        while self._heap:
+            ext, timestamp_ms, payload = self._heap[0]
+            if timestamp_ms + self.offset + self.delay > now_ms:
+                break
+            heapq.heappop(self._heap)
+            self._queued.discard(ext)
+            if self._next is not None and ext > self._next:
+                # 中间的包没有按时到达，跳过
+                self.lost += ext - self._next
+            self._next = ext + 1
+            ready.append(payload)
+        if not self._heap:
+            self._newest_ts = None
+        return ready
+
+    def __len__(self):
+        return len(self._heap)
+
+    def stats(self):
+        return {
+            'buffered': len(self._heap),
+            'delay_ms': round(self.delay, 1),
+            'jitter_ms': round(self.jitter, 1),
+            'received': self.received,
+            'late': self.late,
+            'duplicate': self.duplicate,
+            'lost': self.lost,
+            'dropped': self.dropped,
+        }
+
+
+class SequenceTracker:
+    """
+    只转发最新帧的流（视频、桌面）用的乱序过滤：比已转发的帧旧的帧直接丢弃。
+    序号大幅回退（发送端重启）时重新开始计数
+    """
+
+    def __init__(self, restart_gap=1 << 16):
+        self.restart_gap = restart_gap
+        self._last = {}  # (sid, 流) -> 最近转发的序号
+        self._keys = {}  # sid -> 该连接的所有 key，断开时不必扫描全部流
+        self.discarded = 0
+
+    def accept(self, key, seq):
+        last = self._last.get(key)
+        if last is not None:
+            diff = seq_diff(seq, last)
+            if -self.restart_gap < diff <= 0:
+                self.discarded += 1
+                return False
+        else:
+            self._keys.setdefault(key[0], set()).add(key)
+        self._last[key] = seq
+        return True
+
+    def remove(self, sid):
+        for key in self._keys.pop(sid, ()):
+            self._last.pop(key, None)
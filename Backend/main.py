@@ -0,0 +1,25 @@
+# 统一的服务器入口：视频、桌面共享、音频和 P2P 信令在同一个进程、同一个端口上，
+# 每个客户端只需要一条 Socket.IO 连接。
+#   python main.py                                        # 默认 threading 模式，启用全部流水线
+#   VC_ASYNC_MODE=eventlet python main.py                 # eventlet / gevent
+#   VC_PIPELINES=video,desktop python main.py             # 只启用部分流水线
+# 旧的 test.py（音频，PORT+1）和 server_test.py（信令）仍可单独运行，但不再需要和 server2.py 同时启动。
+# 单进程需要承载数千个连接时，改用 ASGI 版本 server_asgi.py（uvicorn，只有 video、desktop）。
+
+import config
+import async_mode
+
+# 必须在导入服务器（以及 Flask、socket、threading）之前
+async_mode.patch(config.ASYNC_MODE)
+
+import logging
+
+from server2 import app, socketio, pipelines, recorder
+
+if __name__ == '__main__':
+    logging.basicConfig(level=config.LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    try:
+        socketio.run(app, host=config.HOST, port=config.PORT, debug=config.DEBUG, allow_unsafe_werkzeug=True)
+    finally:
+        pipelines.close()
+        recorder.close()
@@ -0,0 +1,140 @@
+import hashlib
+import hmac
+import os
+import struct
+
+import media_packet
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # 服务器只生成和分发密钥，不需要 cryptography；加解密需要
+    AESGCM = None
+
+# 媒体加密：对二进制媒体包（media_packet）的 payload 做 AES-GCM 认证加密，服务器只转发密文。
+#   - 会议的会话密钥在每次成员变化（加入、离开、断开）时更换，由服务器通过 media_key 事件
+#     发给当前所有成员：离开的人拿不到之后的密钥，新加入的人拿不到之前的密钥
+#   - 每个发送者用 HKDF-SHA256(会话密钥, info=用户名) 派生自己的密钥，
+#     不同发送者的 nonce 即使相同也不会在同一个密钥下重复
+#   - nonce（12 字节）：| salt(8) | seq(4) |。salt 是每条流（同一密钥下的 kind + layer）开始时随机生成的，
+#     随包传输；发送端重连、重启或序号没有递增（回到 0、回绕）时都换新的 salt，
+#     所以同一密钥下即使 seq 重复，nonce 也不会重复。seq 超出 32 位时直接拒绝
+#   - 包头（含用户名）作为附加认证数据，篡改包头或换到别的会议/用户都会解密失败
+#   - 加密后的 payload：| key_id(4) | salt(8) | 密文 | tag(16) |，flags 置 FLAG_ENCRYPTED
+# 与旧方案（CryptoJS AES-CBC 加密 base64 data URL 再 base64、所有帧共用一个 IV）相比，
+# 每帧只增加 28 字节，不再有两层 base64 带来的约 78% 膨胀。
+
+CIPHER = 'AES-128-GCM'
+KDF = 'HKDF-SHA256'
+KEY_SIZE = 16
+NONCE = 'salt64-seq32'  # nonce 的构造方式，随 media_key 一起发给客户端
+KEY_ID = struct.Struct('!I')
+SALT_SIZE = 8
+TAG_SIZE = 16
+OVERHEAD = KEY_ID.size + SALT_SIZE + TAG_SIZE
+MAX_SEQ = 0xFFFFFFFF
+
+
+class CryptoError(Exception):
+    """密文无法解密：密钥未知、被篡改或格式错误"""
+
+
+def new_session_key():
+    """生成新的会话密钥，返回 (key_id, key)"""
+    return KEY_ID.unpack(os.urandom(KEY_ID.size))[0], os.urandom(KEY_SIZE)
+
+
+def hkdf_sha256(key, info, length=KEY_SIZE, salt=b''):
+    prk = hmac.new(salt or b'\x00' * hashlib.sha256().digest_size, key, hashlib.sha256).digest()
+    okm = b''
+    block = b''
+    counter = 1
+    while len(okm) < length:
+        block = hmac.new(prk, block + info + bytes([counter]), hashlib.sha256).digest()
+        okm += block
+        counter += 1
+    return okm[:length]
+
+
+def sender_key(session_key, user):
+    return hkdf_sha256(session_key, b'vc-media:' + user.encode('utf-8'))
+
+
+def nonce(salt, seq):
+    if len(salt) != SALT_SIZE:
+        raise CryptoError('salt 长度错误')
+    if not 0 <= seq <= MAX_SEQ:
+        raise CryptoError('序号超出 32 位')
+    return bytes(salt) + struct.pack('!I', seq)
+
+
+class MediaKeyring:
+    """
+    客户端持有的密钥：当前密钥加最近的几个旧密钥（换密钥前发出、换密钥后才到达的包仍能解密），
+    按 (key_id, 用户名) 缓存派生出的发送者密钥
+    """
+
+    def __init__(self, keep=2):
+        self.keep = keep
+        self.current = None   # key_id
+        self._keys = {}       # key_id -> 会话密钥，按加入顺序
+        self._ciphers = {}    # (key_id, 用户名) -> AESGCM
+        self._streams = {}    # 本端发送的流 (key_id, kind, layer) -> [salt, 上一个序号]
+
+    def set_key(self, key_id, key):
+        self._keys[key_id] = key
+        self.current = key_id
+        while len(self._keys) > self.keep:
+            oldest = next(iter(self._keys))
+            del self._keys[oldest]
+            for k in [k for k in self._ciphers if k[0] == oldest]:
+                del self._ciphers[k]
+            for k in [k for k in self._streams if k[0] == oldest]:
+                del self._streams[k]
+
+    def cipher(self, key_id, user):
+        aead = self._ciphers.get((key_id, user))
+        if aead is None:
+            key = self._keys.get(key_id)
+            if key is None:
+                raise CryptoError(f'未知的密钥 {key_id}')
+            aead = self._ciphers[(key_id, user)] = AESGCM(sender_key(key, user))
+        return aead
+
+    def _salt(self, kind, layer, seq):
+        """发送流当前的 salt；新流或序号没有递增（重启、回绕）时换新的 salt"""
+        stream = self._streams.get((self.current, kind, layer))
+        if stream is None or seq <= stream[1]:
+            stream = self._streams[(self.current, kind, layer)] = [os.urandom(SALT_SIZE), seq]
+        stream[1] = seq
+        return stream[0]
+
+    def encrypt_packet(self, kind, meeting_id, user, seq, timestamp_ms, payload, flags=0):
+        """用当前密钥构造一个加密的媒体包，seq 必须在 32 位以内"""
+        if self.current is None:
+            raise CryptoError('还没有收到会话密钥')
+        if not 0 <= seq <= MAX_SEQ:
+            raise CryptoError('序号超出 32 位')
+        flags |= media_packet.FLAG_ENCRYPTED
+        salt = self._salt(kind, media_packet.layer_of(flags), seq)
+        header = media_packet.pack(kind, meeting_id, user, seq, timestamp_ms, b'', flags=flags)
+        ciphertext = self.cipher(self.current, user).encrypt(nonce(salt, seq), bytes(payload), header)
+        return b''.join((header, KEY_ID.pack(self.current), salt, ciphertext))
+
+    def decrypt_packet(self, packet, header=None):
+        """返回解密后的 payload；未加密的包原样返回 payload"""
+        header = header or media_packet.unpack_header(packet)
+        payload = media_packet.payload_of(packet, header)
+        if not header['flags'] & media_packet.FLAG_ENCRYPTED:
+            return bytes(payload)
+        if len(payload) < OVERHEAD:
+            raise CryptoError('密文长度不足')
+        (key_id,) = KEY_ID.unpack_from(payload)
+        salt = bytes(payload[KEY_ID.size:KEY_ID.size + SALT_SIZE])
+        aad = bytes(packet[:header['payload_offset']])
+        try:
+            return self.cipher(key_id, header['user']).decrypt(
+                nonce(salt, header['seq']), bytes(payload[KEY_ID.size + SALT_SIZE:]), aad)
+        except CryptoError:
+            raise
+        except Exception:
+            raise CryptoError('认证失败')
@@ -0,0 +1,103 @@
+import struct
+
+# 二进制媒体包格式（大端序）：
+#
+#   | version(1) | kind(1) | flags(1) | user_len(1) | seq(4) | timestamp_ms(8) | meeting_id(8) |
+#   | user (user_len 字节, UTF-8) | payload (剩余字节，通常为 JPEG 或加密后的数据) |
+#
+# 固定头 24 字节，服务器只解析头部，payload 原样转发，不做 base64 编解码。
+HEADER = struct.Struct('!BBBBIQ8s')
+HEADER_SIZE = HEADER.size
+VERSION = 1
+
+# kind
+KIND_VIDEO = 0
+KIND_DESKTOP = 1
+KIND_AUDIO = 2
+
+# flags
+FLAG_ENCRYPTED = 0x01
+FLAG_KEYFRAME = 0x02
+FLAG_DELTA = 0x04      # 分块增量帧，见 desktop_codec.py
+FLAG_LAYERED = 0x08    # 多分辨率（simulcast）视频，层号在 flags 的 bit4-5
+LAYER_SHIFT = 4
+LAYER_MASK = 0x30
+
+# simulcast 层，数值越大分辨率越高；不分层的视频视为 LAYER_FULL
+LAYER_THUMBNAIL = 0
+LAYER_MEDIUM = 1
+LAYER_FULL = 2
+
+MEETING_ID_SIZE = 8
+MAX_USER_LEN = 255
+
+
+class PacketError(ValueError):
+    """二进制媒体包格式错误"""
+
+
+def pack(kind, meeting_id, user, seq, timestamp_ms, payload, flags=0):
+    """
+    构造一个二进制媒体包，返回 bytes
+    """
+    user_bytes = user.encode('utf-8')
+    if len(user_bytes) > MAX_USER_LEN:
+        raise PacketError('用户名过长')
+    meeting_bytes = meeting_id.encode('ascii')
+    if len(meeting_bytes) > MEETING_ID_SIZE:
+        raise PacketError('会议号过长')
+    header = HEADER.pack(VERSION, kind, flags, len(user_bytes),
+                         seq & 0xFFFFFFFF, timestamp_ms, meeting_bytes)
+    return b''.join((header, user_bytes, payload))
+
+
+def layer_flags(layer):
+    """构造带层号的 flags，与其他 flag 按位或后传给 pack"""
+    return FLAG_LAYERED | (layer << LAYER_SHIFT)
+
+
+def layer_of(flags):
+    if flags & FLAG_LAYERED:
+        return (flags & LAYER_MASK) >> LAYER_SHIFT
+    return LAYER_FULL
+
+
+def unpack_header(packet):
+    """
+    只解析头部，不拷贝 payload。
+    返回 dict: version, kind, flags, seq, timestamp, meeting_id, user, payload_offset
+    """
+    if not isinstance(packet, (bytes, bytearray, memoryview)):
+        raise PacketError('媒体包必须是二进制数据')
+    if len(packet) < HEADER_SIZE:
+        raise PacketError('媒体包长度不足')
+    version, kind, flags, user_len, seq, timestamp, meeting_bytes = HEADER.unpack_from(packet)
+    if version != VERSION:
+        raise PacketError(f'不支持的媒体包版本: {version}')
+    offset = HEADER_SIZE + user_len
+    if len(packet) < offset:
+        raise PacketError('媒体包用户名字段不完整')
+    try:
+        user = bytes(packet[HEADER_SIZE:offset]).decode('utf-8')
+        meeting_id = meeting_bytes.rstrip(b'\x00').decode('ascii')
+    except UnicodeDecodeError:
+        raise PacketError('媒体包头部编码错误')
+    return {
+        'version': version,
+        'kind': kind,
+        'flags': flags,
+        'seq': seq,
+        'timestamp': timestamp,
+        'meeting_id': meeting_id,
+        'user': user,
+        'payload_offset': offset,
+    }
+
+
+def payload_of(packet, header=None):
+    """
+    返回 payload 的 memoryview（零拷贝）
+    """
+    if header is None:
+        header = unpack_header(packet)
+    return memoryview(packet)[header['payload_offset']:]
@@ -0,0 +1,81 @@
+import bisect
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# /list_meetings 的分页、过滤和响应缓存。
+#   - 会议列表按会议号排序，并按创建者、模式建立索引；只有 registry.version 变化时才重建
+#   - 游标分页：cursor 为上一页最后一个会议号，用二分查找定位，每页 O(log M + limit)
+#   - 序列化后的响应按查询参数缓存，version 变化时整体失效；ETag 为响应内容的摘要，只在生成响应时计算一次。
+#     版本号在进程重启后从头计数、各 worker 之间也不同，不能作为 ETag，否则相同的 ETag 可能对应不同的内容。
+#     轮询的客户端带 If-None-Match 时直接返回 304，不再序列化
+#   - 过滤条件来自查询参数，按条件建立的索引和响应缓存一样按 LRU 限制数量
+
+
+class MeetingList:
+
+    def __init__(self, max_limit=500, cache_size=64, index_size=64):
+        self.max_limit = max_limit
+        self.cache_size = cache_size
+        self.index_size = index_size
+        self._version = None
+        self._entries = []   # [{'meeting_id', 'creator', 'mode'}]，按会议号排序
+        self._all = ([], [])  # 不过滤时的 (会议号列表, 条目列表)
+        self._index = OrderedDict()  # (creator, mode) 过滤条件 -> (会议号列表, 条目列表)
+        self._responses = OrderedDict()  # 查询参数 -> (body, etag)
+        self._lock = threading.Lock()
+
+    def _rebuild(self, version, entries):
+        self._entries = sorted(entries, key=lambda e: e['meeting_id'])
+        self._all = ([e['meeting_id'] for e in self._entries], self._entries)
+        self._index.clear()
+        self._responses.clear()
+        self._version = version
+
+    def _filtered(self, creator, mode):
+        if creator is None and mode is None:
+            return self._all
+        key = (creator, mode)
+        found = self._index.get(key)
+        if found is not None:
+            self._index.move_to_end(key)
+            return found
+        entries = [e for e in self._entries
+                   if (creator is None or e['creator'] == creator) and (mode is None or e['mode'] == mode)]
+        found = self._index[key] = ([e['meeting_id'] for e in entries], entries)
+        if len(self._index) > self.index_size:
+            self._index.popitem(last=False)
+        return found
+
+    def page(self, version, load, cursor=None, limit=None, creator=None, mode=None):
+        """
+        返回 (JSON 响应 bytes, etag)。load() 返回所有会议的条目，只在 version 变化时调用。
+        version 为 None 时（没有版本号，例如从多进程共享目录读取）每次都重新加载。
+        limit 为 None 时返回全部会议（与旧接口一致）
+        """
+        if limit is not None:
+            limit = max(1, min(limit, self.max_limit))
+        params = (cursor, limit, creator, mode)
+        with self._lock:
+            if version is None or version != self._version:
+                self._rebuild(version, load())
+            cached = self._responses.get(params)
+            if cached is not None:
+                self._responses.move_to_end(params)
+                return cached
+
+            ids, entries = self._filtered(creator, mode)
+            start = bisect.bisect_right(ids, cursor) if cursor else 0
+            end = len(entries) if limit is None else start + limit
+            page = entries[start:end]
+            body = json.dumps({
+                'meetings': page,
+                'next_cursor': page[-1]['meeting_id'] if end < len(entries) else None,
+                'total': len(entries)
+            }, ensure_ascii=False).encode('utf-8')
+            etag = hashlib.sha1(body).hexdigest()
+            self._responses[params] = (body, etag)
+            if len(self._responses) > self.cache_size:
+                self._responses.popitem(last=False)
+            return body, etag
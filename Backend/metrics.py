@@ -0,0 +1,245 @@
+import bisect
+import functools
+import inspect
+import logging
+import threading
+import time
+
+# 轻量的 Prometheus 文本格式指标，不依赖 prometheus_client。
+# 记录路径只有一次加锁和几次整数加法，可以在生产环境常开；
+# 需要遍历会议表的指标（会议数、发布者数等）用回调实现，只在抓取 /metrics 时计算。
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+FANOUT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(n, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                     for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}  # 标签值元组 -> 计数
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = list(self._values.items())
+        for values, count in items:
+            lines.append(f'{self.name}{_format_labels(self.labels, values)} {_format_value(count)}')
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # 标签值元组 -> [各桶计数..., +Inf 桶计数, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            slot = self._values.get(label_values)
+            if slot is None:
+                slot = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            slot[index] += 1
+            slot[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = [(values, list(slot)) for values, slot in self._values.items()]
+        for values, slot in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), slot):
+                cumulative += count
+                labels = _format_labels(self.labels + ('le',), values + (_format_value(float(bound)),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels, values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(slot[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Gauge:
+    """抓取时调用 collect() 取值，collect 返回 {标签值元组: 数值}"""
+
+    def __init__(self, name, help, collect, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        for values, value in self.collect().items():
+            lines.append(f'{self.name}{_format_labels(self.labels, values)} {_format_value(value)}')
+        return lines
+
+
+def payload_size(value):
+    """消息负载的近似字节数，只看顶层字段，避免在热路径上递归遍历"""
+    if isinstance(value, (bytes, bytearray, memoryview, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(v) for v in value.values() if isinstance(v, (bytes, bytearray, memoryview, str)))
+    return 0
+
+
+class Metrics:
+    """
+    指标集合：
+      - 每个 Socket.IO 事件和 REST 路由的调用次数、收到的字节数、处理耗时直方图、异常次数
+      - 媒体帧转发的扇出大小
+      - 由调用方注册的回调型 gauge
+    """
+
+    def __init__(self):
+        self.events = Counter('relay_events_total', 'Socket.IO events handled', ('event',))
+        self.event_bytes = Counter('relay_event_bytes_total', 'Payload bytes received per event', ('event',))
+        self.event_latency = Histogram('relay_event_seconds', 'Socket.IO handler latency', ('event',))
+        self.event_errors = Counter('relay_event_errors_total', 'Socket.IO handlers that raised', ('event',))
+        self.requests = Counter('relay_http_requests_total', 'REST requests', ('route', 'status'))
+        self.request_latency = Histogram('relay_http_request_seconds', 'REST handler latency', ('route',))
+        self.fanout = Histogram('relay_fanout_receivers', 'Receivers per relayed media frame',
+                                ('event',), buckets=FANOUT_BUCKETS)
+        self.relayed_bytes = Counter('relay_relayed_bytes_total', 'Media bytes queued to receivers', ('event',))
+        self._metrics = [self.events, self.event_bytes, self.event_latency, self.event_errors,
+                         self.requests, self.request_latency, self.fanout, self.relayed_bytes]
+
+    def gauge(self, name, help, collect, labels=()):
+        self._metrics.append(Gauge(name, help, collect, labels))
+
+    def counter(self, name, help, labels=()):
+        counter = Counter(name, help, labels)
+        self._metrics.append(counter)
+        return counter
+
+    def instrument(self, event):
+        """
+        Socket.IO 事件处理函数的装饰器。
+        也可用于 AsyncServer 的 async 处理函数（server_asgi.py），它们的第一个参数是 sid
+        """
+        def decorator(handler):
+            if inspect.iscoroutinefunction(handler):
+                @functools.wraps(handler)
+                async def async_wrapper(*args):
+                    start = time.perf_counter()
+                    try:
+                        return await handler(*args)
+                    except Exception:
+                        self.event_errors.inc(event)
+                        raise
+                    finally:
+                        self._observe_event(event, start, args[1:])
+                return async_wrapper
+
+            @functools.wraps(handler)
+            def wrapper(*args):
+                start = time.perf_counter()
+                try:
+                    return handler(*args)
+                except Exception:
+                    self.event_errors.inc(event)
+                    raise
+                finally:
+                    self._observe_event(event, start, args)
+            return wrapper
+        return decorator
+
+    def _observe_event(self, event, start, args):
+        self.event_latency.observe(time.perf_counter() - start, event)
+        self.events.inc(event)
+        if args:
+            self.event_bytes.inc(event, amount=payload_size(args[0]))
+
+    def observe_relay(self, event, payload, receivers):
+        self.fanout.observe(receivers, event)
+        if receivers:
+            self.relayed_bytes.inc(event, amount=payload_size(payload) * receivers)
+
+    def install_flask(self, app):
+        """为 Flask 应用的所有路由记录请求数和耗时"""
+        from flask import g, request
+
+        @app.before_request
+        def _start_timer():
+            g.metrics_start = time.perf_counter()
+
+        @app.after_request
+        def _record(response):
+            start = g.pop('metrics_start', None)
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            if start is not None:
+                self.request_latency.observe(time.perf_counter() - start, route)
+            self.requests.inc(route, response.status_code)
+            return response
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class ThrottledLogger:
+    """
+    按 key 限频的日志：同一个 key 在 interval 秒内只输出一次，
+    下一次输出时附带期间被抑制的条数。用于替代每帧一次的 print
+    """
+
+    def __init__(self, logger, interval=5.0):
+        self.logger = logger
+        self.interval = interval
+        self._last = {}        # key -> 上次输出时间
+        self._suppressed = {}  # key -> 被抑制的条数
+        self._lock = threading.Lock()
+
+    def log(self, level, key, message, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last.get(key, float('-inf')) < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            message += ' (%d similar messages suppressed)'
+            args = args + (suppressed,)
+        self.logger.log(level, message, *args)
+
+    def debug(self, key, message, *args):
+        self.log(logging.DEBUG, key, message, *args)
+
+    def info(self, key, message, *args):
+        self.log(logging.INFO, key, message, *args)
+
+    def warning(self, key, message, *args):
+        self.log(logging.WARNING, key, message, *args)
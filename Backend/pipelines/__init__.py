@@ -0,0 +1,121 @@
+# 可插拔的媒体流水线：同一个服务器（同一个 Flask-SocketIO、同一个会议表、每个客户端一条连接）里
+# 按 config.PIPELINES 启用 video、desktop、audio、signaling。
+#   - video、desktop 是 server2.py 自己的事件，未启用时不注册
+#   - audio（混音/转发，原来 test.py 单独在 PORT+1 上运行）和 signaling（P2P 信令和拓扑选择，
+#     原来是 server_test.py）在这个包里，由宿主服务器通过 Host 提供会议成员、合并发送等接口，
+#     并在连接、加入、离开、断开时通知它们
+# test.py、server_test.py 仍然可以单独运行，它们只是各自只启用一个流水线的宿主。
+
+BUILTIN = ('video', 'desktop')
+
+
+class Host:
+    """
+    流水线运行所需的宿主接口
+    members(meeting_id) 返回 {sid: 用户名}，会议不存在时返回 None；
+    set_mode(meeting_id, mode) 同步会议的旧模式字段（'p2p' / 'cs'），不需要时为 None；
+    get_mode(meeting_id) 返回宿主自己维护的旧模式字段，没有时返回 None；
+    recorder 为会议录制（recorder.Recorder），不录制时为 None
+    """
+
+    def __init__(self, app, socketio, batcher=None, members=None, set_mode=None, get_mode=None, recorder=None):
+        self.app = app
+        self.socketio = socketio
+        self.batcher = batcher
+        self.members = members or (lambda meeting_id: None)
+        self.set_mode = set_mode
+        self.get_mode = get_mode or (lambda meeting_id: None)
+        self.recorder = recorder
+
+
+class Pipeline:
+    """流水线基类：register 中注册自己的事件和路由，其余为生命周期回调"""
+
+    name = None
+
+    def __init__(self, host):
+        self.host = host
+        self.socketio = host.socketio
+
+    def register(self):
+        pass
+
+    def start(self):
+        """启动后台任务"""
+
+    def close(self):
+        pass
+
+    def on_connect(self, sid, auth):
+        pass
+
+    def on_join(self, meeting_id, sid, user, capabilities):
+        pass
+
+    def on_leave(self, meeting_id, sid, user):
+        pass
+
+    def on_disconnect(self, sid):
+        pass
+
+    def relay_receivers(self, meeting_id, sender, receivers):
+        """宿主经服务器转发 sender 的视频时，实际需要转发的接收者"""
+        return receivers
+
+
+def _available():
+    from pipelines.audio import AudioPipeline
+    from pipelines.signaling import SignalingPipeline
+    return {'audio': AudioPipeline, 'signaling': SignalingPipeline}
+
+
+class Pipelines:
+    """启用的流水线，按配置的顺序依次通知"""
+
+    def __init__(self, host, names, **options):
+        available = _available()
+        unknown = [name for name in names if name not in available and name not in BUILTIN]
+        if unknown:
+            raise ValueError(f'未知的流水线: {", ".join(unknown)}')
+        self.names = tuple(names)
+        self.items = [available[name](host, **options.get(name, {})) for name in names if name in available]
+        for pipeline in self.items:
+            pipeline.register()
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def get(self, name):
+        for pipeline in self.items:
+            if pipeline.name == name:
+                return pipeline
+        return None
+
+    def start(self):
+        for pipeline in self.items:
+            pipeline.start()
+
+    def close(self):
+        for pipeline in self.items:
+            pipeline.close()
+
+    def connected(self, sid, auth=None):
+        for pipeline in self.items:
+            pipeline.on_connect(sid, auth)
+
+    def joined(self, meeting_id, sid, user, capabilities=()):
+        for pipeline in self.items:
+            pipeline.on_join(meeting_id, sid, user, capabilities)
+
+    def left(self, meeting_id, sid, user):
+        for pipeline in self.items:
+            pipeline.on_leave(meeting_id, sid, user)
+
+    def disconnected(self, sid):
+        for pipeline in self.items:
+            pipeline.on_disconnect(sid)
+
+    def relay_receivers(self, meeting_id, sender, receivers):
+        for pipeline in self.items:
+            receivers = pipeline.relay_receivers(meeting_id, sender, receivers)
+        return receivers
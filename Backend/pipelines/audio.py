@@ -0,0 +1,295 @@
+import threading
+import time
+
+from flask import request, jsonify
+from flask_socketio import emit
+
+import audio_codec
+import config
+import media_packet
+import recorder
+from audio_mixer import AudioMixer, DEFAULT_ROOM
+from audio_sink import make_sink
+from jitter_buffer import JitterBuffer
+from pipelines import Pipeline
+
+# 音频流水线（原来 test.py 的音频服务器）：
+#   - mix 模式下每个会议按 20ms 的 tick 混音，每个参与者只收一路除自己以外的混音；
+#   - broadcast 模式把每段音频（audio-stream 或 audio_packet）转发给同一会议（没有会议时为默认房间）的其他客户端，必要时转码
+# 与视频在同一个服务器里时，加入会议即加入该会议的混音房间，不需要再发 join_audio。
+# 会议在录制时（见 recorder.py），mix 模式录制每个 tick 的完整混音，broadcast 模式录制每个发言者的 PCM。
+
+# 定义音频流参数：16位 PCM、单声道
+CHANNELS = 1                     # 单声道
+RATE = config.AUDIO_SAMPLE_RATE  # 44.1 kHz
+CHUNK = 1024                     # 每个缓冲区的帧数
+
+
+class AudioPipeline(Pipeline):
+
+    name = 'audio'
+
+    def __init__(self, host, mode=None):
+        super().__init__(host)
+        self.mode = mode or config.AUDIO_MODE
+        # 服务器本地播放：默认不播放；VC_AUDIO_SINK=pyaudio 用声卡，wav:/path 写入文件。
+        # 播放经过有界环形缓冲，声卡跟不上时丢弃最旧的音频，不会无限积压
+        self.sink = make_sink(config.AUDIO_SINK, RATE, CHANNELS, CHUNK, slots=config.AUDIO_RING_SLOTS)
+        self.mixer = AudioMixer(
+            sample_rate=RATE,
+            tick_ms=config.AUDIO_TICK_MS,
+            max_buffer_ms=config.AUDIO_MAX_BUFFER_MS,
+            jitter_buffer=lambda: JitterBuffer(
+                target_delay_ms=config.JITTER_TARGET_DELAY_MS,
+                min_delay_ms=config.JITTER_MIN_DELAY_MS,
+                max_delay_ms=config.JITTER_MAX_DELAY_MS
+            )
+        )
+        # 每个连接协商的编解码器：sid -> codec 对象。收到的音频先解码成 PCM 再混音，
+        # 发出的音频按接收者的编解码器编码；没有协商的旧客户端使用 pcm
+        self.codecs = {}
+        # sid -> 所在的会议（混音房间），没有声明的在默认房间
+        self.rooms = {}
+        # 房间 -> frozenset(sid)，转发每段音频时只遍历发送者所在的房间；
+        # 变化时整体替换（加入、离开远少于音频段），读者拿到的集合不会在遍历中被修改
+        self.room_sids = {}
+        self._rooms_lock = threading.Lock()
+        # 发送带序号音频包的客户端：sid -> [会议号, 下一个输出序号]，混音结果也按音频包发给它们
+        self.sequenced = {}
+
+    def register(self):
+        on = self.socketio.on
+        on('set_audio_codecs')(self.handle_set_audio_codecs)
+        on('join_audio')(self.handle_join_audio)
+        on('audio-stream')(self.handle_audio_stream)
+        on('audio_packet')(self.handle_audio_packet)
+        self.host.app.add_url_rule('/audio_stats', 'audio_stats', self.audio_stats, methods=['GET'])
+
+    def start(self):
+        if self.mode == 'mix':
+            self.socketio.start_background_task(self.mix_loop)
+
+    def close(self):
+        # 停止播放线程并关闭音频流
+        self.sink.close()
+
+    # ---- 编解码器 ----
+
+    def set_codec(self, sid, offered):
+        name = audio_codec.negotiate(offered, config.AUDIO_CODECS)
+        self.codecs[sid] = audio_codec.make_codec(name, RATE, opus_bitrate=config.AUDIO_OPUS_BITRATE)
+        return name
+
+    def codec_of(self, sid):
+        codec = self.codecs.get(sid)
+        if codec is None:
+            codec = self.codecs[sid] = audio_codec.PcmCodec(RATE)
+        return codec
+
+    # ---- 生命周期 ----
+
+    def on_connect(self, sid, auth):
+        """
+        客户端可以在连接参数中给出支持的编解码器（按偏好排序）：auth = {'codecs': ['opus', 'pcmu']}
+        """
+        offered = auth.get('codecs') if isinstance(auth, dict) else None
+        name = self.set_codec(sid, offered)
+        self._index(sid, DEFAULT_ROOM)
+        if offered:
+            self.socketio.emit('audio_codec', {'codec': name, 'sample_rate': RATE}, to=sid)
+
+    def on_join(self, meeting_id, sid, user, capabilities):
+        self._join(sid, meeting_id)
+
+    def on_leave(self, meeting_id, sid, user):
+        if self.rooms.get(sid) == meeting_id:
+            self._join(sid, DEFAULT_ROOM)
+
+    def on_disconnect(self, sid):
+        self.mixer.leave(sid)
+        self._index(sid, remove=True)
+        self.sequenced.pop(sid, None)
+        self.codecs.pop(sid, None)
+
+    def _join(self, sid, room):
+        self._index(sid, room)
+        self.mixer.join(sid, room)
+
+    def _index(self, sid, room=DEFAULT_ROOM, remove=False):
+        """把 sid 移到 room（remove 为 True 时只移出原来的房间），同时更新 rooms 和 room_sids"""
+        with self._rooms_lock:
+            old = self.rooms.pop(sid, DEFAULT_ROOM)
+            sids = self.room_sids.get(old, frozenset()) - {sid}
+            if sids:
+                self.room_sids[old] = sids
+            else:
+                self.room_sids.pop(old, None)
+            if not remove:
+                self.rooms[sid] = room
+                self.room_sids[room] = self.room_sids.get(room, frozenset()) | {sid}
+
+    # ---- 转发和混音 ----
+
+    def relay_audio(self, sender_sid, data, header=None):
+        """
+        broadcast 模式的转发：接收者与发送者编解码器相同时原样转发，
+        否则解码一次，再按接收者的编解码器编码（无状态的编解码器按类型共享一次编码结果）。
+        data 来自音频包时 header 为其头部，发送过音频包的接收者收到带原序号和时间戳的音频包
+        """
+        sender = self.codec_of(sender_sid)
+        room = self.rooms.get(sender_sid, DEFAULT_ROOM)
+        receivers = []
+        for sid in self.room_sids.get(room, ()):
+            codec = self.codecs.get(sid)
+            # 正在断开的接收者已经没有编解码器
+            if sid != sender_sid and codec is not None:
+                receivers.append((sid, codec))
+        same = [sid for sid, codec in receivers if codec.name == sender.name]
+        if same:
+            self._emit_audio(same, data, header)
+        pcm = sender.decode(data)
+        shared = {}
+        for sid, codec in receivers:
+            if codec.name == sender.name:
+                continue
+            if codec.stateless:
+                if codec.name not in shared:
+                    shared[codec.name] = codec.encode(pcm)
+                payload = shared[codec.name]
+            else:
+                payload = codec.encode(pcm)
+            if payload:
+                self._emit_audio([sid], payload, header)
+        return pcm
+
+    def _emit_audio(self, sids, payload, header):
+        if header is None:
+            self.socketio.emit('audio-stream', payload, to=sids)
+            return
+        streams = [sid for sid in sids if sid not in self.sequenced]
+        if streams:
+            self.socketio.emit('audio-stream', payload, to=streams)
+        packets = [sid for sid in sids if sid in self.sequenced]
+        if packets:
+            packet = media_packet.pack(media_packet.KIND_AUDIO, header['meeting_id'], header['user'],
+                                       header['seq'], header['timestamp'], payload, flags=header['flags'])
+            self.socketio.emit('audio_packet', packet, to=packets)
+
+    def check_sender(self, sid, header):
+        """
+        音频包头部的会议号和用户名由客户端填写，转发前按服务器记录的成员关系核对：
+        会议号必须是 sid 所在的房间（默认房间为空串），宿主知道会议成员时用户名必须是 sid 加入时的用户名，
+        不一致时返回 False，整个包被拒绝，转发和录制用的头部因此总与服务器的记录一致。
+        单独运行、没有成员表的音频服务器只能核对会议号
+        """
+        room = self.rooms.get(sid, DEFAULT_ROOM)
+        if header['meeting_id'] != (room or ''):
+            return False
+        members = self.host.members(room) if room != DEFAULT_ROOM else None
+        if members is not None:
+            return members.get(sid) == header['user']
+        return True
+
+    def send_mix(self, sid, pcm):
+        pcm = self.codec_of(sid).encode(pcm)
+        if not pcm:
+            # opus 还没凑满一帧
+            return
+        state = self.sequenced.get(sid)
+        if state is None:
+            self.socketio.emit('audio-stream', pcm, to=sid)
+            return
+        packet = media_packet.pack(media_packet.KIND_AUDIO, state[0], 'mix', state[1],
+                                   int(time.time() * 1000), pcm)
+        state[1] += 1
+        self.socketio.emit('audio_packet', packet, to=sid)
+
+    def mix_loop(self):
+        """后台任务：按固定间隔混音并发送，按绝对时间调度，避免 sleep 误差累积"""
+        interval = config.AUDIO_TICK_MS / 1000
+        next_tick = time.monotonic()
+        while True:
+            next_tick += interval
+            for room, full_mix, outputs in self.mixer.tick():
+                for sid, pcm in outputs:
+                    self.send_mix(sid, pcm)
+                if room == DEFAULT_ROOM:
+                    self.sink.write(full_mix)
+                else:
+                    self.record(room, 'mix', full_mix)
+            delay = next_tick - time.monotonic()
+            if delay < -interval:
+                # 落后超过一个 tick（例如进程被挂起），重新对齐而不是连续追赶
+                next_tick = time.monotonic()
+                delay = 0
+            self.socketio.sleep(max(0, delay))
+
+    def record(self, room, user, pcm):
+        if self.host.recorder is not None and pcm:
+            self.host.recorder.write(room, media_packet.KIND_AUDIO, recorder.FORMAT_PCM, user, pcm)
+
+    # ---- 路由和事件 ----
+
+    def audio_stats(self):
+        """
+        本地播放缓冲的 overrun/underrun 计数和每个发言者的抖动缓冲状态
+        """
+        return jsonify({'sink': self.sink.stats(), 'jitter': self.mixer.jitter_stats()})
+
+    def handle_set_audio_codecs(self, data):
+        """无法在连接参数中协商的客户端，连接后再协商编解码器"""
+        name = self.set_codec(request.sid, data.get('codecs'))
+        emit('audio_codec', {'codec': name, 'sample_rate': RATE}, to=request.sid)
+
+    def handle_join_audio(self, data):
+        """
+        单独的音频服务器上声明所在的会议，只和同一会议的人混音；
+        不发送该事件的客户端都在默认房间里
+        """
+        self._join(request.sid, data.get('meeting_id') or DEFAULT_ROOM)
+
+    def handle_audio_stream(self, data):
+        """
+        处理接收到的音频数据并播放，同时转发给同一会议的其他客户端
+        data 是按该客户端协商的编解码器编码的音频（旧客户端为原始 PCM）
+        """
+        if self.mode == 'mix':
+            self.mixer.push(request.sid, self.codec_of(request.sid).decode(data))
+            return
+        self.broadcast(data)
+
+    def broadcast(self, data, header=None):
+        # 转发音频数据给其他客户端，必要时转码
+        pcm = self.relay_audio(request.sid, data, header)
+        room = self.rooms.get(request.sid, DEFAULT_ROOM)
+        if room != DEFAULT_ROOM:
+            self.record(room, (self.host.members(room) or {}).get(request.sid), pcm)
+
+        # 将音频数据交给播放输出（只拷贝进环形缓冲，不会阻塞）
+        self.sink.write(pcm)
+
+    def handle_audio_packet(self, packet):
+        """
+        带序号和采集时间戳的音频包（media_packet，KIND_AUDIO，payload 按协商的编解码器编码）。
+        mix 模式下经抖动缓冲重排后混音，迟到的包直接丢弃；
+        broadcast 模式下立即转发，发送过音频包的接收者收到保留原序号的音频包，由接收端重排
+        """
+        try:
+            header = media_packet.unpack_header(packet)
+        except media_packet.PacketError as e:
+            emit('error', {'message': str(e)}, to=request.sid)
+            return
+        if header['kind'] != media_packet.KIND_AUDIO:
+            emit('error', {'message': '媒体包类型错误'}, to=request.sid)
+            return
+        if not self.check_sender(request.sid, header):
+            emit('error', {'message': '音频包的会议或用户名不匹配'}, to=request.sid)
+            return
+        if request.sid not in self.sequenced:
+            self.sequenced[request.sid] = [header['meeting_id'], 0]
+        payload = bytes(media_packet.payload_of(packet, header))
+        if self.mode != 'mix':
+            self.broadcast(payload, header)
+            return
+        pcm = self.codec_of(request.sid).decode(payload)
+        self.mixer.push_packet(request.sid, header['seq'], header['timestamp'], pcm)
@@ -0,0 +1,253 @@
+import logging
+
+from flask import request
+from flask_socketio import emit
+
+import config
+from control_batch import ControlBatcher
+from pipelines import Pipeline
+from topology import TopologyManager, MESH, RELAY
+
+log = logging.getLogger('signaling')
+
+# P2P 信令流水线（原来 server_test.py 的信令部分）：每个会议按人数和上报的上行带宽选择
+# mesh / hybrid / relay（见 topology.py），转发 offer/answer/ICE，并告诉宿主哪些视频帧仍需经服务器转发。
+#   - opt_in=False（单独的信令服务器）：会议里所有人都参与拓扑选择，旧模式字段和 switch_to_* 随方案变化
+#   - opt_in=True（与视频转发在同一个服务器里）：只有加入时声明了 'p2p' 能力的客户端参与，
+#     其他客户端的视频照常经服务器转发，switch_to_* 仍由宿主按人数发送（会议里有人参与拓扑时不切到 p2p）。
+#     收到 switch_to_p2p 的旧客户端按原来 server_test.py 的规则互相发信令：
+#     宿主的旧模式为 p2p 时，不参与拓扑的成员之间的信令照常转发
+
+
+class SignalingPipeline(Pipeline):
+
+    name = 'signaling'
+
+    def __init__(self, host, opt_in=False):
+        super().__init__(host)
+        self.opt_in = opt_in
+        self.topology = TopologyManager(
+            stream_kbps=config.TOPOLOGY_STREAM_KBPS,
+            mesh_max=config.TOPOLOGY_MESH_MAX,
+            partial_max=config.TOPOLOGY_PARTIAL_MAX,
+            upgrade_margin=config.TOPOLOGY_UPGRADE_MARGIN,
+            transition_timeout=config.TOPOLOGY_TRANSITION_TIMEOUT
+        )
+        # 信令合并发送：声明了 'batch' 能力的客户端每个间隔收到一条 'batch' 事件，
+        # 其中是这段时间内发给它的所有 signal。宿主已有合并发送器时共用
+        self.own_batcher = host.batcher is None
+        self.batcher = host.batcher or ControlBatcher(
+            self.socketio,
+            interval=config.SIGNAL_BATCH_INTERVAL,
+            max_items=config.SIGNAL_BATCH_MAX_ITEMS
+        )
+        self.modes = {}  # 会议号 -> 旧模式（'p2p' / 'cs'），只在 opt_in=False 时使用
+
+    def register(self):
+        on = self.socketio.on
+        on('get_current_participants_p2p')(self.get_current_participants_p2p)
+        on('signal')(self.handle_signal)
+        on('signal_batch')(self.handle_signal_batch)
+        on('report_bandwidth')(self.handle_report_bandwidth)
+        on('topology_ready')(self.handle_topology_ready)
+
+    def start(self):
+        self.socketio.start_background_task(self.watch_transitions)
+
+    # ---- 生命周期 ----
+
+    def on_join(self, meeting_id, sid, user, capabilities):
+        if self.own_batcher:
+            self.batcher.add(sid, batch='batch' in capabilities)
+        if self.opt_in and 'p2p' not in capabilities:
+            return
+        # 按人数（和已上报的带宽）重新选择拓扑
+        self.apply_plan(meeting_id, self.topology.add(meeting_id, sid))
+
+    def on_leave(self, meeting_id, sid, user):
+        # 按剩下的人重新选择拓扑（只剩 1 人时回到 cs）
+        self.apply_plan(meeting_id, self.topology.remove(meeting_id, sid))
+        if self.topology.plan(meeting_id) is None:
+            self.modes.pop(meeting_id, None)
+            if self.own_batcher:
+                self.batcher.discard(meeting_id)
+
+    def on_disconnect(self, sid):
+        if self.own_batcher:
+            self.batcher.remove(sid)
+
+    def participants(self, meeting_id):
+        """参与拓扑选择的人数（opt_in 时为声明了 'p2p' 的客户端）"""
+        plan = self.topology.plan(meeting_id)
+        return len(plan.routes) if plan is not None else 0
+
+    def relay_receivers(self, meeting_id, sender, receivers):
+        """
+        只转给收不到 sender P2P 画面的人：经服务器发送的用户转给所有人，
+        已切到 P2P 的用户只在过渡期间转给还没建好连接的人；不参与拓扑的接收者照常转发
+        """
+        plan = self.topology.plan(meeting_id)
+        if plan is None or sender not in plan.routes:
+            return receivers
+        inside = [sid for sid in receivers if sid in plan.routes]
+        outside = [sid for sid in receivers if sid not in plan.routes]
+        return self.topology.relay_receivers(meeting_id, sender, inside) + outside
+
+    # ---- 拓扑方案 ----
+
+    def apply_plan(self, meeting_id, plan):
+        """
+        拓扑方案变化时通知参与的所有人：新客户端收到 topology（每个人的发送方式），
+        单独运行时旧客户端仍然收到 switch_to_p2p / switch_to_cs（mesh 对应 p2p，其他对应 cs）
+        """
+        if plan is None:
+            return
+        members = self.host.members(meeting_id)
+        if members is None:
+            return
+        recipients = list(plan.routes)
+        if not self.opt_in:
+            mode = 'p2p' if plan.mode == MESH else 'cs'
+            if mode != self.modes.get(meeting_id, 'cs'):
+                self.modes[meeting_id] = mode
+                if self.host.set_mode is not None:
+                    self.host.set_mode(meeting_id, mode)
+                if mode == 'p2p':
+                    log.info('meeting %s switching to p2p mode', meeting_id)
+                    self.socketio.emit('switch_to_p2p', {'message': '参与人数为2人，可以使用P2P模式'},
+                                       to=recipients)
+                else:
+                    log.info('meeting %s switching to cs mode', meeting_id)
+                    self.socketio.emit('switch_to_cs', {'message': '当前人数或带宽不适合P2P，切换到CS模式'},
+                                       to=recipients)
+        topology_data = plan.to_dict()
+        topology_data['users'] = {sid: members[sid] for sid in recipients if sid in members}
+        self.socketio.emit('topology', topology_data, to=recipients)
+
+    def _settled(self, meeting_id, plan):
+        self.socketio.emit('topology_settled', {'plan_id': plan.plan_id}, to=list(plan.routes))
+
+    def watch_transitions(self):
+        """后台任务：有人迟迟没有建好新方案的连接时结束过渡，服务器不再为已切到 P2P 的发送者转发"""
+        while True:
+            self.socketio.sleep(1)
+            for meeting_id, plan in self.topology.expire():
+                self._settled(meeting_id, plan)
+
+    def _legacy_peers(self, meeting_id, sid, members):
+        """
+        opt_in 时不参与拓扑的旧客户端可以连接的对端：宿主的旧模式为 p2p 时，其他同样不参与拓扑的成员；
+        sid 参与拓扑或不适用旧规则时返回 None
+        """
+        if not self.opt_in:
+            return None
+        plan = self.topology.plan(meeting_id)
+        routes = plan.routes if plan is not None else {}
+        if sid in routes:
+            return None
+        if self.host.get_mode(meeting_id) != 'p2p':
+            return set()
+        return {other for other in members if other != sid and other not in routes}
+
+    # ---- 事件 ----
+
+    def get_current_participants_p2p(self, data):
+        meeting_id = data.get('meeting_id')
+
+        # 检查会议是否存在
+        members = self.host.members(meeting_id) if meeting_id else None
+        if members is None:
+            emit('error', {'message': '会议不存在'}, to=request.sid)
+            return
+
+        legacy = self._legacy_peers(meeting_id, request.sid, members)
+        if legacy is not None:
+            if not legacy:
+                emit('error', {'message': '当前会议不处于P2P模式'}, to=request.sid)
+            else:
+                emit('current_participants_p2p', {'participants': [request.sid] + sorted(legacy)}, to=request.sid)
+            return
+
+        # 检查会议是否使用 P2P（mesh 或 hybrid）
+        plan = self.topology.plan(meeting_id)
+        if plan is None or plan.mode == RELAY:
+            emit('error', {'message': '当前会议不处于P2P模式'}, to=request.sid)
+            return
+
+        # 需要和自己建立 P2P 连接的参与者（mesh 时为所有人），包含自己
+        participants = [request.sid] + plan.peers(request.sid)
+
+        emit('current_participants_p2p', {'participants': participants}, to=request.sid)
+
+    def forward_signals(self, meeting_id, signals):
+        """
+        转发 [(目标 sid, SDP 或 ICE), ...]。会议、发送者和可连接的对端只查一次，
+        目标不在会议中或当前拓扑下与发送者没有 P2P 连接时回 error 并跳过
+        """
+        members = self.host.members(meeting_id) if meeting_id else None
+        if members is None:
+            emit('error', {'message': '会议不存在'}, to=request.sid)
+            return
+        user = members.get(request.sid)
+        if user is None:
+            emit('error', {'message': '用户不在此会议中'}, to=request.sid)
+            return
+
+        # 仅在当前（或过渡中的旧）拓扑方案中两人之间有 P2P 连接时转发信令；旧客户端按旧模式转发
+        peers = self._legacy_peers(meeting_id, request.sid, members)
+        if peers is None:
+            peers = self.topology.signal_peers(meeting_id, request.sid)
+        for target_sid, signal_data in signals:
+            if target_sid not in members:
+                emit('error', {'message': '目标用户不在会议中'}, to=request.sid)
+                continue
+            if target_sid not in peers:
+                emit('error', {'message': '当前拓扑下与该用户没有P2P连接，不处理信令'}, to=request.sid)
+                continue
+            log.debug('signal %s -> %s in meeting %s', request.sid, target_sid, meeting_id)
+            self.batcher.emit(meeting_id, 'signal', {
+                'from_sid': request.sid,
+                'userName': user,
+                'signal': signal_data,
+            }, (target_sid,))
+
+    def handle_signal(self, data):
+        # 转发信令数据给目标用户；data: {meeting_id, target_sid, signal}
+        self.forward_signals(data.get('meeting_id'), [(data.get('target_sid'), data.get('signal'))])
+
+    def handle_signal_batch(self, data):
+        """
+        一次转发多条信令，例如新加入者发给所有人的 offer、攒在一起的 ICE candidate
+        data: {meeting_id, signals: [{target_sid, signal}, ...]}
+        """
+        signals = data.get('signals')
+        if not isinstance(signals, list):
+            emit('error', {'message': '无效的信令列表'}, to=request.sid)
+            return
+        self.forward_signals(data.get('meeting_id'), [(item.get('target_sid'), item.get('signal'))
+                                                      for item in signals if isinstance(item, dict)])
+
+    def handle_report_bandwidth(self, data):
+        """
+        客户端上报自己的上行带宽，用于选择拓扑
+        data: {meeting_id, uplink_kbps}
+        """
+        meeting_id = data.get('meeting_id')
+        uplink = data.get('uplink_kbps')
+        if not meeting_id or self.host.members(meeting_id) is None:
+            emit('error', {'message': '会议不存在'}, to=request.sid)
+            return
+        if not isinstance(uplink, (int, float)) or uplink < 0:
+            emit('error', {'message': '无效的带宽'}, to=request.sid)
+            return
+        self.apply_plan(meeting_id, self.topology.report(meeting_id, request.sid, uplink))
+
+    def handle_topology_ready(self, data):
+        """
+        客户端已经建好 plan_id 方案需要的 P2P 连接；所有人都 ready 后通知发送者停止向服务器重复发送
+        data: {meeting_id, plan_id}
+        """
+        meeting_id = data.get('meeting_id')
+        plan = self.topology.mark_ready(meeting_id, request.sid, data.get('plan_id'))
+        if plan is not None:
+            self._settled(meeting_id, plan)
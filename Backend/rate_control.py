@@ -0,0 +1,127 @@
+import threading
+import time
+
+
+class ReceiverRate:
+    """单个接收者的测量值和目标帧率"""
+    __slots__ = ('fps', 'rtt', 'sent', 'acked', 'dropped', 'last_forward')
+
+    def __init__(self, fps):
+        self.fps = fps            # 当前允许转发给该接收者的帧率（每路流）
+        self.rtt = None           # 帧 ack 往返时延的 EWMA（秒），不回 ack 的客户端为 None
+        self.sent = 0             # 本周期内发出的帧数
+        self.acked = 0            # 本周期内收到 ack 的帧数
+        self.dropped = 0          # 本周期内在发送队列中被丢弃的帧数
+        self.last_forward = {}    # 流 -> 上次转发时间
+
+
+class RateController:
+    """
+    按接收者实际吞吐调整转发帧率（AIMD）：
+      - 发送队列丢帧比例过高或 ack 时延超过目标值时，帧率乘性下降
+      - 否则每个周期加性上升，直到 max_fps
+    转发时按接收者的帧率对每一路流抽帧；
+    同时根据发送者需要服务的接收者中最慢的那一个，给发送者建议采集间隔，
+    不采集最慢的接收者也收不下的帧
+    """
+
+    def __init__(self, max_fps=10, min_fps=1, target_latency=0.3, drop_threshold=0.2,
+                 rtt_alpha=0.2, decrease=0.7, hint_hysteresis=0.2):
+        self.max_fps = max_fps
+        self.min_fps = min_fps
+        self.target_latency = target_latency
+        self.drop_threshold = drop_threshold
+        self.rtt_alpha = rtt_alpha
+        self.decrease = decrease
+        self.hint_hysteresis = hint_hysteresis
+        self._receivers = {}   # sid -> ReceiverRate
+        self._hints = {}       # (sid, kind) -> 上次建议的采集间隔（毫秒）
+        self._lock = threading.Lock()
+
+    def add(self, sid):
+        with self._lock:
+            self._receivers[sid] = ReceiverRate(self.max_fps)
+
+    def remove(self, sid):
+        with self._lock:
+            self._receivers.pop(sid, None)
+            for key in [k for k in self._hints if k[0] == sid]:
+                del self._hints[key]
+
+    # ---- 发送队列回调 ----
+
+    def on_sent(self, sid):
+        r = self._receivers.get(sid)
+        if r is not None:
+            r.sent += 1
+
+    def on_drop(self, sid):
+        r = self._receivers.get(sid)
+        if r is not None:
+            r.dropped += 1
+
+    def on_ack(self, sid, rtt):
+        r = self._receivers.get(sid)
+        if r is not None:
+            r.acked += 1
+            r.rtt = rtt if r.rtt is None else r.rtt + self.rtt_alpha * (rtt - r.rtt)
+
+    # ---- 抽帧 ----
+
+    def allow(self, sid, stream, now=None):
+        """按接收者的目标帧率决定这一帧是否转发给它"""
+        r = self._receivers.get(sid)
+        if r is None:
+            return True
+        now = now if now is not None else time.time()
+        last = r.last_forward.get(stream)
+        # 留 10% 余量，避免采集抖动导致刚好达到目标帧率的流被误抽
+        if last is not None and now - last < 0.9 / r.fps:
+            return False
+        r.last_forward[stream] = now
+        return True
+
+    def fps(self, sid):
+        r = self._receivers.get(sid)
+        return r.fps if r is not None else self.max_fps
+
+    # ---- 周期调整 ----
+
+    def update(self):
+        """每个测量周期调用一次：根据丢帧比例和时延调整每个接收者的帧率"""
+        with self._lock:
+            for r in self._receivers.values():
+                offered = r.sent + r.dropped
+                drop_ratio = r.dropped / offered if offered else 0.0
+                congested = drop_ratio > self.drop_threshold or \
+                    (r.rtt is not None and r.rtt > self.target_latency)
+                if congested:
+                    r.fps = max(self.min_fps, r.fps * self.decrease)
+                elif offered:
+                    r.fps = min(self.max_fps, r.fps + 1)
+                r.sent = r.acked = r.dropped = 0
+
+    def capture_fps(self, receiver_sids):
+        """
+        发送者需要服务的接收者中最慢的帧率。
+        只传入实际经服务器转发的接收者；没有这样的接收者时服务器不限制，返回 max_fps
+        """
+        rates = [self.fps(sid) for sid in receiver_sids]
+        return min(rates) if rates else self.max_fps
+
+    def should_hint(self, sid, kind, interval):
+        """建议采集间隔变化超过阈值时返回 True 并记录"""
+        key = (sid, kind)
+        with self._lock:
+            last = self._hints.get(key)
+            if last is not None and abs(interval - last) <= last * self.hint_hysteresis:
+                return False
+            self._hints[key] = interval
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                sid: {'fps': round(r.fps, 2), 'rtt': r.rtt}
+                for sid, r in self._receivers.items()
+            }
@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+
+# 令牌桶限流，用于会议创建和加入的突发（整点时大量用户同时创建、加入会议）：
+#   - allow(key)：有令牌时立即通过，否则拒绝
+#   - reserve(key, max_wait)：预约一个令牌，返回需要等待的秒数；排在前面的请求越多等得越久，
+#     等待超过 max_wait 时拒绝（返回 None）。调用方等待后再处理，突发被平滑成均匀的速率
+# 每个 key（IP、会议号）一个桶，只保留最近使用的 max_keys 个，内存有上限。rate 为 0 时不限流。
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now, max_wait=0.0):
+        """预约一个令牌（令牌可以为负，表示已经排队的请求），返回等待秒数，超过 max_wait 返回 None"""
+        self._refill(now)
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+
+class RateLimiter:
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> TokenBucket，按最近使用排序
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def reserve(self, key, max_wait=0.0, now=None):
+        if self.rate <= 0:
+            return 0.0
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            wait = bucket.reserve(now, max_wait)
+            if wait is None:
+                self.rejected += 1
+            return wait
+
+    def allow(self, key, now=None):
+        return self.reserve(key, 0.0, now) is not None
+
+    def retry_after(self, key):
+        """被拒绝的请求建议多久后重试（秒）"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                return 0.0
+            bucket._refill(time.monotonic())
+            return max(0.0, (1 - bucket.tokens) / self.rate)
@@ -0,0 +1,265 @@
+import logging
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+import async_mode
+
+# 会议录制：按会议开启，转发路径只把记录放进有界队列（满了直接丢弃，从不阻塞），
+# 由后台写线程追加写入分段的录制文件，磁盘慢时只会丢帧，不会拖慢转发。
+# 写线程是真正的操作系统线程：eventlet / gevent 打过补丁时用 async_mode.original 取原始的线程和 sleep，
+# 否则阻塞的文件写入会卡住整个协程调度。转发路径和写线程之间只通过 deque 交换数据
+# （append / popleft 在 CPython 里是原子的），不共用任何锁。
+#
+# 每个会议一个目录 <RECORD_DIR>/<会议号>/，每 segment_seconds 秒换一个文件 <起始时间 ms>.vcr：
+#
+#   文件头  | MAGIC(5) | version(1) | meeting_id_len(1) | meeting_id |
+#   记录    | length(4) | timestamp_ms(8) | kind(1) | format(1) | user_len(1) | user | data |
+#
+# length 为记录中 length 之后的字节数；进程中途退出时文件末尾可能有不完整的记录，读取时忽略。
+# kind 沿用 media_packet 的 KIND_VIDEO / KIND_DESKTOP / KIND_AUDIO，timestamp_ms 为服务器收到的时间。
+# 加密的媒体包原样写入，服务器没有密钥，回放时需要客户端的 media_key。
+
+log = logging.getLogger('recorder')
+
+MAGIC = b'VCREC'
+VERSION = 1
+RECORD_HEADER = struct.Struct('!IQBBB')
+
+# format：data 的格式
+FORMAT_TEXT = 0     # 旧客户端的字符串帧（data URL 或 base64 密文），UTF-8
+FORMAT_PACKET = 1   # 二进制媒体包（media_packet），原样保存
+FORMAT_PCM = 2      # 16 位单声道 PCM（config.AUDIO_SAMPLE_RATE）
+
+_IDLE = 0.5   # 检查分段轮换的间隔（秒）
+_POLL = 0.02  # 队列为空时写线程的轮询间隔（秒）
+
+_start_thread = async_mode.original('_thread', 'start_new_thread')
+_sleep = async_mode.original('time', 'sleep')
+
+
+class _Segment:
+    """正在写入的一个分段文件"""
+
+    def __init__(self, directory, meeting_id, start_ms, generation):
+        path = os.path.join(directory, meeting_id)
+        os.makedirs(path, exist_ok=True)
+        self.path = os.path.join(path, f'{start_ms}.vcr')
+        self.start_ms = start_ms
+        self.generation = generation
+        self.file = open(self.path, 'ab')
+        meeting = meeting_id.encode('utf-8')
+        self.file.write(MAGIC + bytes((VERSION, len(meeting))) + meeting)
+
+    def write(self, timestamp_ms, kind, fmt, user, data):
+        user = user.encode('utf-8')[:255]
+        self.file.write(RECORD_HEADER.pack(RECORD_HEADER.size - 4 + len(user) + len(data),
+                                           timestamp_ms, kind, fmt, len(user)))
+        self.file.write(user)
+        self.file.write(data)
+        return RECORD_HEADER.size + len(user) + len(data)
+
+    def close(self):
+        self.file.close()
+
+
+class Recorder:
+
+    def __init__(self, directory, segment_seconds=60, queue_size=256):
+        self.directory = directory
+        self.segment_ms = int(segment_seconds * 1000)
+        self.queue_size = queue_size
+        # 多个转发线程同时写入时长度可能略超过 queue_size，仍然是有界的
+        self._records = deque()   # (会议号, 录制代数, 记录)
+        self._stops = deque()     # (会议号, 录制代数)，写线程每次先处理停止请求再写记录
+        self._active = {}         # 正在录制的会议号 -> 录制代数，每次开始录制加一
+        self._generation = 0
+        self._lock = threading.Lock()  # 只在 start / stop / close 之间使用，写线程不加锁
+        self._running = False
+        self._closing = False
+        self._finished = False
+        # 以下计数只由写线程修改（dropped 除外），读取时不加锁
+        self.written = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def is_recording(self, meeting_id):
+        return meeting_id in self._active
+
+    def recording(self):
+        return sorted(self._active)
+
+    def start(self, meeting_id):
+        """开始录制，已在录制或录制器已关闭时返回 False"""
+        with self._lock:
+            if meeting_id in self._active or self._closing:
+                return False
+            self._generation += 1
+            self._active[meeting_id] = self._generation
+            if not self._running:
+                self._running = True
+                _start_thread(self._run, ())
+        log.info('recording meeting %s', meeting_id)
+        return True
+
+    def stop(self, meeting_id):
+        """
+        停止录制：写线程优先处理停止请求，不论队列里积压多少记录都立即关闭当前分段；
+        队列里还没写入的这次录制的记录被丢弃
+        """
+        with self._lock:
+            generation = self._active.pop(meeting_id, None)
+        if generation is None:
+            return False
+        self._stops.append((meeting_id, generation))
+        log.info('stopped recording meeting %s', meeting_id)
+        return True
+
+    def write(self, meeting_id, kind, fmt, user, data):
+        """
+        转发路径上调用：会议在录制时把一条记录放进队列，队列满时丢弃。
+        data 为 bytes 或 str（按 UTF-8 保存），返回是否放进了队列
+        """
+        generation = self._active.get(meeting_id)
+        if generation is None:
+            return False
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        elif not isinstance(data, (bytes, bytearray)):
+            return False
+        if len(self._records) >= self.queue_size:
+            self.dropped += 1
+            return False
+        self._records.append((meeting_id, generation, (int(time.time() * 1000), kind, fmt, user or '', data)))
+        return True
+
+    def close(self, timeout=2.0):
+        """不再接受新的录制，等写线程写完队列中已有的记录并关闭所有分段（最多 timeout 秒）"""
+        with self._lock:
+            self._closing = True
+            self._active.clear()
+            running = self._running
+        if not running:
+            return
+        deadline = time.monotonic() + timeout
+        while not self._finished and time.monotonic() < deadline:
+            # 调用方可能在协程里，用（可能打过补丁的）time.sleep 等待
+            time.sleep(_POLL)
+
+    def stats(self):
+        return {
+            'recording': self.recording(),
+            'queue': len(self._records),
+            'queue_size': self.queue_size,
+            'written': self.written,
+            'bytes': self.bytes,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
+
+    # ---- 写线程 ----
+
+    def _run(self):
+        segments = {}  # 会议号 -> _Segment
+        stopped = {}   # 会议号 -> 已停止的最大录制代数，队列中属于这些录制的记录直接丢弃
+        dirty = False
+        next_check = time.monotonic() + _IDLE
+        while True:
+            while self._stops:
+                meeting_id, generation = self._stops.popleft()
+                stopped[meeting_id] = max(generation, stopped.get(meeting_id, 0))
+                self._close(segments, meeting_id)
+
+            if self._records:
+                meeting_id, generation, record = self._records.popleft()
+                if generation <= stopped.get(meeting_id, 0):
+                    self.dropped += 1
+                else:
+                    self._write(segments, meeting_id, generation, record)
+                    dirty = True
+            elif self._closing:
+                for meeting_id in list(segments):
+                    self._close(segments, meeting_id)
+                self._finished = True
+                return
+            else:
+                # 队列空了：把缓冲写到磁盘，等新的记录
+                if dirty:
+                    for segment in segments.values():
+                        self._flush(segment)
+                    dirty = False
+                _sleep(_POLL)
+
+            now = time.monotonic()
+            if now >= next_check:
+                next_check = now + _IDLE
+                now_ms = int(time.time() * 1000)
+                for meeting_id, segment in list(segments.items()):
+                    if now_ms - segment.start_ms >= self.segment_ms:
+                        self._close(segments, meeting_id)
+
+    def _write(self, segments, meeting_id, generation, record):
+        timestamp_ms = record[0]
+        segment = segments.get(meeting_id)
+        if segment is not None and (segment.generation != generation or
+                                    timestamp_ms - segment.start_ms >= self.segment_ms):
+            self._close(segments, meeting_id)
+            segment = None
+        try:
+            if segment is None:
+                segment = segments[meeting_id] = _Segment(self.directory, meeting_id, timestamp_ms, generation)
+            self.bytes += segment.write(*record)
+            self.written += 1
+        except OSError:
+            self.errors += 1
+            log.exception('failed to write recording of meeting %s', meeting_id)
+            self._close(segments, meeting_id)
+
+    def _flush(self, segment):
+        try:
+            segment.file.flush()
+        except OSError:
+            self.errors += 1
+
+    def _close(self, segments, meeting_id):
+        segment = segments.pop(meeting_id, None)
+        if segment is None:
+            return
+        try:
+            segment.close()
+        except OSError:
+            self.errors += 1
+            log.exception('failed to close recording %s', segment.path)
+
+
+def read_records(path):
+    """
+    读取一个分段文件，返回 (会议号, 记录迭代器)，每条记录为 (timestamp_ms, kind, format, user, data)。
+    文件末尾不完整的记录被忽略
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    if content[:len(MAGIC)] != MAGIC or len(content) < len(MAGIC) + 2:
+        raise ValueError(f'不是录制文件: {path}')
+    version, meeting_len = content[len(MAGIC)], content[len(MAGIC) + 1]
+    if version != VERSION:
+        raise ValueError(f'不支持的录制文件版本: {version}')
+    offset = len(MAGIC) + 2
+    meeting_id = content[offset:offset + meeting_len].decode('utf-8')
+    offset += meeting_len
+
+    def records(offset):
+        while offset + RECORD_HEADER.size <= len(content):
+            length, timestamp_ms, kind, fmt, user_len = RECORD_HEADER.unpack_from(content, offset)
+            end = offset + 4 + length
+            if end > len(content):
+                return
+            user_end = offset + RECORD_HEADER.size + user_len
+            yield (timestamp_ms, kind, fmt, content[offset + RECORD_HEADER.size:user_end].decode('utf-8', 'replace'),
+                   content[user_end:end])
+            offset = end
+
+    return meeting_id, records(offset)
@@ -0,0 +1,246 @@
+import itertools
+import threading
+import zlib
+
+from forwarding import ForwardingState
+from snapshot_cache import SnapshotCache
+
+
+class Meeting:
+    """
+    单个会议的状态
+    clients: {sid: userName}
+    users:   {userName: sid}，用于 O(1) 检查用户名是否被占用
+    publishers: 正在发送视频的用户名，snapshots 按内存上限淘汰旧帧，不能用来判断谁在发送
+    clients、users 只在 lock（所在分片的锁）下修改；需要遍历成员时用 members() 取副本，
+    直接遍历 clients 时其他线程的加入、离开会导致 "dictionary changed size during iteration"
+    """
+    __slots__ = ('meeting_id', 'lock', 'creator_sid', 'clients', 'users', 'snapshots', 'publishers',
+                 'forwarding', 'deskframe', 'key', 'iv', 'mode', 'remote')
+
+    def __init__(self, meeting_id, key=None, iv=None, mode='cs', snapshot_budget=4 * 1024 * 1024, lock=None):
+        self.meeting_id = meeting_id
+        self.lock = lock or threading.RLock()
+        self.creator_sid = None  # 第一个加入的用户成为创建者
+        self.clients = {}
+        self.users = {}
+        self.snapshots = SnapshotCache(snapshot_budget)  # 每个用户最近的视频帧
+        self.publishers = set()                          # 正在发送视频的用户名
+        self.forwarding = ForwardingState()             # 选择性转发的发言人排序和订阅状态
+        self.deskframe = {}      # 桌面帧 {userName: deskframe}
+        self.key = key
+        self.iv = iv
+        self.mode = mode
+        self.remote = False      # 多 worker 部署时，是否有成员连接在其他 worker 上
+
+    def members(self):
+        """成员 {sid: userName} 的副本"""
+        with self.lock:
+            return dict(self.clients)
+
+    def sids(self, skip_sid=None):
+        """成员 sid 列表的副本，可以排除一个 sid"""
+        with self.lock:
+            return [sid for sid in self.clients if sid != skip_sid]
+
+    def creator_name(self):
+        if self.creator_sid and self.creator_sid in self.clients:
+            return self.clients[self.creator_sid]
+        return None
+
+    def __repr__(self):
+        return f'<Meeting {self.meeting_id} mode={self.mode} clients={len(self.clients)}>'
+
+
+class RegistryError(Exception):
+    """会议操作失败，message 直接返回给客户端"""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class LeaveResult:
+    __slots__ = ('meeting', 'user', 'new_creator_sid', 'deleted')
+
+    def __init__(self, meeting, user, new_creator_sid=None, deleted=False):
+        self.meeting = meeting
+        self.user = user
+        self.new_creator_sid = new_creator_sid  # 创建者离开后新指定的创建者
+        self.deleted = deleted                  # 会议因为没人而被删除
+
+
+class _Shard:
+    __slots__ = ('lock', 'items')
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.items = {}
+
+
+class MeetingRegistry:
+    """
+    分片的会议表，替代全局 meetings 字典。
+    - 按会议号分片，每个分片一把锁，不同会议之间互不阻塞
+    - 维护 sid -> 会议号 的反向索引（同样分片），加入、离开、断开连接都是 O(1)
+    锁顺序固定为：会议分片锁 -> sid 分片锁，避免死锁
+    - version 在会议列表可见的内容（会议的增删、创建者、模式）变化时递增，用于缓存会议列表
+    """
+
+    def __init__(self, shards=64, snapshot_budget=4 * 1024 * 1024):
+        self.snapshot_budget = snapshot_budget
+        self._shards = [_Shard() for _ in range(shards)]
+        self._sid_shards = [_Shard() for _ in range(shards)]
+        self._versions = itertools.count(1)
+        self.version = 0
+
+    def _changed(self):
+        self.version = next(self._versions)
+
+    def _shard(self, meeting_id):
+        return self._shards[zlib.crc32(meeting_id.encode('utf-8')) % len(self._shards)]
+
+    def _sid_shard(self, sid):
+        return self._sid_shards[zlib.crc32(sid.encode('utf-8')) % len(self._sid_shards)]
+
+    # ---- 会议 ----
+
+    def create(self, id_factory, **fields):
+        """
+        用 id_factory() 生成会议号直到不重复为止，创建并返回 Meeting
+        """
+        while True:
+            meeting_id = id_factory()
+            shard = self._shard(meeting_id)
+            with shard.lock:
+                if meeting_id in shard.items:
+                    continue
+                meeting = Meeting(meeting_id, snapshot_budget=self.snapshot_budget, lock=shard.lock, **fields)
+                shard.items[meeting_id] = meeting
+                self._changed()
+                return meeting
+
+    def adopt(self, meeting_id, creator_sid=None, **fields):
+        """
+        为其他 worker 创建的会议建立本地副本，已存在时直接返回本地会议
+        """
+        shard = self._shard(meeting_id)
+        with shard.lock:
+            meeting = shard.items.get(meeting_id)
+            if meeting is None:
+                meeting = Meeting(meeting_id, snapshot_budget=self.snapshot_budget, lock=shard.lock, **fields)
+                meeting.creator_sid = creator_sid
+                shard.items[meeting_id] = meeting
+                self._changed()
+            return meeting
+
+    def get(self, meeting_id):
+        """meeting_id 来自客户端消息，不是非空字符串（例如数字、列表）时视为会议不存在"""
+        if not isinstance(meeting_id, str) or not meeting_id:
+            return None
+        return self._shard(meeting_id).items.get(meeting_id)
+
+    def __contains__(self, meeting_id):
+        return self.get(meeting_id) is not None
+
+    def __len__(self):
+        return sum(len(shard.items) for shard in self._shards)
+
+    def meetings(self):
+        """所有会议的快照列表"""
+        result = []
+        for shard in self._shards:
+            with shard.lock:
+                result.extend(shard.items.values())
+        return result
+
+    def remove(self, meeting_id):
+        """删除会议并清理其中所有 sid 的反向索引，返回被删除的 Meeting"""
+        shard = self._shard(meeting_id)
+        with shard.lock:
+            meeting = shard.items.pop(meeting_id, None)
+            if meeting is None:
+                return None
+            for sid in meeting.clients:
+                self._unindex(sid, meeting_id)
+            self._changed()
+        return meeting
+
+    def set_mode(self, meeting, mode):
+        if meeting.mode != mode:
+            meeting.mode = mode
+            self._changed()
+
+    # ---- 成员 ----
+
+    def join(self, meeting_id, sid, user):
+        """
+        把 sid 以 user 的名字加入会议，返回 (meeting, is_creator)
+        会议不存在或用户名被占用时抛出 RegistryError
+        """
+        if not isinstance(meeting_id, str):
+            raise RegistryError('会议不存在')
+        shard = self._shard(meeting_id)
+        with shard.lock:
+            meeting = shard.items.get(meeting_id)
+            if meeting is None:
+                raise RegistryError('会议不存在')
+            if user in meeting.users:
+                raise RegistryError('用户名在此会议中已被占用')
+            is_creator = False
+            if meeting.creator_sid is None:
+                meeting.creator_sid = sid
+                is_creator = True
+            meeting.clients[sid] = user
+            meeting.users[user] = sid
+            sid_shard = self._sid_shard(sid)
+            with sid_shard.lock:
+                sid_shard.items.setdefault(sid, set()).add(meeting_id)
+            if is_creator:
+                self._changed()
+        return meeting, is_creator
+
+    def leave(self, meeting_id, sid):
+        """
+        sid 离开会议。创建者离开时指定下一个成员为创建者，没人时删除会议。
+        sid 不在会议中时返回 None
+        """
+        if not isinstance(meeting_id, str):
+            return None
+        shard = self._shard(meeting_id)
+        with shard.lock:
+            meeting = shard.items.get(meeting_id)
+            if meeting is None or sid not in meeting.clients:
+                return None
+            user = meeting.clients.pop(sid)
+            meeting.users.pop(user, None)
+            self._unindex(sid, meeting_id)
+
+            result = LeaveResult(meeting, user)
+            if meeting.creator_sid == sid and meeting.clients:
+                result.new_creator_sid = next(iter(meeting.clients))
+                meeting.creator_sid = result.new_creator_sid
+            if not meeting.clients:
+                del shard.items[meeting_id]
+                result.deleted = True
+            if result.new_creator_sid or result.deleted:
+                self._changed()
+            return result
+
+    def meetings_of(self, sid):
+        """sid 当前所在的会议号列表"""
+        sid_shard = self._sid_shard(sid)
+        with sid_shard.lock:
+            return list(sid_shard.items.get(sid, ()))
+
+    def _unindex(self, sid, meeting_id):
+        sid_shard = self._sid_shard(sid)
+        with sid_shard.lock:
+            ids = sid_shard.items.get(sid)
+            if ids is not None:
+                ids.discard(meeting_id)
+                if not ids:
+                    del sid_shard.items[sid]
+
+    def __repr__(self):
+        return f'<MeetingRegistry meetings={len(self)}>'
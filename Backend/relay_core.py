@@ -0,0 +1,1263 @@
+import base64
+import logging
+import math
+import os
+import uuid
+
+import config
+import media_crypto
+import media_packet
+import transcode
+from desktop_codec import DesktopComposite
+from forwarding import ForwardingPolicy
+from jitter_buffer import SequenceTracker
+from meeting_list import MeetingList
+from metrics import ThrottledLogger
+from rate_control import RateController
+from ratelimit import RateLimiter
+from recorder import FORMAT_PACKET, FORMAT_TEXT
+from registry import MeetingRegistry, RegistryError
+
+# 视频会议转发服务器的事件处理逻辑，与具体的 Socket.IO 服务器无关：
+#   - server2.py（Flask-SocketIO，线程 / eventlet / gevent）和 server_asgi.py（python-socketio 的 AsyncServer）
+#     只负责注册事件、取出 sid 和客户端 IP，然后执行 RelayCore 返回的 Outbox
+#   - Outbox 是按顺序要执行的发送操作；Transport / AsyncTransport 分别用同步和 async 的方式执行
+#   - 多 worker 的共享目录、JPEG 转码、audio/signaling 流水线、会议录制是可选的，
+#     宿主没有提供时相应的功能不可用，其他行为相同
+
+log = logging.getLogger('relay')
+# 每帧、每条消息级别的日志按类型限频
+throttled_log = ThrottledLogger(log, interval=config.LOG_THROTTLE_INTERVAL)
+
+VIDEO_EVENTS = ('receive_frame', 'receive_frame_bin')
+
+# 由 RelayCore 同名方法处理的事件 -> 所属的流水线（只在 config.PIPELINES 中启用时注册），None 表示总是注册。
+# join_meeting（排队等待）、connect、disconnect 以及录制事件由宿主单独注册
+EVENTS = {
+    'leave_meeting': None,
+    'cancel_meeting': None,
+    'video_frame': 'video',
+    'video_frame_bin': 'video',
+    'stop_video': 'video',
+    'subscribe_video': 'video',
+    'unsubscribe_video': 'video',
+    'pin_video': 'video',
+    'unpin_video': 'video',
+    'set_viewport': 'video',
+    'desktop_frame': 'desktop',
+    'desktop_frame_bin': 'desktop',
+    'request_desktop_keyframe': 'desktop',
+    'stop_desktop': 'desktop',
+    'send_comment': None,
+    'audio_level': None,
+    'send_system_message': None,
+}
+RECORDING_EVENTS = ('start_recording', 'stop_recording')
+
+
+class Outbox(list):
+    """
+    RelayCore 处理一个事件的结果：按顺序要执行的发送操作，每项为 (操作名, 参数...)，
+    操作名就是 Transport 上的方法名：
+      emit(event, data, to)                        发给一个 sid
+      broadcast(event, data, room, skip_sid)        按房间发送，多 worker 时由消息总线扇出
+      control(room, event, data, members, coalesce) 经 control_batcher 合并发送的控制消息
+      relay(event, payload, receivers, stream)      经各接收者的发送队列转发媒体帧
+      enter_room(sid, room) / leave_room(sid, room) / close_room(room)
+      send_snapshots(frames, sid)                   后台任务逐个发送缓存的画面
+    """
+
+    def emit(self, event, data, to):
+        self.append(('emit', event, data, to))
+
+    def error(self, sid, message, **extra):
+        self.emit('error', dict(message=message, **extra), sid)
+
+    def broadcast(self, event, data, room, skip_sid=None):
+        self.append(('broadcast', event, data, room, skip_sid))
+
+    def control(self, room, event, data, members, coalesce=False):
+        self.append(('control', room, event, data, members, coalesce))
+
+    def relay(self, event, payload, receivers, stream):
+        self.append(('relay', event, payload, receivers, stream))
+
+    def enter_room(self, sid, room):
+        self.append(('enter_room', sid, room))
+
+    def leave_room(self, sid, room):
+        self.append(('leave_room', sid, room))
+
+    def close_room(self, room):
+        self.append(('close_room', room))
+
+    def send_snapshots(self, frames, sid):
+        self.append(('send_snapshots', frames, sid))
+
+
+class RelayCore:
+    """
+    会议表、转发策略、限流和各事件的处理。
+    事件处理方法与事件同名，参数为 (sid, data)，返回 Outbox；
+    send_queues、control_batcher 由宿主按自己的服务器创建（同步或 async 版本），
+    这里只调用它们的登记方法，实际发送由 Transport 执行。
+    directory、transcoder、recorder 为 None 时相应功能不可用；pipelines 可以在创建后再设置
+    """
+
+    def __init__(self, metrics, send_queues, control_batcher,
+                 directory=None, transcoder=None, recorder=None, pipelines=None):
+        self.metrics = metrics
+        self.send_queues = send_queues
+        self.control_batcher = control_batcher
+        self.directory = directory
+        self.transcoder = transcoder
+        self.recorder = recorder
+        self.pipelines = pipelines
+
+        # 整点时大量用户同时创建、加入会议：按 IP 限制创建和加入频率，按会议让加入请求排队
+        self.create_limiter = RateLimiter(config.CREATE_RATE_PER_IP, config.CREATE_BURST_PER_IP)
+        self.join_limiter = RateLimiter(config.JOIN_RATE_PER_IP, config.JOIN_BURST_PER_IP)
+        self.join_admission = RateLimiter(config.JOIN_RATE_PER_MEETING, config.JOIN_BURST_PER_MEETING)
+        self.rate_limited = metrics.counter('relay_rate_limited_total',
+                                            'Create/join requests rejected by rate limits', ('limit',))
+        self.joins_queued = metrics.counter('relay_joins_queued_total',
+                                            'Joins delayed by per-meeting admission control')
+        self.frames_dropped = metrics.counter('relay_frames_dropped_total', 'Media frames dropped from send queues')
+        self.frames_late = metrics.counter('relay_frames_late_total',
+                                           'Media frames older than one already relayed', ('kind',))
+
+        # 按接收者实测吞吐调整转发帧率，并向发送者建议采集间隔
+        self.rate_control = RateController(
+            max_fps=config.RATE_MAX_FPS,
+            min_fps=config.RATE_MIN_FPS,
+            target_latency=config.RATE_TARGET_LATENCY,
+            drop_threshold=config.RATE_DROP_THRESHOLD
+        )
+        # 大会议中每个接收者只全帧率收到 last-N 个发言人和置顶用户的视频
+        self.forwarding = ForwardingPolicy(
+            last_n=config.SFU_LAST_N,
+            others_fps=config.SFU_OTHERS_FPS,
+            speaking_level=config.SFU_SPEAKING_LEVEL,
+            layer_widths=config.SIMULCAST_LAYER_WIDTHS,
+            layer_timeout=config.SIMULCAST_LAYER_TIMEOUT
+        )
+        self.forwarding.bandwidth_layer = self._bandwidth_layer
+        # 只保留最新帧的流（视频、桌面）丢弃乱序到达的旧帧
+        self.sequences = SequenceTracker()
+        send_queues.listener = self
+
+        # 每个会议是一个 registry.Meeting：
+        #   meeting.creator_sid = 'sid1'
+        #   meeting.clients = {sid1: 'userNameA', sid2: 'userNameB', ...}
+        #   meeting.snapshots = SnapshotCache，每个用户最近一帧（字符串帧或二进制媒体包），有内存上限，
+        #                       只用于发给新加入的用户
+        #   meeting.publishers = {'userNameA', ...}，正在发送视频的用户（缓存会淘汰帧，以这里为准）
+        # registry 按会议号分片加锁，并维护 sid -> 会议号 的反向索引
+        self.registry = MeetingRegistry(shards=config.REGISTRY_SHARDS, snapshot_budget=config.SNAPSHOT_BUDGET)
+        # /list_meetings 的分页索引和响应缓存
+        self.meeting_list = MeetingList(max_limit=config.LIST_MEETINGS_MAX_LIMIT)
+
+        registry = self.registry
+        metrics.gauge('relay_meetings', 'Meetings hosted by this worker', lambda: {(): len(registry)})
+        metrics.gauge('relay_clients', 'Clients joined to meetings on this worker',
+                      lambda: {(): sum(len(meeting.sids()) for meeting in registry.meetings())})
+        # 正在发送视频或共享桌面的用户数
+        metrics.gauge('relay_meeting_publishers', 'Active video/desktop publishers per meeting',
+                      lambda: {(meeting.meeting_id,): len(meeting.publishers) + len(meeting.deskframe)
+                               for meeting in registry.meetings()}, labels=('meeting',))
+        if transcoder is not None:
+            metrics.gauge('relay_transcode_jobs', 'JPEG transcode jobs by outcome (pending is current)',
+                          lambda: {(k,): v for k, v in transcoder.stats().items()}, labels=('state',))
+        if recorder is not None:
+            metrics.gauge('relay_recorder_records', 'Recording records written, dropped on a full queue, or failed',
+                          lambda: {(k,): recorder.stats()[k] for k in ('written', 'dropped', 'errors')},
+                          labels=('state',))
+        metrics.gauge('relay_control_events', 'Control events delivered through batching, and the frames they took',
+                      lambda: {('events',): control_batcher.events, ('frames',): control_batcher.frames},
+                      labels=('kind',))
+
+    # ---- 发送队列回调：交给 rate_control，同时统计丢帧 ----
+
+    def on_sent(self, sid):
+        self.rate_control.on_sent(sid)
+
+    def on_drop(self, sid):
+        self.frames_dropped.inc()
+        self.rate_control.on_drop(sid)
+
+    def on_ack(self, sid, rtt):
+        self.rate_control.on_ack(sid, rtt)
+
+    def _bandwidth_layer(self, sid):
+        """按接收者当前的转发帧率（由实测吞吐决定）限制 simulcast 层"""
+        ratio = self.rate_control.fps(sid) / self.rate_control.max_fps
+        if ratio < config.SIMULCAST_THUMBNAIL_FPS_RATIO:
+            return media_packet.LAYER_THUMBNAIL
+        if ratio < config.SIMULCAST_MEDIUM_FPS_RATIO:
+            return media_packet.LAYER_MEDIUM
+        return media_packet.LAYER_FULL
+
+    # ---- 宿主接口 ----
+
+    def members(self, meeting_id):
+        """{sid: 用户名}，会议不存在时返回 None（供 pipelines.Host 使用）"""
+        meeting = self.registry.get(meeting_id)
+        return meeting.members() if meeting is not None else None
+
+    def meeting_mode(self, meeting_id):
+        meeting = self.registry.get(meeting_id)
+        return meeting.mode if meeting is not None else None
+
+    def _attach_client(self, sid, capabilities):
+        # 客户端在 capabilities 中声明 'ack' 表示会对媒体帧回 ack，用于发送窗口控制和时延测量
+        self.send_queues.add(sid, ack='ack' in capabilities)
+        self.rate_control.add(sid)
+        # 声明 'batch' 的客户端会处理 batch 事件：[[事件名, 数据], ...]
+        self.control_batcher.add(sid, batch='batch' in capabilities)
+
+    def _detach_client(self, sid):
+        self.sequences.remove(sid)
+        self.send_queues.remove(sid)
+        self.rate_control.remove(sid)
+        self.control_batcher.remove(sid)
+
+    def _record(self, meeting_id, kind, fmt, user, data):
+        if self.recorder is not None:
+            self.recorder.write(meeting_id, kind, fmt, user, data)
+
+    def _stop_recording(self, meeting_id):
+        if self.recorder is not None:
+            self.recorder.stop(meeting_id)
+
+    # ---- 多 worker ----
+
+    def _participant_count(self, meeting):
+        """会议总人数，多进程部署时包括连接在其他 worker 上的成员"""
+        if self.directory is not None:
+            return self.directory.count(meeting.meeting_id)
+        return len(meeting.clients)
+
+    def _creator_sid(self, meeting):
+        if self.directory is not None:
+            return self.directory.creator_of(meeting.meeting_id)
+        return meeting.creator_sid
+
+    def _legacy_p2p_allowed(self, meeting):
+        """
+        旧客户端的 P2P（switch_to_p2p）只在两人都是旧客户端时可用：
+        有人声明了 'p2p' 时由 signaling 流水线的拓扑方案负责，旧客户端无法与其互发信令
+        """
+        signaling = self.pipelines.get('signaling') if self.pipelines is not None else None
+        return signaling is None or signaling.participants(meeting.meeting_id) == 0
+
+    def _set_mode(self, meeting, mode):
+        self.registry.set_mode(meeting, mode)
+        if self.directory is not None:
+            self.directory.set_mode(meeting.meeting_id, mode)
+
+    def _adopt_meeting(self, meeting_id):
+        """会议由其他 worker 创建时，在本地建立副本"""
+        directory = self.directory
+        record = directory.lookup(meeting_id)
+        if record is None:
+            return None
+        meeting = self.registry.adopt(
+            meeting_id,
+            creator_sid=directory.creator_of(meeting_id),
+            key=record['key'],
+            iv=record['iv'],
+            mode=record['mode']
+        )
+        meeting.remote = directory.has_remote_members(meeting_id)
+        return meeting
+
+    def directory_changed(self, meeting_id):
+        """其他 worker 上的成员变化时，更新本地副本"""
+        out = Outbox()
+        meeting = self.registry.get(meeting_id)
+        if meeting is None:
+            return out
+        if self.directory.lookup(meeting_id) is None:
+            # 会议已在其他 worker 上被取消
+            self._stop_recording(meeting_id)
+            for sid, user in self.registry.remove(meeting_id).members().items():
+                self._detach_client(sid)
+                self._pipelines_left(meeting_id, sid, user)
+            self.control_batcher.discard(meeting_id)
+            return out
+        meeting.remote = self.directory.has_remote_members(meeting_id)
+        meeting.creator_sid = self.directory.creator_of(meeting_id) or meeting.creator_sid
+        return out
+
+    def _release_cluster_member(self, sid, result):
+        """
+        成员离开后更新共享目录，返回新创建者 (userName, sid)，没有变更时返回 None
+        """
+        meeting = result.meeting
+        if self.directory is None:
+            if result.new_creator_sid:
+                return meeting.clients.get(result.new_creator_sid), result.new_creator_sid
+            return None
+        self.directory.unclaim_user(meeting.meeting_id, result.user)
+        new_creator = self.directory.reassign_creator(meeting.meeting_id, sid, result.new_creator_sid)
+        self.directory.member_left(meeting.meeting_id)
+        return new_creator
+
+    def _pipelines_left(self, meeting_id, sid, user):
+        if self.pipelines is not None:
+            self.pipelines.left(meeting_id, sid, user)
+
+    # ---- 后台任务 ----
+
+    def adapt_rates(self):
+        """
+        每个测量周期调整各接收者的转发帧率，
+        并按发送者实际经服务器服务的最慢接收者给发送者下发 set_capture_rate 建议
+        """
+        out = Outbox()
+        rate_control = self.rate_control
+        rate_control.update()
+        for meeting in self.registry.meetings():
+            for sid, user in meeting.members().items():
+                receivers = meeting.sids(skip_sid=sid)
+                if user in meeting.publishers:
+                    fps = rate_control.capture_fps(self._video_receivers(meeting, sid, user, receivers))
+                    interval = int(1000 / fps)
+                    if rate_control.should_hint(sid, 'video', interval):
+                        out.emit('set_capture_rate', {'kind': 'video', 'interval': interval}, sid)
+                if user in meeting.deskframe:
+                    # 桌面共享不会比默认的 500ms 更快
+                    interval = max(config.DESKTOP_CAPTURE_INTERVAL, int(1000 / rate_control.capture_fps(receivers)))
+                    if rate_control.should_hint(sid, 'desktop', interval):
+                        out.emit('set_capture_rate', {'kind': 'desktop', 'interval': interval}, sid)
+        return out
+
+    def _video_receivers(self, meeting, sid, user, receivers):
+        """
+        经服务器以全帧率收到 user 视频的接收者：
+        不含通过 P2P 直接收到的，也不含按 last-N / 订阅关系只收缩略图或不收的
+        """
+        if self.pipelines is not None:
+            receivers = self.pipelines.relay_receivers(meeting.meeting_id, sid, receivers)
+        return self.forwarding.full_rate_receivers(meeting, user, receivers)
+
+    def transcoded(self):
+        """收取完成的转码任务，发给仍在会议中的接收者"""
+        out = Outbox()
+        for job, sids in self.transcoder.completed():
+            meeting = self.registry.get(job.key[0])
+            if meeting is None:
+                continue
+            sids = [sid for sid in sids if sid in meeting.clients]
+            if sids:
+                self._send_transcoded(out, job, sids)
+        return out
+
+    # ---- 发送 ----
+
+    def _room_emit(self, out, meeting, event, data, skip_sid=None, coalesce=False):
+        """
+        发给会议内所有成员（skip_sid 除外）的控制消息，经 control_batcher 合并发送；
+        有成员连接在其他 worker 上时直接按房间发送，由消息总线扇出
+        """
+        if meeting.remote:
+            out.broadcast(event, data, meeting.meeting_id, skip_sid)
+            return
+        out.control(meeting.meeting_id, event, data, meeting.sids(skip_sid=skip_sid), coalesce)
+
+    def _announce_speakers(self, out, meeting, speakers):
+        """last-N 发言人变化时通知会议内所有人"""
+        if speakers is not None:
+            self._room_emit(out, meeting, 'active_speakers', {'users': speakers}, coalesce=True)
+
+    def _rotate_media_key(self, out, meeting):
+        """
+        成员变化时换新的媒体会话密钥并发给会议内当前所有成员（见 media_crypto.py），
+        离开的成员拿不到新密钥，新成员拿不到旧密钥。服务器不保存密钥，也不解密媒体包
+        """
+        key_id, key = media_crypto.new_session_key()
+        # 同一个 tick 内多次更换时只发最新的密钥
+        self._room_emit(out, meeting, 'media_key', {
+            'key_id': key_id,
+            'key': base64.b64encode(key).decode('utf-8'),
+            'cipher': media_crypto.CIPHER,
+            'kdf': media_crypto.KDF,
+            'nonce': media_crypto.NONCE
+        }, coalesce=True)
+        # 加密的桌面共享没有服务器端合成画面，请共享者用新密钥发一个关键帧
+        for sharer, composite in list(meeting.deskframe.items()):
+            sharer_sid = meeting.users.get(sharer)
+            if isinstance(composite, DesktopComposite) and composite.encrypted and sharer_sid:
+                out.emit('desktop_keyframe_request', {}, sharer_sid)
+
+    def _relay_media(self, out, meeting, sid, event, payload, stream, layer=media_packet.LAYER_FULL):
+        """
+        转发 sid 发来的媒体帧：本 worker 上的接收者走各自的发送队列，
+        连接在其他 worker 上的接收者经由消息总线转发。
+        layer 为视频帧所属的 simulcast 层
+        """
+        receivers = meeting.sids(skip_sid=sid)
+        if event in VIDEO_EVENTS:
+            if self.pipelines is not None:
+                # 已经通过 P2P 收到该用户画面的接收者不再转发
+                receivers = self.pipelines.relay_receivers(meeting.meeting_id, sid, receivers)
+            # 视频按 last-N / 置顶 / 订阅关系选择接收者
+            self._announce_speakers(out, meeting, self.forwarding.on_publish(meeting, stream))
+            receivers = self.forwarding.select(meeting, stream, receivers, layer)
+        # 按每个接收者的目标帧率抽帧
+        receivers = [s for s in receivers if self.rate_control.allow(s, (event, stream))]
+        if self.transcoder is not None and event in VIDEO_EVENTS:
+            receivers = self._transcode_for(out, meeting, event, payload, stream, layer, receivers)
+        out.relay(event, payload, receivers, stream)
+        self.metrics.observe_relay(event, payload, len(receivers))
+        if meeting.remote:
+            out.broadcast(event, payload, meeting.meeting_id, meeting.sids())
+
+    def _transcode_for(self, out, meeting, event, payload, user, layer, receivers):
+        """
+        发布者只发送一层时，想要更低层的接收者改收转码后的帧（转码完成后由后台任务发送）。
+        返回仍然收原始帧的接收者：不需要转码的、帧无法转码的、转码任务排满时的
+        """
+        groups = self.forwarding.transcode_layers(meeting, user, receivers, layer)
+        if not groups:
+            return receivers
+        if event == 'receive_frame':
+            header = None
+            data = payload['frame']
+            if not isinstance(data, str) or not data.startswith(transcode.DATA_URL_PREFIX):
+                return receivers
+            frame_id = hash(data)
+        else:
+            header = media_packet.unpack_header(payload)
+            if header['flags'] & media_packet.FLAG_ENCRYPTED:
+                return receivers
+            data = bytes(media_packet.payload_of(payload, header))
+            frame_id = (header['seq'], header['timestamp'])
+
+        originals = [sid for sid in receivers if not any(sid in sids for sids in groups.values())]
+        for target, sids in groups.items():
+            job = self.transcoder.submit((meeting.meeting_id, user, target), frame_id, data,
+                                         self.forwarding.layer_widths[target], config.TRANSCODE_QUALITY[target],
+                                         sids, context=(event, header))
+            if job is None:
+                originals.extend(sids)
+            elif job.result is not None:
+                # 同一帧已经转码过
+                self._send_transcoded(out, job, sids)
+        return originals
+
+    def _send_transcoded(self, out, job, sids):
+        event, header = job.context
+        meeting_id, user, layer = job.key
+        if header is None:
+            payload = {'user': user, 'frame': job.result, 'layer': layer}
+        else:
+            flags = header['flags'] & ~media_packet.LAYER_MASK | media_packet.layer_flags(layer)
+            payload = media_packet.pack(media_packet.KIND_VIDEO, meeting_id, user, header['seq'],
+                                        header['timestamp'], job.result, flags=flags)
+        out.relay(event, payload, sids, user)
+        self.metrics.observe_relay(event, payload, len(sids))
+
+    def _forget_transcodes(self, meeting, user):
+        if self.transcoder is not None:
+            self.transcoder.forget(meeting.meeting_id, user)
+
+    @staticmethod
+    def _snapshot_frames(meeting, sid, thumbnails):
+        """缓存的最近一帧逐个取出，用户已经离开时停止"""
+        for event, payload in meeting.snapshots.snapshots(thumbnails=thumbnails):
+            if sid not in meeting.clients:
+                # 还没发完用户就已经离开
+                return
+            yield event, payload
+
+    # ---- REST 接口，返回 JSON 数据，由宿主包装成响应 ----
+
+    def _load_meetings(self):
+        directory = self.directory
+        if directory is not None:
+            # 多进程部署时从共享目录读取所有 worker 上的会议
+            return [{
+                'meeting_id': meeting_id,
+                'creator': directory.creator_name(meeting_id) or 'Unknown',
+                'mode': record['mode']
+            } for meeting_id, record in directory.list().items()]
+        return [{
+            'meeting_id': meeting.meeting_id,
+            'creator': meeting.creator_name() or 'Unknown',  # 如果没有创建者信息
+            'mode': meeting.mode
+        } for meeting in self.registry.meetings()]
+
+    def list_meetings(self, args):
+        """
+        GET /list_meetings?limit=50&cursor=<上一页的 next_cursor>&creator=<用户名>&mode=cs|p2p
+        返回 (状态码, 响应, ETag)：成功时响应为编码好的 JSON { meetings, next_cursor, total }，
+        参数错误时为错误信息 dict，ETag 为 None
+        """
+        limit = args.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                return 400, {'message': 'limit 必须是整数'}, None
+        # 单进程时会议列表只在 registry.version 变化后重建；共享目录没有版本号，每次读取
+        version = self.registry.version if self.directory is None else None
+        body, etag = self.meeting_list.page(
+            version,
+            self._load_meetings,
+            cursor=args.get('cursor'),
+            limit=limit,
+            creator=args.get('creator'),
+            mode=args.get('mode')
+        )
+        return 200, body, etag
+
+    def queue_stats(self):
+        """
+        每个接收者的媒体帧发送队列状态：队列深度、在途帧数、已发送和已丢弃帧数；
+        以及录制队列的深度、已写入和丢弃的记录数
+        """
+        stats = {'queues': self.send_queues.stats(), 'rates': self.rate_control.stats()}
+        if self.recorder is not None:
+            stats['recorder'] = self.recorder.stats()
+        return stats
+
+    def create_meeting(self, ip):
+        """
+        后端自动生成一个不重复的随机会议号，然后初始化会议数据。
+        返回 (状态码, 响应 dict, 响应头 dict)
+        """
+        if not self.create_limiter.allow(ip):
+            self.rate_limited.inc('create_ip')
+            retry_after = max(1, math.ceil(self.create_limiter.retry_after(ip)))
+            return 429, {'message': '创建会议过于频繁，请稍后重试'}, {'Retry-After': str(retry_after)}
+
+        # 使用 UUID 生成随机会议号，这里只取前 8 位即可，重复时由 registry 重新生成
+        meeting = self.registry.create(
+            lambda: str(uuid.uuid4())[:8],
+            key=base64.b64encode(os.urandom(32)).decode('utf-8'),
+            iv=base64.b64encode(os.urandom(16)).decode('utf-8'),
+            mode='cs'
+        )
+        meeting_id = meeting.meeting_id
+        if self.directory is not None:
+            self.directory.publish_meeting(meeting)
+        log.info('meeting %s created', meeting_id)
+        return 200, {
+            'message': f'Meeting {meeting_id} created successfully',
+            'meeting_id': meeting_id,
+            'worker': config.WORKER_URL
+        }, {}
+
+    def check_meeting(self, meeting_id):
+        """
+        返回 { exist: True, worker: url } 或 { exist: False }
+        worker 是会议所绑定的 worker 地址，客户端连接到它可以让会议留在同一个进程内
+        """
+        if self.directory is not None:
+            record = self.directory.lookup(meeting_id)
+            if record is not None:
+                return {'exist': True, 'worker': record['worker_url']}
+        elif meeting_id in self.registry:
+            return {'exist': True, 'worker': config.WORKER_URL}
+        return {'exist': False}
+
+    # ---- 会议成员 ----
+
+    def admit(self, sid, data, ip):
+        """
+        join_meeting 的第一步：限流和按会议排队。
+        返回 (outbox, wait)：wait 为 None 表示已拒绝；否则宿主等待 wait 秒，
+        确认连接仍在后调用 join
+        """
+        out = Outbox()
+        meeting_id = data.get('meeting_id')
+        if not self.join_limiter.allow(ip):
+            self.rate_limited.inc('join_ip')
+            out.error(sid, '加入会议过于频繁，请稍后重试', retry_after=self.join_limiter.retry_after(ip))
+            return out, None
+
+        meeting = self.registry.get(meeting_id)
+        if meeting is None and self.directory is not None and isinstance(meeting_id, str):
+            meeting = self._adopt_meeting(meeting_id)
+        if meeting is None:
+            out.error(sid, '会议不存在')
+            return out, None
+
+        if not data.get('user'):
+            out.error(sid, '需要用户名才能加入会议')
+            return out, None
+
+        # 同一会议的加入请求按固定速率放行，突发的请求排队等待而不是同时涌入
+        wait = self.join_admission.reserve(meeting_id, config.JOIN_MAX_WAIT)
+        if wait is None:
+            self.rate_limited.inc('join_meeting')
+            out.error(sid, '加入会议的人数过多，请稍后重试',
+                      retry_after=self.join_admission.retry_after(meeting_id))
+            return out, None
+        if wait > 0:
+            self.joins_queued.inc()
+            out.emit('join_queued', {'wait': round(wait, 3)}, sid)
+        return out, wait
+
+    def join(self, sid, data):
+        """join_meeting 的第二步：加入会议并发送初始状态"""
+        out = Outbox()
+        meeting_id = data.get('meeting_id')
+        user = data.get('user')
+        directory = self.directory
+
+        # 多进程部署时用户名需要在整个集群内唯一
+        if directory is not None and not directory.claim_user(meeting_id, user, sid):
+            out.error(sid, '用户名在此会议中已被占用')
+            return out
+
+        # 将用户添加到会议；用户名被占用时报错，会议没有创建者时当前用户成为创建者
+        try:
+            meeting, is_creator = self.registry.join(meeting_id, sid, user)
+        except RegistryError as e:
+            if directory is not None:
+                directory.unclaim_user(meeting_id, user)
+            out.error(sid, e.message)
+            return out
+        if directory is not None:
+            # 其他 worker 上可能同时有人成为创建者，以共享目录为准
+            if is_creator and not directory.claim_creator(meeting_id, sid):
+                is_creator = False
+                meeting.creator_sid = directory.creator_of(meeting_id)
+            directory.member_joined(meeting_id)
+        out.enter_room(sid, meeting_id)
+        capabilities = data.get('capabilities') or []
+        self._attach_client(sid, capabilities)
+        if self.pipelines is not None:
+            self.pipelines.joined(meeting_id, sid, user, capabilities)
+        self._rotate_media_key(out, meeting)
+
+        log.info('user %s joined meeting %s', user, meeting_id)
+
+        # 通知房间内的其他用户
+        self._room_emit(out, meeting, 'system_message', {'message': f'{user} 加入了会议', 'timestamp': sid},
+                        skip_sid=sid)
+
+        # 旧客户端使用的整场会议固定的 AES-CBC 密钥；新客户端使用随成员变化更换的 media_key
+        out.emit('set_key_and_iv', {'key': meeting.key, 'iv': meeting.iv}, sid)
+        # 旧客户端依赖 all_current_frames 初始化画面列表，这里只发空表，
+        # 缓存的帧随后由后台任务逐个发送，避免一次性把所有人的画面塞进一条大消息
+        out.emit('all_current_frames', {'frames': {}}, sid)
+        out.send_snapshots(self._snapshot_frames(meeting, sid, 'thumbnails' in capabilities), sid)
+        # 正在共享的桌面：发送服务器保存的合成画面（关键帧 + 已变化的块）
+        for composite in list(meeting.deskframe.values()):
+            if isinstance(composite, DesktopComposite):
+                for packet in composite.snapshot():
+                    out.emit('receive_desktop_frame_bin', packet, sid)
+
+        speakers = self.forwarding.active_speakers(meeting)
+        if speakers:
+            out.emit('active_speakers', {'users': speakers}, sid)
+        if self.recorder is not None and self.recorder.is_recording(meeting_id):
+            out.emit('recording_state', {'recording': True}, sid)
+
+        # 通知用户是否为创建者
+        out.emit('joined_meeting', {'is_creator': is_creator}, sid)
+
+        # 检查当前会议人数，决定是否切换模式
+        current_count = self._participant_count(meeting)
+        previous_mode = meeting.mode
+        if current_count == 3 and previous_mode == 'p2p':
+            log.info('meeting %s switching to cs mode', meeting_id)
+            self._set_mode(meeting, 'cs')
+            self._room_emit(out, meeting, 'switch_to_cs', {'message': '参与人数超过2人，切换到CS模式'})
+        elif current_count == 2 and previous_mode == 'cs' and self._legacy_p2p_allowed(meeting):
+            log.info('meeting %s switching to p2p mode', meeting_id)
+            self._set_mode(meeting, 'p2p')
+            self._room_emit(out, meeting, 'switch_to_p2p', {'message': '参与人数为2人或更少，可以使用P2P模式'})
+        return out
+
+    def _release(self, out, sid, result, desktop_event, switch_mode):
+        """成员离开（leave_meeting）或断开后清理并通知其他人"""
+        meeting, user = result.meeting, result.user
+        meeting_id = meeting.meeting_id
+        out.leave_room(sid, meeting_id)
+        self._detach_client(sid)
+        self._pipelines_left(meeting_id, sid, user)
+        new_creator = self._release_cluster_member(sid, result)
+        self._announce_speakers(out, meeting, self.forwarding.remove_member(meeting, sid, user))
+        self._forget_transcodes(meeting, user)
+        self._rotate_media_key(out, meeting)
+        log.info('user %s left meeting %s', user, meeting_id)
+
+        if switch_mode:
+            # 检查当前会议人数，决定是否切换模式
+            current_count = self._participant_count(meeting)
+            previous_mode = meeting.mode
+            if current_count == 2 and previous_mode == 'cs' and self._legacy_p2p_allowed(meeting):
+                self._set_mode(meeting, 'p2p')
+                self._room_emit(out, meeting, 'switch_to_p2p', {'message': '参与人数为2人，可以切换到P2P模式'})
+            elif current_count == 1 and previous_mode == 'p2p':
+                self._set_mode(meeting, 'cs')
+                self._room_emit(out, meeting, 'switch_to_cs', {'message': '参与人数为1人，可以使用cs模式'})
+
+        # 移除用户的视频帧和桌面帧，让其他人移除画面
+        if self._unpublish(meeting, user):
+            self._room_emit(out, meeting, 'remove_frame', {'user': user}, skip_sid=sid)
+        if user in meeting.deskframe:
+            del meeting.deskframe[user]
+            self._room_emit(out, meeting, desktop_event, {'user': user}, skip_sid=sid)
+
+        self._room_emit(out, meeting, 'system_message', {'message': f'{user} 离开了会议', 'timestamp': sid},
+                        skip_sid=sid)
+        # 如果用户是创建者，通知新的创建者
+        if new_creator:
+            self._room_emit(out, meeting, 'system_message',
+                            {'message': f'{new_creator[0]} 成为了新的会议创建者', 'timestamp': new_creator[1]})
+        # 会议里没人了，registry 已经删除了会议
+        if result.deleted:
+            self._stop_recording(meeting_id)
+            self.control_batcher.discard(meeting_id)
+            log.info('meeting %s deleted, no active clients', meeting_id)
+
+    def leave_meeting(self, sid, data):
+        out = Outbox()
+        meeting_id = data.get('meeting_id')
+        if self.registry.get(meeting_id) is None:
+            out.error(sid, '会议不存在')
+            return out
+        if not data.get('user'):
+            out.error(sid, '需要用户名才能离开会议')
+            return out
+
+        # 移除用户；创建者离开时由 registry 指定新的创建者，没人时删除会议
+        result = self.registry.leave(meeting_id, sid)
+        if result is None:
+            out.error(sid, '用户不在此会议中')
+            return out
+        self._release(out, sid, result, 'remove_deskframe', switch_mode=True)
+        return out
+
+    def disconnect(self, sid):
+        out = Outbox()
+        self._detach_client(sid)
+        if self.pipelines is not None:
+            self.pipelines.disconnected(sid)
+        # 通过 sid 反向索引找到该用户所在的会议并移除
+        for meeting_id in self.registry.meetings_of(sid):
+            result = self.registry.leave(meeting_id, sid)
+            if result is not None:
+                self._release(out, sid, result, 'remove_desktop', switch_mode=False)
+        return out
+
+    def cancel_meeting(self, sid, data):
+        out = Outbox()
+        meeting_id = data.get('meeting_id')
+        meeting = self.registry.get(meeting_id)
+        if meeting is None:
+            out.error(sid, '会议不存在')
+            return out
+        if not data.get('user'):
+            out.error(sid, '需要用户名才能取消会议')
+            return out
+        # 检查请求者是否为会议创建者
+        if self._creator_sid(meeting) != sid:
+            out.error(sid, '只有会议的创建者可以取消会议')
+            return out
+
+        # 通知房间内所有用户会议已被取消
+        out.broadcast('meeting_canceled', {'message': '会议已被创建者取消。'}, meeting_id)
+        # 清理会议数据
+        for member, user in meeting.members().items():
+            self._detach_client(member)
+            self._pipelines_left(meeting_id, member, user)
+        self.registry.remove(meeting_id)
+        self.control_batcher.discard(meeting_id)
+        out.close_room(meeting_id)
+        self._stop_recording(meeting_id)
+        if self.directory is not None:
+            # 其他 worker 收到目录变更后删除各自的本地副本
+            self.directory.remove_meeting(meeting_id)
+            self.directory.notify(meeting_id)
+        log.info('meeting %s canceled by its creator', meeting_id)
+        return out
+
+    # ---- 视频 ----
+
+    def _check_member(self, out, sid, meeting, user, missing_user):
+        """会议存在、指定了用户且用户名与 sid 匹配，否则向发送者报错并返回 False"""
+        if meeting is None:
+            out.error(sid, '会议不存在')
+            return False
+        if not user:
+            out.error(sid, missing_user)
+            return False
+        if meeting.clients.get(sid) != user:
+            out.error(sid, '用户名不匹配')
+            return False
+        return True
+
+    @staticmethod
+    def _unpublish(meeting, user):
+        """用户停止发送视频：清除缓存的帧，返回用户之前是否在发送"""
+        meeting.snapshots.remove(user)
+        with meeting.lock:
+            if user not in meeting.publishers:
+                return False
+            meeting.publishers.discard(user)
+            return True
+
+    def _is_top_layer(self, meeting, user, layer):
+        top = self.forwarding.top_layer(meeting, user)
+        return top is None or layer >= top
+
+    def video_frame(self, sid, data):
+        out = Outbox()
+        meeting = self.registry.get(data.get('meeting_id'))
+        user = data.get('user')
+        frame = data.get('frame')
+        if not self._check_member(out, sid, meeting, user, '视频帧中未指定用户'):
+            return out
+        # 帧必须是非空字符串，否则缓存和转发都会出错
+        if not isinstance(frame, str) or not frame:
+            out.error(sid, '无效的视频帧')
+            return out
+
+        # simulcast 客户端用 layer 标明分辨率层，旧客户端只发一层
+        layer = data.get('layer', media_packet.LAYER_FULL)
+        if layer not in (media_packet.LAYER_THUMBNAIL, media_packet.LAYER_MEDIUM, media_packet.LAYER_FULL):
+            out.error(sid, '无效的视频层')
+            return out
+        # 带序号的客户端：丢弃乱序到达的旧帧
+        seq = data.get('seq')
+        if isinstance(seq, int) and not self.sequences.accept((sid, media_packet.KIND_VIDEO, layer), seq):
+            self.frames_late.inc(media_packet.KIND_VIDEO)
+            return out
+
+        # 保存或更新用户的视频帧（只缓存和录制最高层）
+        meeting.publishers.add(user)
+        if self._is_top_layer(meeting, user, layer):
+            meeting.snapshots.put_text(user, frame)
+            self._record(meeting.meeting_id, media_packet.KIND_VIDEO, FORMAT_TEXT, user, frame)
+
+        # 通过每个接收者的发送队列转发，慢客户端只会丢帧，不会拖住其他人
+        self._relay_media(out, meeting, sid, 'receive_frame', {'user': user, 'frame': frame}, user, layer)
+        return out
+
+    def _check_bin_packet(self, out, sid, packet, kind):
+        """
+        校验二进制媒体包头部：会议存在、类型正确、用户名与 sid 匹配。
+        成功返回 (meeting, header)，失败时向发送者报错并返回 (None, None)
+        """
+        try:
+            header = media_packet.unpack_header(packet)
+        except media_packet.PacketError as e:
+            out.error(sid, f'媒体包格式错误: {e}')
+            return None, None
+
+        meeting = self.registry.get(header['meeting_id'])
+        if meeting is None:
+            out.error(sid, '会议不存在')
+            return None, None
+        if header['kind'] != kind:
+            out.error(sid, '媒体包类型错误')
+            return None, None
+        if meeting.clients.get(sid) != header['user']:
+            out.error(sid, '用户名不匹配')
+            return None, None
+        # 比已转发的帧更旧的帧不再转发（每个 simulcast 层各自编号）
+        if not self.sequences.accept((sid, kind, media_packet.layer_of(header['flags'])), header['seq']):
+            self.frames_late.inc(kind)
+            if kind == media_packet.KIND_DESKTOP and header['flags'] & media_packet.FLAG_DELTA:
+                # 丢掉的增量帧里可能有之后没再变化的块，请共享者补一个关键帧
+                composite = meeting.deskframe.get(header['user'])
+                if isinstance(composite, DesktopComposite) and \
+                        composite.should_request_keyframe(config.DESKTOP_KEYFRAME_MIN_INTERVAL):
+                    out.emit('desktop_keyframe_request', {}, sid)
+            return None, None
+        return meeting, header
+
+    def video_frame_bin(self, sid, packet):
+        """
+        二进制视频帧：payload 为媒体包（见 media_packet.py），原样转发，不做 base64 编解码
+        """
+        out = Outbox()
+        meeting, header = self._check_bin_packet(out, sid, packet, media_packet.KIND_VIDEO)
+        if meeting is None:
+            return out
+
+        # 保存或更新用户的视频帧（只缓存和录制最高层）
+        layer = media_packet.layer_of(header['flags'])
+        meeting.publishers.add(header['user'])
+        if self._is_top_layer(meeting, header['user'], layer):
+            meeting.snapshots.put_packet(header['user'], packet)
+            self._record(meeting.meeting_id, media_packet.KIND_VIDEO, FORMAT_PACKET, header['user'], packet)
+
+        self._relay_media(out, meeting, sid, 'receive_frame_bin', packet, header['user'], layer)
+        return out
+
+    def stop_video(self, sid, data):
+        out = Outbox()
+        meeting = self.registry.get(data.get('meeting_id'))
+        user = data.get('user')
+        if not self._check_member(out, sid, meeting, user, '未指定要停止视频的用户'):
+            return out
+
+        # 从视频帧中移除用户，通知房间内的其他用户移除画面
+        if self._unpublish(meeting, user):
+            log.info('user %s stopped video in meeting %s', user, meeting.meeting_id)
+            self._announce_speakers(out, meeting, self.forwarding.remove_publisher(meeting, user))
+            self._forget_transcodes(meeting, user)
+            self._room_emit(out, meeting, 'remove_frame', {'user': user}, skip_sid=sid)
+        else:
+            out.error(sid, '未找到用户的视频帧')
+        return out
+
+    def _video_subscription(self, sid, data, action):
+        """接收者调整对某个发布者视频的订阅：data: {meeting_id, publisher}"""
+        out = Outbox()
+        meeting = self.registry.get(data.get('meeting_id'))
+        if meeting is None:
+            out.error(sid, '会议不存在')
+            return out
+        publisher = data.get('publisher')
+        if sid not in meeting.clients or not publisher:
+            out.error(sid, '未指定发布者或不在会议中')
+            return out
+        action(meeting, sid, publisher)
+        return out
+
+    def subscribe_video(self, sid, data):
+        return self._video_subscription(sid, data, self.forwarding.subscribe)
+
+    def unsubscribe_video(self, sid, data):
+        return self._video_subscription(sid, data, self.forwarding.unsubscribe)
+
+    def pin_video(self, sid, data):
+        return self._video_subscription(sid, data, self.forwarding.pin)
+
+    def unpin_video(self, sid, data):
+        return self._video_subscription(sid, data, self.forwarding.unpin)
+
+    def set_viewport(self, sid, data):
+        """
+        接收者上报视频格子的显示宽度，用于选择 simulcast 层
+        data: {meeting_id, width: 默认宽度, tiles: {userName: 宽度}}
+        """
+        out = Outbox()
+        meeting = self.registry.get(data.get('meeting_id'))
+        if meeting is None or sid not in meeting.clients:
+            out.error(sid, '会议不存在')
+            return out
+        # 宽度无效时保留原来的设置
+        if not self.forwarding.set_viewport(meeting, sid, width=data.get('width'), tiles=data.get('tiles')):
+            out.error(sid, '无效的画面尺寸')
+        return out
+
+    def audio_level(self, sid, data):
+        """
+        客户端上报自己的麦克风音量（0~1），用于确定 last-N 发言人
+        data: {meeting_id, user, level}
+        """
+        out = Outbox()
+        meeting = self.registry.get(data.get('meeting_id'))
+        if meeting is None:
+            return out
+        user = meeting.clients.get(sid)
+        if user is None or user != data.get('user'):
+            return out
+        try:
+            level = float(data.get('level', 0))
+        except (TypeError, ValueError):
+            return out
+        self._announce_speakers(out, meeting, self.forwarding.on_audio_level(meeting, user, level))
+        return out
+
+    # ---- 桌面共享 ----
+
+    def _refuse_desktop(self, out, sid):
+        out.emit('refuse_desktop_frame', None, sid)
+        out.error(sid, '需要等到共享桌面者结束共享')
+
+    def desktop_frame(self, sid, data):
+        throttled_log.debug('desktop_frame', 'receive desktop frame')
+        out = Outbox()
+        meeting = self.registry.get(data.get('meeting_id'))
+        user = data.get('user')
+        deskframe = data.get('frame')
+        if not self._check_member(out, sid, meeting, user, '视频帧中未指定用户'):
+            return out
+        if not isinstance(deskframe, str) or not deskframe:
+            out.error(sid, '无效的桌面帧')
+            return out
+
+        # 同一时间只允许一个人共享桌面
+        if user in meeting.deskframe or len(meeting.deskframe) == 0:
+            meeting.deskframe[user] = deskframe
+            self._record(meeting.meeting_id, media_packet.KIND_DESKTOP, FORMAT_TEXT, user, deskframe)
+            # 通过每个接收者的发送队列转发
+            self._relay_media(out, meeting, sid, 'receive_desktop_frame', {'user': user, 'frame': deskframe}, user)
+        else:
+            self._refuse_desktop(out, sid)
+        return out
+
+    def desktop_frame_bin(self, sid, packet):
+        """
+        二进制桌面帧：关键帧、分块增量帧（见 desktop_codec.py）或不分块的整帧。
+        服务器在 deskframe 中维护合成状态，供新加入的用户获得完整画面
+        """
+        out = Outbox()
+        meeting, header = self._check_bin_packet(out, sid, packet, media_packet.KIND_DESKTOP)
+        if meeting is None:
+            return out
+        user = header['user']
+
+        # 同一时间只允许一个人共享桌面
+        if user not in meeting.deskframe and len(meeting.deskframe) != 0:
+            self._refuse_desktop(out, sid)
+            return out
+        composite = meeting.deskframe.get(user)
+        first = not isinstance(composite, DesktopComposite)
+        if first:
+            composite = DesktopComposite(meeting.meeting_id, user)
+        try:
+            complete = composite.apply(packet, header)
+        except media_packet.PacketError as e:
+            out.error(sid, f'桌面帧格式错误: {e}')
+            return out
+        if first:
+            # 第一个包能解析后才成为共享者，格式错误的包不会占住桌面共享
+            meeting.deskframe[user] = composite
+        # 增量帧没有可叠加的关键帧，或累积的变化块已经很多时，向共享者请求关键帧
+        if not complete or composite.needs_keyframe(config.DESKTOP_KEYFRAME_RATIO):
+            if composite.should_request_keyframe(config.DESKTOP_KEYFRAME_MIN_INTERVAL):
+                out.emit('desktop_keyframe_request', {}, sid)
+        if complete:
+            self._record(meeting.meeting_id, media_packet.KIND_DESKTOP, FORMAT_PACKET, user, packet)
+            self._relay_media(out, meeting, sid, 'receive_desktop_frame_bin', packet, user)
+        return out
+
+    def request_desktop_keyframe(self, sid, data):
+        """
+        接收者发现桌面增量帧序号不连续（被丢帧或抽帧）时请求完整画面：
+        服务器直接用保存的合成状态回复，只有服务器也没有关键帧时才转给共享者
+        """
+        out = Outbox()
+        meeting = self.registry.get(data.get('meeting_id'))
+        if meeting is None:
+            out.error(sid, '会议不存在')
+            return out
+        for sharer, composite in list(meeting.deskframe.items()):
+            if not isinstance(composite, DesktopComposite):
+                continue
+            packets = composite.snapshot()
+            for packet in packets:
+                out.emit('receive_desktop_frame_bin', packet, sid)
+            sharer_sid = meeting.users.get(sharer)
+            if not packets and sharer_sid and \
+                    composite.should_request_keyframe(config.DESKTOP_KEYFRAME_MIN_INTERVAL):
+                out.emit('desktop_keyframe_request', {}, sharer_sid)
+        return out
+
+    def stop_desktop(self, sid, data):
+        out = Outbox()
+        meeting = self.registry.get(data.get('meeting_id'))
+        user = data.get('user')
+        if not self._check_member(out, sid, meeting, user, '未指定要停止视频的用户'):
+            return out
+
+        # 如果是这个用户，则移除用户，通知房间内的其他用户移除画面
+        if user in meeting.deskframe:
+            del meeting.deskframe[user]
+            log.info('user %s stopped desktop sharing in meeting %s', user, meeting.meeting_id)
+            self._room_emit(out, meeting, 'remove_desktop', {'user': user}, skip_sid=sid)
+        else:
+            out.error(sid, '需要等到共享桌面者结束共享')
+        return out
+
+    # ---- 文字消息 ----
+
+    def send_comment(self, sid, data):
+        out = Outbox()
+        meeting = self.registry.get(data.get('meeting_id'))
+        user = data.get('user')
+        message = data.get('message')
+        if meeting is None:
+            out.error(sid, '会议不存在')
+            return out
+        if not user or not message:
+            out.error(sid, '评论需要用户名和内容')
+            return out
+        # 确保用户名与 SID 匹配
+        if meeting.clients.get(sid) != user:
+            out.error(sid, '用户名不匹配')
+            return out
+
+        # 广播评论给房间内的其他用户
+        self._room_emit(out, meeting, 'receive_comment', {
+            'user': user,
+            'message': message,
+            'timestamp': data.get('timestamp') or int(uuid.uuid4().int / 1e18)  # 使用唯一标识符作为时间戳
+        }, skip_sid=sid)
+        throttled_log.debug('send_comment', '用户 %s 在会议 %s 中发送了评论', user, meeting.meeting_id)
+        return out
+
+    def send_system_message(self, sid, data):
+        out = Outbox()
+        meeting = self.registry.get(data.get('meeting_id'))
+        message = data.get('message')
+        if meeting is None:
+            out.error(sid, '会议不存在')
+            return out
+        if not message:
+            out.error(sid, '系统消息内容为空')
+            return out
+
+        # 广播系统消息给房间内的所有用户（包括发送者）
+        self._room_emit(out, meeting, 'system_message', {
+            'message': message,
+            'timestamp': data.get('timestamp') or int(uuid.uuid4().int / 1e18)
+        })
+        throttled_log.info('send_system_message', '会议 %s 的系统消息: %s', meeting.meeting_id, message)
+        return out
+
+    # ---- 录制（需要 recorder） ----
+
+    def _recording_request(self, out, sid, data):
+        """start_recording / stop_recording 的检查：只有创建者可以开关录制，成功时返回会议"""
+        meeting = self.registry.get(data.get('meeting_id'))
+        if meeting is None:
+            out.error(sid, '会议不存在')
+            return None
+        if self._creator_sid(meeting) != sid:
+            out.error(sid, '只有会议的创建者可以开关录制')
+            return None
+        return meeting
+
+    def start_recording(self, sid, data):
+        """
+        开始录制会议（只录制连接在本 worker 上的成员发送的视频、桌面和音频）
+        data: {meeting_id}
+        """
+        out = Outbox()
+        meeting = self._recording_request(out, sid, data)
+        if meeting is None or not self.recorder.start(meeting.meeting_id):
+            return out
+        # 桌面共享只发送变化的块，先写入当前的合成画面，录制从完整画面开始
+        for sharer, composite in list(meeting.deskframe.items()):
+            if isinstance(composite, DesktopComposite):
+                for packet in composite.snapshot():
+                    self._record(meeting.meeting_id, media_packet.KIND_DESKTOP, FORMAT_PACKET, sharer, packet)
+        self._room_emit(out, meeting, 'recording_state', {'recording': True})
+        self._room_emit(out, meeting, 'system_message', {'message': '会议开始录制', 'timestamp': sid})
+        return out
+
+    def stop_recording(self, sid, data):
+        out = Outbox()
+        meeting = self._recording_request(out, sid, data)
+        if meeting is None or not self.recorder.stop(meeting.meeting_id):
+            return out
+        self._room_emit(out, meeting, 'recording_state', {'recording': False})
+        self._room_emit(out, meeting, 'system_message', {'message': '会议录制已结束', 'timestamp': sid})
+        return out
+
+
+class Transport:
+    """在 Flask-SocketIO 上执行 Outbox（线程、eventlet、gevent 模式）"""
+
+    def __init__(self, socketio, send_queues, control_batcher):
+        self.socketio = socketio
+        self.send_queues = send_queues
+        self.control_batcher = control_batcher
+
+    def deliver(self, outbox):
+        for op, *args in outbox:
+            getattr(self, op)(*args)
+
+    def emit(self, event, data, to):
+        # data 为 None 时发送不带参数的事件
+        self.socketio.emit(event, data, to=to)
+
+    def broadcast(self, event, data, room, skip_sid):
+        self.socketio.emit(event, data, to=room, skip_sid=skip_sid)
+
+    def control(self, room, event, data, members, coalesce):
+        self.control_batcher.emit(room, event, data, members, coalesce=coalesce)
+
+    def relay(self, event, payload, receivers, stream):
+        self.send_queues.relay(event, payload, receivers, stream=stream)
+
+    def enter_room(self, sid, room):
+        self.socketio.server.enter_room(sid, room, namespace='/')
+
+    def leave_room(self, sid, room):
+        self.socketio.server.leave_room(sid, room, namespace='/')
+
+    def close_room(self, room):
+        self.socketio.server.close_room(room, namespace='/')
+
+    def send_snapshots(self, frames, sid):
+        self.socketio.start_background_task(self._send_frames, frames, sid)
+
+    def _send_frames(self, frames, sid):
+        """
+        后台任务：把缓存的最近一帧逐个发给新加入的用户，每发一帧让出一次，
+        人数多的会议里新成员加入不会长时间占住工作线程
+        """
+        for event, payload in frames:
+            self.socketio.emit(event, payload, to=sid)
+            self.socketio.sleep(0)
+
+    def every(self, interval, produce):
+        """后台任务：每 interval 秒执行一次 produce() 返回的 Outbox"""
+        def run():
+            while True:
+                self.socketio.sleep(interval)
+                self.deliver(produce())
+        self.socketio.start_background_task(run)
+
+    def is_connected(self, sid):
+        return self.socketio.server.manager.is_connected(sid, '/')
+
+
+class AsyncTransport(Transport):
+    """Transport 的 asyncio 版本，用于 python-socketio 的 AsyncServer（见 server_asgi.py）"""
+
+    async def deliver(self, outbox):
+        for op, *args in outbox:
+            await getattr(self, op)(*args)
+
+    async def emit(self, event, data, to):
+        await self.socketio.emit(event, data, to=to)
+
+    async def broadcast(self, event, data, room, skip_sid):
+        await self.socketio.emit(event, data, room=room, skip_sid=skip_sid)
+
+    async def control(self, room, event, data, members, coalesce):
+        await self.control_batcher.emit(room, event, data, members, coalesce=coalesce)
+
+    async def relay(self, event, payload, receivers, stream):
+        await self.send_queues.relay(event, payload, receivers, stream=stream)
+
+    async def enter_room(self, sid, room):
+        await self.socketio.enter_room(sid, room)
+
+    async def leave_room(self, sid, room):
+        await self.socketio.leave_room(sid, room)
+
+    async def close_room(self, room):
+        await self.socketio.close_room(room)
+
+    async def send_snapshots(self, frames, sid):
+        self.socketio.start_background_task(self._send_frames, frames, sid)
+
+    async def _send_frames(self, frames, sid):
+        for event, payload in frames:
+            await self.socketio.emit(event, payload, to=sid)
+            await self.socketio.sleep(0)
+
+    def every(self, interval, produce):
+        async def run():
+            while True:
+                await self.socketio.sleep(interval)
+                await self.deliver(produce())
+        self.socketio.start_background_task(run)
+
+    def is_connected(self, sid):
+        return self.socketio.manager.is_connected(sid, '/')
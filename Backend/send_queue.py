@@ -0,0 +1,231 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ClientQueue:
+    """
+    单个接收者的待发送媒体帧。
+    按 (事件, 发送者) 去重，同一路流只保留最新一帧；总数超过上限时丢弃最旧的帧
+    """
+    __slots__ = ('sid', 'ack', 'pending', 'in_flight', 'sent', 'dropped', 'acked',
+                 'last_ack', 'last_send')
+
+    def __init__(self, sid, ack):
+        self.sid = sid
+        self.ack = ack               # 客户端是否会对媒体帧回 ack
+        self.pending = OrderedDict()  # (event, stream) -> payload
+        self.in_flight = 0
+        self.sent = 0
+        self.dropped = 0
+        self.acked = 0
+        self.last_ack = None
+        self.last_send = 0.0
+
+
+class SendQueues:
+    """
+    每个接收者一个有界发送队列，只用于视频帧、桌面帧等可丢弃的媒体数据。
+    文字、系统消息和控制事件不经过这里，直接 emit，永远不会被丢弃。
+
+    发送窗口：
+      - 声明了 'ack' 能力的客户端：未 ack 的帧数
+      - 其他客户端：engine.io 底层发送队列的长度
+    窗口满时帧留在本队列中，由 ack 回调或后台 pump 任务补发
+    """
+
+    def __init__(self, socketio, max_size=2, window=2, pump_interval=0.02, ack_timeout=2.0):
+        self.socketio = socketio
+        self.max_size = max_size
+        self.window = window
+        self.pump_interval = pump_interval
+        self.ack_timeout = ack_timeout  # 超时未 ack 的帧视为丢失，释放窗口
+        self._clients = {}  # sid -> ClientQueue
+        self._lock = threading.Lock()
+        self._pump_started = False
+        # 可选的测量回调对象，需要实现 on_sent(sid) / on_drop(sid) / on_ack(sid, rtt)
+        self.listener = None
+
+    def add(self, sid, ack=False):
+        with self._lock:
+            self._clients[sid] = ClientQueue(sid, ack)
+        if not self._pump_started:
+            self._pump_started = True
+            self.socketio.start_background_task(self._pump)
+
+    def remove(self, sid):
+        with self._lock:
+            self._clients.pop(sid, None)
+
+    def relay(self, event, payload, sids, stream=None, skip_sid=None):
+        """
+        把一帧媒体数据投递给多个接收者
+        stream: 用于去重的流标识（一般是发送者用户名），同一路流只保留最新一帧
+        """
+        for sid in sids:
+            if sid != skip_sid:
+                self.push(sid, event, payload, stream)
+
+    def push(self, sid, event, payload, stream=None):
+        if self._enqueue(sid, event, payload, stream):
+            self._flush(sid)
+        else:
+            # 未登记的接收者按原方式直接发送
+            self.socketio.emit(event, payload, to=sid)
+
+    def _enqueue(self, sid, event, payload, stream):
+        """放入接收者的队列，返回 False 表示接收者未登记"""
+        dropped = 0
+        with self._lock:
+            client = self._clients.get(sid)
+            if client is None:
+                return False
+            key = (event, stream)
+            if key in client.pending:
+                # 同一路流的旧帧已过时，直接替换
+                del client.pending[key]
+                dropped += 1
+            client.pending[key] = payload
+            while len(client.pending) > self.max_size:
+                client.pending.popitem(last=False)
+                dropped += 1
+            client.dropped += dropped
+        if dropped and self.listener is not None:
+            for _ in range(dropped):
+                self.listener.on_drop(sid)
+        return True
+
+    def _flush(self, sid):
+        """在窗口允许的范围内把队列中的帧发出去"""
+        while True:
+            item = self._next(sid)
+            if item is None:
+                return
+            event, payload, callback = item
+            self.socketio.emit(event, payload, to=sid, callback=callback)
+            if self.listener is not None:
+                self.listener.on_sent(sid)
+
+    def _next(self, sid):
+        """窗口允许时取出下一帧，返回 (事件, 数据, ack 回调)，否则返回 None"""
+        with self._lock:
+            client = self._clients.get(sid)
+            if client is None or not client.pending:
+                return None
+            if client.ack:
+                busy = client.in_flight >= self.window
+            else:
+                busy = self._transport_backlog(sid) >= self.window
+            if busy:
+                return None
+            (event, _), payload = client.pending.popitem(last=False)
+            client.sent += 1
+            client.last_send = time.time()
+            if client.ack:
+                client.in_flight += 1
+                callback = self._make_ack(sid, client.last_send)
+            else:
+                callback = None
+        return event, payload, callback
+
+    def _make_ack(self, sid, sent_at):
+        def on_ack(*args):
+            if self._acked(sid, sent_at):
+                self._flush(sid)
+        return on_ack
+
+    def _acked(self, sid, sent_at):
+        now = time.time()
+        with self._lock:
+            client = self._clients.get(sid)
+            if client is None:
+                return False
+            client.in_flight = max(0, client.in_flight - 1)
+            client.acked += 1
+            client.last_ack = now
+        if self.listener is not None:
+            self.listener.on_ack(sid, now - sent_at)
+        return True
+
+    def _transport_backlog(self, sid):
+        """engine.io 层尚未写出的包数量，取不到时视为 0"""
+        try:
+            # Flask-SocketIO 包装的 server，或者直接是 python-socketio 的 AsyncServer
+            server = getattr(self.socketio, 'server', self.socketio)
+            eio_sid = server.manager.eio_sid_from_sid(sid, '/')
+            return server.eio.sockets[eio_sid].queue.qsize()
+        except (AttributeError, KeyError, TypeError):
+            return 0
+
+    def _pump(self):
+        """后台任务：定期补发因窗口已满而积压的帧"""
+        while True:
+            self.socketio.sleep(self.pump_interval)
+            for sid in self._waiting():
+                self._flush(sid)
+
+    def _waiting(self):
+        """有积压帧的接收者；超时未 ack 的在途帧同时释放"""
+        now = time.time()
+        with self._lock:
+            waiting = []
+            for sid, c in self._clients.items():
+                if c.in_flight and now - c.last_send > self.ack_timeout:
+                    c.in_flight = 0
+                if c.pending:
+                    waiting.append(sid)
+        return waiting
+
+    def stats(self):
+        """每个接收者的队列深度、在途帧数、发送数和丢弃数"""
+        with self._lock:
+            return {
+                sid: {
+                    'depth': len(c.pending),
+                    'in_flight': c.in_flight,
+                    'sent': c.sent,
+                    'dropped': c.dropped,
+                    'acked': c.acked,
+                }
+                for sid, c in self._clients.items()
+            }
+
+
+class AsyncSendQueues(SendQueues):
+    """
+    SendQueues 的 asyncio 版本，用于 python-socketio 的 AsyncServer（见 server_asgi.py）。
+    队列和窗口的记账与线程版共用；所有调用都在事件循环中进行，持锁期间不会 await
+    """
+
+    async def relay(self, event, payload, sids, stream=None, skip_sid=None):
+        for sid in sids:
+            if sid != skip_sid:
+                await self.push(sid, event, payload, stream)
+
+    async def push(self, sid, event, payload, stream=None):
+        if self._enqueue(sid, event, payload, stream):
+            await self._flush(sid)
+        else:
+            await self.socketio.emit(event, payload, to=sid)
+
+    async def _flush(self, sid):
+        while True:
+            item = self._next(sid)
+            if item is None:
+                return
+            event, payload, callback = item
+            await self.socketio.emit(event, payload, to=sid, callback=callback)
+            if self.listener is not None:
+                self.listener.on_sent(sid)
+
+    def _make_ack(self, sid, sent_at):
+        async def on_ack(*args):
+            if self._acked(sid, sent_at):
+                await self._flush(sid)
+        return on_ack
+
+    async def _pump(self):
+        while True:
+            await self.socketio.sleep(self.pump_interval)
+            for sid in self._waiting():
+                await self._flush(sid)
@@ -1,15 +1,22 @@
-import uuid
-from flask import Flask, request, jsonify
-from flask_socketio import SocketIO, emit, join_room, leave_room
+import logging
+from flask import Flask, Response, request, jsonify
+from flask_socketio import SocketIO
 from flask_cors import CORS
 import config
+from send_queue import SendQueues
+from control_batch import ControlBatcher
+from directory import MeetingDirectory
+from metrics import Metrics
+from pipelines import Host, Pipelines
+from recorder import Recorder
+from relay_core import EVENTS, RECORDING_EVENTS, RelayCore, Transport
+import transcode
+import bus
 # from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 # from cryptography.hazmat.backends import default_backend
 # from cryptography.hazmat.primitives import padding
 # from cryptography.hazmat.primitives import hashes
 # from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-import os
-import base64
 
 # def encrypt(encryptor, data):
 #     padded_data = padder.update(data) + padder.finalize()
@@ -26,40 +33,123 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
 CORS(app, resources={r"/*": {"origins": "*"}})
 
-socketio = SocketIO(app, cors_allowed_origins="*")
-
-# 用于存储会议数据
-# meetings = {
-#   meeting_id: {
-#     'creator_sid': 'sid1',
-#     'clients': {sid1: 'userNameA', sid2: 'userNameB', ...},
-#     'frames': {
-#         'userNameA': 'base64...',
-#         'userNameB': '...'
-#     }
-#   },
-#   ...
-# }
-meetings = {}
-
-# API 端点：列出所有会议
+log = logging.getLogger('relay')
+
+# 所有事件和路由的调用次数、字节数、耗时，见 /metrics
+metrics = Metrics()
+metrics.install_flask(app)
+
+# 多进程部署时，房间消息经由消息总线在 worker 之间扇出；单进程时 client_manager 为 None
+bus_store = bus.make_store(config.BUS_URL)
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode=config.ASYNC_MODE,
+    client_manager=bus.make_client_manager(config.BUS_URL, bus_store)
+)
+
+# 每个接收者的媒体帧发送队列（只用于视频/桌面帧，可丢弃）
+send_queues = SendQueues(
+    socketio,
+    max_size=config.FRAME_QUEUE_SIZE,
+    window=config.FRAME_SEND_WINDOW,
+    pump_interval=config.FRAME_PUMP_INTERVAL,
+    ack_timeout=config.FRAME_ACK_TIMEOUT
+)
+
+# 系统消息、聊天、成员变化等控制消息按会议合并发送（只对声明了 'batch' 能力的客户端）
+control_batcher = ControlBatcher(
+    socketio,
+    interval=config.CONTROL_BATCH_INTERVAL,
+    max_items=config.CONTROL_BATCH_MAX_ITEMS
+)
+
+# 只发一层的发布者：在进程池中为想要更低层的接收者转码，未配置或没有 Pillow 时为 None
+transcoder = None
+if config.TRANSCODE_WORKERS > 0:
+    if transcode.available():
+        transcoder = transcode.Transcoder(workers=config.TRANSCODE_WORKERS,
+                                          queue_limit=config.TRANSCODE_QUEUE_LIMIT)
+    else:
+        log.warning('TRANSCODE_WORKERS is set but Pillow is not installed, transcoding disabled')
+
+# 会议录制：由创建者开启，转发路径只把帧放进有界队列，由后台线程写入分段文件（见 recorder.py）
+recorder = Recorder(
+    config.RECORD_DIR,
+    segment_seconds=config.RECORD_SEGMENT_SECONDS,
+    queue_size=config.RECORD_QUEUE_SIZE
+)
+
+# 多进程部署时各 worker 共享的会议目录，单进程时为 None
+directory = None
+if not config.BUS_URL.startswith('memory://'):
+    directory = MeetingDirectory(bus_store, config.WORKER_ID, config.WORKER_URL)
+
+# 会议表、限流、转发策略和各事件的处理在 relay_core.py 中，与 server_asgi.py 共用；
+# 这里只注册事件，并用 transport 执行处理结果
+core = RelayCore(metrics, send_queues, control_batcher,
+                 directory=directory, transcoder=transcoder, recorder=recorder)
+transport = Transport(socketio, send_queues, control_batcher)
+
+# 同一个连接上的其他媒体流水线（音频混音、P2P 信令），共用会议表和控制消息的合并发送；
+# 信令只对加入时声明了 'p2p' 能力的客户端生效，其他客户端的视频照常经服务器转发
+pipelines = Pipelines(
+    Host(app, socketio, batcher=control_batcher, members=core.members, get_mode=core.meeting_mode,
+         recorder=recorder),
+    config.PIPELINES,
+    signaling={'opt_in': True}
+)
+core.pipelines = pipelines
+pipelines.start()
+
+
+def _watch_directory():
+    """后台任务：其他 worker 上的成员变化时，更新本地副本"""
+    for meeting_id in directory.changes():
+        transport.deliver(core.directory_changed(meeting_id))
+
+
+if directory is not None:
+    socketio.start_background_task(_watch_directory)
+
+# 每个测量周期调整各接收者的转发帧率，并给发送者下发 set_capture_rate 建议
+transport.every(config.RATE_UPDATE_INTERVAL, core.adapt_rates)
+if transcoder is not None:
+    # 收取完成的转码任务，发给仍在会议中的接收者
+    transport.every(config.FRAME_PUMP_INTERVAL, core.transcoded)
+
+
 @app.route('/list_meetings', methods=['GET'])
 def list_meetings():
     """
-    获取当前所有会议的列表，包括会议号和创建者用户名。
+    获取会议列表，包括会议号、创建者用户名和模式。
+    GET /list_meetings?limit=50&cursor=<上一页的 next_cursor>&creator=<用户名>&mode=cs|p2p
+    不带 limit 时返回全部会议；返回 { meetings, next_cursor, total }，带 ETag，
+    列表没有变化时对 If-None-Match 返回 304
+    """
+    status, body, etag = core.list_meetings(request.args)
+    if status != 200:
+        return jsonify(body), status
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+
+@app.route('/queue_stats', methods=['GET'])
+def queue_stats():
+    """
+    每个接收者的媒体帧发送队列状态：队列深度、在途帧数、已发送和已丢弃帧数；
+    以及录制队列的深度、已写入和丢弃的记录数
+    """
+    return jsonify(core.queue_stats()), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_text():
+    """
+    Prometheus 文本格式的指标
     """
-    meeting_list = []
-    for meeting_id, meeting_data in meetings.items():
-        creator_sid = meeting_data.get('creator_sid')
-        if creator_sid and creator_sid in meeting_data['clients']:
-            creator = meeting_data['clients'][creator_sid]
-        else:
-            creator = 'Unknown'  # 如果没有创建者信息
-        meeting_list.append({
-            'meeting_id': meeting_id,
-            'creator': creator
-        })
-    return jsonify({'meetings': meeting_list}), 200
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/create_meeting', methods=['POST'])
@@ -67,42 +157,8 @@ def create_meeting():
     """
     后端自动生成一个不重复的随机会议号，然后初始化会议数据并返回给前端
     """
-    key = os.urandom(32)
-    iv = os.urandom(16)
-    # print(type(key))
-    print('generate:',key,',',iv)
-    while True:
-        # 使用 UUID 生成随机会议号，这里只取前 8 位即可
-        meeting_id = str(uuid.uuid4())[:8]
-        if meeting_id in meetings:
-            continue
-        
-        # cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
-        # 初始化会议数据
-        
-        meetings[meeting_id] = {
-            'creator_sid': None,  # To be set when the first user joins
-            'clients': {},  # {sid: username}
-            'frames': {},  
-            'deskframe': {}, # desktop frame {username: deskframe},
-            'key': base64.b64encode(key).decode('utf-8'),
-            'iv': base64.b64encode(iv).decode('utf-8'),
-            'mode': 'cs'
-            # 'encryptor': cipher.encryptor(),
-            # 'decryptor': cipher.decryptor()
-        }
-
-        print("meetings are: ", meetings)
-
-        break
-
-    print('meeting create',meeting_id)
-    print(meetings)
-
-    return jsonify({
-        'message': f'Meeting {meeting_id} created successfully',
-        'meeting_id': meeting_id
-    }), 200
+    status, body, headers = core.create_meeting(request.remote_addr)
+    return jsonify(body), status, headers
 
 
 @app.route('/check_meeting', methods=['GET'])
@@ -110,447 +166,68 @@ def check_meeting():
     """
     前端在“加入会议”前，先来这里验证会议是否存在
     GET /check_meeting?meeting_id=xxxx
-    返回 { exist: True } 或 { exist: False }
+    返回 { exist: True, worker: url } 或 { exist: False }
+    worker 是会议所绑定的 worker 地址，客户端连接到它可以让会议留在同一个进程内
     """
-    meeting_id = request.args.get('meeting_id')
-    if meeting_id in meetings:
-        return jsonify({'exist': True})
-    return jsonify({'exist': False})
+    return jsonify(core.check_meeting(request.args.get('meeting_id')))
 
 
 @socketio.on('join_meeting')
+@metrics.instrument('join_meeting')
 def join_meeting(data):
-    meeting_id = data.get('meeting_id')
-    user = data.get('user')
-
-
-    print("In join_meeting, meeting_id is: ", meeting_id)
-    if not meeting_id or meeting_id not in meetings:
-        print("In join_meeting, 会议不存在")
-        emit('error', {'message': '会议不存在'}, to=request.sid)
-        return
-
-    if not user:
-        emit('error', {'message': '需要用户名才能加入会议'}, to=request.sid)
-        return
-
-    # 检查用户名是否已被占用
-    if user in meetings[meeting_id]['clients'].values():
-        emit('error', {'message': '用户名在此会议中已被占用'}, to=request.sid)
-        return
-
-    # 如果会议没有创建者，则将当前用户设置为创建者
-    is_creator = False
-    if meetings[meeting_id]['creator_sid'] is None:
-        meetings[meeting_id]['creator_sid'] = request.sid
-        is_creator = True
-
-    # 将用户添加到会议
-    meetings[meeting_id]['clients'][request.sid] = user
-    join_room(meeting_id)
-
-    print(f"用户 {user} 加入了会议 {meeting_id}")
-
-    # 通知房间内的其他用户
-    emit(
-        'system_message',
-        {'message': f'{user} 加入了会议', 'timestamp': request.sid},
-        room=meeting_id,
-        include_self=False
-    )
-
-    emit(
-        'set_key_and_iv',
-        {'key': meetings[meeting_id]['key'],
-         'iv': meetings[meeting_id]['iv']},
-         to=request.sid
-    )
-    # 发送当前所有的视频帧给新加入的用户
-    emit(
-        'all_current_frames',
-        {'frames': meetings[meeting_id]['frames']},
-        to=request.sid
-    )
-
-    # 通知用户是否为创建者
-    emit(
-        'joined_meeting',
-        {'is_creator': is_creator},
-        to=request.sid
-    )
-    # 检查当前会议人数，决定是否切换模式
-    current_count = len(meetings[meeting_id]['clients'])
-    previous_mode = meetings[meeting_id]['mode']
-
-    if current_count == 3 and previous_mode == 'p2p':
-        print('Switching to cs mode...')
-        meetings[meeting_id]['mode'] = 'cs'
-        emit('switch_to_cs', {'message': '参与人数超过2人，切换到CS模式'}, room=meeting_id)
-    elif current_count == 2 and previous_mode == 'cs':
-        print('Switching to p2p mode...')
-        meetings[meeting_id]['mode'] = 'p2p'
-        emit('switch_to_p2p', {'message': '参与人数为2人或更少，可以使用P2P模式'}, room=meeting_id)
-
-@socketio.on('leave_meeting')
-def leave_meeting(data):
-    meeting_id = data.get('meeting_id')
-    user = data.get('user')
-
-    if not meeting_id or meeting_id not in meetings:
-        emit('error', {'message': '会议不存在'}, to=request.sid)
-        return
-
-    if not user:
-        emit('error', {'message': '需要用户名才能离开会议'}, to=request.sid)
-        return
-
-    # 检查用户是否在会议中
-    if request.sid in meetings[meeting_id]['clients']:
-        # 移除用户
-        del meetings[meeting_id]['clients'][request.sid]
-        leave_room(meeting_id)
-        print(f"用户 {user} 离开了会议 {meeting_id}")
-
-        # 检查当前会议人数，决定是否切换模式
-        current_count = len(meetings[meeting_id]['clients'])
-        previous_mode = meetings[meeting_id]['mode']
-
-        if current_count == 2 and previous_mode == 'cs':
-            meetings[meeting_id]['mode'] = 'p2p'
-            emit('switch_to_p2p', {'message': '参与人数为2人，可以切换到P2P模式'}, room=meeting_id)
-        elif current_count == 1 and previous_mode == 'p2p':
-            meetings[meeting_id]['mode'] = 'cs'
-            emit('switch_to_cs', {'message': '参与人数为1人，可以使用cs模式'}, room=meeting_id)
-
-        # 移除用户的视频帧
-        if user in meetings[meeting_id]['frames']:
-            del meetings[meeting_id]['frames'][user]
-            emit(
-                'remove_frame',
-                {'user': user},
-                room=meeting_id,
-                include_self=False
-            )
-
-        # 移除用户的桌面帧
-        if user in meetings[meeting_id]['deskframe']:
-            del meetings[meeting_id]['deskframe'][user]
-            emit(
-                'remove_deskframe',
-                {'user': user},
-                room=meeting_id,
-                include_self=False
-            )
-
-        # 发送系统消息
-        emit(
-            'system_message',
-            {'message': f'{user} 离开了会议', 'timestamp': request.sid},
-            room=meeting_id,
-            include_self=False
-        )
-
-        # 如果用户是创建者，重新分配创建者或删除会议
-        if meetings[meeting_id].get('creator_sid') == request.sid:
-            if meetings[meeting_id]['clients']:
-                # 指定新的创建者
-                new_creator_sid = next(iter(meetings[meeting_id]['clients']))
-                new_creator = meetings[meeting_id]['clients'][new_creator_sid]
-                meetings[meeting_id]['creator_sid'] = new_creator_sid
-                emit(
-                    'system_message',
-                    {'message': f'{new_creator} 成为了新的会议创建者', 'timestamp': new_creator_sid},
-                    room=meeting_id
-                )
-            else:
-                # 没有其他用户，删除会议
-                del meetings[meeting_id]
-                print(f"会议 {meeting_id} 因为没有活跃用户而被删除。")
-        else:
-            # 如果会议中没有用户，删除会议
-            if not meetings[meeting_id]['clients']:
-                del meetings[meeting_id]
-                print(f"会议 {meeting_id} 因为没有活跃用户而被删除。")
-    else:
-        emit('error', {'message': '用户不在此会议中'}, to=request.sid)
-
-
-@socketio.on('video_frame')
-def handle_video_frame(data):
-    meeting_id = data.get('meeting_id')
-    frame = data.get('frame')
-    user = data.get('user')
-
-    if not meeting_id or meeting_id not in meetings:
-        emit('error', {'message': '会议不存在'}, to=request.sid)
+    # 同一会议的加入请求按固定速率放行，突发的请求在这里排队等待
+    outbox, wait = core.admit(request.sid, data, request.remote_addr)
+    transport.deliver(outbox)
+    if wait is None:
         return
-    if not user:
-        emit('error', {'message': '视频帧中未指定用户'}, to=request.sid)
-        return
-
-    # 确保用户名与 SID 匹配
-    if meetings[meeting_id]['clients'].get(request.sid) != user:
-        emit('error', {'message': '用户名不匹配'}, to=request.sid)
-        return
-
-    # 保存或更新用户的视频帧
-    meetings[meeting_id]['frames'][user] = frame
-
-    # 广播给房间内的其他用户
-    emit(
-        'receive_frame',
-        {'user': user, 'frame': frame},
-        room=meeting_id,
-        include_self=False
-    )
+    if wait > 0:
+        socketio.sleep(wait)
+        if not transport.is_connected(request.sid):
+            # 排队期间已经断开
+            return
+    transport.deliver(core.join(request.sid, data))
 
 
-@socketio.on('stop_video')
-def handle_stop_video(data):
-    meeting_id = data.get('meeting_id')
-    user = data.get('user')
+def _register(event):
+    handler = getattr(core, event)
 
-    if not meeting_id or meeting_id not in meetings:
-        emit('error', {'message': '会议不存在'}, to=request.sid)
-        return
-    if not user:
-        emit('error', {'message': '未指定要停止视频的用户'}, to=request.sid)
-        return
-
-    # 确保用户名与 SID 匹配
-    if meetings[meeting_id]['clients'].get(request.sid) != user:
-        emit('error', {'message': '用户名不匹配'}, to=request.sid)
-        return
-
-    # 从视频帧中移除用户
-    if user in meetings[meeting_id]['frames']:
-        del meetings[meeting_id]['frames'][user]
-        print(f"用户 {user} 在会议 {meeting_id} 中停止了视频")
-
-        # 通知房间内的其他用户移除视频帧
-        emit(
-            'remove_frame',
-            {'user': user},
-            room=meeting_id,
-            include_self=False
-        )
-    else:
-        emit('error', {'message': '未找到用户的视频帧'}, to=request.sid)
-
-@socketio.on('desktop_frame')
-def handle_desktop_frame(data):
-    print("receive frame")
-    meeting_id = data.get('meeting_id')
-    deskframe = data.get('frame')
-    user = data.get('user')
-
-    if not meeting_id or meeting_id not in meetings:
-        emit('error', {'message': '会议不存在'}, to=request.sid)
-        return
-    if not user:
-        emit('error', {'message': '视频帧中未指定用户'}, to=request.sid)
-        return
-
-    # 确保用户名与 SID 匹配
-    if meetings[meeting_id]['clients'].get(request.sid) != user:
-        emit('error', {'message': '用户名不匹配'}, to=request.sid)
-        return
-
-    # 保存或更新用户的视频帧
-    if user in meetings[meeting_id]['deskframe'] or len(meetings[meeting_id]['deskframe']) == 0:
-        meetings[meeting_id]['deskframe'][user] = deskframe
-
-        # 广播给房间内的其他用户
-        emit(
-            'receive_desktop_frame',
-            {'user': user, 'frame': deskframe},
-            room=meeting_id,
-            include_self=False
-        )
-    else:
-        emit(
-            'refuse_desktop_frame',
-            to=request.sid
-        )
-        emit('error', {'message': '需要等到共享桌面者结束共享'}, to=request.sid)
-        
-
-@socketio.on('stop_desktop')
-def handle_stop_desktop(data):
-    meeting_id = data.get('meeting_id')
-    user = data.get('user')
-
-    if not meeting_id or meeting_id not in meetings:
-        emit('error', {'message': '会议不存在'}, to=request.sid)
-        return
-    if not user:
-        emit('error', {'message': '未指定要停止视频的用户'}, to=request.sid)
-        return
-
-    # 确保用户名与 SID 匹配
-    if meetings[meeting_id]['clients'].get(request.sid) != user:
-        emit('error', {'message': '用户名不匹配'}, to=request.sid)
-        return
-
-    # 如果是这个用户，则移除用户
-    if user in meetings[meeting_id]['deskframe']:
-        del meetings[meeting_id]['deskframe'][user]
-        print(f"用户 {user} 在会议 {meeting_id} 中停止了桌面分享")
-
-        # 通知房间内的其他用户移除视频帧
-        emit(
-            'remove_desktop',
-            {'user': user},
-            room=meeting_id,
-            include_self=False
-        )
-    else:
-        emit('error', {'message': '需要等到共享桌面者结束共享'}, to=request.sid)
-
-@socketio.on('send_comment')
-def handle_send_comment(data):
-    meeting_id = data.get('meeting_id')
-    user = data.get('user')
-    message = data.get('message')
-    timestamp = data.get('timestamp')
-
-    if not meeting_id or meeting_id not in meetings:
-        emit('error', {'message': '会议不存在'}, to=request.sid)
-        return
-    print(user)
-    print(message)
-    if not user or not message:
-        emit('error', {'message': '评论需要用户名和内容'}, to=request.sid)
-        return
-
-    # 确保用户名与 SID 匹配
-    if meetings[meeting_id]['clients'].get(request.sid) != user:
-        emit('error', {'message': '用户名不匹配'}, to=request.sid)
-        return
-
-    # 广播评论给房间内的其他用户
-    emit(
-        'receive_comment',
-        {
-            'user': user,
-            'message': message,
-            'timestamp': timestamp or int(uuid.uuid4().int / 1e18)  # 使用唯一标识符作为时间戳
-        },
-        room=meeting_id,
-        include_self=False
-    )
-
-    print(f"用户 {user} 在会议 {meeting_id} 中发送了评论: {message}")
-
-
-@socketio.on('send_system_message')
-def handle_send_system_message(data):
-    meeting_id = data.get('meeting_id')
-    message = data.get('message')
-    timestamp = data.get('timestamp')
-
-    if not meeting_id or meeting_id not in meetings:
-        emit('error', {'message': '会议不存在'}, to=request.sid)
-        return
-    if not message:
-        emit('error', {'message': '系统消息内容为空'}, to=request.sid)
-        return
-
-    # 广播系统消息给房间内的所有用户（包括发送者）
-    emit(
-        'system_message',
-        {
-            'message': message,
-            'timestamp': timestamp or int(uuid.uuid4().int / 1e18)
-        },
-        room=meeting_id
-    )
-
-    print(f"会议 {meeting_id} 的系统消息: {message}")
-
-
-@socketio.on('cancel_meeting')
-def cancel_meeting(data):
-    # print(123)
-    meeting_id = data.get('meeting_id')
-    user = data.get('user')
-
-    if not meeting_id or meeting_id not in meetings:
-        emit('error', {'message': '会议不存在'}, to=request.sid)
-        return
-
-    if not user:
-        emit('error', {'message': '需要用户名才能取消会议'}, to=request.sid)
-        return
-
-    # 检查请求者是否为会议创建者
-    if meetings[meeting_id].get('creator_sid') != request.sid:
-        emit('error', {'message': '只有会议的创建者可以取消会议'}, to=request.sid)
-        return
+    @metrics.instrument(event)
+    def on_event(data):
+        transport.deliver(handler(request.sid, data))
 
-    # 通知房间内所有用户会议已被取消
-    emit(
-        'meeting_canceled',
-        {'message': '会议已被创建者取消。'},
-        room=meeting_id
-    )
+    socketio.on_event(event, on_event)
 
-    # 清理会议数据
-    del meetings[meeting_id]
 
-    print(f"会议 {meeting_id} 已被创建者取消。")
+# video、desktop 流水线的事件只在 config.PIPELINES 中启用时注册
+for _event, _pipeline in EVENTS.items():
+    if _pipeline is None or _pipeline in pipelines:
+        _register(_event)
+for _event in RECORDING_EVENTS:
+    _register(_event)
 
 
 @socketio.on('connect')
-def on_connect():
-    print('A user connected')
+@metrics.instrument('connect')
+def on_connect(auth=None):
+    # 音频流水线在连接参数中协商编解码器：auth = {'codecs': ['opus', 'pcmu']}
+    pipelines.connected(request.sid, auth)
+    log.debug('client %s connected', request.sid)
 
 
 @socketio.on('disconnect')
+@metrics.instrument('disconnect')
 def on_disconnect():
-    print('A user disconnected')
-    # 从所有会议中移除该用户
-    for meeting_id in list(meetings.keys()):
-        if request.sid in meetings[meeting_id]['clients']:
-            user = meetings[meeting_id]['clients'][request.sid]
-            del meetings[meeting_id]['clients'][request.sid]
-            leave_room(meeting_id)
-            print(f"User {user} disconnected and left meeting {meeting_id}")
-
-            # 从 frames 中移除该用户的帧
-            if user in meetings[meeting_id]['frames']:
-                del meetings[meeting_id]['frames'][user]
-                # 广播给同会议的其他客户端，让他们移除画面
-                emit(
-                    'remove_frame',
-                    {'user': user},
-                    room=meeting_id,
-                    include_self=False
-                )
-            # 移除屏幕共享
-            if user in meetings[meeting_id]['deskframe']:
-                del meetings[meeting_id]['deskframe'][user]
-                # 广播给同会议的其他客户端，让他们移除画面
-                emit(
-                    'remove_desktop',
-                    {'user': user},
-                    room=meeting_id,
-                    include_self=False
-                )
-
-            # 发送系统消息：用户离开
-            emit(
-                'system_message',
-                {'message': f'{user} 离开了会议', 'timestamp': request.sid},
-                room=meeting_id,
-                include_self=False
-            )
-
-            # 如果这个会议里没人了，就删除会议
-            if not meetings[meeting_id]['clients']:
-                del meetings[meeting_id]
-                print(f"Meeting {meeting_id} has been deleted due to no active clients.")
+    log.debug('client %s disconnected', request.sid)
+    transport.deliver(core.disconnect(request.sid))
 
 
 if __name__ == '__main__':
-    socketio.run(app, host=config.HOST, port=config.PORT, debug=True)
+    logging.basicConfig(level=config.LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    try:
+        socketio.run(app, host=config.HOST, port=config.PORT, debug=config.DEBUG, allow_unsafe_werkzeug=True)
+    finally:
+        pipelines.close()
+        recorder.close()
+        if transcoder is not None:
+            # 取消排队的转码任务并结束进程池中的子进程
+            transcoder.close()
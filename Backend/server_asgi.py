@@ -0,0 +1,233 @@
+# server2.py 的 ASGI 版本：同一套 Socket.IO 事件和 REST 接口，运行在 python-socketio 的 AsyncServer 上。
+# 每个连接是事件循环里的一个协程而不是一个线程，单进程可以承载数千个 websocket 客户端。
+#   pip install uvicorn
+#   python server_asgi.py                                  # 监听 config.HOST:PORT
+#   uvicorn server_asgi:app --host 0.0.0.0 --port 5000     # 或者直接用 uvicorn 启动
+# 事件处理和 server2.py 共用 relay_core.py，这里只注册事件并用 AsyncTransport 执行处理结果：
+# 每个接收者的有界发送队列（AsyncSendQueues）、控制消息合并发送、按接收者调整帧率、
+# last-N / simulcast 选择、桌面增量帧合成、缓存画面、媒体密钥轮换、创建/加入限流。
+# 会议录制与 server2.py 相同（写入在 recorder 自己的线程中进行，不会阻塞事件循环），
+# 但没有 audio 流水线，只录制视频和桌面。
+# 只支持单进程：多 worker 的消息总线和共享目录、JPEG 转码、audio/signaling 流水线
+# （基于 Flask-SocketIO 的线程模型）仍然只在 server2.py 中可用。
+import json
+import logging
+import time
+from urllib.parse import parse_qs
+
+import socketio
+
+import config
+from control_batch import AsyncControlBatcher
+from metrics import Metrics
+from recorder import Recorder
+from relay_core import EVENTS, RECORDING_EVENTS, AsyncTransport, RelayCore
+from send_queue import AsyncSendQueues
+
+log = logging.getLogger('relay')
+
+metrics = Metrics()
+
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+
+send_queues = AsyncSendQueues(
+    sio,
+    max_size=config.FRAME_QUEUE_SIZE,
+    window=config.FRAME_SEND_WINDOW,
+    pump_interval=config.FRAME_PUMP_INTERVAL,
+    ack_timeout=config.FRAME_ACK_TIMEOUT
+)
+
+control_batcher = AsyncControlBatcher(
+    sio,
+    interval=config.CONTROL_BATCH_INTERVAL,
+    max_items=config.CONTROL_BATCH_MAX_ITEMS
+)
+
+# 会议录制：由创建者开启，转发路径只把帧放进有界队列（见 recorder.py）
+recorder = Recorder(
+    config.RECORD_DIR,
+    segment_seconds=config.RECORD_SEGMENT_SECONDS,
+    queue_size=config.RECORD_QUEUE_SIZE
+)
+
+core = RelayCore(metrics, send_queues, control_batcher, recorder=recorder)
+transport = AsyncTransport(sio, send_queues, control_batcher)
+
+# sid -> 客户端 IP，用于加入会议的限流（ASGI 的 environ 中没有真实的 REMOTE_ADDR）
+addresses = {}
+
+unsupported = [name for name in config.PIPELINES if name not in ('video', 'desktop')]
+if unsupported:
+    log.warning('pipelines %s are not available in server_asgi.py, use server2.py', ', '.join(unsupported))
+
+
+def _start_background_tasks():
+    transport.every(config.RATE_UPDATE_INTERVAL, core.adapt_rates)
+
+
+def _shutdown():
+    # 写完录制队列中剩下的记录
+    recorder.close()
+
+
+# ---- REST 接口 ----
+# 不依赖 Web 框架的最小 ASGI 应用，Socket.IO 以外的 HTTP 请求都交给它
+
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+    (b'access-control-allow-headers', b'*'),
+]
+
+routes = {}  # 路径 -> (允许的方法, 处理函数)
+
+
+def route(path, methods=('GET',)):
+    def decorator(handler):
+        routes[path] = (methods, handler)
+        return handler
+    return decorator
+
+
+class Request:
+    """REST 处理函数收到的请求：方法、查询参数（每个取第一个值）、请求头（小写）和客户端 IP"""
+
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.args = {k: v[0] for k, v in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+        client = scope.get('client')
+        self.remote_addr = client[0] if client else None
+
+
+def json_response(data, status=200, headers=()):
+    return status, json.dumps(data, ensure_ascii=False).encode('utf-8'), 'application/json', list(headers)
+
+
+async def rest_app(scope, receive, send):
+    if scope['type'] != 'http':
+        return
+    start = time.perf_counter()
+    request = Request(scope)
+    path = scope['path'].rstrip('/') or '/'
+    methods, handler = routes.get(path, ((), None))
+    if handler is None:
+        path = 'unmatched'
+        status, body, content_type, headers = json_response({'message': 'Not Found'}, 404)
+    elif request.method == 'OPTIONS':
+        status, body, content_type, headers = 204, b'', None, []
+    elif request.method not in methods:
+        status, body, content_type, headers = json_response({'message': 'Method Not Allowed'}, 405)
+    else:
+        status, body, content_type, headers = await handler(request)
+
+    headers = [(k.lower().encode('latin-1'), str(v).encode('latin-1')) for k, v in headers] + CORS_HEADERS
+    if content_type is not None:
+        headers.append((b'content-type', content_type.encode('latin-1')))
+    headers.append((b'content-length', str(len(body)).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+    metrics.request_latency.observe(time.perf_counter() - start, path)
+    metrics.requests.inc(path, status)
+
+
+@route('/list_meetings')
+async def list_meetings(request):
+    """
+    GET /list_meetings?limit=50&cursor=<上一页的 next_cursor>&creator=<用户名>&mode=cs|p2p
+    与 server2.py 相同：返回 { meetings, next_cursor, total }，带 ETag，列表没有变化时对 If-None-Match 返回 304
+    """
+    status, body, etag = core.list_meetings(request.args)
+    if status != 200:
+        return json_response(body, status)
+    quoted = f'"{etag}"'
+    matches = [tag.strip().removeprefix('W/') for tag in request.headers.get('if-none-match', '').split(',')]
+    if quoted in matches or '*' in matches:
+        return 304, b'', None, [('ETag', quoted)]
+    return 200, body, 'application/json', [('ETag', quoted)]
+
+
+@route('/queue_stats')
+async def queue_stats(request):
+    return json_response(core.queue_stats())
+
+
+@route('/metrics')
+async def metrics_text(request):
+    return 200, metrics.render().encode('utf-8'), 'text/plain; version=0.0.4', []
+
+
+@route('/create_meeting', methods=('POST',))
+async def create_meeting(request):
+    """后端自动生成一个不重复的随机会议号，然后初始化会议数据并返回给前端"""
+    status, body, headers = core.create_meeting(request.remote_addr)
+    return json_response(body, status, headers.items())
+
+
+@route('/check_meeting')
+async def check_meeting(request):
+    """GET /check_meeting?meeting_id=xxxx，返回 { exist: True, worker: url } 或 { exist: False }"""
+    return json_response(core.check_meeting(request.args.get('meeting_id')))
+
+
+# ---- Socket.IO 事件 ----
+
+@sio.on('connect')
+@metrics.instrument('connect')
+async def on_connect(sid, environ, auth=None):
+    client = environ.get('asgi.scope', {}).get('client')
+    addresses[sid] = client[0] if client else environ.get('REMOTE_ADDR')
+    log.debug('client %s connected', sid)
+
+
+@sio.on('join_meeting')
+@metrics.instrument('join_meeting')
+async def join_meeting(sid, data):
+    # 同一会议的加入请求按固定速率放行，突发的请求排队等待（只挂起这个协程）
+    outbox, wait = core.admit(sid, data, addresses.get(sid))
+    await transport.deliver(outbox)
+    if wait is None:
+        return
+    if wait > 0:
+        await sio.sleep(wait)
+        if not transport.is_connected(sid):
+            return
+    await transport.deliver(core.join(sid, data))
+
+
+@sio.on('disconnect')
+@metrics.instrument('disconnect')
+async def on_disconnect(sid, reason=None):
+    addresses.pop(sid, None)
+    await transport.deliver(core.disconnect(sid))
+
+
+def _register(event):
+    handler = getattr(core, event)
+
+    @metrics.instrument(event)
+    async def on_event(sid, data):
+        await transport.deliver(handler(sid, data))
+
+    sio.on(event, on_event)
+
+
+# video、desktop 事件只在 config.PIPELINES 中启用时注册
+for _event, _pipeline in EVENTS.items():
+    if _pipeline is None or _pipeline in config.PIPELINES:
+        _register(_event)
+for _event in RECORDING_EVENTS:
+    _register(_event)
+
+
+app = socketio.ASGIApp(sio, other_asgi_app=rest_app, on_startup=_start_background_tasks, on_shutdown=_shutdown)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=config.LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit('server_asgi.py 需要 uvicorn：pip install uvicorn')
+    uvicorn.run(app, host=config.HOST, port=config.PORT, log_level=config.LOG_LEVEL.lower())
@@ -1,7 +1,12 @@
+import logging
 import uuid
 from flask import Flask, request, jsonify
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_cors import CORS
+import config
+from pipelines import Host, Pipelines
+
+log = logging.getLogger('signaling')
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
@@ -14,6 +19,7 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 #   meeting_id: {
 #     'creator_sid': 'sid1',
 #     'clients': {sid1: 'userNameA', sid2: 'userNameB', ...},
+#     'names': {'userNameA': sid1, ...},   # clients 的反向索引
 #     'frames': {
 #         'userNameA': 'base64...',
 #         'userNameB': '...'
@@ -22,6 +28,24 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 #   ...
 # }
 meetings = {}
+# sid -> 该用户所在的会议号集合，断开连接时不用遍历所有会议
+member_of = {}
+
+
+def _members(meeting_id):
+    meeting = meetings.get(meeting_id)
+    return meeting['clients'] if meeting is not None else None
+
+
+def _set_mode(meeting_id, mode):
+    if meeting_id in meetings:
+        meetings[meeting_id]['mode'] = mode
+
+
+# 信令服务器只启用 signaling 流水线（拓扑选择和 P2P 信令，见 pipelines/signaling.py）
+pipelines = Pipelines(Host(app, socketio, members=_members, set_mode=_set_mode), ('signaling',))
+pipelines.start()
+
 
 @app.route('/create_meeting', methods=['POST'])
 def create_meeting():
@@ -31,6 +55,7 @@ def create_meeting():
             meetings[meeting_id] = {
                 'creator_sid': None,
                 'clients': {},
+                'names': {},
                 'frames': {},
                 'mode': 'cs'  # 初始模式为 P2P
             }
@@ -58,7 +83,7 @@ def join_meeting(data):
         emit('error', {'message': '需要用户名才能加入会议'}, to=request.sid)
         return
 
-    if userName in meetings[meeting_id]['clients'].values():
+    if userName in meetings[meeting_id]['names']:
         emit('error', {'message': '用户名在此会议中已被占用'}, to=request.sid)
         return
 
@@ -68,23 +93,15 @@ def join_meeting(data):
         is_creator = True
 
     meetings[meeting_id]['clients'][request.sid] = userName
+    meetings[meeting_id]['names'][userName] = request.sid
+    member_of.setdefault(request.sid, set()).add(meeting_id)
     join_room(meeting_id)
 
     emit('system_message', {'message': f'{userName} 加入了会议'}, room=meeting_id, include_self=False)
     emit('joined_meeting', {'is_creator': is_creator}, to=request.sid)
 
-    # 检查当前会议人数，决定是否切换模式
-    current_count = len(meetings[meeting_id]['clients'])
-    previous_mode = meetings[meeting_id]['mode']
-
-    if current_count == 3 and previous_mode == 'p2p':
-        print('Switching to cs mode...')
-        meetings[meeting_id]['mode'] = 'cs'
-        emit('switch_to_cs', {'message': '参与人数超过2人，切换到CS模式'}, room=meeting_id)
-    elif current_count == 2 and previous_mode == 'cs':
-        print('Switching to p2p mode...')
-        meetings[meeting_id]['mode'] = 'p2p'
-        emit('switch_to_p2p', {'message': '参与人数为2人或更少，可以使用P2P模式'}, room=meeting_id)
+    # 按人数（和已上报的带宽）重新选择拓扑
+    pipelines.joined(meeting_id, request.sid, userName, data.get('capabilities') or [])
 
 @socketio.on('leave_meeting')
 def leave_meeting(data):
@@ -100,21 +117,14 @@ def leave_meeting(data):
         return
 
     if request.sid in meetings[meeting_id]['clients']:
-        del meetings[meeting_id]['clients'][request.sid]
+        meetings[meeting_id]['names'].pop(meetings[meeting_id]['clients'].pop(request.sid), None)
+        member_of.get(request.sid, set()).discard(meeting_id)
         leave_room(meeting_id)
 
         emit('system_message', {'message': f'{userName} 离开了会议'}, room=meeting_id, include_self=False)
 
-        # 检查当前会议人数，决定是否切换模式
-        current_count = len(meetings[meeting_id]['clients'])
-        previous_mode = meetings[meeting_id]['mode']
-
-        if current_count == 2 and previous_mode == 'cs':
-            meetings[meeting_id]['mode'] = 'p2p'
-            emit('switch_to_p2p', {'message': '参与人数为2人，可以切换到P2P模式'}, room=meeting_id)
-        elif current_count == 1 and previous_mode == 'p2p':
-            meetings[meeting_id]['mode'] = 'cs'
-            emit('switch_to_cs', {'message': '参与人数为1人，可以使用cs模式'}, room=meeting_id)
+        # 按剩下的人重新选择拓扑
+        pipelines.left(meeting_id, request.sid, userName)
 
         # 处理创建者变更或会议删除
         if meetings[meeting_id].get('creator_sid') == request.sid:
@@ -131,56 +141,6 @@ def leave_meeting(data):
     else:
         emit('error', {'message': '用户不在此会议中'}, to=request.sid)
 
-@socketio.on('get_current_participants_p2p')
-def get_current_participants_p2p(data):
-    print('get_current_participants_p2p', data)
-    meeting_id = data.get('meeting_id')
-
-    # 检查会议是否存在
-    if not meeting_id or meeting_id not in meetings:
-        emit('error', {'message': '会议不存在'}, to=request.sid)
-        return
-
-    # 检查会议模式是否为 P2P
-    if meetings[meeting_id]['mode'] != 'p2p':
-        emit('error', {'message': '当前会议不处于P2P模式'}, to=request.sid)
-        return
-
-    # 获取当前会议的参与者列表
-    participants = list(meetings[meeting_id]['clients'])
-    print('Participants: ', participants)
-
-    emit('current_participants_p2p', {'participants': participants}, to=request.sid)
-
-@socketio.on('signal')
-def handle_signal(data):
-    meeting_id = data.get('meeting_id')
-    target_sid = data.get('target_sid')  # 目标用户的 SID
-    signal_data = data.get('signal')  # SDP 或 ICE
-    print(f'meeting_id: {meeting_id}, target_sid: {target_sid}')
-    print(meetings[meeting_id])
-
-    if not meeting_id or meeting_id not in meetings:
-        emit('error', {'message': '会议不存在'}, to=request.sid)
-        return
-
-    if target_sid not in meetings[meeting_id]['clients']:
-        emit('error', {'message': '目标用户不在会议中'}, to=request.sid)
-        return
-
-    # 仅在 P2P 模式下转发信令
-    if meetings[meeting_id]['mode'] != 'p2p':
-        emit('error', {'message': '当前会议不处于P2P模式，不处理信令'}, to=request.sid)
-        return
-
-    print('emiting signal: ', request.sid, signal_data)
-    # 转发信令数据给目标用户
-    emit('signal', {
-        'from_sid': request.sid,
-        'userName': meetings[meeting_id]['clients'].get(request.sid),
-        'signal': signal_data,
-    }, to=target_sid)
-
 @socketio.on('video_frame')
 def handle_video_frame(data):
     meeting_id = data.get('meeting_id')
@@ -194,53 +154,47 @@ def handle_video_frame(data):
         emit('error', {'message': '视频帧中未指定用户'}, to=request.sid)
         return
 
-    # 检查会议当前模式是否为 'cs'
-    if meetings[meeting_id].get('mode') != 'cs':
-        emit('error', {'message': '当前会议不处于CS模式，不处理视频帧'}, to=request.sid)
-        return
-
     # 确保用户名与 SID 匹配
     if meetings[meeting_id]['clients'].get(request.sid) != userName:
         emit('error', {'message': '用户名不匹配'}, to=request.sid)
         return
 
+    # 只转给收不到该用户 P2P 画面的人：经服务器发送的用户转给所有人，
+    # 已切到 P2P 的用户只在过渡期间转给还没建好连接的人
+    receivers = pipelines.relay_receivers(
+        meeting_id, request.sid, [sid for sid in meetings[meeting_id]['clients'] if sid != request.sid])
+    if not receivers:
+        return
+
     # 保存或更新用户的视频帧
     meetings[meeting_id]['frames'][userName] = frame
 
-    # 广播视频帧给房间内的其他用户
     emit(
         'receive_frame',
         {'user': userName, 'frame': frame},
-        room=meeting_id,
-        include_self=False
+        to=receivers
     )
 
 @socketio.on('connect')
 def on_connect():
-    print('A user connected')
+    log.debug('user %s connected', request.sid)
 
 @socketio.on('disconnect')
 def on_disconnect():
-    print('A user disconnected')
-    # 从所有会议中移除该用户
-    for meeting_id in list(meetings.keys()):
-        if request.sid in meetings[meeting_id]['clients']:
+    log.debug('user %s disconnected', request.sid)
+    pipelines.disconnected(request.sid)
+    # 从该用户所在的所有会议中移除
+    for meeting_id in member_of.pop(request.sid, ()):
+        if meeting_id in meetings and request.sid in meetings[meeting_id]['clients']:
             userName = meetings[meeting_id]['clients'].get(request.sid)
             del meetings[meeting_id]['clients'][request.sid]
+            meetings[meeting_id]['names'].pop(userName, None)
             leave_room(meeting_id)
 
             emit('system_message', {'message': f'{userName} 离开了会议'}, room=meeting_id, include_self=False)
 
-            # 检查当前会议人数，决定是否切换模式
-            current_count = len(meetings[meeting_id]['clients'])
-            previous_mode = meetings[meeting_id]['mode']
-
-            if current_count == 2 and previous_mode == 'cs':
-                meetings[meeting_id]['mode'] = 'p2p'
-                emit('switch_to_p2p', {'message': '参与人数为2人，可以切换到P2P模式'}, room=meeting_id)
-            elif current_count <= 2 and previous_mode == 'cs':
-                meetings[meeting_id]['mode'] = 'p2p'
-                emit('switch_to_p2p', {'message': '参与人数为2人或更少，可以使用P2P模式'}, room=meeting_id)
+            # 按剩下的人重新选择拓扑（只剩 1 人时回到 cs，而不是切到 p2p）
+            pipelines.left(meeting_id, request.sid, userName)
 
             # 处理创建者变更或会议删除
             if meetings[meeting_id].get('creator_sid') == request.sid:
@@ -256,4 +210,5 @@ def on_disconnect():
                     del meetings[meeting_id]
 
 if __name__ == '__main__':
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+    logging.basicConfig(level=config.LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    socketio.run(app, host='0.0.0.0', port=config.PORT, debug=config.DEBUG, allow_unsafe_werkzeug=True)
@@ -0,0 +1,145 @@
+import base64
+import binascii
+import io
+import threading
+from collections import OrderedDict
+
+import media_packet
+
+try:
+    from PIL import Image
+except ImportError:  # 没有 Pillow 时不生成缩略图
+    Image = None
+
+# 每个会议里每个用户最近一帧的缓存，供新加入的用户获取当前画面。
+# 统一保存原始字节：
+#   - 旧客户端的字符串帧（base64 密文或 data URL）解码成字节保存，发送时再编码回字符串
+#   - 二进制媒体包原样保存
+# 每个会议有内存预算，超出时按最久未更新淘汰。
+
+KIND_TEXT = 0     # 字符串帧，data 为 base64 解码后的字节，prefix 为 data URL 前缀（可为空）
+KIND_PACKET = 1   # 二进制媒体包
+
+
+class Snapshot:
+    __slots__ = ('kind', 'prefix', 'data', 'thumbnail')
+
+    def __init__(self, kind, data, prefix=''):
+        self.kind = kind
+        self.prefix = prefix
+        self.data = data
+        self.thumbnail = None  # 懒生成的缩略图包，帧更新时失效
+
+    def size(self):
+        # 缩略图很小且可以随时丢弃，不计入预算
+        return len(self.data) + len(self.prefix or '')
+
+
+def _encode_text(frame):
+    """把字符串帧压缩成 (prefix, 原始字节)；不是 base64 时按 UTF-8 原样保存"""
+    prefix, _, body = frame.rpartition(',') if frame.startswith('data:') else ('', '', frame)
+    if prefix:
+        prefix += ','
+    try:
+        data = base64.b64decode(body, validate=True)
+    except (binascii.Error, ValueError):
+        return None, frame.encode('utf-8')
+    # 只有能原样还原时才按 base64 保存
+    if base64.b64encode(data).decode('ascii') != body:
+        return None, frame.encode('utf-8')
+    return prefix, data
+
+
+class SnapshotCache:
+
+    def __init__(self, budget, thumbnail_size=(160, 120)):
+        self.budget = budget
+        self.thumbnail_size = thumbnail_size
+        self._items = OrderedDict()  # userName -> Snapshot
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, user):
+        return user in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    def put_text(self, user, frame):
+        if not isinstance(frame, str):
+            raise TypeError(f'文本帧必须是 str，收到 {type(frame).__name__}')
+        # 非 base64 字符串的 prefix 为 None，表示 data 是原样保存的 UTF-8
+        prefix, data = _encode_text(frame)
+        self._put(user, Snapshot(KIND_TEXT, data, prefix=prefix))
+
+    def put_packet(self, user, packet):
+        self._put(user, Snapshot(KIND_PACKET, bytes(packet)))
+
+    def _put(self, user, snapshot):
+        with self._lock:
+            old = self._items.pop(user, None)
+            if old is not None:
+                self._bytes -= old.size()
+            self._items[user] = snapshot
+            self._bytes += snapshot.size()
+            # 超出预算时淘汰最久未更新的帧（至少保留刚写入的这一帧）
+            while self._bytes > self.budget and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= evicted.size()
+
+    def remove(self, user):
+        with self._lock:
+            old = self._items.pop(user, None)
+            if old is None:
+                return False
+            self._bytes -= old.size()
+            return True
+
+    def snapshots(self, thumbnails=False):
+        """
+        返回 [(event, payload), ...]，逐个发送给新加入的用户。
+        thumbnails=True 时，未加密的二进制帧换成缩略图（需要 Pillow）
+        """
+        with self._lock:
+            items = list(self._items.items())
+        result = []
+        for user, snapshot in items:
+            if snapshot.kind == KIND_PACKET:
+                packet = snapshot.data
+                if thumbnails:
+                    packet = self._thumbnail(snapshot) or packet
+                result.append(('receive_frame_bin', packet))
+            elif snapshot.prefix is None:
+                result.append(('receive_frame', {'user': user, 'frame': snapshot.data.decode('utf-8')}))
+            else:
+                frame = snapshot.prefix + base64.b64encode(snapshot.data).decode('ascii')
+                result.append(('receive_frame', {'user': user, 'frame': frame}))
+        return result
+
+    def _thumbnail(self, snapshot):
+        if snapshot.thumbnail is not None:
+            return snapshot.thumbnail
+        if Image is None:
+            return None
+        try:
+            header = media_packet.unpack_header(snapshot.data)
+        except media_packet.PacketError:
+            return None
+        if header['flags'] & media_packet.FLAG_ENCRYPTED:
+            # 密文无法缩放，只能发原帧
+            return None
+        try:
+            image = Image.open(io.BytesIO(media_packet.payload_of(snapshot.data, header)))
+            image.thumbnail(self.thumbnail_size)
+            out = io.BytesIO()
+            image.convert('RGB').save(out, format='JPEG', quality=70)
+        except (OSError, ValueError):
+            return None
+        snapshot.thumbnail = media_packet.pack(
+            header['kind'], header['meeting_id'], header['user'], header['seq'],
+            header['timestamp'], out.getvalue(), flags=header['flags'])
+        return snapshot.thumbnail
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 后端模块都在 Backend/ 下平铺，按顶层模块导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,75 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import audio_codec  # noqa: E402
+from audio_codec import ALawCodec, MuLawCodec, PcmCodec, negotiate, resample  # noqa: E402
+
+
+def _pcm(samples):
+    return np.asarray(samples, dtype=audio_codec.PCM_DTYPE).tobytes()
+
+
+def _samples(data):
+    return np.frombuffer(data, dtype=audio_codec.PCM_DTYPE).astype(np.int32)
+
+
+def test_known_g711_code_words():
+    # 静音在 μ-law 中是 0xFF，在 A-law 中是 0xD5
+    assert MuLawCodec(pcm_rate=8000).encode(_pcm([0])) == b'\xff'
+    assert ALawCodec(pcm_rate=8000).encode(_pcm([0])) == b'\xd5'
+
+
+@pytest.mark.parametrize('codec_class', [MuLawCodec, ALawCodec])
+def test_g711_round_trip_within_quantization_error(codec_class):
+    codec = codec_class(pcm_rate=8000)
+    values = np.array([-32000, -8000, -1000, -100, 0, 100, 1000, 8000, 32000])
+    encoded = codec.encode(_pcm(values))
+    assert len(encoded) == len(values)
+    decoded = _samples(codec.decode(encoded))
+    # 8 位压扩：误差随幅度增长，相对误差不超过约 1/16
+    assert np.all(np.abs(decoded - values) <= np.maximum(np.abs(values) / 16, 16))
+    # A-law 没有 0 码字，静音解码为 ±8；只比较非零样本的符号
+    nonzero = values != 0
+    assert np.all(np.sign(decoded[nonzero]) == np.sign(values[nonzero]))
+
+
+def test_g711_resamples_to_8khz():
+    codec = MuLawCodec(pcm_rate=44100)
+    tone = 8000 * np.sin(2 * np.pi * 440 * np.arange(4410) / 44100)
+    encoded = codec.encode(_pcm(tone))
+    assert len(encoded) == 800
+    decoded = _samples(codec.decode(encoded))
+    assert len(decoded) == 4410
+    # 440 Hz 在 8 kHz 下完整保留，能量接近原始信号
+    assert abs(np.std(decoded) - np.std(tone)) < 0.1 * np.std(tone)
+
+
+def test_resample_keeps_length_ratio():
+    samples = np.arange(441, dtype=np.float64)
+    assert len(resample(samples, 44100, 48000)) == 480
+    assert np.array_equal(resample(samples, 44100, 44100), samples)
+    assert len(resample([], 44100, 8000)) == 0
+
+
+def test_pcm_is_passed_through():
+    codec = PcmCodec()
+    assert codec.encode(b'\x01\x02') == b'\x01\x02'
+    assert codec.decode(bytearray(b'\x03\x04')) == b'\x03\x04'
+
+
+def test_negotiate_follows_client_preference():
+    assert negotiate(['opus', 'pcmu'], supported=['pcmu', 'pcma']) == 'pcmu'
+    assert negotiate(['unknown']) == 'pcm'
+    assert negotiate(None) == 'pcm'
+
+
+def test_opus_frames_round_trip():
+    if 'opus' not in audio_codec.CODECS:
+        pytest.skip('opuslib is not installed')
+    codec = audio_codec.make_codec('opus', pcm_rate=48000)
+    tone = 8000 * np.sin(2 * np.pi * 440 * np.arange(1500) / 48000)
+    # 1500 个样本只够一帧（960），剩下的留到下一次
+    encoded = codec.encode(_pcm(tone))
+    assert len(codec._pending) == 540
+    assert len(_samples(codec.decode(encoded))) == 960
@@ -0,0 +1,97 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from audio_mixer import DEFAULT_ROOM, AudioMixer  # noqa: E402
+from jitter_buffer import JitterBuffer  # noqa: E402
+
+
+def _pcm(*samples):
+    return np.array(samples, dtype='<i2').tobytes()
+
+
+def _samples(pcm):
+    return np.frombuffer(pcm, dtype='<i2').tolist()
+
+
+def _mixer(**kwargs):
+    # 每个 tick 4 个样本，便于直接比较
+    return AudioMixer(sample_rate=200, tick_ms=20, **kwargs)
+
+
+def test_each_member_gets_everyone_but_themselves():
+    mixer = _mixer()
+    for sid in ('a', 'b', 'c'):
+        mixer.join(sid, 'm1')
+    mixer.push('a', _pcm(1, 1, 1, 1))
+    mixer.push('b', _pcm(10, 10, 10, 10))
+    (room, full, outputs), = mixer.tick()
+    assert room == 'm1' and _samples(full) == [11] * 4
+    assert {sid: _samples(pcm) for sid, pcm in outputs} == {'a': [10] * 4, 'b': [1] * 4, 'c': [11] * 4}
+
+
+def test_lone_talker_gets_no_output():
+    mixer = _mixer()
+    mixer.join('a', 'm1')
+    mixer.join('b', 'm1')
+    mixer.push('a', _pcm(5, 5, 5, 5))
+    (_, _, outputs), = mixer.tick()
+    assert [sid for sid, _ in outputs] == ['b']
+    # 没有人说话的 tick 不产生结果
+    assert mixer.tick() == []
+
+
+def test_rooms_are_mixed_separately():
+    mixer = _mixer()
+    mixer.join('a', 'm1')
+    mixer.join('b', 'm2')
+    mixer.push('a', _pcm(1, 1, 1, 1))
+    mixer.push('b', _pcm(2, 2, 2, 2))
+    # 没有加入会议就发送音频的客户端在默认房间
+    mixer.push('legacy', _pcm(3, 3, 3, 3))
+    mixes = {room: _samples(full) for room, full, _ in mixer.tick()}
+    assert mixes == {'m1': [1] * 4, 'm2': [2] * 4, DEFAULT_ROOM: [3] * 4}
+
+
+def test_short_input_is_padded_and_sum_is_clipped():
+    mixer = _mixer()
+    mixer.join('a', 'm1')
+    mixer.join('b', 'm1')
+    mixer.push('a', _pcm(30000, 30000))
+    mixer.push('b', _pcm(30000, -30000, 5, 5, 7))
+    (_, full, _), = mixer.tick()
+    assert _samples(full) == [32767, 0, 5, 5]
+    # 超出一个 tick 的数据留到下一个 tick
+    (_, full, _), = mixer.tick()
+    assert _samples(full) == [7, 0, 0, 0]
+
+
+def test_backlog_is_trimmed_to_whole_samples():
+    mixer = _mixer(max_buffer_ms=20)
+    mixer.join('a', 'm1')
+    mixer.join('b', 'm1')
+    mixer.push('a', _pcm(1, 2, 3, 4, 5, 6))
+    (_, full, _), = mixer.tick()
+    assert _samples(full) == [3, 4, 5, 6]
+
+
+def test_leave_removes_member_and_empty_room():
+    mixer = _mixer()
+    mixer.join('a', 'm1')
+    mixer.join('a', 'm2')
+    mixer.leave('a')
+    assert mixer._rooms == {}
+    mixer.push('b', _pcm(1, 1, 1, 1))
+    assert [room for room, _, _ in mixer.tick()] == [DEFAULT_ROOM]
+
+
+def test_sequenced_packets_are_mixed_in_seq_order():
+    mixer = _mixer(jitter_buffer=lambda: JitterBuffer(target_delay_ms=0, min_delay_ms=0, max_delay_ms=200))
+    mixer.join('a', 'm1')
+    mixer.join('b', 'm1')
+    assert mixer.push_packet('a', 1, 0, _pcm(3, 4))
+    assert mixer.push_packet('a', 0, 0, _pcm(1, 2))
+    assert not mixer.push_packet('a', 0, 0, _pcm(1, 2))
+    (_, full, _), = mixer.tick()
+    assert _samples(full) == [1, 2, 3, 4]
+    assert mixer.jitter_stats()['a']['duplicate'] == 1
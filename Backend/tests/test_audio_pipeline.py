@@ -0,0 +1,98 @@
+import flask
+import pytest
+
+pytest.importorskip('numpy')
+
+import media_packet  # noqa: E402
+from audio_mixer import DEFAULT_ROOM  # noqa: E402
+from pipelines import Host, audio  # noqa: E402
+from pipelines.audio import AudioPipeline  # noqa: E402
+
+
+class FakeSocketIO:
+
+    def __init__(self):
+        self.sent = []
+
+    def emit(self, event, data, to=None):
+        for sid in [to] if isinstance(to, str) else to:
+            self.sent.append((sid, event, data))
+
+    def start_background_task(self, target, *args):
+        pass
+
+
+def _pipeline(members=None):
+    sio = FakeSocketIO()
+    host = Host(None, sio, members=lambda meeting_id: (members or {}).get(meeting_id))
+    pipeline = AudioPipeline(host, mode='broadcast')
+    return pipeline, sio
+
+
+def _receivers(sio, event='audio-stream'):
+    return sorted(sid for sid, e, _ in sio.sent if e == event)
+
+
+def test_audio_is_relayed_only_within_the_room():
+    pipeline, sio = _pipeline()
+    for sid in ('sa', 'sb', 'sc', 'sd'):
+        pipeline.on_connect(sid, None)
+    pipeline.on_join('m1', 'sa', 'a', ())
+    pipeline.on_join('m1', 'sb', 'b', ())
+    pipeline.on_join('m2', 'sc', 'c', ())
+    pipeline.relay_audio('sa', b'\x00\x01')
+    assert _receivers(sio) == ['sb']
+    sio.sent.clear()
+    # 没有加入会议的客户端在默认房间里
+    pipeline.relay_audio('sd', b'\x00\x01')
+    assert sio.sent == []
+
+
+def test_room_index_follows_leave_and_disconnect():
+    pipeline, sio = _pipeline()
+    for sid in ('sa', 'sb', 'sc'):
+        pipeline.on_connect(sid, None)
+        pipeline.on_join('m1', sid, sid[1], ())
+    pipeline.on_leave('m1', 'sb', 'b')
+    pipeline.on_disconnect('sc')
+    assert pipeline.room_sids == {'m1': frozenset({'sa'}), DEFAULT_ROOM: frozenset({'sb'})}
+    pipeline.relay_audio('sa', b'\x00\x01')
+    assert sio.sent == []
+    pipeline.on_disconnect('sa')
+    pipeline.on_disconnect('sb')
+    assert pipeline.room_sids == {} and pipeline.rooms == {}
+
+
+def _header(meeting_id, user):
+    return media_packet.unpack_header(media_packet.pack(media_packet.KIND_AUDIO, meeting_id, user, 0, 0, b''))
+
+
+def test_audio_packet_sender_must_match_membership():
+    pipeline, _ = _pipeline({'m1': {'sa': 'a', 'sb': 'b'}})
+    pipeline.on_connect('sa', None)
+    pipeline.on_connect('sx', None)
+    pipeline.on_join('m1', 'sa', 'a', ())
+    assert pipeline.check_sender('sa', _header('m1', 'a'))
+    # 冒充同一会议里的其他人、或者声称在自己没有加入的会议里
+    assert not pipeline.check_sender('sa', _header('m1', 'b'))
+    assert not pipeline.check_sender('sa', _header('m2', 'a'))
+    assert not pipeline.check_sender('sx', _header('m1', 'x'))
+    # 默认房间只能发空会议号的包，没有成员表可核对用户名
+    assert pipeline.check_sender('sx', _header('', 'x'))
+
+
+def test_rejected_audio_packet_is_not_relayed(monkeypatch):
+    pipeline, sio = _pipeline({'m1': {'sa': 'a', 'sb': 'b'}})
+    for sid, user in (('sa', 'a'), ('sb', 'b')):
+        pipeline.on_connect(sid, None)
+        pipeline.on_join('m1', sid, user, ())
+    errors = []
+    monkeypatch.setattr(audio, 'emit', lambda event, data, to=None: errors.append((to, data)))
+    app = flask.Flask(__name__)
+    with app.test_request_context():
+        flask.request.sid = 'sa'
+        pipeline.handle_audio_packet(media_packet.pack(media_packet.KIND_AUDIO, 'm1', 'b', 0, 0, b'\x00\x01'))
+        assert sio.sent == [] and errors[0][0] == 'sa'
+        assert 'sa' not in pipeline.sequenced
+        pipeline.handle_audio_packet(media_packet.pack(media_packet.KIND_AUDIO, 'm1', 'a', 0, 0, b'\x00\x01'))
+    assert _receivers(sio) == ['sb']
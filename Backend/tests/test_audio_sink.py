@@ -0,0 +1,123 @@
+import os
+import subprocess
+import sys
+import time
+import wave
+
+import pytest
+
+from audio_sink import BufferedSink, NullSink, PcmRingBuffer, WaveOutput, make_sink
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _played(sink, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while sink.stats()['played'] < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_ring_buffer_returns_slots_in_order():
+    ring = PcmRingBuffer(slots=4, slot_size=4)
+    ring.write(b'abcdefgh')
+    ring.write(b'ij')
+    parts = []
+    for _ in range(3):
+        parts.append(bytes(ring.acquire(timeout=0)))
+        ring.release()
+    assert parts == [b'abcd', b'efgh', b'ij']
+    assert ring.stats()['played'] == 3 and ring.stats()['buffered'] == 0
+
+
+def test_full_ring_drops_oldest_audio():
+    ring = PcmRingBuffer(slots=2, slot_size=2)
+    ring.write(b'aabbcc')
+    assert ring.stats()['overruns'] == 1
+    assert bytes(ring.acquire(timeout=0)) == b'bb'
+
+
+def test_slot_held_by_reader_is_not_overwritten():
+    ring = PcmRingBuffer(slots=2, slot_size=2)
+    ring.write(b'aa')
+    held = ring.acquire(timeout=0)
+    ring.write(b'bbcc')
+    assert bytes(held) == b'aa'
+    ring.release()
+    assert bytes(ring.acquire(timeout=0)) == b'cc'
+
+
+def test_underrun_is_counted_once_per_gap():
+    ring = PcmRingBuffer(slots=2, slot_size=2)
+    assert ring.acquire(timeout=0) is None
+    ring.write(b'aa')
+    ring.acquire(timeout=0)
+    ring.release()
+    assert ring.acquire(timeout=0.01) is None
+    assert ring.acquire(timeout=0.01) is None
+    # 启动时没有数据不算 underrun，之后的一次断流只算一次
+    assert ring.stats()['underruns'] == 1
+
+
+def test_buffered_sink_plays_to_wave_file(tmp_path):
+    path = str(tmp_path / 'out.wav')
+    sink = make_sink(f'wav:{path}', sample_rate=8000, chunk=4)
+    assert isinstance(sink, BufferedSink)
+    sink.write(b'\x01\x00' * 10)
+    _played(sink, 3)
+    sink.close()
+    with wave.open(path, 'rb') as f:
+        assert f.readframes(100) == b'\x01\x00' * 10
+
+
+def test_null_sink_by_default():
+    assert isinstance(make_sink('null'), NullSink)
+
+
+def test_output_errors_do_not_stop_playback(tmp_path):
+    class Flaky(WaveOutput):
+        calls = 0
+
+        def write(self, pcm):
+            Flaky.calls += 1
+            if Flaky.calls == 1:
+                raise OSError('device busy')
+            super().write(pcm)
+
+    path = str(tmp_path / 'out.wav')
+    sink = BufferedSink(Flaky(path, sample_rate=8000), slots=4, slot_size=2, poll_interval=0.01)
+    sink.write(b'aabb')
+    _played(sink, 2)
+    sink.close()
+    with wave.open(path, 'rb') as f:
+        assert f.readframes(100) == b'bb'
+
+
+@pytest.mark.parametrize('mode', ['eventlet', 'gevent'])
+def test_playback_runs_on_os_thread_when_patched(tmp_path, mode):
+    pytest.importorskip(mode)
+    script = f'''
+import sys, time
+sys.path.insert(0, {BACKEND!r})
+import async_mode
+async_mode.patch({mode!r})
+import audio_sink
+class SlowOutput:
+    def write(self, pcm):
+        async_mode.original('time', 'sleep')(0.3)  # 播放线程里阻塞，不应卡住协程
+    def close(self):
+        pass
+sink = audio_sink.BufferedSink(SlowOutput(), slots=4, slot_size=2, poll_interval=0.01)
+sink.write(b'aa')
+ticks = 0
+started = time.monotonic()
+while time.monotonic() - started < 0.2:
+    time.sleep(0.01)
+    ticks += 1
+sink.close()
+print(ticks, sink.stats()['played'])
+'''
+    out = subprocess.run([sys.executable, '-W', 'ignore', '-c', script], capture_output=True, text=True,
+                         timeout=30, check=True).stdout.split()
+    ticks, played = int(out[-2]), int(out[-1])
+    assert ticks >= 10 and played == 1
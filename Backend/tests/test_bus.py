@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+
+import pytest
+
+import broker
+from bus import BrokerStore, BusManager, MemoryStore, make_client_manager, make_store
+
+
+def _next_in_thread(messages):
+    """在后台线程里读取订阅生成器，读到的消息放进队列"""
+    received = queue.Queue()
+    threading.Thread(target=lambda: [received.put(m) for m in messages], daemon=True).start()
+    return received
+
+
+def test_hash_operations():
+    store = MemoryStore()
+    store.hset('meetings', 'm1', 'a')
+    assert store.hsetnx('meetings', 'm1', 'b') is False
+    assert store.hsetnx('meetings', 'm2', 'b') is True
+    assert store.hget('meetings', 'm1') == 'a'
+    assert store.hgetall('meetings') == {'m1': 'a', 'm2': 'b'}
+    assert store.hlen('meetings') == 2
+    assert store.hdel('meetings', 'm1') == 1
+    assert store.hdel('meetings', 'm1') == 0
+    assert store.hget('missing', 'm1') is None
+
+
+def test_hgetall_returns_a_copy():
+    store = MemoryStore()
+    store.hset('k', 'f', 1)
+    store.hgetall('k')['f'] = 2
+    assert store.hget('k', 'f') == 1
+
+
+def test_hincrby_and_delete():
+    store = MemoryStore()
+    assert store.hincrby('count', 'm1', 2) == 2
+    assert store.hincrby('count', 'm1', -1) == 1
+    store.delete('count')
+    assert store.hlen('count') == 0
+    # 删除最后一个字段时整个 key 一起删除
+    store.hset('k', 'f', 1)
+    store.hdel('k', 'f')
+    assert 'k' not in store._data
+
+
+def test_publish_reaches_every_subscriber_of_the_channel():
+    store = MemoryStore()
+    first, second, other = (store.subscribe(c) for c in ('room', 'room', 'other'))
+    # 生成器第一次 next 时才登记订阅，等后台线程都登记完再发布
+    received = [_next_in_thread(first), _next_in_thread(second), _next_in_thread(other)]
+    deadline = time.monotonic() + 1
+    while len(store._subscribers.get('room', ())) < 2 or 'other' not in store._subscribers:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    store.publish('room', 'hello')
+    assert received[0].get(timeout=1) == 'hello'
+    assert received[1].get(timeout=1) == 'hello'
+    assert received[2].empty()
+
+
+def test_make_store_selects_backend_by_url():
+    assert isinstance(make_store(None), MemoryStore)
+    assert isinstance(make_store('memory://'), MemoryStore)
+    assert isinstance(make_store('unix:///tmp/x.sock'), BrokerStore)
+    assert make_store('unix:///tmp/x.sock').path == '/tmp/x.sock'
+    with pytest.raises(ValueError):
+        make_store('tcp://localhost')
+
+
+def test_memory_bus_uses_default_client_manager():
+    assert make_client_manager('memory://') is None
+    assert isinstance(make_client_manager('unix:///tmp/x.sock'), BusManager)
+
+
+@pytest.fixture
+def broker_path(tmp_path):
+    path = str(tmp_path / 'bus.sock')
+    server = broker.BrokerServer(path, broker.BrokerHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def test_broker_store_round_trip(broker_path):
+    store = BrokerStore(broker_path)
+    key = f'meetings-{id(store)}'
+    store.hset(key, 'm1', {'creator': 'alice'})
+    assert store.hsetnx(key, 'm1', 'x') is False
+    assert store.hget(key, 'm1') == {'creator': 'alice'}
+    assert store.hincrby(key, 'n', 3) == 3
+    assert store.hlen(key) == 2
+    assert store.hdel(key, 'm1') == 1
+    store.delete(key)
+    assert store.hgetall(key) == {}
+
+
+def test_broker_store_publish_subscribe(broker_path):
+    store = BrokerStore(broker_path)
+    received = _next_in_thread(store.subscribe('room'))
+    # 订阅连接建立是异步的，重复发布直到订阅者收到
+    for _ in range(100):
+        store.publish('room', 'hello')
+        try:
+            assert received.get(timeout=0.05) == 'hello'
+            break
+        except queue.Empty:
+            continue
+    else:
+        pytest.fail('订阅者没有收到消息')
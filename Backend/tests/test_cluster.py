@@ -0,0 +1,32 @@
+import argparse
+import os
+import subprocess
+import sys
+
+from cluster import worker_env
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _args(**overrides):
+    args = dict(bus='unix:///tmp/vc-bus.sock', host='0.0.0.0', public_host=None, base_port=5100)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def test_workers_bind_to_host_and_advertise_public_host():
+    env = worker_env(_args(public_host='10.0.0.5'), 2)
+    assert env['VC_HOST'] == '0.0.0.0' and env['VC_PORT'] == '5102'
+    assert env['VC_WORKER_URL'] == 'http://10.0.0.5:5102'
+    assert env['VC_WORKER_ID'] == '2' and env['VC_BUS_URL'] == 'unix:///tmp/vc-bus.sock'
+
+
+def test_public_host_defaults_to_bind_host():
+    assert worker_env(_args(host='192.168.1.2'), 0)['VC_WORKER_URL'] == 'http://192.168.1.2:5100'
+
+
+def test_config_reads_bind_address_from_worker_env():
+    env = worker_env(_args(), 1)
+    out = subprocess.run([sys.executable, '-c', 'import config; print(config.HOST, config.PORT)'],
+                         cwd=BACKEND, env=env, capture_output=True, text=True, check=True).stdout
+    assert out.split() == ['0.0.0.0', '5101']
@@ -0,0 +1,120 @@
+import asyncio
+
+from control_batch import AsyncControlBatcher, ControlBatcher
+
+
+class FakeSocketIO:
+
+    def __init__(self):
+        self.sent = []
+        self.tasks = []
+
+    def emit(self, event, data, to=None):
+        self.sent.append((event, data, sorted(to)))
+
+    def start_background_task(self, target, *args):
+        self.tasks.append(target)
+
+
+class FakeAsyncSocketIO(FakeSocketIO):
+
+    async def emit(self, event, data, to=None):
+        super().emit(event, data, to)
+
+
+def _batcher(batch=('sa', 'sb'), **kwargs):
+    sio = FakeSocketIO()
+    batcher = ControlBatcher(sio, **kwargs)
+    for sid in batch:
+        batcher.add(sid, batch=True)
+    return batcher, sio
+
+
+def test_legacy_clients_receive_immediately():
+    batcher, sio = _batcher()
+    batcher.emit('m1', 'chat_message', 'hi', ['sa', 'sc'])
+    assert sio.sent == [('chat_message', 'hi', ['sc'])]
+    batcher.flush()
+    assert sio.sent[1] == ('chat_message', 'hi', ['sa'])
+    # 后台任务只启动一次
+    assert len(sio.tasks) == 1
+
+
+def test_messages_with_same_recipients_share_one_batch_frame():
+    batcher, sio = _batcher()
+    batcher.emit('m1', 'system_message', 1, ['sa', 'sb'])
+    batcher.emit('m1', 'chat_message', 2, ['sa', 'sb'])
+    batcher.emit('m1', 'chat_message', 3, ['sb'])
+    batcher.flush()
+    assert sorted(sio.sent, key=lambda frame: frame[2]) == [
+        ('batch', [['system_message', 1], ['chat_message', 2]], ['sa']),
+        ('batch', [['system_message', 1], ['chat_message', 2], ['chat_message', 3]], ['sb']),
+    ]
+    assert batcher.events == 5 and batcher.frames == 2
+
+
+def test_coalesced_event_keeps_latest_per_meeting():
+    batcher, sio = _batcher()
+    batcher.emit('m1', 'active_speakers', 'old', ['sa', 'sb'], coalesce=True)
+    batcher.emit('m2', 'active_speakers', 'other', ['sa'], coalesce=True)
+    batcher.emit('m1', 'active_speakers', 'new', ['sa', 'sb'], coalesce=True)
+    batcher.flush('m1')
+    assert sio.sent == [('active_speakers', 'new', ['sa', 'sb'])]
+    batcher.flush('m2')
+    assert sio.sent[1] == ('active_speakers', 'other', ['sa'])
+
+
+def test_full_meeting_flushes_immediately():
+    batcher, sio = _batcher(max_items=2)
+    batcher.emit('m1', 'chat_message', 1, ['sa'])
+    assert sio.sent == []
+    batcher.emit('m1', 'chat_message', 2, ['sa'])
+    assert sio.sent == [('batch', [['chat_message', 1], ['chat_message', 2]], ['sa'])]
+
+
+def test_async_batcher_flushes_through_async_server():
+    sio = FakeAsyncSocketIO()
+    batcher = AsyncControlBatcher(sio)
+    batcher.add('sa', batch=True)
+
+    async def scenario():
+        await batcher.emit('m1', 'chat_message', 'hi', ['sa', 'sc'])
+        await batcher.flush()
+
+    asyncio.run(scenario())
+    assert sio.sent == [('chat_message', 'hi', ['sc']), ('chat_message', 'hi', ['sa'])]
+
+
+def test_coalescing_only_replaces_recipients_of_the_newer_message():
+    batcher, sio = _batcher(batch=('sa', 'sb', 'sc'))
+    batcher.emit('m1', 'media_key', 'k1', ['sa', 'sb'], coalesce=True)
+    # 只发给 sc 的新密钥不能让 sa、sb 丢掉它们的密钥
+    batcher.emit('m1', 'media_key', 'k2', ['sc'], coalesce=True)
+    batcher.emit('m1', 'media_key', 'k3', ['sb'], coalesce=True)
+    batcher.flush()
+    assert sorted(sio.sent, key=lambda frame: frame[2]) == [
+        ('media_key', 'k1', ['sa']),
+        ('media_key', 'k3', ['sb']),
+        ('media_key', 'k2', ['sc']),
+    ]
+
+
+def test_removed_client_gets_nothing_pending():
+    batcher, sio = _batcher()
+    batcher.emit('m1', 'chat_message', 1, ['sa', 'sb'])
+    batcher.emit('m1', 'chat_message', 2, ['sa'])
+    batcher.remove('sa')
+    batcher.flush()
+    assert sio.sent == [('chat_message', 1, ['sb'])]
+    batcher.remove('sb')
+    assert batcher._pending == {}
+
+
+def test_discarded_meeting_drops_its_pending_messages():
+    batcher, sio = _batcher()
+    batcher.emit('m1', 'chat_message', 1, ['sa'])
+    batcher.emit('m2', 'chat_message', 2, ['sb'])
+    batcher.discard('m1')
+    batcher.discard('m3')
+    batcher.flush()
+    assert sio.sent == [('chat_message', 2, ['sb'])]
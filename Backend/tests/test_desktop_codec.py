@@ -0,0 +1,78 @@
+import pytest
+
+import desktop_codec
+import media_packet
+from desktop_codec import DesktopComposite, pack_delta, pack_keyframe, parse_delta, parse_keyframe
+
+
+def _packet(payload, flags, seq=1):
+    packet = media_packet.pack(media_packet.KIND_DESKTOP, 'm1', 'alice', seq, 1000, payload, flags=flags)
+    return packet, media_packet.unpack_header(packet)
+
+
+def test_keyframe_and_delta_round_trip():
+    assert parse_keyframe(pack_keyframe(640, 480, 64, b'jpeg')) == (640, 480, 64, b'jpeg')
+    width, height, tile_size, tiles = parse_delta(pack_delta(640, 480, 64, [(0, 0, b'a'), (9, 7, b'bc')]))
+    assert (width, height, tile_size) == (640, 480, 64)
+    assert [(c, r, bytes(d)) for c, r, d in tiles] == [(0, 0, b'a'), (9, 7, b'bc')]
+
+
+@pytest.mark.parametrize('width, height, tile_size', [
+    (640, 480, 0),
+    (640, 480, 1),
+    (640, 480, desktop_codec.MAX_TILE_SIZE + 1),
+    (0, 480, 64),
+    (640, 0, 64),
+    (desktop_codec.MAX_SCREEN_SIZE + 1, 480, 64),
+])
+def test_rejects_invalid_screen(width, height, tile_size):
+    with pytest.raises(media_packet.PacketError):
+        parse_keyframe(pack_keyframe(width, height, tile_size, b'jpeg'))
+    with pytest.raises(media_packet.PacketError):
+        parse_delta(pack_delta(width, height, tile_size, []))
+
+
+def test_rejects_tile_outside_screen():
+    with pytest.raises(media_packet.PacketError):
+        parse_delta(pack_delta(640, 480, 64, [(10, 0, b'a')]))
+    with pytest.raises(media_packet.PacketError):
+        parse_delta(pack_delta(640, 480, 64, [(0, 8, b'a')]))
+
+
+def test_rejects_truncated_delta():
+    payload = pack_delta(640, 480, 64, [(0, 0, b'abcd')])
+    with pytest.raises(media_packet.PacketError):
+        parse_delta(payload[:-1])
+
+
+def test_composite_rejects_zero_tile_size_without_state_change():
+    composite = DesktopComposite('m1', 'alice')
+    composite.apply(*_packet(pack_keyframe(640, 480, 64, b'jpeg'), media_packet.FLAG_KEYFRAME))
+    with pytest.raises(media_packet.PacketError):
+        composite.apply(*_packet(pack_keyframe(640, 480, 0, b'jpeg'), media_packet.FLAG_KEYFRAME, seq=2))
+    assert composite.tile_count() == 10 * 8
+    assert not composite.needs_keyframe(0.5)
+
+
+def test_composite_snapshot_merges_delta_tiles():
+    composite = DesktopComposite('m1', 'alice')
+    delta = _packet(pack_delta(640, 480, 64, [(1, 1, b'x')]), media_packet.FLAG_DELTA)
+    assert composite.apply(*delta) is False
+    assert composite.snapshot() == []
+
+    keyframe, _ = _packet(pack_keyframe(640, 480, 64, b'jpeg'), media_packet.FLAG_KEYFRAME)
+    composite.apply(keyframe, media_packet.unpack_header(keyframe))
+    assert composite.apply(*_packet(pack_delta(640, 480, 64, [(1, 1, b'x'), (2, 1, b'y')]),
+                                    media_packet.FLAG_DELTA, seq=3))
+    packets = composite.snapshot()
+    assert packets[0] == keyframe
+    header = media_packet.unpack_header(packets[1])
+    _, _, _, tiles = parse_delta(media_packet.payload_of(packets[1], header))
+    assert sorted((c, r, bytes(d)) for c, r, d in tiles) == [(1, 1, b'x'), (2, 1, b'y')]
+    assert composite.needs_keyframe(0.01) and not composite.needs_keyframe(0.5)
+
+
+def test_encrypted_packets_are_not_composited():
+    composite = DesktopComposite('m1', 'alice')
+    assert composite.apply(*_packet(b'ciphertext', media_packet.FLAG_ENCRYPTED | media_packet.FLAG_KEYFRAME))
+    assert composite.encrypted and composite.snapshot() == []
@@ -0,0 +1,139 @@
+import pytest
+
+import media_packet
+from forwarding import FULL, NONE, THUMBNAIL, ForwardingPolicy
+from registry import Meeting
+
+
+def _meeting(*users):
+    meeting = Meeting('m1')
+    for i, user in enumerate(users):
+        meeting.clients[f's{i}'] = user
+        meeting.users[user] = f's{i}'
+    return meeting
+
+
+def test_speaking_publisher_moves_into_last_n():
+    policy = ForwardingPolicy(last_n=2)
+    meeting = _meeting('a', 'b', 'c', 'd')
+    policy.on_publish(meeting, 'a')
+    policy.on_publish(meeting, 'b')
+    # 新发布者插在排序最前（视为最久没发言），c 发言后挤掉 b
+    assert policy.on_publish(meeting, 'c') is None
+    assert policy.on_audio_level(meeting, 'c', 0.5, now=1.0) == ['c', 'a']
+    assert policy.active_speakers(meeting) == ['c', 'a']
+
+
+def test_quiet_level_is_ignored():
+    policy = ForwardingPolicy(last_n=1)
+    meeting = _meeting('a', 'b')
+    policy.on_publish(meeting, 'a')
+    policy.on_publish(meeting, 'b')
+    assert policy.on_audio_level(meeting, 'b', 0.0, now=1.0) is None
+    assert policy.active_speakers(meeting) == ['a']
+
+
+def test_audio_only_talker_does_not_displace_publishers():
+    policy = ForwardingPolicy(last_n=2)
+    meeting = _meeting('a', 'b', 'talker')
+    policy.on_publish(meeting, 'a')
+    policy.on_publish(meeting, 'b')
+    assert policy.on_audio_level(meeting, 'talker', 0.9, now=1.0) is None
+    assert set(policy.active_speakers(meeting)) == {'a', 'b'}
+    assert 'talker' not in meeting.forwarding.speakers
+
+
+def test_stopped_publisher_leaves_ranking():
+    policy = ForwardingPolicy(last_n=1)
+    meeting = _meeting('a', 'b')
+    policy.on_publish(meeting, 'a')
+    policy.on_publish(meeting, 'b')
+    assert policy.remove_publisher(meeting, 'a') == ['b']
+    # 停止视频后再发言也不会回到 last-N
+    assert policy.on_audio_level(meeting, 'a', 0.9, now=2.0) is None
+    assert policy.active_speakers(meeting) == ['b']
+
+
+def test_tiers_follow_pins_and_subscriptions():
+    policy = ForwardingPolicy(last_n=1, others_fps=1.0)
+    meeting = _meeting('a', 'b', 'c')
+    policy.on_publish(meeting, 'a')
+    policy.on_publish(meeting, 'b')
+    assert policy.tier(meeting, 's2', 'a') == FULL
+    assert policy.tier(meeting, 's2', 'b') == THUMBNAIL
+    policy.pin(meeting, 's2', 'b')
+    assert policy.tier(meeting, 's2', 'b') == FULL
+    policy.unsubscribe(meeting, 's2', 'a')
+    assert policy.tier(meeting, 's2', 'a') == NONE
+
+
+def test_select_throttles_thumbnail_receivers():
+    policy = ForwardingPolicy(last_n=1, others_fps=1.0)
+    meeting = _meeting('a', 'b', 'c', 'd')
+    policy.on_publish(meeting, 'a')
+    policy.on_publish(meeting, 'b')
+    receivers = ['s2', 's3']
+    assert policy.select(meeting, 'b', receivers, now=10.0) == receivers
+    assert policy.select(meeting, 'b', receivers, now=10.5) == []
+    assert policy.select(meeting, 'b', receivers, now=11.0) == receivers
+    assert policy.select(meeting, 'a', receivers, now=11.0) == receivers
+
+
+def test_full_rate_receivers_skip_thumbnail_and_unsubscribed():
+    policy = ForwardingPolicy(last_n=1, others_fps=1.0)
+    meeting = _meeting('a', 'b', 'c', 'd')
+    policy.on_publish(meeting, 'a')
+    policy.on_publish(meeting, 'b')
+    assert policy.full_rate_receivers(meeting, 'a', ['s1', 's2', 's3']) == ['s1', 's2', 's3']
+    assert policy.full_rate_receivers(meeting, 'b', ['s0', 's2', 's3']) == []
+    policy.pin(meeting, 's3', 'b')
+    policy.unsubscribe(meeting, 's2', 'a')
+    assert policy.full_rate_receivers(meeting, 'b', ['s0', 's2', 's3']) == ['s3']
+    assert policy.full_rate_receivers(meeting, 'a', ['s1', 's2', 's3']) == ['s1', 's3']
+    # 小会议里所有人都是全帧率
+    small = _meeting('a', 'b')
+    assert ForwardingPolicy(last_n=1).full_rate_receivers(small, 'a', ['s1']) == ['s1']
+
+
+def test_select_picks_one_simulcast_layer_per_receiver():
+    policy = ForwardingPolicy(last_n=4)
+    meeting = _meeting('a', 'b', 'c')
+    policy.on_publish(meeting, 'a')
+    policy.set_viewport(meeting, 's1', width=120)
+    receivers = ['s1', 's2']
+    policy.select(meeting, 'a', receivers, media_packet.LAYER_THUMBNAIL, now=1.0)
+    assert policy.select(meeting, 'a', receivers, media_packet.LAYER_FULL, now=1.0) == ['s2']
+    assert policy.select(meeting, 'a', receivers, media_packet.LAYER_THUMBNAIL, now=1.0) == ['s1']
+
+
+def test_viewport_width_is_coerced_to_int():
+    policy = ForwardingPolicy()
+    meeting = _meeting('a', 'b')
+    assert policy.set_viewport(meeting, 's1', width=639.5, tiles={'a': 120})
+    assert meeting.forwarding.viewports['s1'] == {None: 639, 'a': 120}
+    assert policy.wanted_layer(meeting, 's1', 'a', FULL) == media_packet.LAYER_THUMBNAIL
+    assert policy.wanted_layer(meeting, 's1', 'b', FULL) == media_packet.LAYER_MEDIUM
+
+
+@pytest.mark.parametrize('width, tiles', [
+    ('640', None),
+    (True, None),
+    (0, None),
+    (-5, None),
+    (float('nan'), None),
+    (10 ** 9, None),
+    (None, {'a': '120'}),
+    (None, {'a': None}),
+    (None, {1: 120}),
+    (None, ['a']),
+])
+def test_invalid_viewport_update_is_ignored(width, tiles):
+    policy = ForwardingPolicy()
+    meeting = _meeting('a', 'b')
+    policy.set_viewport(meeting, 's1', width=320)
+    assert not policy.set_viewport(meeting, 's1', width=width, tiles=tiles)
+    # 原来的设置不变，之后的转发不会出错
+    assert meeting.forwarding.viewports['s1'] == {None: 320}
+    policy.on_publish(meeting, 'a')
+    policy.select(meeting, 'a', ['s1'], media_packet.LAYER_THUMBNAIL, now=1.0)
+    assert policy.select(meeting, 'a', ['s1'], media_packet.LAYER_MEDIUM, now=1.0) == ['s1']
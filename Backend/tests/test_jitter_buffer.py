@@ -0,0 +1,73 @@
+from jitter_buffer import SEQ_MOD, JitterBuffer, SequenceTracker, seq_diff
+
+
+def test_seq_diff_wraps():
+    assert seq_diff(5, 3) == 2
+    assert seq_diff(0, SEQ_MOD - 1) == 1
+    assert seq_diff(SEQ_MOD - 1, 0) == -1
+
+
+def test_reorders_by_seq():
+    buffer = JitterBuffer(target_delay_ms=20, min_delay_ms=20, max_delay_ms=200)
+    for seq in (2, 0, 1):
+        assert buffer.push(seq, seq * 20, f'p{seq}', now_ms=1000)
+    assert buffer.pop_ready(now_ms=975) == []
+    assert buffer.pop_ready(now_ms=1100) == ['p0', 'p1', 'p2']
+
+
+def test_late_and_duplicate_packets_are_dropped():
+    buffer = JitterBuffer(target_delay_ms=20, min_delay_ms=20, max_delay_ms=200)
+    buffer.push(0, 0, 'p0', now_ms=1000)
+    buffer.push(1, 20, 'p1', now_ms=1000)
+    assert not buffer.push(1, 20, 'p1', now_ms=1000)
+    assert buffer.pop_ready(now_ms=1100) == ['p0', 'p1']
+    assert not buffer.push(0, 0, 'p0', now_ms=1100)
+    assert (buffer.duplicate, buffer.late) == (1, 1)
+
+
+def test_gap_is_counted_as_lost():
+    buffer = JitterBuffer(target_delay_ms=20, min_delay_ms=20, max_delay_ms=200)
+    buffer.push(0, 0, 'p0', now_ms=1000)
+    buffer.push(3, 60, 'p3', now_ms=1000)
+    assert buffer.pop_ready(now_ms=1200) == ['p0', 'p3']
+    assert buffer.lost == 2
+
+
+def test_seq_wraparound_keeps_order():
+    buffer = JitterBuffer(target_delay_ms=20, min_delay_ms=20, max_delay_ms=200)
+    buffer.push(SEQ_MOD - 1, 0, 'last', now_ms=1000)
+    buffer.push(0, 20, 'first', now_ms=1000)
+    assert buffer.pop_ready(now_ms=1100) == ['last', 'first']
+
+
+def test_backlog_beyond_max_delay_is_trimmed():
+    buffer = JitterBuffer(target_delay_ms=20, min_delay_ms=20, max_delay_ms=100)
+    for seq in range(10):
+        buffer.push(seq, seq * 20, seq, now_ms=1000)
+    assert buffer.dropped > 0
+    assert len(buffer) * 20 <= 120
+
+
+def test_sequence_tracker_drops_stale_frames():
+    tracker = SequenceTracker()
+    key = ('s1', 0, 2)
+    assert tracker.accept(key, 10)
+    assert not tracker.accept(key, 9)
+    assert not tracker.accept(key, 10)
+    assert tracker.accept(key, 11)
+    # 大幅回退视为发送端重启
+    assert tracker.accept(key, 11 - (1 << 20))
+    assert tracker.discarded == 2
+
+
+def test_sequence_tracker_remove_only_touches_one_sid():
+    tracker = SequenceTracker()
+    for sid in ('s1', 's2'):
+        for layer in range(3):
+            tracker.accept((sid, 0, layer), 5)
+    tracker.remove('s1')
+    tracker.remove('missing')
+    assert tracker.accept(('s1', 0, 0), 1)
+    assert not tracker.accept(('s2', 0, 0), 1)
+    assert set(tracker._keys) == {'s1', 's2'}
+    assert tracker._keys['s1'] == {('s1', 0, 0)}
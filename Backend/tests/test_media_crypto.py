@@ -0,0 +1,89 @@
+import pytest
+
+import media_crypto
+import media_packet
+from media_crypto import CryptoError, MediaKeyring
+
+# 服务器不依赖 cryptography，只有加解密需要
+pytest.importorskip('cryptography')
+
+
+def _keyring():
+    keyring = MediaKeyring()
+    key_id, key = media_crypto.new_session_key()
+    keyring.set_key(key_id, key)
+    return keyring, key_id, key
+
+
+def _salt(packet):
+    payload = media_packet.payload_of(packet)
+    return bytes(payload[media_crypto.KEY_ID.size:media_crypto.KEY_ID.size + media_crypto.SALT_SIZE])
+
+
+def test_round_trip_between_keyrings():
+    sender, key_id, key = _keyring()
+    receiver = MediaKeyring()
+    receiver.set_key(key_id, key)
+    packet = sender.encrypt_packet(media_packet.KIND_VIDEO, 'm1', 'alice', 1, 1000, b'frame')
+    header = media_packet.unpack_header(packet)
+    assert header['flags'] & media_packet.FLAG_ENCRYPTED
+    assert len(packet) == header['payload_offset'] + len(b'frame') + media_crypto.OVERHEAD
+    assert receiver.decrypt_packet(packet) == b'frame'
+
+
+def test_tampered_header_fails():
+    sender, _, _ = _keyring()
+    packet = bytearray(sender.encrypt_packet(media_packet.KIND_VIDEO, 'm1', 'alice', 1, 1000, b'frame'))
+    packet[4] ^= 1  # seq
+    with pytest.raises(CryptoError):
+        sender.decrypt_packet(bytes(packet))
+
+
+def test_unknown_key_fails():
+    sender, _, _ = _keyring()
+    packet = sender.encrypt_packet(media_packet.KIND_VIDEO, 'm1', 'alice', 1, 1000, b'frame')
+    with pytest.raises(CryptoError):
+        MediaKeyring().decrypt_packet(packet)
+
+
+def test_salt_is_kept_while_seq_increases():
+    sender, _, _ = _keyring()
+    first = sender.encrypt_packet(media_packet.KIND_AUDIO, 'm1', 'alice', 1, 0, b'a')
+    second = sender.encrypt_packet(media_packet.KIND_AUDIO, 'm1', 'alice', 2, 0, b'b')
+    assert _salt(first) == _salt(second)
+
+
+def test_seq_restart_under_same_key_uses_new_salt():
+    sender, key_id, key = _keyring()
+    first = sender.encrypt_packet(media_packet.KIND_AUDIO, 'm1', 'alice', 5, 0, b'a')
+    restarted = sender.encrypt_packet(media_packet.KIND_AUDIO, 'm1', 'alice', 0, 0, b'b')
+    repeated = sender.encrypt_packet(media_packet.KIND_AUDIO, 'm1', 'alice', 0, 0, b'c')
+    assert len({_salt(first), _salt(restarted), _salt(repeated)}) == 3
+    # 重连后的新 keyring 从 0 开始，salt 也不同
+    reconnected = MediaKeyring()
+    reconnected.set_key(key_id, key)
+    again = reconnected.encrypt_packet(media_packet.KIND_AUDIO, 'm1', 'alice', 5, 0, b'a')
+    assert _salt(again) != _salt(first)
+    for packet, payload in ((first, b'a'), (restarted, b'b'), (repeated, b'c'), (again, b'a')):
+        assert sender.decrypt_packet(packet) == payload
+
+
+def test_streams_have_independent_salts():
+    sender, _, _ = _keyring()
+    video = sender.encrypt_packet(media_packet.KIND_VIDEO, 'm1', 'alice', 1, 0, b'v')
+    audio = sender.encrypt_packet(media_packet.KIND_AUDIO, 'm1', 'alice', 1, 0, b'a')
+    assert _salt(video) != _salt(audio)
+
+
+@pytest.mark.parametrize('seq', [-1, media_crypto.MAX_SEQ + 1])
+def test_seq_outside_32_bits_is_rejected(seq):
+    sender, _, _ = _keyring()
+    with pytest.raises(CryptoError):
+        sender.encrypt_packet(media_packet.KIND_VIDEO, 'm1', 'alice', seq, 0, b'frame')
+
+
+def test_hkdf_matches_rfc5869_case_1():
+    okm = media_crypto.hkdf_sha256(bytes.fromhex('0b' * 22), bytes.fromhex('f0f1f2f3f4f5f6f7f8f9'), 42,
+                                   salt=bytes.fromhex('000102030405060708090a0b0c'))
+    assert okm.hex() == ('3cb25f25faacd57a90434f64d0362f2a2d2d0a90cf1a5a4c5db02d56ecc4c5bf'
+                         '34007208d5b887185865')
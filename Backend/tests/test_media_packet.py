@@ -0,0 +1,67 @@
+import pytest
+
+import media_packet
+from media_packet import PacketError
+
+
+def test_pack_and_unpack_header_round_trip():
+    packet = media_packet.pack(media_packet.KIND_DESKTOP, 'm1', '张三', 7, 1234567890123, b'\xff\xd8jpeg',
+                               flags=media_packet.FLAG_KEYFRAME)
+    header = media_packet.unpack_header(packet)
+    assert header == {
+        'version': media_packet.VERSION,
+        'kind': media_packet.KIND_DESKTOP,
+        'flags': media_packet.FLAG_KEYFRAME,
+        'seq': 7,
+        'timestamp': 1234567890123,
+        'meeting_id': 'm1',
+        'user': '张三',
+        'payload_offset': media_packet.HEADER_SIZE + len('张三'.encode('utf-8')),
+    }
+    assert bytes(media_packet.payload_of(packet, header)) == b'\xff\xd8jpeg'
+
+
+def test_payload_is_a_view_of_the_packet():
+    packet = bytearray(media_packet.pack(media_packet.KIND_VIDEO, 'm1', 'a', 0, 0, b'abc'))
+    payload = media_packet.payload_of(packet)
+    packet[-1] = ord('z')
+    assert bytes(payload) == b'abz'
+
+
+def test_seq_wraps_to_32_bits():
+    packet = media_packet.pack(media_packet.KIND_VIDEO, 'm1', 'a', 2 ** 32 + 5, 0, b'')
+    assert media_packet.unpack_header(packet)['seq'] == 5
+
+
+@pytest.mark.parametrize('packet, message', [
+    ('text', '媒体包必须是二进制数据'),
+    (b'\x01' * (media_packet.HEADER_SIZE - 1), '媒体包长度不足'),
+])
+def test_malformed_packets_are_rejected(packet, message):
+    with pytest.raises(PacketError, match=message):
+        media_packet.unpack_header(packet)
+
+
+def test_wrong_version_and_truncated_user_are_rejected():
+    packet = media_packet.pack(media_packet.KIND_VIDEO, 'm1', 'alice', 0, 0, b'')
+    with pytest.raises(PacketError, match='版本'):
+        media_packet.unpack_header(b'\x09' + packet[1:])
+    with pytest.raises(PacketError, match='用户名字段不完整'):
+        media_packet.unpack_header(packet[:media_packet.HEADER_SIZE + 2])
+
+
+def test_pack_rejects_oversized_fields():
+    with pytest.raises(PacketError):
+        media_packet.pack(media_packet.KIND_VIDEO, 'm' * 9, 'a', 0, 0, b'')
+    with pytest.raises(PacketError):
+        media_packet.pack(media_packet.KIND_VIDEO, 'm1', 'a' * 256, 0, 0, b'')
+
+
+def test_layer_travels_in_flags():
+    flags = media_packet.FLAG_KEYFRAME | media_packet.layer_flags(media_packet.LAYER_MEDIUM)
+    packet = media_packet.pack(media_packet.KIND_VIDEO, 'm1', 'a', 0, 0, b'', flags=flags)
+    header = media_packet.unpack_header(packet)
+    assert media_packet.layer_of(header['flags']) == media_packet.LAYER_MEDIUM
+    assert header['flags'] & media_packet.FLAG_KEYFRAME
+    # 不分层的旧客户端视为完整层
+    assert media_packet.layer_of(media_packet.FLAG_KEYFRAME) == media_packet.LAYER_FULL
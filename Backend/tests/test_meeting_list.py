@@ -0,0 +1,102 @@
+import json
+
+from meeting_list import MeetingList
+
+MEETINGS = [
+    {'meeting_id': 'c3', 'creator': 'bob', 'mode': 'cs'},
+    {'meeting_id': 'a1', 'creator': 'alice', 'mode': 'cs'},
+    {'meeting_id': 'b2', 'creator': 'alice', 'mode': 'p2p'},
+    {'meeting_id': 'd4', 'creator': 'carol', 'mode': 'cs'},
+]
+
+
+class Loader:
+
+    def __init__(self, meetings):
+        self.meetings = meetings
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return list(self.meetings)
+
+
+def _page(listing, version, load, **params):
+    body, etag = listing.page(version, load, **params)
+    return json.loads(body), etag
+
+
+def test_cursor_pages_through_sorted_meetings():
+    listing = MeetingList()
+    load = Loader(MEETINGS)
+    first, _ = _page(listing, 1, load, limit=2)
+    assert [m['meeting_id'] for m in first['meetings']] == ['a1', 'b2']
+    assert first['next_cursor'] == 'b2' and first['total'] == 4
+    second, _ = _page(listing, 1, load, limit=2, cursor=first['next_cursor'])
+    assert [m['meeting_id'] for m in second['meetings']] == ['c3', 'd4']
+    assert second['next_cursor'] is None
+
+
+def test_no_limit_returns_everything():
+    page, _ = _page(MeetingList(), 1, Loader(MEETINGS))
+    assert len(page['meetings']) == 4 and page['next_cursor'] is None
+
+
+def test_filters_by_creator_and_mode():
+    listing = MeetingList()
+    load = Loader(MEETINGS)
+    page, _ = _page(listing, 1, load, creator='alice')
+    assert [m['meeting_id'] for m in page['meetings']] == ['a1', 'b2']
+    page, _ = _page(listing, 1, load, creator='alice', mode='cs')
+    assert [m['meeting_id'] for m in page['meetings']] == ['a1']
+    assert page['total'] == 1
+
+
+def test_limit_is_clamped():
+    listing = MeetingList(max_limit=3)
+    page, _ = _page(listing, 1, Loader(MEETINGS), limit=100)
+    assert len(page['meetings']) == 3
+    page, _ = _page(listing, 1, Loader(MEETINGS), limit=0)
+    assert len(page['meetings']) == 1
+
+
+def test_reloads_and_changes_etag_only_when_version_changes():
+    listing = MeetingList()
+    load = Loader(MEETINGS)
+    body, etag = listing.page(1, load, limit=2)
+    assert listing.page(1, load, limit=2) == (body, etag)
+    assert load.calls == 1
+    load.meetings = MEETINGS[:2]
+    _, new_etag = listing.page(2, load, limit=2)
+    assert load.calls == 2 and new_etag != etag
+
+
+def test_unversioned_source_is_reloaded_with_content_etag():
+    listing = MeetingList()
+    load = Loader(MEETINGS)
+    _, etag = listing.page(None, load)
+    _, same = listing.page(None, load)
+    load.meetings = MEETINGS[1:]
+    _, changed = listing.page(None, load)
+    assert load.calls == 3
+    assert etag == same and changed != etag
+
+
+def test_etag_identifies_content_across_processes():
+    # 重启后的进程（或另一个 worker）版本号可能相同，但内容不同
+    _, before = MeetingList().page(1, Loader(MEETINGS), limit=2)
+    _, restarted = MeetingList().page(1, Loader(MEETINGS[2:]), limit=2)
+    assert restarted != before
+    # 内容相同时版本号不同也是同一个 ETag，轮询的客户端仍然可以得到 304
+    _, same = MeetingList().page(7, Loader(MEETINGS), limit=2)
+    assert same == before
+
+
+def test_filter_index_is_bounded():
+    listing = MeetingList(index_size=2)
+    load = Loader(MEETINGS)
+    for creator in ('alice', 'bob', 'carol', 'dave'):
+        _page(listing, 1, load, creator=creator)
+    assert list(listing._index) == [('carol', None), ('dave', None)]
+    page, _ = _page(listing, 1, load, creator='alice')
+    assert [m['meeting_id'] for m in page['meetings']] == ['a1', 'b2']
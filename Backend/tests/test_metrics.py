@@ -0,0 +1,123 @@
+import asyncio
+import logging
+
+import pytest
+
+import metrics
+from metrics import Metrics, ThrottledLogger, payload_size
+
+
+def _lines(text, prefix):
+    return [line for line in text.splitlines() if line.startswith(prefix)]
+
+
+def test_counter_renders_escaped_labels():
+    counter = metrics.Counter('relay_test_total', 'Test counter', ('event',))
+    counter.inc('a"b')
+    counter.inc('a"b', amount=2)
+    assert counter.render() == [
+        '# HELP relay_test_total Test counter',
+        '# TYPE relay_test_total counter',
+        'relay_test_total{event="a\\"b"} 3',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram('relay_test_seconds', 'Test histogram', buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value)
+    assert histogram.render()[2:] == [
+        'relay_test_seconds_bucket{le="0.1"} 1',
+        'relay_test_seconds_bucket{le="1"} 3',
+        'relay_test_seconds_bucket{le="+Inf"} 4',
+        'relay_test_seconds_sum 4.05',
+        'relay_test_seconds_count 4',
+    ]
+
+
+def test_gauge_is_collected_at_scrape_time():
+    registry = Metrics()
+    meetings = {}
+    registry.gauge('relay_meetings', 'Meetings', lambda: {(): len(meetings)})
+    meetings['m1'] = object()
+    assert _lines(registry.render(), 'relay_meetings ') == ['relay_meetings 1']
+
+
+def test_instrument_counts_calls_bytes_and_errors():
+    registry = Metrics()
+
+    @registry.instrument('video_frame')
+    def handler(data):
+        if data is None:
+            raise ValueError('bad frame')
+
+    handler({'frame': 'abcd', 'user': 'al'})
+    with pytest.raises(ValueError):
+        handler(None)
+    text = registry.render()
+    assert _lines(text, 'relay_events_total') == ['relay_events_total{event="video_frame"} 2']
+    assert _lines(text, 'relay_event_bytes_total') == ['relay_event_bytes_total{event="video_frame"} 6']
+    assert _lines(text, 'relay_event_errors_total') == ['relay_event_errors_total{event="video_frame"} 1']
+    assert _lines(text, 'relay_event_seconds_count') == ['relay_event_seconds_count{event="video_frame"} 2']
+
+
+
+def test_instrument_wraps_async_handlers():
+    registry = Metrics()
+
+    @registry.instrument('video_frame')
+    async def handler(sid, data):
+        return sid
+
+    # AsyncServer 的处理函数第一个参数是 sid，只统计后面的数据
+    assert asyncio.run(handler('sa', {'frame': 'abcd'})) == 'sa'
+    text = registry.render()
+    assert _lines(text, 'relay_events_total') == ['relay_events_total{event="video_frame"} 1']
+    assert _lines(text, 'relay_event_bytes_total') == ['relay_event_bytes_total{event="video_frame"} 4']
+
+def test_observe_relay_records_fanout_and_bytes():
+    registry = Metrics()
+    registry.observe_relay('receive_frame_bin', b'x' * 10, 3)
+    registry.observe_relay('receive_frame_bin', b'x' * 10, 0)
+    text = registry.render()
+    assert _lines(text, 'relay_relayed_bytes_total') == ['relay_relayed_bytes_total{event="receive_frame_bin"} 30']
+    assert _lines(text, 'relay_fanout_receivers_count') == ['relay_fanout_receivers_count{event="receive_frame_bin"} 2']
+
+
+def test_payload_size_only_counts_top_level_fields():
+    assert payload_size(b'abc') == 3
+    assert payload_size({'frame': 'abcd', 'seq': 1, 'nested': {'frame': 'x'}}) == 4
+    assert payload_size(None) == 0
+
+
+def test_flask_routes_are_recorded():
+    flask = pytest.importorskip('flask')
+    app = flask.Flask(__name__)
+    registry = Metrics()
+    registry.install_flask(app)
+
+    @app.route('/check_meeting')
+    def check_meeting():
+        return 'ok'
+
+    client = app.test_client()
+    client.get('/check_meeting')
+    client.get('/missing')
+    text = registry.render()
+    assert 'relay_http_requests_total{route="/check_meeting",status="200"} 1' in text
+    assert 'relay_http_requests_total{route="unmatched",status="404"} 1' in text
+
+
+def test_throttled_logger_reports_suppressed_messages(monkeypatch, caplog):
+    now = [100.0]
+    monkeypatch.setattr('metrics.time.monotonic', lambda: now[0])
+    throttled = ThrottledLogger(logging.getLogger('test.throttled'), interval=5.0)
+    with caplog.at_level(logging.INFO, logger='test.throttled'):
+        for _ in range(3):
+            throttled.info('late', 'late frame from %s', 'alice')
+        now[0] += 6
+        throttled.info('late', 'late frame from %s', 'alice')
+    assert [r.getMessage() for r in caplog.records] == [
+        'late frame from alice',
+        'late frame from alice (2 similar messages suppressed)',
+    ]
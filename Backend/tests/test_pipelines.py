@@ -0,0 +1,109 @@
+import pytest
+
+import pipelines
+from pipelines import Host, Pipeline, Pipelines
+from pipelines.signaling import SignalingPipeline
+
+
+class FakeSocketIO:
+
+    def __init__(self):
+        self.handlers = {}
+
+    def on(self, event):
+        def register(handler):
+            self.handlers[event] = handler
+            return handler
+        return register
+
+    def emit(self, event, data, to=None, room=None):
+        pass
+
+    def start_background_task(self, target, *args):
+        pass
+
+
+def _recording(name, calls, drop=None):
+    class Recording(Pipeline):
+
+        def __init__(self, host, **options):
+            super().__init__(host)
+            self.name = name
+            self.options = options
+
+        def register(self):
+            calls.append((name, 'register'))
+
+        def on_join(self, meeting_id, sid, user, capabilities):
+            calls.append((name, 'join', sid))
+
+        def on_disconnect(self, sid):
+            calls.append((name, 'disconnect', sid))
+
+        def relay_receivers(self, meeting_id, sender, receivers):
+            return [sid for sid in receivers if sid != drop]
+
+    return Recording
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(pipelines, '_available', lambda: {
+        'first': _recording('first', calls, drop='s1'),
+        'second': _recording('second', calls, drop='s2'),
+    })
+    return calls
+
+
+def test_unknown_pipeline_is_rejected():
+    with pytest.raises(ValueError):
+        Pipelines(Host(None, FakeSocketIO()), ('signaling', 'bogus'))
+
+
+def test_builtin_pipelines_are_enabled_but_not_loaded():
+    enabled = Pipelines(Host(None, FakeSocketIO()), ('video', 'signaling'))
+    assert 'video' in enabled and 'audio' not in enabled
+    assert enabled.get('video') is None
+    assert isinstance(enabled.get('signaling'), SignalingPipeline)
+    assert [pipeline.name for pipeline in enabled.items] == ['signaling']
+
+
+def test_signaling_registers_its_events():
+    sio = FakeSocketIO()
+    Pipelines(Host(None, sio), ('signaling',))
+    assert {'signal', 'signal_batch', 'report_bandwidth', 'topology_ready'} <= set(sio.handlers)
+
+
+def test_hooks_run_in_configured_order(calls):
+    enabled = Pipelines(Host(None, FakeSocketIO()), ('second', 'first'), first={'opt_in': True})
+    assert enabled.get('first').options == {'opt_in': True}
+    enabled.joined('m1', 's1', 'a')
+    enabled.disconnected('s1')
+    assert calls == [('second', 'register'), ('first', 'register'),
+                     ('second', 'join', 's1'), ('first', 'join', 's1'),
+                     ('second', 'disconnect', 's1'), ('first', 'disconnect', 's1')]
+
+
+def test_relay_receivers_are_filtered_by_every_pipeline(calls):
+    enabled = Pipelines(Host(None, FakeSocketIO()), ('first', 'second'))
+    assert enabled.relay_receivers('m1', 's0', ['s1', 's2', 's3']) == ['s3']
+
+
+def test_opt_in_signaling_pairs_legacy_members_only_in_p2p_mode():
+    modes = {'m1': 'cs'}
+    members = {'m1': {'sa': 'a', 'sb': 'b', 'sc': 'c'}}
+    signaling = SignalingPipeline(Host(None, FakeSocketIO(), members=members.get, get_mode=modes.get), opt_in=True)
+    signaling.on_join('m1', 'sc', 'c', ['p2p'])
+    assert signaling.participants('m1') == 1
+    assert signaling._legacy_peers('m1', 'sa', members['m1']) == set()
+    modes['m1'] = 'p2p'
+    # 旧客户端只和同样不参与拓扑的成员互发信令，参与拓扑的成员按方案转发
+    assert signaling._legacy_peers('m1', 'sa', members['m1']) == {'sb'}
+    assert signaling._legacy_peers('m1', 'sc', members['m1']) is None
+
+
+def test_host_defaults():
+    host = Host(None, FakeSocketIO())
+    assert host.members('m1') is None and host.get_mode('m1') is None
+    assert host.batcher is None and host.set_mode is None
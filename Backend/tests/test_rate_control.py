@@ -0,0 +1,80 @@
+from rate_control import RateController
+
+
+def _congest(rc, sid, sent, dropped):
+    for _ in range(sent):
+        rc.on_sent(sid)
+    for _ in range(dropped):
+        rc.on_drop(sid)
+
+
+def test_drops_decrease_fps_multiplicatively():
+    rc = RateController(max_fps=10, min_fps=1, drop_threshold=0.2, decrease=0.5)
+    rc.add('r')
+    _congest(rc, 'r', sent=5, dropped=5)
+    rc.update()
+    assert rc.fps('r') == 5
+    for _ in range(10):
+        _congest(rc, 'r', sent=1, dropped=9)
+        rc.update()
+    assert rc.fps('r') == 1
+
+
+def test_clean_periods_increase_fps_additively():
+    rc = RateController(max_fps=10, min_fps=1, decrease=0.5)
+    rc.add('r')
+    _congest(rc, 'r', sent=0, dropped=4)
+    rc.update()
+    _congest(rc, 'r', sent=4, dropped=0)
+    rc.update()
+    assert rc.fps('r') == 6
+    # 没有发送任何帧的周期不加速
+    rc.update()
+    assert rc.fps('r') == 6
+    for _ in range(10):
+        _congest(rc, 'r', sent=4, dropped=0)
+        rc.update()
+    assert rc.fps('r') == 10
+
+
+def test_high_ack_latency_counts_as_congestion():
+    rc = RateController(max_fps=10, target_latency=0.3, decrease=0.5)
+    rc.add('r')
+    rc.on_sent('r')
+    rc.on_ack('r', 0.5)
+    rc.update()
+    assert rc.fps('r') == 5
+    assert rc.stats()['r'] == {'fps': 5, 'rtt': 0.5}
+
+
+def test_allow_thins_each_stream_to_target_fps():
+    rc = RateController(max_fps=10)
+    rc.add('r')
+    assert rc.allow('r', 'a', now=0.0)
+    assert not rc.allow('r', 'a', now=0.05)
+    assert rc.allow('r', 'b', now=0.05)
+    assert rc.allow('r', 'a', now=0.095)
+    # 未登记的接收者不抽帧
+    assert rc.allow('other', 'a', now=0.0) and rc.allow('other', 'a', now=0.0)
+
+
+def test_capture_fps_follows_slowest_receiver():
+    rc = RateController(max_fps=10, min_fps=2, decrease=0.5)
+    rc.add('slow')
+    rc.add('fast')
+    _congest(rc, 'slow', sent=1, dropped=9)
+    rc.update()
+    assert rc.capture_fps(['fast']) == 10
+    assert rc.capture_fps(['slow', 'fast']) == 5
+    # 没有经服务器转发的接收者时不限制
+    assert rc.capture_fps([]) == 10
+
+
+def test_hint_only_on_significant_change():
+    rc = RateController(hint_hysteresis=0.2)
+    assert rc.should_hint('s', 'video', 100)
+    assert not rc.should_hint('s', 'video', 115)
+    assert rc.should_hint('s', 'video', 130)
+    assert rc.should_hint('s', 'desktop', 500)
+    rc.remove('s')
+    assert rc.should_hint('s', 'video', 130)
@@ -0,0 +1,50 @@
+import pytest
+
+from ratelimit import RateLimiter
+
+
+def test_burst_then_steady_rate():
+    limiter = RateLimiter(rate=2, burst=3)
+    assert [limiter.allow('ip', now=0.0) for _ in range(4)] == [True, True, True, False]
+    assert not limiter.allow('ip', now=0.4)
+    assert limiter.allow('ip', now=0.5)
+    assert limiter.rejected == 2
+
+
+def test_keys_are_independent():
+    limiter = RateLimiter(rate=1, burst=1)
+    assert limiter.allow('a', now=0.0)
+    assert not limiter.allow('a', now=0.0)
+    assert limiter.allow('b', now=0.0)
+
+
+def test_reserve_queues_requests_up_to_max_wait():
+    limiter = RateLimiter(rate=10, burst=1)
+    waits = [limiter.reserve('m', max_wait=0.25, now=0.0) for _ in range(5)]
+    # 第一个立即通过，之后每个多等 0.1 秒，超过 0.25 秒的被拒绝
+    assert waits[:3] == [0.0, pytest.approx(0.1), pytest.approx(0.2)]
+    assert waits[3:] == [None, None]
+
+
+def test_zero_rate_disables_limiting():
+    limiter = RateLimiter(rate=0, burst=0)
+    assert all(limiter.allow('ip', now=0.0) for _ in range(100))
+    assert limiter.retry_after('ip') == 0.0
+
+
+def test_retry_after_reports_time_to_next_token():
+    limiter = RateLimiter(rate=0.5, burst=1)
+    limiter.allow('ip')
+    assert limiter.retry_after('ip') == pytest.approx(2.0, abs=0.1)
+    assert limiter.retry_after('unknown') == 0.0
+
+
+def test_least_recently_used_keys_are_evicted():
+    limiter = RateLimiter(rate=1, burst=1, max_keys=2)
+    limiter.allow('a', now=0.0)
+    limiter.allow('b', now=0.0)
+    limiter.allow('a', now=0.0)  # a 变成最近使用
+    limiter.allow('c', now=0.0)
+    assert list(limiter._buckets) == ['a', 'c']
+    # 被淘汰的 key 重新获得满桶
+    assert limiter.allow('b', now=0.0)
@@ -0,0 +1,134 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import media_packet
+import recorder
+from recorder import FORMAT_PACKET, FORMAT_TEXT, Recorder, read_records
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _segments(directory, meeting_id):
+    path = os.path.join(directory, meeting_id)
+    return sorted(os.path.join(path, name) for name in os.listdir(path))
+
+
+def _wait(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_records_round_trip(tmp_path):
+    rec = Recorder(str(tmp_path))
+    assert rec.start('m1')
+    assert not rec.start('m1')
+    assert rec.write('m1', media_packet.KIND_VIDEO, FORMAT_TEXT, 'alice', 'data:image/jpeg;base64,AAAA')
+    assert rec.write('m1', media_packet.KIND_AUDIO, FORMAT_PACKET, 'bob', b'\x00\x01')
+    assert not rec.write('other', media_packet.KIND_VIDEO, FORMAT_TEXT, 'alice', 'x')
+    assert not rec.write('m1', media_packet.KIND_VIDEO, FORMAT_TEXT, 'alice', None)
+    rec.close()
+
+    (path,) = _segments(str(tmp_path), 'm1')
+    meeting_id, records = read_records(path)
+    records = list(records)
+    assert meeting_id == 'm1'
+    assert [(kind, fmt, user, data) for _, kind, fmt, user, data in records] == [
+        (media_packet.KIND_VIDEO, FORMAT_TEXT, 'alice', b'data:image/jpeg;base64,AAAA'),
+        (media_packet.KIND_AUDIO, FORMAT_PACKET, 'bob', b'\x00\x01'),
+    ]
+    assert rec.stats()['written'] == 2
+
+
+def test_truncated_tail_is_ignored(tmp_path):
+    rec = Recorder(str(tmp_path))
+    rec.start('m1')
+    rec.write('m1', media_packet.KIND_VIDEO, FORMAT_PACKET, 'alice', b'first')
+    rec.write('m1', media_packet.KIND_VIDEO, FORMAT_PACKET, 'alice', b'second')
+    rec.close()
+    (path,) = _segments(str(tmp_path), 'm1')
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 3)
+    assert [r[4] for r in read_records(path)[1]] == [b'first']
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    rec = Recorder(str(tmp_path), queue_size=4)
+    rec._active['m1'] = 1  # 不启动写线程，队列只进不出
+    results = [rec.write('m1', media_packet.KIND_AUDIO, FORMAT_PACKET, 'a', b'x') for _ in range(6)]
+    assert results == [True] * 4 + [False] * 2
+    assert rec.stats()['dropped'] == 2
+
+
+def test_stop_is_handled_before_the_backlog(tmp_path, monkeypatch):
+    write = recorder._Segment.write
+
+    def slow_write(self, *record):
+        time.sleep(0.01)
+        return write(self, *record)
+
+    monkeypatch.setattr(recorder._Segment, 'write', slow_write)
+    rec = Recorder(str(tmp_path), queue_size=1000)
+    rec.start('m1')
+    for _ in range(500):
+        rec.write('m1', media_packet.KIND_AUDIO, FORMAT_PACKET, 'a', b'x')
+    started = time.monotonic()
+    rec.stop('m1')
+    # 积压 500 条、每条 10ms；停止请求应该立即生效，剩下的记录被丢弃
+    _wait(lambda: not rec._records)
+    assert time.monotonic() - started < 1.0
+    assert rec.written < 500 and rec.written + rec.dropped == 500
+
+    # 再次开始录制写入新的分段，旧录制的记录不会混进来
+    rec.start('m1')
+    rec.write('m1', media_packet.KIND_AUDIO, FORMAT_PACKET, 'a', b'new')
+    rec.close()
+    segments = _segments(str(tmp_path), 'm1')
+    assert [r[4] for r in read_records(segments[-1])[1]] == [b'new']
+
+
+def test_segments_rotate(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(recorder.time, 'time', lambda: now[0])
+    rec = Recorder(str(tmp_path), segment_seconds=1)
+    rec.start('m1')
+    rec.write('m1', media_packet.KIND_AUDIO, FORMAT_PACKET, 'a', b'1')
+    now[0] += 2
+    rec.write('m1', media_packet.KIND_AUDIO, FORMAT_PACKET, 'a', b'2')
+    rec.close()
+    assert len(_segments(str(tmp_path), 'm1')) == 2
+
+
+@pytest.mark.parametrize('mode', ['eventlet', 'gevent'])
+def test_writer_runs_on_os_thread_when_patched(tmp_path, mode):
+    pytest.importorskip(mode)
+    script = f'''
+import sys, time
+sys.path.insert(0, {BACKEND!r})
+import async_mode
+async_mode.patch({mode!r})
+import recorder
+ticks = []
+def slow_write(self, *record, _write=recorder._Segment.write):
+    recorder._sleep(0.3)  # 真线程里阻塞，不应卡住协程
+    return _write(self, *record)
+recorder._Segment.write = slow_write
+rec = recorder.Recorder({str(tmp_path)!r})
+rec.start('m1')
+rec.write('m1', 0, recorder.FORMAT_PACKET, 'a', b'x')
+started = time.monotonic()
+while time.monotonic() - started < 0.2:
+    time.sleep(0.01)
+    ticks.append(1)
+rec.close()
+print(len(ticks), rec.written)
+'''
+    out = subprocess.run([sys.executable, '-W', 'ignore', '-c', script], capture_output=True, text=True,
+                         timeout=30, check=True).stdout.split()
+    ticks, written = int(out[-2]), int(out[-1])
+    assert ticks >= 10 and written == 1
@@ -0,0 +1,103 @@
+import threading
+
+import pytest
+
+from registry import MeetingRegistry, RegistryError
+
+
+def _ids(*ids):
+    it = iter(ids)
+    return lambda: next(it)
+
+
+def test_create_retries_duplicate_ids():
+    registry = MeetingRegistry(shards=4)
+    first = registry.create(_ids('m1'))
+    second = registry.create(_ids('m1', 'm2'))
+    assert (first.meeting_id, second.meeting_id) == ('m1', 'm2')
+    assert 'm1' in registry and len(registry) == 2
+
+
+def test_join_leave_and_creator_handover():
+    registry = MeetingRegistry(shards=4)
+    registry.create(_ids('m1'))
+    meeting, is_creator = registry.join('m1', 's1', 'alice')
+    assert is_creator
+    _, is_creator = registry.join('m1', 's2', 'bob')
+    assert not is_creator
+    assert registry.meetings_of('s2') == ['m1']
+
+    result = registry.leave('m1', 's1')
+    assert result.user == 'alice' and result.new_creator_sid == 's2' and not result.deleted
+    assert meeting.creator_name() == 'bob'
+
+    result = registry.leave('m1', 's2')
+    assert result.deleted and 'm1' not in registry
+    assert registry.meetings_of('s2') == []
+    assert registry.leave('m1', 's2') is None
+
+
+def test_join_rejects_missing_meeting_and_duplicate_user():
+    registry = MeetingRegistry(shards=4)
+    with pytest.raises(RegistryError):
+        registry.join('nope', 's1', 'alice')
+    registry.create(_ids('m1'))
+    registry.join('m1', 's1', 'alice')
+    with pytest.raises(RegistryError):
+        registry.join('m1', 's2', 'alice')
+
+
+def test_version_changes_with_listing():
+    registry = MeetingRegistry(shards=4)
+    before = registry.version
+    meeting = registry.create(_ids('m1'))
+    assert registry.version != before
+    before = registry.version
+    registry.set_mode(meeting, 'cs')
+    assert registry.version == before
+    registry.set_mode(meeting, 'p2p')
+    assert registry.version != before
+
+
+def test_remove_clears_sid_index():
+    registry = MeetingRegistry(shards=4)
+    registry.create(_ids('m1'))
+    registry.join('m1', 's1', 'alice')
+    assert registry.remove('m1').meeting_id == 'm1'
+    assert registry.meetings_of('s1') == []
+    assert registry.remove('m1') is None
+
+
+def test_member_copies_are_safe_during_concurrent_joins():
+    registry = MeetingRegistry(shards=1)
+    meeting = registry.create(_ids('m1'))
+    stop = threading.Event()
+
+    def churn():
+        i = 0
+        while not stop.is_set():
+            registry.join('m1', f's{i}', f'u{i}')
+            registry.leave('m1', f's{i}')
+            i += 1
+
+    registry.join('m1', 'keep', 'keeper')
+    thread = threading.Thread(target=churn)
+    thread.start()
+    try:
+        for _ in range(20000):
+            assert 'keep' in meeting.members()
+            assert 'keep' not in meeting.sids(skip_sid='keep')
+    finally:
+        stop.set()
+        thread.join()
+
+
+@pytest.mark.parametrize('meeting_id', [None, '', 123, ['m1'], {'id': 'm1'}])
+def test_non_string_meeting_id_is_not_found(meeting_id):
+    registry = MeetingRegistry(shards=4)
+    registry.create(_ids('m1'))
+    assert registry.get(meeting_id) is None
+    assert meeting_id not in registry
+    assert registry.leave(meeting_id, 's1') is None
+    with pytest.raises(RegistryError):
+        registry.join(meeting_id, 's1', 'alice')
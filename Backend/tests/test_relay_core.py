@@ -0,0 +1,298 @@
+import asyncio
+
+import media_packet
+from control_batch import AsyncControlBatcher
+from desktop_codec import pack_keyframe
+from metrics import Metrics
+from relay_core import AsyncTransport, RelayCore
+from send_queue import AsyncSendQueues
+
+
+class FakeAsyncServer:
+    """python-socketio AsyncServer 的替身：维护房间，记录每个 sid 收到的事件"""
+
+    def __init__(self):
+        self.received = {}  # sid -> [(事件名, 数据)]
+        self.rooms = {}     # 房间 -> {sid}
+        self.tasks = []
+        self.connected = set()
+        self.manager = self
+
+    async def emit(self, event, data=None, to=None, room=None, skip_sid=None, callback=None):
+        target = to if to is not None else room
+        if isinstance(target, str):
+            target = self.rooms.get(target, {target})
+        for sid in target:
+            if sid != skip_sid:
+                self.received.setdefault(sid, []).append((event, data))
+
+    async def enter_room(self, sid, room):
+        self.rooms.setdefault(room, set()).add(sid)
+
+    async def leave_room(self, sid, room):
+        self.rooms.get(room, set()).discard(sid)
+
+    async def close_room(self, room):
+        self.rooms.pop(room, None)
+
+    def start_background_task(self, target, *args):
+        self.tasks.append((target, args))
+
+    async def sleep(self, seconds):
+        pass
+
+    def is_connected(self, sid, namespace):
+        return sid in self.connected
+
+
+class Server:
+    """server_asgi.py 的组合方式：AsyncSendQueues、AsyncControlBatcher、RelayCore、AsyncTransport"""
+
+    def __init__(self):
+        self.sio = FakeAsyncServer()
+        self.send_queues = AsyncSendQueues(self.sio)
+        self.control_batcher = AsyncControlBatcher(self.sio)
+        self.core = RelayCore(Metrics(), self.send_queues, self.control_batcher)
+        self.transport = AsyncTransport(self.sio, self.send_queues, self.control_batcher)
+
+    def create(self):
+        status, body, _ = self.core.create_meeting('127.0.0.1')
+        assert status == 200
+        return body['meeting_id']
+
+    async def join(self, sid, meeting_id, user, capabilities=()):
+        self.sio.connected.add(sid)
+        data = {'meeting_id': meeting_id, 'user': user, 'capabilities': list(capabilities)}
+        outbox, wait = self.core.admit(sid, data, sid)
+        await self.transport.deliver(outbox)
+        if wait is not None:
+            await self.transport.deliver(self.core.join(sid, data))
+
+    async def handle(self, event, sid, data):
+        await self.transport.deliver(getattr(self.core, event)(sid, data))
+
+    async def disconnect(self, sid):
+        self.sio.connected.discard(sid)
+        await self.transport.deliver(self.core.disconnect(sid))
+
+    async def run_tasks(self):
+        """执行排队的一次性后台任务（缓存画面的发送），跳过常驻的 pump 循环"""
+        tasks, self.sio.tasks = self.sio.tasks, []
+        for target, args in tasks:
+            if args:
+                await target(*args)
+
+    def events(self, sid, name=None):
+        return [(e, d) for e, d in self.sio.received.get(sid, []) if name is None or e == name]
+
+    def clear(self):
+        self.sio.received.clear()
+
+
+def run(scenario):
+    asyncio.run(scenario(Server()))
+
+
+def test_join_sends_initial_state_and_announces_member():
+    async def scenario(server):
+        meeting_id = server.create()
+        await server.join('sa', meeting_id, 'a')
+        await server.join('sb', meeting_id, 'b')
+        assert server.events('sa', 'joined_meeting') == [('joined_meeting', {'is_creator': True})]
+        assert server.events('sb', 'joined_meeting') == [('joined_meeting', {'is_creator': False})]
+        assert server.events('sb', 'set_key_and_iv')
+        assert ('system_message', {'message': 'b 加入了会议', 'timestamp': 'sb'}) in server.events('sa')
+        # 两个旧客户端可以切换到 P2P
+        assert server.events('sa', 'switch_to_p2p') and server.events('sb', 'switch_to_p2p')
+        assert server.sio.rooms[meeting_id] == {'sa', 'sb'}
+    run(scenario)
+
+
+def test_join_errors_go_to_the_sender_only():
+    async def scenario(server):
+        await server.join('sa', 'missing', 'a')
+        assert server.events('sa') == [('error', {'message': '会议不存在'})]
+        server.clear()
+        await server.join('sa', ['missing'], 'a')
+        await server.handle('video_frame', 'sa', {'meeting_id': 42, 'user': 'a', 'frame': 'f1'})
+        assert server.events('sa') == [('error', {'message': '会议不存在'})] * 2
+        server.clear()
+        meeting_id = server.create()
+        await server.join('sa', meeting_id, 'a')
+        await server.join('sb', meeting_id, 'a')
+        assert server.events('sb') == [('error', {'message': '用户名在此会议中已被占用'})]
+    run(scenario)
+
+
+def test_video_frames_are_relayed_through_send_queues():
+    async def scenario(server):
+        meeting_id = server.create()
+        await server.join('sa', meeting_id, 'a')
+        await server.join('sb', meeting_id, 'b')
+        server.clear()
+        await server.handle('video_frame', 'sa', {'meeting_id': meeting_id, 'user': 'a', 'frame': 'f1'})
+        assert server.events('sb', 'receive_frame') == [('receive_frame', {'user': 'a', 'frame': 'f1'})]
+        # 新发布者进入 last-N，通知所有人；发送者自己不会收到自己的帧
+        assert server.events('sa') == [('active_speakers', {'users': ['a']})]
+        assert server.send_queues.stats()['sb']['sent'] == 1
+
+        packet = media_packet.pack(media_packet.KIND_VIDEO, meeting_id, 'a', 1, 0, b'jpeg')
+        await server.handle('video_frame_bin', 'sa', packet)
+        assert server.events('sb', 'receive_frame_bin') == [('receive_frame_bin', packet)]
+    run(scenario)
+
+
+def test_late_joiner_gets_cached_frames_in_background():
+    async def scenario(server):
+        meeting_id = server.create()
+        await server.join('sa', meeting_id, 'a')
+        await server.handle('video_frame', 'sa', {'meeting_id': meeting_id, 'user': 'a', 'frame': 'f1'})
+        await server.join('sb', meeting_id, 'b')
+        assert server.events('sb', 'all_current_frames') == [('all_current_frames', {'frames': {}})]
+        assert server.events('sb', 'receive_frame') == []
+        await server.run_tasks()
+        assert server.events('sb', 'receive_frame') == [('receive_frame', {'user': 'a', 'frame': 'f1'})]
+    run(scenario)
+
+
+def test_frames_from_impostors_are_rejected():
+    async def scenario(server):
+        meeting_id = server.create()
+        await server.join('sa', meeting_id, 'a')
+        await server.join('sb', meeting_id, 'b')
+        server.clear()
+        await server.handle('video_frame', 'sb', {'meeting_id': meeting_id, 'user': 'a', 'frame': 'f1'})
+        assert server.events('sb') == [('error', {'message': '用户名不匹配'})]
+        assert server.events('sa') == []
+    run(scenario)
+
+
+def test_disconnect_removes_tile_and_hands_over_creator():
+    async def scenario(server):
+        meeting_id = server.create()
+        await server.join('sa', meeting_id, 'a')
+        await server.join('sb', meeting_id, 'b')
+        await server.handle('video_frame', 'sa', {'meeting_id': meeting_id, 'user': 'a', 'frame': 'f1'})
+        server.clear()
+        await server.disconnect('sa')
+        events = server.events('sb')
+        assert ('remove_frame', {'user': 'a'}) in events
+        assert ('system_message', {'message': 'b 成为了新的会议创建者', 'timestamp': 'sb'}) in events
+        assert server.sio.rooms[meeting_id] == {'sb'}
+        assert server.core.registry.get(meeting_id).creator_sid == 'sb'
+    run(scenario)
+
+
+def test_only_creator_cancels_and_room_is_closed():
+    async def scenario(server):
+        meeting_id = server.create()
+        await server.join('sa', meeting_id, 'a')
+        await server.join('sb', meeting_id, 'b')
+        server.clear()
+        await server.handle('cancel_meeting', 'sb', {'meeting_id': meeting_id, 'user': 'b'})
+        assert server.events('sb') == [('error', {'message': '只有会议的创建者可以取消会议'})]
+        await server.handle('cancel_meeting', 'sa', {'meeting_id': meeting_id, 'user': 'a'})
+        assert server.events('sa', 'meeting_canceled') and server.events('sb', 'meeting_canceled')
+        assert meeting_id not in server.sio.rooms
+        assert meeting_id not in server.core.registry
+    run(scenario)
+
+
+def test_batch_clients_get_control_events_in_one_frame():
+    async def scenario(server):
+        meeting_id = server.create()
+        await server.join('sa', meeting_id, 'a', capabilities=['batch'])
+        await server.join('sb', meeting_id, 'b')
+        await server.handle('send_comment', 'sb', {'meeting_id': meeting_id, 'user': 'b', 'message': 'hi',
+                                                    'timestamp': 1})
+        # 旧客户端立即收到，声明了 batch 的客户端等到下一个 tick
+        assert server.events('sa', 'receive_comment') == []
+        server.clear()
+        await server.control_batcher.flush()
+        (event, items), = server.events('sa')
+        assert event == 'batch'
+        assert ['receive_comment', {'user': 'b', 'message': 'hi', 'timestamp': 1}] in items
+    run(scenario)
+
+
+
+def test_canceled_meeting_does_not_flush_pending_control_events():
+    async def scenario(server):
+        meeting_id = server.create()
+        await server.join('sa', meeting_id, 'a', capabilities=['batch'])
+        await server.join('sb', meeting_id, 'b', capabilities=['batch'])
+        await server.handle('send_comment', 'sb', {'meeting_id': meeting_id, 'user': 'b', 'message': 'hi',
+                                                    'timestamp': 1})
+        await server.handle('cancel_meeting', 'sa', {'meeting_id': meeting_id, 'user': 'a'})
+        server.clear()
+        await server.control_batcher.flush()
+        assert server.sio.received == {}
+    run(scenario)
+
+def test_publisher_evicted_from_snapshot_cache_still_stops_cleanly(monkeypatch):
+    monkeypatch.setattr('config.SNAPSHOT_BUDGET', 1000)
+
+    async def scenario(server):
+        meeting_id = server.create()
+        for sid, user in (('sa', 'a'), ('sb', 'b'), ('sc', 'c')):
+            await server.join(sid, meeting_id, user)
+        for sid, user in (('sa', 'a'), ('sb', 'b')):
+            await server.handle('video_frame', sid, {'meeting_id': meeting_id, 'user': user, 'frame': 'x' * 800})
+        meeting = server.core.registry.get(meeting_id)
+        # b 的帧把 a 的帧挤出了缓存，但 a 仍然在发送视频
+        assert 'a' not in meeting.snapshots and meeting.publishers == {'a', 'b'}
+        server.clear()
+        await server.handle('stop_video', 'sa', {'meeting_id': meeting_id, 'user': 'a'})
+        assert server.events('sa', 'error') == []
+        assert server.events('sc', 'remove_frame') == [('remove_frame', {'user': 'a'})]
+        assert server.core.forwarding.active_speakers(meeting) == ['b']
+
+        await server.handle('video_frame', 'sa', {'meeting_id': meeting_id, 'user': 'a', 'frame': 'x' * 800})
+        assert 'b' not in meeting.snapshots
+        server.clear()
+        await server.handle('leave_meeting', 'sb', {'meeting_id': meeting_id, 'user': 'b'})
+        assert server.events('sc', 'remove_frame') == [('remove_frame', {'user': 'b'})]
+        assert meeting.publishers == {'a'}
+    run(scenario)
+
+
+def test_capture_rate_follows_slowest_full_rate_receiver(monkeypatch):
+    monkeypatch.setattr('config.SFU_LAST_N', 1)
+
+    async def scenario(server):
+        meeting_id = server.create()
+        for sid, user in (('sa', 'a'), ('sb', 'b'), ('sc', 'c'), ('sd', 'd')):
+            await server.join(sid, meeting_id, user)
+        for sid, user in (('sa', 'a'), ('sb', 'b')):
+            await server.handle('video_frame', sid, {'meeting_id': meeting_id, 'user': user, 'frame': 'f'})
+        # c 拥塞，a 是 last-N 发言人，b 只以缩略图帧率转发给其他人
+        server.core.rate_control.on_drop('sc')
+        server.clear()
+        await server.transport.deliver(server.core.adapt_rates())
+        rate_control = server.core.rate_control
+        slow = int(1000 / (rate_control.max_fps * rate_control.decrease))
+        assert server.events('sa', 'set_capture_rate') == [('set_capture_rate', {'kind': 'video', 'interval': slow})]
+        full = int(1000 / rate_control.max_fps)
+        assert server.events('sb', 'set_capture_rate') == [('set_capture_rate', {'kind': 'video', 'interval': full})]
+    run(scenario)
+
+
+def test_malformed_first_desktop_packet_does_not_claim_sharing():
+    async def scenario(server):
+        meeting_id = server.create()
+        await server.join('sa', meeting_id, 'a')
+        await server.join('sb', meeting_id, 'b')
+        bad = media_packet.pack(media_packet.KIND_DESKTOP, meeting_id, 'a', 1, 0, b'\x00',
+                                flags=media_packet.FLAG_KEYFRAME)
+        server.clear()
+        await server.handle('desktop_frame_bin', 'sa', bad)
+        (event, error), = server.events('sa')
+        assert event == 'error' and error['message'].startswith('桌面帧格式错误')
+        assert server.core.registry.get(meeting_id).deskframe == {}
+
+        good = media_packet.pack(media_packet.KIND_DESKTOP, meeting_id, 'b', 1, 0,
+                                 pack_keyframe(640, 480, 64, b'jpeg'), flags=media_packet.FLAG_KEYFRAME)
+        await server.handle('desktop_frame_bin', 'sb', good)
+        assert server.events('sb') == []
+        assert server.events('sa', 'receive_desktop_frame_bin') == [('receive_desktop_frame_bin', good)]
+    run(scenario)
@@ -0,0 +1,134 @@
+import asyncio
+
+from send_queue import AsyncSendQueues, SendQueues
+
+
+class FakeSocketIO:
+    """记录 emit，不启动后台任务"""
+
+    def __init__(self):
+        self.sent = []
+
+    def emit(self, event, payload, to=None, callback=None):
+        self.sent.append((to, event, payload, callback))
+
+    def start_background_task(self, target, *args):
+        pass
+
+    def sleep(self, seconds):
+        pass
+
+
+class AsyncFakeSocketIO(FakeSocketIO):
+
+    async def emit(self, event, payload, to=None, callback=None):
+        super().emit(event, payload, to=to, callback=callback)
+
+
+class Listener:
+
+    def __init__(self):
+        self.sent = self.dropped = 0
+        self.rtts = []
+
+    def on_sent(self, sid):
+        self.sent += 1
+
+    def on_drop(self, sid):
+        self.dropped += 1
+
+    def on_ack(self, sid, rtt):
+        self.rtts.append(rtt)
+
+
+def _payloads(sio):
+    return [payload for _, _, payload, _ in sio.sent]
+
+
+def test_ack_window_holds_frames_until_acked():
+    sio = FakeSocketIO()
+    queues = SendQueues(sio, max_size=4, window=2)
+    queues.listener = listener = Listener()
+    queues.add('r', ack=True)
+    for stream in ('a', 'b', 'c'):
+        queues.push('r', 'receive_frame', stream, stream=stream)
+    assert _payloads(sio) == ['a', 'b']
+    assert queues.stats()['r']['depth'] == 1
+
+    sio.sent[0][3]()  # 第一帧的 ack 释放窗口
+    assert _payloads(sio) == ['a', 'b', 'c']
+    assert listener.sent == 3 and len(listener.rtts) == 1
+    assert queues.stats()['r']['in_flight'] == 2
+
+
+def test_newer_frame_replaces_queued_frame_of_same_stream():
+    sio = FakeSocketIO()
+    queues = SendQueues(sio, max_size=4, window=1)
+    queues.listener = listener = Listener()
+    queues.add('r', ack=True)
+    for i in range(4):
+        queues.push('r', 'receive_frame', f'a{i}', stream='a')
+    # 第一帧在途，后面的帧同一路流只保留最新一帧
+    sio.sent[0][3]()
+    assert _payloads(sio) == ['a0', 'a3']
+    assert listener.dropped == 2 and queues.stats()['r']['dropped'] == 2
+
+
+def test_full_queue_drops_oldest_stream():
+    sio = FakeSocketIO()
+    queues = SendQueues(sio, max_size=2, window=1)
+    queues.add('r', ack=True)
+    for stream in ('a', 'b', 'c', 'd'):
+        queues.push('r', 'receive_frame', stream, stream=stream)
+    assert _payloads(sio) == ['a']
+    stats = queues.stats()['r']
+    assert stats['depth'] == 2 and stats['dropped'] == 1
+    sio.sent[0][3]()
+    assert _payloads(sio) == ['a', 'c']
+
+
+def test_unregistered_receiver_is_sent_directly():
+    sio = FakeSocketIO()
+    queues = SendQueues(sio)
+    queues.relay('receive_frame', 'x', ['r1', 'r2'], stream='a', skip_sid='r2')
+    assert sio.sent == [('r1', 'receive_frame', 'x', None)]
+
+
+def test_unacked_frames_time_out(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('send_queue.time.time', lambda: now[0])
+    sio = FakeSocketIO()
+    queues = SendQueues(sio, max_size=2, window=1, ack_timeout=2.0)
+    queues.add('r', ack=True)
+    queues.push('r', 'receive_frame', 'a', stream='a')
+    queues.push('r', 'receive_frame', 'b', stream='b')
+    assert queues._waiting() == ['r']
+    assert queues.stats()['r']['in_flight'] == 1
+    now[0] += 3
+    for sid in queues._waiting():
+        queues._flush(sid)
+    assert _payloads(sio) == ['a', 'b']
+
+
+def test_removed_receiver_ignores_late_ack():
+    sio = FakeSocketIO()
+    queues = SendQueues(sio)
+    queues.add('r', ack=True)
+    queues.push('r', 'receive_frame', 'a', stream='a')
+    queues.remove('r')
+    sio.sent[0][3]()
+    assert queues.stats() == {}
+
+
+def test_async_queues_share_window_accounting():
+    async def scenario():
+        sio = AsyncFakeSocketIO()
+        queues = AsyncSendQueues(sio, max_size=4, window=1)
+        queues.add('r', ack=True)
+        await queues.relay('receive_frame_bin', b'a', ['r'], stream='a')
+        await queues.relay('receive_frame_bin', b'b', ['r'], stream='b')
+        assert _payloads(sio) == [b'a']
+        await sio.sent[0][3]()
+        return _payloads(sio)
+
+    assert asyncio.run(scenario()) == [b'a', b'b']
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+pytest.importorskip('flask_cors')
+
+import server_test  # noqa: E402
+
+
+def _meeting():
+    return server_test.app.test_client().post('/create_meeting').get_json()['meeting_id']
+
+
+def _join(meeting_id, user, capabilities=()):
+    client = server_test.socketio.test_client(server_test.app)
+    client.emit('join_meeting', {'meeting_id': meeting_id, 'userName': user, 'capabilities': list(capabilities)})
+    client.get_received()
+    return client
+
+
+def _sid(client):
+    return server_test.socketio.server.manager.sid_from_eio_sid(client.eio_sid, '/')
+
+
+def _events(client, name, timeout=1.0):
+    """收集 name 事件；批量帧在后台 tick 里发出，等到收到为止"""
+    deadline = time.monotonic() + timeout
+    while True:
+        received = [e['args'][0] for e in client.get_received() if e['name'] == name]
+        if received or time.monotonic() > deadline:
+            return received
+        # 后台任务跑在 socketio 选择的异步模式里，用它的 sleep 让出执行权
+        server_test.socketio.sleep(0.005)
+
+
+def test_signal_batch_is_forwarded_to_each_peer():
+    meeting_id = _meeting()
+    a, b = _join(meeting_id, 'a'), _join(meeting_id, 'b')
+    a.emit('signal_batch', {'meeting_id': meeting_id, 'signals': [
+        {'target_sid': _sid(b), 'signal': {'type': 'offer'}},
+        {'target_sid': _sid(b), 'signal': {'candidate': 1}},
+    ]})
+    signals = _events(b, 'signal')
+    assert [s['signal'] for s in signals] == [{'type': 'offer'}, {'candidate': 1}]
+    assert {s['from_sid'] for s in signals} == {_sid(a)} and signals[0]['userName'] == 'a'
+    a.disconnect()
+    b.disconnect()
+
+
+def test_batch_capable_client_gets_one_frame():
+    meeting_id = _meeting()
+    a, b = _join(meeting_id, 'a'), _join(meeting_id, 'b', ('batch',))
+    a.emit('signal_batch', {'meeting_id': meeting_id, 'signals': [
+        {'target_sid': _sid(b), 'signal': {'candidate': i}} for i in range(3)
+    ]})
+    frames = _events(b, 'batch')
+    assert len(frames) == 1
+    assert [data['signal'] for _, data in frames[0]] == [{'candidate': i} for i in range(3)]
+    a.disconnect()
+    b.disconnect()
+
+
+def test_invalid_signals_are_rejected():
+    meeting_id = _meeting()
+    a, b = _join(meeting_id, 'a'), _join(meeting_id, 'b')
+    outsider = _join(_meeting(), 'c')
+    a.emit('signal_batch', {'meeting_id': meeting_id, 'signals': 'x'})
+    a.emit('signal', {'meeting_id': meeting_id, 'target_sid': _sid(outsider), 'signal': {}})
+    a.emit('signal', {'meeting_id': 'missing', 'target_sid': _sid(b), 'signal': {}})
+    outsider.emit('signal', {'meeting_id': meeting_id, 'target_sid': _sid(b), 'signal': {}})
+    errors = [e['message'] for e in _events(a, 'error')]
+    assert errors == ['无效的信令列表', '目标用户不在会议中', '会议不存在']
+    assert [e['message'] for e in _events(outsider, 'error')] == ['用户不在此会议中']
+    assert _events(b, 'signal', timeout=0.05) == []
+    for client in (a, b, outsider):
+        client.disconnect()
+
+
+def test_signaling_needs_a_p2p_route():
+    meeting_id = _meeting()
+    a, b, c = (_join(meeting_id, user) for user in 'abc')
+    # 三人且没有上报带宽时全部经服务器转发，成员之间不建立 P2P 连接
+    a.emit('signal', {'meeting_id': meeting_id, 'target_sid': _sid(b), 'signal': {}})
+    assert [e['message'] for e in _events(a, 'error')] == ['当前拓扑下与该用户没有P2P连接，不处理信令']
+    assert _events(b, 'signal', timeout=0.05) == []
+    for client in (a, b, c):
+        client.disconnect()
@@ -0,0 +1,64 @@
+import base64
+
+import pytest
+
+import media_packet
+from snapshot_cache import SnapshotCache
+
+
+def test_data_url_round_trip_is_stored_decoded():
+    cache = SnapshotCache(budget=1 << 20)
+    body = base64.b64encode(b'\xff\xd8jpeg-bytes').decode('ascii')
+    frame = 'data:image/jpeg;base64,' + body
+    cache.put_text('alice', frame)
+    # 按解码后的字节计入预算
+    assert cache.bytes == len(b'\xff\xd8jpeg-bytes') + len('data:image/jpeg;base64,')
+    assert cache.snapshots() == [('receive_frame', {'user': 'alice', 'frame': frame})]
+
+
+@pytest.mark.parametrize('frame', ['not base64!', 'QUJD=', 'ciphertext:中文'])
+def test_non_base64_text_is_kept_verbatim(frame):
+    cache = SnapshotCache(budget=1 << 20)
+    cache.put_text('alice', frame)
+    assert cache.snapshots() == [('receive_frame', {'user': 'alice', 'frame': frame})]
+
+
+@pytest.mark.parametrize('frame', [None, b'bytes', 42, {'frame': 'x'}])
+def test_put_text_rejects_non_str(frame):
+    cache = SnapshotCache(budget=1 << 20)
+    with pytest.raises(TypeError):
+        cache.put_text('alice', frame)
+    assert len(cache) == 0 and cache.bytes == 0
+
+
+def test_budget_evicts_least_recently_updated():
+    cache = SnapshotCache(budget=10)
+    cache.put_packet('a', b'x' * 4)
+    cache.put_packet('b', b'x' * 4)
+    cache.put_packet('a', b'x' * 4)  # a 更新后变成最新
+    cache.put_packet('c', b'x' * 4)
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    assert cache.bytes == 8
+
+
+def test_oversized_frame_is_kept_alone():
+    cache = SnapshotCache(budget=4)
+    cache.put_packet('a', b'x' * 2)
+    cache.put_packet('b', b'x' * 16)
+    assert 'a' not in cache and 'b' in cache
+
+
+def test_remove_releases_budget():
+    cache = SnapshotCache(budget=1 << 20)
+    cache.put_packet('a', b'x' * 8)
+    assert cache.remove('a')
+    assert not cache.remove('a')
+    assert cache.bytes == 0
+
+
+def test_encrypted_packet_is_not_thumbnailed():
+    cache = SnapshotCache(budget=1 << 20)
+    packet = media_packet.pack(media_packet.KIND_VIDEO, 'm1', 'alice', 1, 0, b'ciphertext',
+                               flags=media_packet.FLAG_ENCRYPTED)
+    cache.put_packet('alice', packet)
+    assert cache.snapshots(thumbnails=True) == [('receive_frame_bin', packet)]
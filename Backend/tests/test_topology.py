@@ -0,0 +1,97 @@
+from topology import HYBRID, MESH, RELAY, ROUTE_P2P, ROUTE_RELAY, TopologyManager
+
+
+def _meeting(manager, uplinks):
+    """加入成员并上报带宽，返回最后一个方案"""
+    for sid in uplinks:
+        manager.add('m1', sid)
+    for sid, uplink in uplinks.items():
+        manager.report('m1', sid, uplink)
+    return manager.plan('m1')
+
+
+def _settle(manager, plan):
+    for sid in plan.routes:
+        manager.mark_ready('m1', sid, plan.plan_id)
+
+
+def test_legacy_clients_keep_two_person_p2p_rule():
+    manager = TopologyManager()
+    manager.add('m1', 'a')
+    plan = manager.add('m1', 'b')
+    assert plan.mode == MESH and set(plan.routes.values()) == {ROUTE_P2P}
+    plan = manager.add('m1', 'c')
+    assert plan.mode == RELAY
+
+
+def test_mode_follows_uplink_bandwidth():
+    manager = TopologyManager(stream_kbps=400, mesh_max=4, upgrade_margin=1.0)
+    # 3 人时直接发送需要 800 kbps
+    assert _meeting(manager, {'a': 1000, 'b': 1000, 'c': 1000}).mode == MESH
+    plan = manager.report('m1', 'c', 500)
+    assert plan.mode == HYBRID and plan.routes['c'] == ROUTE_RELAY
+    assert plan.connected('a', 'c') and plan.peers('c') == ['a', 'b']
+
+
+def test_large_meeting_is_relayed():
+    manager = TopologyManager(partial_max=3)
+    plan = _meeting(manager, {sid: 10 ** 6 for sid in 'abcd'})
+    assert plan.mode == RELAY and set(plan.routes.values()) == {ROUTE_RELAY}
+
+
+def test_upgrade_needs_margin_but_downgrade_does_not():
+    manager = TopologyManager(stream_kbps=400, upgrade_margin=1.5)
+    plan = _meeting(manager, {'a': 2000, 'b': 1000, 'c': 2000})
+    # 3 人时直接发送需要 800 kbps，b 的 1000 kbps 不够 800 * 1.5
+    assert plan.routes == {'a': ROUTE_P2P, 'b': ROUTE_RELAY, 'c': ROUTE_P2P}
+    assert manager.report('m1', 'b', 1300).routes['b'] == ROUTE_P2P
+    # 已经直接发送的人低于 1.0 倍才退回
+    assert manager.report('m1', 'b', 900) is None
+    assert manager.report('m1', 'b', 700).routes['b'] == ROUTE_RELAY
+
+
+def test_transition_relays_to_receivers_not_ready():
+    manager = TopologyManager(stream_kbps=400)
+    old = _meeting(manager, {'a': 100, 'b': 100, 'c': 100})
+    _settle(manager, old)
+    assert manager.relay_receivers('m1', 'a', ['b', 'c']) == ['b', 'c']
+
+    new = manager.report('m1', 'a', 10 ** 6)
+    assert new.routes['a'] == ROUTE_P2P
+    assert manager.relay_receivers('m1', 'a', ['b', 'c']) == ['b', 'c']
+    assert manager.mark_ready('m1', 'b', new.plan_id) is None
+    assert manager.relay_receivers('m1', 'a', ['b', 'c']) == ['c']
+    assert manager.mark_ready('m1', 'a', new.plan_id - 1) is None
+    manager.mark_ready('m1', 'a', new.plan_id)
+    assert manager.mark_ready('m1', 'c', new.plan_id) is new
+    assert manager.relay_receivers('m1', 'a', ['b', 'c']) == []
+
+
+def test_transition_expires():
+    manager = TopologyManager(transition_timeout=5.0)
+    manager.add('m1', 'a')
+    plan = manager.add('m1', 'b')
+    since = manager._meetings['m1'].since
+    assert manager.expire(now=since + 1) == []
+    assert manager.expire(now=since + 6) == [('m1', plan)]
+    assert manager.expire(now=since + 12) == []
+
+
+def test_signaling_is_limited_to_p2p_peers():
+    manager = TopologyManager(stream_kbps=400, upgrade_margin=1.0)
+    plan = _meeting(manager, {'a': 1000, 'b': 1000, 'c': 100})
+    _settle(manager, plan)
+    assert plan.mode == HYBRID
+    # c 经服务器发送，但 a、b 直接发给 c，所以 c 仍与 a、b 连接
+    assert manager.can_signal('m1', 'a', 'c')
+    assert manager.signal_peers('m1', 'c') == {'a', 'b'}
+    assert not manager.can_signal('m1', 'a', 'a')
+    assert not manager.can_signal('other', 'a', 'b')
+
+
+def test_last_member_leaving_drops_meeting():
+    manager = TopologyManager()
+    manager.add('m1', 'a')
+    assert manager.remove('m1', 'a') is None
+    assert manager.plan('m1') is None
+    assert manager.remove('m1', 'a') is None
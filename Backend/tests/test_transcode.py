@@ -0,0 +1,93 @@
+import base64
+import io
+import time
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+import transcode  # noqa: E402
+from transcode import Transcoder, transcode_jpeg  # noqa: E402
+
+
+def _jpeg(width=320, height=240):
+    out = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 40, 40)).save(out, 'JPEG')
+    return out.getvalue()
+
+
+def _size(data):
+    if isinstance(data, str):
+        data = base64.b64decode(data.split(',', 1)[1])
+    return Image.open(io.BytesIO(data)).size
+
+
+def _completed(transcoder, count=1, timeout=10.0):
+    ready = []
+    deadline = time.monotonic() + timeout
+    while len(ready) < count:
+        assert time.monotonic() < deadline
+        ready.extend(transcoder.completed())
+        time.sleep(0.01)
+    return ready
+
+
+@pytest.fixture
+def transcoder():
+    transcoder = Transcoder(workers=1, queue_limit=2)
+    yield transcoder
+    transcoder.close()
+
+
+def test_downscales_bytes_and_data_urls():
+    assert _size(transcode_jpeg(_jpeg(), 160, 60)) == (160, 120)
+    url = transcode.DATA_URL_PREFIX + base64.b64encode(_jpeg()).decode('ascii')
+    result = transcode_jpeg(url, 160, 60)
+    assert result.startswith(transcode.DATA_URL_PREFIX) and _size(result) == (160, 120)
+    # 不放大比目标层更小的画面
+    assert _size(transcode_jpeg(_jpeg(100, 80), 160, 60)) == (100, 80)
+
+
+def test_same_frame_and_layer_is_transcoded_once(transcoder):
+    key = ('m1', 'alice', 0)
+    job = transcoder.submit(key, 1, _jpeg(), 160, 60, ['s1'], context='ctx')
+    assert transcoder.submit(key, 1, _jpeg(), 160, 60, ['s2']) is job
+    (done, receivers), = _completed(transcoder)
+    assert done is job and done.context == 'ctx' and sorted(receivers) == ['s1', 's2']
+    assert _size(done.result) == (160, 120)
+    # 已完成的结果直接共享给后来的接收者
+    assert transcoder.submit(key, 1, _jpeg(), 160, 60, ['s3']).result == done.result
+    assert transcoder.stats()['shared'] == 2 and transcoder.stats()['submitted'] == 1
+
+
+def test_newer_frame_supersedes_pending_job(transcoder):
+    key = ('m1', 'alice', 0)
+    transcoder.submit(key, 1, _jpeg(), 160, 60, ['s1'])
+    newer = transcoder.submit(key, 2, _jpeg(), 160, 60, ['s1'])
+    ready = _completed(transcoder)
+    while transcoder.stats()['pending']:
+        ready.extend(transcoder.completed())
+        time.sleep(0.01)
+    assert [job for job, _ in ready] == [newer]
+    assert transcoder.stats()['superseded'] == 1
+
+
+def test_full_queue_and_failures_fall_back(transcoder):
+    transcoder.submit(('m1', 'a', 0), 1, _jpeg(), 160, 60, ['s1'])
+    transcoder.submit(('m1', 'b', 0), 1, b'not a jpeg', 160, 60, ['s1'])
+    assert transcoder.submit(('m1', 'c', 0), 1, _jpeg(), 160, 60, ['s1']) is None
+    ready = _completed(transcoder)
+    while transcoder.stats()['pending']:
+        ready.extend(transcoder.completed())
+        time.sleep(0.01)
+    assert [job.key for job, _ in ready] == [('m1', 'a', 0)]
+    stats = transcoder.stats()
+    assert stats['overloaded'] == 1 and stats['failed'] == 1
+
+
+def test_forget_drops_cached_results(transcoder):
+    key = ('m1', 'alice', 0)
+    transcoder.submit(key, 1, _jpeg(), 160, 60, ['s1'])
+    _completed(transcoder)
+    transcoder.forget('m1', 'alice')
+    assert transcoder.submit(key, 1, _jpeg(), 160, 60, ['s1']).result is None
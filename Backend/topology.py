@@ -0,0 +1,205 @@
+import threading
+import time
+from collections import OrderedDict
+
+# 信令服务器（server_test.py）的拓扑选择：每个会议按人数和各客户端上报的上行带宽选择
+#   mesh    全连接 P2P：每个人把自己的画面直接发给其他所有人
+#   hybrid  部分 P2P：上行带宽够的人直接发给其他所有人，不够的人只向服务器发一路，由服务器转发
+#   relay   全部经服务器转发
+# 一个发送者直接发给 n-1 个人需要 (n-1) * stream_kbps 的上行带宽。
+# 没有上报过带宽的旧客户端不知道 hybrid，会议中有这样的客户端时沿用原来的规则：恰好 2 人时 mesh，否则 relay。
+#
+# 切换时先连后断：新方案（plan）发出后，客户端建好新方案需要的 P2P 连接再回 ready。
+# 在所有人 ready（或超时）之前，发送者同时向服务器发送，服务器只转给还没 ready 的接收者；
+# 过渡结束后服务器只转发方案中经服务器发送的人（relay 只承担 P2P 做不到的部分）。
+
+MESH = 'mesh'
+HYBRID = 'hybrid'
+RELAY = 'relay'
+ROUTE_P2P = 'p2p'
+ROUTE_RELAY = 'relay'
+
+
+class Plan:
+    __slots__ = ('plan_id', 'mode', 'routes')
+
+    def __init__(self, plan_id, mode, routes):
+        self.plan_id = plan_id
+        self.mode = mode
+        self.routes = routes  # sid -> ROUTE_P2P / ROUTE_RELAY，该成员如何发送自己的画面
+
+    def connected(self, a, b):
+        """a、b 之间是否需要 P2P 连接：任一方直接发送给对方"""
+        return a != b and a in self.routes and b in self.routes and \
+            ROUTE_P2P in (self.routes[a], self.routes[b])
+
+    def peers(self, sid):
+        return [other for other in self.routes if self.connected(sid, other)]
+
+    def to_dict(self):
+        return {'plan_id': self.plan_id, 'mode': self.mode, 'routes': dict(self.routes)}
+
+
+class _MeetingTopology:
+    __slots__ = ('uplinks', 'plan', 'previous', 'ready', 'since')
+
+    def __init__(self):
+        self.uplinks = OrderedDict()  # sid -> 上报的上行带宽（kbps），None 为没有上报
+        self.plan = Plan(0, RELAY, {})
+        self.previous = None          # 过渡中的旧方案
+        self.ready = set()            # 已经建好新方案连接的 sid
+        self.since = 0.0              # 过渡开始时间
+
+
+class TopologyManager:
+
+    def __init__(self, stream_kbps=400, mesh_max=4, partial_max=8, upgrade_margin=1.2,
+                 transition_timeout=10.0):
+        self.stream_kbps = stream_kbps
+        self.mesh_max = mesh_max            # 全连接的最多人数
+        self.partial_max = partial_max      # 部分 P2P 的最多人数，更多时全部经服务器转发
+        self.upgrade_margin = upgrade_margin  # 从 relay 改为 P2P 需要的带宽余量，避免来回切换
+        self.transition_timeout = transition_timeout
+        self._meetings = {}
+        self._lock = threading.Lock()
+
+    # ---- 成员与带宽 ----
+
+    def add(self, meeting_id, sid):
+        """成员加入，方案变化时返回新方案，否则返回 None"""
+        with self._lock:
+            state = self._meetings.setdefault(meeting_id, _MeetingTopology())
+            state.uplinks[sid] = None
+            return self._update(state)
+
+    def remove(self, meeting_id, sid):
+        with self._lock:
+            state = self._meetings.get(meeting_id)
+            if state is None or sid not in state.uplinks:
+                return None
+            del state.uplinks[sid]
+            state.ready.discard(sid)
+            if not state.uplinks:
+                del self._meetings[meeting_id]
+                return None
+            return self._update(state)
+
+    def report(self, meeting_id, sid, uplink_kbps):
+        """客户端上报上行带宽（kbps）"""
+        with self._lock:
+            state = self._meetings.get(meeting_id)
+            if state is None or sid not in state.uplinks:
+                return None
+            state.uplinks[sid] = uplink_kbps
+            return self._update(state)
+
+    def discard(self, meeting_id):
+        with self._lock:
+            self._meetings.pop(meeting_id, None)
+
+    # ---- 方案 ----
+
+    def _choose(self, state):
+        sids = list(state.uplinks)
+        n = len(sids)
+        current = state.plan.routes
+        if n <= 1:
+            return RELAY, {sid: ROUTE_RELAY for sid in sids}
+        if any(uplink is None for uplink in state.uplinks.values()):
+            # 有旧客户端：恰好 2 人时 P2P，否则经服务器转发
+            mode = MESH if n == 2 else RELAY
+            route = ROUTE_P2P if mode == MESH else ROUTE_RELAY
+            return mode, {sid: route for sid in sids}
+        if n > self.partial_max:
+            return RELAY, {sid: ROUTE_RELAY for sid in sids}
+        need = (n - 1) * self.stream_kbps
+        routes = {}
+        for sid, uplink in state.uplinks.items():
+            margin = 1.0 if current.get(sid) == ROUTE_P2P else self.upgrade_margin
+            routes[sid] = ROUTE_P2P if uplink >= need * margin else ROUTE_RELAY
+        direct = sum(1 for route in routes.values() if route == ROUTE_P2P)
+        if direct == n and n <= self.mesh_max:
+            return MESH, routes
+        if direct == 0:
+            return RELAY, routes
+        return HYBRID, routes
+
+    def _update(self, state):
+        mode, routes = self._choose(state)
+        if mode == state.plan.mode and routes == state.plan.routes:
+            return None
+        # 上一次过渡还没结束时，仍以更早的方案为准（还没 ready 的人仍在用它）
+        if state.previous is None:
+            state.previous = state.plan
+        state.plan = Plan(state.plan.plan_id + 1, mode, routes)
+        state.ready = set()
+        state.since = time.monotonic()
+        return state.plan
+
+    def plan(self, meeting_id):
+        with self._lock:
+            state = self._meetings.get(meeting_id)
+            return state.plan if state is not None else None
+
+    def mark_ready(self, meeting_id, sid, plan_id):
+        """
+        客户端建好了 plan_id 需要的 P2P 连接。所有人都 ready 时过渡结束，返回该方案，否则返回 None
+        """
+        with self._lock:
+            state = self._meetings.get(meeting_id)
+            if state is None or state.previous is None or plan_id != state.plan.plan_id:
+                return None
+            state.ready.add(sid)
+            if state.ready >= set(state.uplinks):
+                state.previous = None
+                return state.plan
+            return None
+
+    def expire(self, now=None):
+        """结束超时的过渡（有人一直没建好连接），返回 [(会议号, 方案)]"""
+        now = now if now is not None else time.monotonic()
+        settled = []
+        with self._lock:
+            for meeting_id, state in self._meetings.items():
+                if state.previous is not None and now - state.since > self.transition_timeout:
+                    state.previous = None
+                    settled.append((meeting_id, state.plan))
+        return settled
+
+    # ---- 转发与信令 ----
+
+    def relay_receivers(self, meeting_id, sender, receivers):
+        """sender 发给服务器的帧应该转发给哪些接收者：方案中经服务器发送时转给所有人，过渡中转给还没 ready 的人"""
+        with self._lock:
+            state = self._meetings.get(meeting_id)
+            if state is None:
+                return []
+            if state.plan.routes.get(sender) == ROUTE_RELAY:
+                return list(receivers)
+            previous = state.previous
+            if previous is not None:
+                # 旧方案里已经直接收到的接收者不用再转发
+                direct = previous.routes.get(sender) == ROUTE_P2P
+                return [sid for sid in receivers
+                        if sid not in state.ready and not (direct and previous.connected(sender, sid))]
+            return []
+
+    def signal_peers(self, meeting_id, sid):
+        """当前方案或过渡中的旧方案里与 sid 有 P2P 连接的成员"""
+        with self._lock:
+            state = self._meetings.get(meeting_id)
+            if state is None:
+                return set()
+            peers = set(state.plan.peers(sid))
+            if state.previous is not None:
+                peers.update(state.previous.peers(sid))
+            return peers
+
+    def can_signal(self, meeting_id, a, b):
+        """a、b 在当前方案或过渡中的旧方案里需要 P2P 连接时才转发信令"""
+        with self._lock:
+            state = self._meetings.get(meeting_id)
+            if state is None:
+                return False
+            return state.plan.connected(a, b) or \
+                (state.previous is not None and state.previous.connected(a, b))
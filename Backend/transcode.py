@@ -0,0 +1,150 @@
+import base64
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # 没有 Pillow 时不转码
+    Image = None
+
+# 服务器端 JPEG 转码：发布者只发送一层（通常是全分辨率）时，为想要更低层的接收者
+# 解码后按层的宽度缩小、降低质量重新编码。
+#   - 解码和编码都在进程池中进行，事件循环只提交任务，由后台任务收取结果，不会被阻塞
+#   - 每路流每层只保留最新一帧的任务，同一帧同一层只转码一次，结果在所有接收者之间共享
+#   - 进程池大小和排队中的任务数都有上限，超出时不转码，调用方改发原始帧
+# 字符串帧为 'data:image/jpeg;base64,...' 形式的 data URL，二进制帧为 JPEG 字节。
+
+DATA_URL_PREFIX = 'data:image/jpeg;base64,'
+
+
+def available():
+    return Image is not None
+
+
+def transcode_jpeg(data, max_width, quality):
+    """在工作进程中运行：缩小到不超过 max_width 宽并按 quality 重新编码，输入输出同为 data URL 或字节"""
+    is_url = isinstance(data, str)
+    raw = base64.b64decode(data.split(',', 1)[-1]) if is_url else data
+    image = Image.open(io.BytesIO(raw))
+    if image.width > max_width:
+        height = max(1, image.height * max_width // image.width)
+        # draft 让 JPEG 解码器直接按 1/2、1/4、1/8 缩小解码，比解码全图再缩小快得多
+        image.draft('RGB', (max_width, height))
+        image = image.convert('RGB').resize((max_width, height), Image.BILINEAR)
+    else:
+        image = image.convert('RGB')
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=quality)
+    encoded = out.getvalue()
+    if is_url:
+        return DATA_URL_PREFIX + base64.b64encode(encoded).decode('ascii')
+    return encoded
+
+
+def _warm_up():
+    return None
+
+
+class TranscodeJob:
+    """一路流一帧一层的转码任务；receivers 为等待结果的接收者，context 由调用方用来组装转发的数据"""
+    __slots__ = ('key', 'frame_id', 'future', 'receivers', 'context', 'result')
+
+    def __init__(self, key, frame_id, future, context):
+        self.key = key
+        self.frame_id = frame_id
+        self.future = future
+        self.receivers = set()
+        self.context = context
+        self.result = None
+
+
+class Transcoder:
+
+    def __init__(self, workers=2, queue_limit=4):
+        self.queue_limit = queue_limit
+        # 用 fork 启动工作进程：spawn 会在子进程里重新导入服务器主模块
+        try:
+            context = multiprocessing.get_context('fork')
+        except ValueError:
+            context = None
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        # 启动时就创建工作进程，不在处理帧的过程中 fork
+        self._pool.submit(_warm_up)
+        self._latest = {}   # (会议号, 发布者, 层) -> 该层最新一帧的任务
+        self._pending = []  # 还没完成的任务
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.shared = 0
+        self.overloaded = 0
+        self.superseded = 0
+        self.failed = 0
+
+    def submit(self, key, frame_id, data, max_width, quality, receivers, context=None):
+        """
+        请求把一帧转码到某层，receivers 等待结果。
+        同一帧同一层已有任务时共享它：已完成时返回的任务带有 result，调用方直接发送；
+        否则接收者加入等待列表，由 completed() 取出后发送。排队的任务已满时返回 None
+        """
+        with self._lock:
+            job = self._latest.get(key)
+            if job is not None and job.frame_id == frame_id:
+                self.shared += 1
+                if job.result is None:
+                    job.receivers.update(receivers)
+                return job
+            if len(self._pending) >= self.queue_limit:
+                self.overloaded += 1
+                return None
+            future = self._pool.submit(transcode_jpeg, data, max_width, quality)
+            job = self._latest[key] = TranscodeJob(key, frame_id, future, context)
+            job.receivers.update(receivers)
+            self._pending.append(job)
+            self.submitted += 1
+            return job
+
+    def completed(self):
+        """取出已完成的任务；失败的任务和已被同一路流更新的帧取代的任务不返回"""
+        ready = []
+        with self._lock:
+            pending = []
+            for job in self._pending:
+                if not job.future.done():
+                    pending.append(job)
+                    continue
+                latest = self._latest.get(job.key) is job
+                try:
+                    job.result = job.future.result()
+                except Exception:
+                    self.failed += 1
+                    if latest:
+                        del self._latest[job.key]
+                    continue
+                if latest:
+                    ready.append((job, list(job.receivers)))
+                else:
+                    self.superseded += 1
+                job.receivers.clear()
+            self._pending = pending
+        return ready
+
+    def forget(self, meeting_id, user):
+        """发布者停止发送后丢弃它的缓存结果"""
+        with self._lock:
+            for key in [k for k in self._latest if k[0] == meeting_id and k[1] == user]:
+                del self._latest[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'submitted': self.submitted,
+                'shared': self.shared,
+                'overloaded': self.overloaded,
+                'superseded': self.superseded,
+                'failed': self.failed,
+            }
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)